@@ -13,7 +13,8 @@ import sys
 import argparse
 
 from entropy.i18n import _
-from entropy.output import blue, brown, darkgreen
+from entropy.output import blue, brown, darkgreen, darkred, purple
+from entropy.db.stats import SQLQueryStatistics
 
 from solo.commands.descriptor import SoloCommandDescriptor
 from solo.commands.command import SoloCommand, sharedlock
@@ -72,6 +73,22 @@ Manage Entropy Library Cache.
         clean_parser.set_defaults(func=self._clean)
         _commands.append("clean")
 
+        sqlstats_parser = subparsers.add_parser(
+            "sqlstats", help=_("show SQL query statistics saved by "
+                               "ETP_SQL_STATS"))
+        sqlstats_parser.add_argument(
+            "files", nargs="+", metavar="<file>",
+            help=_("SQL query statistics file"))
+        sqlstats_parser.add_argument(
+            "--limit", type=int, default=20,
+            help=_("number of statements to show"))
+        sqlstats_parser.add_argument(
+            "--explain", type=int, default=5,
+            help=_("number of the slowest statements to explain"))
+
+        sqlstats_parser.set_defaults(func=self._sqlstats)
+        _commands.append("sqlstats")
+
         self._commands = _commands
         return parser
 
@@ -116,6 +133,9 @@ Manage Entropy Library Cache.
         elif command == "enable":
             outcome += ["--verbose", "-v", "--quiet", "-q"]
 
+        elif command == "sqlstats":
+            outcome += ["--limit", "--explain"]
+
         return self._bashcomp(sys.stdout, last_arg, outcome)
 
     @sharedlock  # clear_cache uses inst_repo
@@ -137,6 +157,26 @@ Manage Entropy Library Cache.
         )
         return 0
 
+    def _sqlstats(self, entropy_client):
+        """
+        Solo Cache SQL Statistics command.
+        """
+        stats = SQLQueryStatistics()
+        stats.clear()
+        for path in self._nsargs.files:
+            try:
+                stats.load(path)
+            except (IOError, OSError, ValueError, KeyError) as err:
+                entropy_client.output(
+                    "%s: %s" % (purple(path), err),
+                    level = "error",
+                    header = darkred(" @@ "))
+                return 1
+
+        stats.report(limit = self._nsargs.limit,
+                     explain = self._nsargs.explain)
+        return 0
+
 
 SoloCommandDescriptor.register(
     SoloCommandDescriptor(
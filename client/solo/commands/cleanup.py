@@ -15,6 +15,7 @@ import argparse
 
 from entropy.i18n import _
 from entropy.const import etpConst
+from entropy.client.misc import PackageStore
 
 from solo.commands.descriptor import SoloCommandDescriptor
 from solo.commands.command import SoloCommand
@@ -87,6 +88,7 @@ Remove downloaded packages and clean temporary directories.
             dirs.append(os.path.join(
                     etpConst['entropypackagesworkdir'],
                     rel))
+        dirs.append(PackageStore.path())
         cleanup(entropy_client, dirs)
         return 0
 
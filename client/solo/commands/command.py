@@ -25,7 +25,7 @@ from entropy.core.settings.base import SystemSettings
 
 import entropy.tools
 
-from solo.utils import enlightenatom
+from solo.utils import enlightenatom, OutputPager
 
 
 def _fix_argparse_print_help():
@@ -142,6 +142,45 @@ class SoloCommand(object):
         msg = "%s: %s" % (_("not a valid Entropy package file"), string)
         raise argparse.ArgumentTypeError(msg)
 
+    def _argparse_is_non_negative_integer(self, string):
+        """
+        To be used with argparse add_argument() type parameter for
+        validating --limit and --offset values.
+        """
+        try:
+            value = int(string)
+        except ValueError:
+            value = -1
+        if value >= 0:
+            return value
+        msg = "%s: %s" % (_("not a valid non-negative number"), string)
+        raise argparse.ArgumentTypeError(msg)
+
+    def _setup_pagination_parser(self, parser):
+        """
+        Add --limit, --offset and --json switches to parser.
+        """
+        parser.add_argument(
+            "--limit", type=self._argparse_is_non_negative_integer,
+            default=None, metavar="<n>",
+            help=_("show at most <n> results"))
+        parser.add_argument(
+            "--offset", type=self._argparse_is_non_negative_integer,
+            default=0, metavar="<n>",
+            help=_("skip the first <n> results"))
+        parser.add_argument(
+            "--json", action="store_true", default=False,
+            help=_("print results as JSON objects, one per line"))
+
+    def _get_pager(self, nsargs):
+        """
+        Return an OutputPager object honoring the --limit and --offset
+        switches (see _setup_pagination_parser()).
+        """
+        return OutputPager(
+            offset=getattr(nsargs, "offset", 0),
+            limit=getattr(nsargs, "limit", None))
+
     def _setup_verbose_quiet_parser(self, parser):
         """
         Add --verbose and --quiet switches to parser.
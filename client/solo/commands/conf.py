@@ -77,6 +77,10 @@ Manage package file updates.
 
         update_parser = subparsers.add_parser(
             "update", help=_("update configuration files"))
+        update_parser.add_argument(
+            "--rescan", action="store_true", default=False,
+            help=_("scan the whole filesystem instead of relying "
+                   "on the list of updates recorded by Entropy"))
         update_parser.set_defaults(func=self._update)
         _commands.append("update")
 
@@ -122,7 +126,7 @@ Manage package file updates.
             outcome += self._commands
 
         elif command == "update":
-            pass # nothing to add
+            outcome += ["--rescan"]
 
         return self._bashcomp(sys.stdout, last_arg, outcome)
 
@@ -144,7 +148,10 @@ Manage package file updates.
                     darkgreen(_("Scanning filesystem")),),
                 header=brown(" @@ "))
 
-            scandata = updates.get()
+            # the full scan is only needed once, afterwards
+            # the journal is in sync with the filesystem
+            scandata = updates.get(
+                rescan=first_pass and self._nsargs.rescan)
             if not scandata:
                 entropy_client.output(
                     teal(_("All fine baby. Nothing to do!"))
@@ -10,6 +10,8 @@
     Solo Command descriptor class.
 
 """
+import os
+
 
 class SoloCommandDescriptor(object):
     """
@@ -20,6 +22,8 @@ class SoloCommandDescriptor(object):
     SOLO_COMMANDS = []
     SOLO_COMMANDS_MAP = {}
 
+    _SOLO_COMMANDS_LOADED = False
+
     @staticmethod
     def register(descriptor):
         """
@@ -29,13 +33,72 @@ class SoloCommandDescriptor(object):
         SoloCommandDescriptor.SOLO_COMMANDS_MAP[descriptor.get_name()] = \
             descriptor
 
+    @staticmethod
+    def _load_all():
+        """
+        Import all the solo.commands modules, so that every
+        command gets registered.
+        """
+        if SoloCommandDescriptor._SOLO_COMMANDS_LOADED:
+            return
+
+        cur_dir = os.path.dirname(os.path.abspath(__file__))
+        for py_file in sorted(os.listdir(cur_dir)):
+            if not py_file.endswith(".py"):
+                continue
+            if py_file.startswith("_"):
+                continue
+            # strip .py
+            mod = py_file[:-3]
+            if mod == "descriptor":
+                continue
+            try:
+                __import__("solo.commands." + mod)
+            except ValueError:
+                # garbage
+                continue
+        SoloCommandDescriptor._SOLO_COMMANDS_LOADED = True
+
     @staticmethod
     def obtain():
         """
         Get the list of registered SoloCommandDescriptor object
         """
+        SoloCommandDescriptor._load_all()
         return SoloCommandDescriptor.SOLO_COMMANDS[:]
 
+    @staticmethod
+    def obtain_class(name):
+        """
+        Get the SoloCommand class bound to the given command name
+        or alias. Only the module named after the command is imported,
+        aliases and unknown names cause all the commands to be loaded.
+
+        @param name: command name or alias
+        @type name: string
+        @return: the SoloCommand class or None, if not found
+        @rtype: class or None
+        """
+        if not SoloCommandDescriptor._SOLO_COMMANDS_LOADED and \
+                name and "." not in name and not name.startswith("_") and \
+                name != "descriptor":
+            try:
+                __import__("solo.commands." + name)
+            except ImportError:
+                pass
+
+        def _lookup():
+            for descriptor in SoloCommandDescriptor.SOLO_COMMANDS:
+                klass = descriptor.get_class()
+                if klass.NAME == name or name in klass.ALIASES:
+                    return klass
+
+        klass = _lookup()
+        if klass is None:
+            SoloCommandDescriptor._load_all()
+            klass = _lookup()
+        return klass
+
     @staticmethod
     def obtain_descriptor(name):
         """
@@ -47,7 +110,11 @@ class SoloCommandDescriptor(object):
         @raise KeyError: if name isn't bound to any
         SoloCommandDescriptor object.
         """
-        return SoloCommandDescriptor.SOLO_COMMANDS_MAP[name]
+        descriptor = SoloCommandDescriptor.SOLO_COMMANDS_MAP.get(name)
+        if descriptor is None:
+            SoloCommandDescriptor._load_all()
+            descriptor = SoloCommandDescriptor.SOLO_COMMANDS_MAP[name]
+        return descriptor
 
     def __init__(self, klass, name, description):
         self._klass = klass
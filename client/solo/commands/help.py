@@ -75,6 +75,9 @@ class SoloHelp(SoloCommand):
         parser.add_argument(
             "--color", action="store_true",
             default=None, help=_("force colored output"))
+        parser.add_argument(
+            "--profile", action="store_true",
+            default=None, help=_("print a timing summary at exit"))
 
         descriptors = SoloCommandDescriptor.obtain()
         descriptors.sort(key = lambda x: x.get_name())
@@ -11,7 +11,6 @@
 """
 import os
 import sys
-import re
 import argparse
 
 from entropy.const import etpConst, const_convert_to_unicode, \
@@ -20,12 +19,14 @@ from entropy.i18n import _, ngettext
 from entropy.output import darkgreen, darkred, blue, teal, purple, brown, \
     bold
 
+from entropy.client.misc import OrphanedFiles
+
 import entropy.tools
 
 from solo.commands.descriptor import SoloCommandDescriptor
 from solo.commands.command import SoloCommand, sharedlock
 from solo.utils import print_package_info, print_table, get_file_mime, \
-    graph_packages, revgraph_packages
+    graph_packages, revgraph_packages, print_packages, iter_package_data
 
 
 class SoloQuery(SoloCommand):
@@ -79,8 +80,13 @@ Repository query tools.
             "files", nargs='+', metavar="<file>",
             help=_("file path"))
         self._setup_verbose_quiet_parser(belongs_parser)
+        self._setup_pagination_parser(belongs_parser)
         belongs_parser.set_defaults(func=self._belongs)
-        _commands["belongs"] = {}
+        _commands["belongs"] = {
+            "--limit": {},
+            "--offset": {},
+            "--json": {},
+        }
 
         changelog_parser = subparsers.add_parser(
             "changelog",
@@ -99,8 +105,13 @@ Repository query tools.
             "packages", nargs='+', metavar="<package>",
             help=_("package name"))
         self._setup_verbose_quiet_parser(revdeps_parser)
+        self._setup_pagination_parser(revdeps_parser)
         revdeps_parser.set_defaults(func=self._revdeps)
-        _commands["revdeps"] = {}
+        _commands["revdeps"] = {
+            "--limit": {},
+            "--offset": {},
+            "--json": {},
+        }
 
         desc_parser = subparsers.add_parser(
             "description",
@@ -110,7 +121,12 @@ Repository query tools.
             help=_("description keyword"))
         desc_parser.set_defaults(func=self._description)
         self._setup_verbose_quiet_parser(desc_parser)
-        _commands["description"] = {}
+        self._setup_pagination_parser(desc_parser)
+        _commands["description"] = {
+            "--limit": {},
+            "--offset": {},
+            "--json": {},
+        }
 
         files_parser = subparsers.add_parser(
             "files",
@@ -130,7 +146,12 @@ Repository query tools.
             help=_("package name"))
         installed_parser.set_defaults(func=self._installed)
         self._setup_verbose_quiet_parser(installed_parser)
-        _commands["installed"] = {}
+        self._setup_pagination_parser(installed_parser)
+        _commands["installed"] = {
+            "--limit": {},
+            "--offset": {},
+            "--json": {},
+        }
 
         lic_parser = subparsers.add_parser(
             "license",
@@ -162,9 +183,13 @@ Repository query tools.
             "repos", metavar="<repo>", nargs="*",
             help=_("only list packages installed from given repositories"))
         self._setup_verbose_quiet_parser(installed_parser)
+        self._setup_pagination_parser(installed_parser)
         installed_parser.set_defaults(func=self._list_installed)
         list_d["installed"] = {
             "--by-user": {},
+            "--limit": {},
+            "--offset": {},
+            "--json": {},
         }
 
         available_parser = list_subparsers.add_parser(
@@ -173,8 +198,13 @@ Repository query tools.
             "repos", metavar="<repo>", nargs="+",
             help=_("only list packages from given repositories"))
         self._setup_verbose_quiet_parser(available_parser)
+        self._setup_pagination_parser(available_parser)
         available_parser.set_defaults(func=self._list_available)
-        list_d["available"] = {}
+        list_d["available"] = {
+            "--limit": {},
+            "--offset": {},
+            "--json": {},
+        }
 
 
         mime_parser = subparsers.add_parser(
@@ -350,21 +380,21 @@ Repository query tools.
         """
         Solo Query Belongs command.
         """
-        quiet = self._nsargs.quiet
+        json_output = self._nsargs.json
+        quiet = self._nsargs.quiet or json_output
         verbose = self._nsargs.verbose
         files = self._nsargs.files
+        pager = self._get_pager(self._nsargs)
 
         if not quiet:
             entropy_client.output(
                 darkgreen(_("Belong Search")),
                 header=darkred(" @@ "))
 
-        results = {}
         reverse_symlink_map = entropy_client.Settings(
             )['system_rev_symlinks']
 
         for xfile in files:
-            outcome = results.setdefault(xfile, set())
 
             pkg_ids = inst_repo.searchBelongs(xfile)
             if not pkg_ids:
@@ -384,25 +414,21 @@ Repository query tools.
                         if pkg_ids:
                             break
 
-            outcome.update(pkg_ids)
-
-        key_sorter = lambda x: inst_repo.retrieveAtom(x)
+            atoms = inst_repo.retrieveAtomMany(pkg_ids)
+            pkg_ids = sorted(pkg_ids, key=atoms.get)
 
-        matches_found = 0
-
-        for xfile, pkg_ids in results.items():
-
-            matches_found += len(pkg_ids)  # can be incorrect
-
-            for pkg_id in sorted(pkg_ids, key=key_sorter):
-                if quiet:
-                    atom = inst_repo.retrieveAtom(pkg_id)
+            if json_output:
+                print_packages(pkg_ids, entropy_client, inst_repo,
+                    pager=pager, json_output=True, installed_search=True)
+            elif quiet:
+                for pkg_id in pager.page(pkg_ids):
+                    atom = atoms.get(pkg_id)
                     if atom is not None:
                         entropy_client.output(atom, level="generic")
-                else:
-                    print_package_info(pkg_id, entropy_client,
-                        inst_repo, installed_search=True,
-                        extended=verbose, quiet=quiet)
+            else:
+                print_packages(pkg_ids, entropy_client, inst_repo,
+                    pager=pager, installed_search=True,
+                    extended=verbose, quiet=quiet)
 
             if not quiet:
                 entries_txt = ngettext("entry", "entries", len(pkg_ids))
@@ -504,10 +530,12 @@ Repository query tools.
         """
         Solo Query Revdeps command.
         """
-        quiet = self._nsargs.quiet
+        json_output = self._nsargs.json
+        quiet = self._nsargs.quiet or json_output
         verbose = self._nsargs.verbose
         packages = self._nsargs.packages
         settings = entropy_client.Settings()
+        pager = self._get_pager(self._nsargs)
 
         if not quiet:
             entropy_client.output(
@@ -553,11 +581,12 @@ Repository query tools.
             search_results = repo.retrieveReverseDependencies(
                 package_id, exclude_deptypes=excluded_dep_types)
 
-            key_sorter = lambda x: repo.retrieveAtom(x)
-            for pkg_id in sorted(search_results, key=key_sorter):
-                print_package_info(pkg_id, entropy_client, repo,
-                    installed_search=True, strict_output=quiet,
-                    extended=verbose, quiet=quiet)
+            atoms = repo.retrieveAtomMany(search_results)
+            print_packages(
+                sorted(search_results, key=atoms.get), entropy_client,
+                repo, pager=pager, json_output=json_output,
+                installed_search=True, strict_output=quiet,
+                extended=verbose, quiet=quiet)
 
             if quiet:
                 continue
@@ -604,10 +633,12 @@ Repository query tools.
         """
         Solo Query Description command.
         """
-        quiet = self._nsargs.quiet
+        json_output = self._nsargs.json
+        quiet = self._nsargs.quiet or json_output
         verbose = self._nsargs.verbose
         descriptions = self._nsargs.descriptions
         settings = entropy_client.Settings()
+        pager = self._get_pager(self._nsargs)
 
         found = False
         if not quiet:
@@ -632,7 +663,8 @@ Repository query tools.
 
             repo = entropy_client.open_repository(repo_id)
             found = self._search_descriptions(
-                descriptions, entropy_client, repo, quiet, verbose)
+                descriptions, entropy_client, repo, quiet, verbose,
+                pager=pager, json_output=json_output)
 
         if not quiet and not found:
             entropy_client.output(
@@ -643,9 +675,9 @@ Repository query tools.
 
     def _search_descriptions(self, descriptions,
                              entropy_client, entropy_repository,
-                             quiet, verbose):
+                             quiet, verbose, pager = None,
+                             json_output = False):
 
-        key_sorter = lambda x: entropy_repository.retrieveAtom(x)
         found = 0
         for desc in descriptions:
 
@@ -655,16 +687,19 @@ Repository query tools.
                 continue
 
             found += len(pkg_ids)
-            for pkg_id in sorted(pkg_ids, key = key_sorter):
-                if quiet:
-                    entropy_client.output(
-                        entropy_repository.retrieveAtom(pkg_id))
-                else:
-                    print_package_info(
-                        pkg_id, entropy_client,
-                        entropy_repository,
-                        extended = verbose, strict_output = False,
-                        quiet = False)
+            atoms = entropy_repository.retrieveAtomMany(pkg_ids)
+            pkg_ids = sorted(pkg_ids, key = atoms.get)
+            if quiet and not json_output:
+                if pager is not None:
+                    pkg_ids = pager.page(pkg_ids)
+                for pkg_id in pkg_ids:
+                    entropy_client.output(atoms.get(pkg_id))
+            else:
+                print_packages(
+                    pkg_ids, entropy_client, entropy_repository,
+                    pager = pager, json_output = json_output,
+                    extended = verbose, strict_output = False,
+                    quiet = False)
 
             if not quiet:
                 toc = []
@@ -729,7 +764,9 @@ Repository query tools.
         search = SoloSearch(
             self._nsargs, quiet=self._nsargs.quiet,
             verbose=self._nsargs.verbose,
-            installed=True, packages=self._nsargs.packages)
+            installed=True, packages=self._nsargs.packages,
+            limit=self._nsargs.limit, offset=self._nsargs.offset,
+            json_output=self._nsargs.json)
         return search.search(entropy_client)
 
     def _license(self, entropy_client):
@@ -763,7 +800,6 @@ Repository query tools.
                     header=blue(header))
 
             repo = entropy_client.open_repository(repo_id)
-            key_sorter = lambda x: repo.retrieveAtom(x)
             for mylicense in licenses:
 
                 results = repo.searchLicense(mylicense, just_id = True)
@@ -771,7 +807,8 @@ Repository query tools.
                     continue
 
                 found = True
-                for pkg_id in sorted(results, key = key_sorter):
+                atoms = repo.retrieveAtomMany(results)
+                for pkg_id in sorted(results, key = atoms.get):
                     print_package_info(
                         pkg_id, entropy_client, repo,
                         extended = verbose,
@@ -803,9 +840,10 @@ Repository query tools.
         List packages in repository. The filter functions determine
         what packages shall be listed.
         """
-        quiet = self._nsargs.quiet
+        json_output = self._nsargs.json
+        quiet = self._nsargs.quiet or json_output
         verbose = self._nsargs.verbose
-        settings = entropy_client.Settings()
+        pager = self._get_pager(self._nsargs)
 
         if not quiet:
             entropy_client.output(
@@ -821,21 +859,28 @@ Repository query tools.
                 [(x, repository_id) for x in pkg_ids])
             pkg_ids = [x[0] for x in pkg_mtc]
 
-        for pkg_id in pkg_ids:
-            atom = entropy_repository.retrieveAtom(pkg_id)
-            if atom is None:
-                continue
+        if json_output:
+            print_packages(pkg_ids, entropy_client, entropy_repository,
+                pager=pager, json_output=True)
+            return 0
+
+        fields = ("atom",)
+        if verbose:
+            fields = ("atom", "branch", "disksize")
+
+        for pkg_id, data in iter_package_data(
+                pager.page(pkg_ids), entropy_repository, fields=fields):
+            atom = data["atom"]
             if not verbose:
                 atom = entropy.dep.dep_getkey(atom)
 
             branchinfo = ""
             sizeinfo = ""
             if verbose:
-                branch = entropy_repository.retrieveBranch(pkg_id)
+                branch = data["branch"]
                 branchinfo = darkgreen(" [") + darkred(branch) + \
                     darkgreen("] ")
-                mysize = entropy_repository.retrieveOnDiskSize(pkg_id)
-                mysize = entropy.tools.bytes_into_human(mysize)
+                mysize = entropy.tools.bytes_into_human(data["disksize"])
                 sizeinfo = brown(" [") + purple(mysize) + brown("]")
 
             if not quiet:
@@ -960,9 +1005,16 @@ Repository query tools.
             if matches:
                 found = True
 
-            key_sorter = lambda x: \
-                entropy_client.open_repository(x[1]).retrieveAtom(x[0])
-            for pkg_id, pkg_repo in sorted(matches, key = key_sorter):
+            repo_pkg_ids = {}
+            for pkg_id, pkg_repo in matches:
+                obj = repo_pkg_ids.setdefault(pkg_repo, [])
+                obj.append(pkg_id)
+            atoms = {}
+            for pkg_repo, pkg_ids in repo_pkg_ids.items():
+                repo = entropy_client.open_repository(pkg_repo)
+                for pkg_id, atom in repo.retrieveAtomMany(pkg_ids).items():
+                    atoms[(pkg_id, pkg_repo)] = atom
+            for pkg_id, pkg_repo in sorted(matches, key = atoms.get):
                 repo = entropy_client.open_repository(pkg_repo)
                 print_package_info(pkg_id, entropy_client, repo,
                     extended = verbose, quiet = quiet)
@@ -1058,80 +1110,24 @@ Repository query tools.
                 darkgreen(_("Orphans Search")),
                 header=darkred(" @@ "))
 
-        reverse_symlink_map = settings['system_rev_symlinks']
-        system_dirs_mask = [x for x in settings['system_dirs_mask'] \
-            if entropy.tools.is_valid_path(x)]
-        # make sure we're all rawstring.
-        system_dirs_mask = [const_convert_to_rawstring(x) for x in \
-                system_dirs_mask]
+        scanner = OrphanedFiles(entropy_client)
 
-        system_dirs_mask_regexp = []
-        for mask in settings['system_dirs_mask']:
-            reg_mask = re.compile(mask)
-            system_dirs_mask_regexp.append(reg_mask)
-
-        file_data = set()
-        dirs = settings['system_dirs']
-        count = 0
-        for xdir in dirs:
-            # make sure it's bytes (raw encoding
-            # as per EntropyRepository.retrieveContent())
-            xdir = const_convert_to_rawstring(
-                    xdir,
-                    from_enctype=etpConst['conf_raw_encoding'])
-            try:
-                wd = os.walk(xdir)
-            except RuntimeError: # maximum recursion?
-                continue
-
-            for currentdir, subdirs, files in wd:
-                found_files = set()
-
-                for filename in files:
-                    filename = os.path.join(currentdir, filename)
-
-                    # filter symlinks, broken ones will be reported
-                    if os.path.islink(filename) and \
-                            os.path.lexists(filename):
-                        continue
-
-                    do_cont = False
-                    for mask in system_dirs_mask:
-                        if filename.startswith(mask):
-                            do_cont = True
-                            break
-                    if do_cont:
-                        continue
-
-                    for mask in system_dirs_mask_regexp:
-                        if mask.match(filename):
-                            do_cont = True
-                            break
-
-                    if do_cont:
-                        continue
-
-                    count += 1
-                    filename_utf = const_convert_to_unicode(filename)
-                    if not quiet and ((count == 0) or (count % 500 == 0)):
-                        count = 0
-                        if len(filename_utf) > 50:
-                            fname = filename_utf[:40] + \
-                                const_convert_to_unicode("...") + \
-                                filename_utf[-10:]
-                        else:
-                            fname = filename_utf
-                        entropy_client.output(
-                            "%s: %s" % (
-                                blue(_("Analyzing")),
-                                fname),
-                            header=darkred(" @@ "),
-                            back=True)
-                    found_files.add(filename_utf)
-
-                if found_files:
-                    file_data |= found_files
+        def _progress(filename_utf):
+            if len(filename_utf) > 50:
+                fname = filename_utf[:40] + \
+                    const_convert_to_unicode("...") + \
+                    filename_utf[-10:]
+            else:
+                fname = filename_utf
+            entropy_client.output(
+                "%s: %s" % (
+                    blue(_("Analyzing")),
+                    fname),
+                header=darkred(" @@ "),
+                back=True)
 
+        file_data = scanner.collect(
+            progress=None if quiet else _progress)
         totalfiles = len(file_data)
 
         if not quiet:
@@ -1156,41 +1152,8 @@ Repository query tools.
                     bold(const_convert_to_unicode(totalfiles)),),
                 header=darkred(" @@ "))
 
-
-        pkg_ids = inst_repo.listAllPackageIds()
-        length = str(len(pkg_ids))
-        count = 0
-
-        def gen_cont(pkg_id):
-            for path, ftype in inst_repo.retrieveContentIter(
-                pkg_id):
-                # reverse sym
-                for sym_dir in reverse_symlink_map:
-                    if path.startswith(sym_dir):
-                        for sym_child in reverse_symlink_map[sym_dir]:
-                            yield sym_child+path[len(sym_dir):]
-                # real path also
-                dirname_real = os.path.realpath(os.path.dirname(path))
-                yield os.path.join(dirname_real, os.path.basename(path))
-                yield path
-
-        for pkg_id in pkg_ids:
-
-            if not quiet:
-                count += 1
-                atom = inst_repo.retrieveAtom(pkg_id)
-                if atom is None:
-                    continue
-                entropy_client.output(
-                    "%s: %s" % (
-                        blue(_("Checking")),
-                        bold(atom),),
-                    header=darkred(" @@ "),
-                    count=(count, length),
-                    back=True)
-
-            # remove from file_data
-            file_data -= set(gen_cont(pkg_id))
+        # remove from file_data
+        file_data.difference_update(scanner.owned_files(inst_repo))
 
         orphanedfiles = len(file_data)
         fname = "/tmp/entropy-orphans.txt"
@@ -1268,12 +1231,12 @@ Repository query tools.
                 darkgreen(_("Required Packages Search")),
                 header=darkred(" @@ "))
 
-        key_sorter = lambda x: inst_repo.retrieveAtom(x)
         for library in libraries:
             results = inst_repo.searchNeeded(
                 library, like = True)
 
-            for pkg_id in sorted(results, key = key_sorter):
+            atoms = inst_repo.retrieveAtomMany(results)
+            for pkg_id in sorted(results, key = atoms.get):
                 print_package_info(
                     pkg_id, entropy_client, inst_repo,
                     installed_search=True, strict_output=True,
@@ -1388,8 +1351,8 @@ Repository query tools.
             for slot in slots:
 
                 results = repo.searchSlotted(slot, just_id = True)
-                key_sorter = lambda x: repo.retrieveAtom(x)
-                for pkg_id in sorted(results, key = key_sorter):
+                atoms = repo.retrieveAtomMany(results)
+                for pkg_id in sorted(results, key = atoms.get):
                     found = True
                     print_package_info(pkg_id, entropy_client, repo,
                         extended=verbose, strict_output=quiet,
@@ -1451,8 +1414,8 @@ Repository query tools.
             for tag in tags:
 
                 results = repo.searchTaggedPackages(tag)
-                key_sorter = lambda x: repo.retrieveAtom(x)
-                for pkg_id in sorted(results, key = key_sorter):
+                atoms = repo.retrieveAtomMany(results)
+                for pkg_id in sorted(results, key = atoms.get):
                     found = True
                     print_package_info(pkg_id, entropy_client, repo,
                         extended=verbose, strict_output=quiet,
@@ -1493,14 +1456,14 @@ Repository query tools.
                 header=darkred(" @@ "))
 
         found = False
-        key_sorter = lambda x: inst_repo.retrieveAtom(x)
 
         for revision in revisions:
             results = inst_repo.searchRevisionedPackages(
                 revision)
 
             found = True
-            for pkg_id in sorted(results, key = key_sorter):
+            atoms = inst_repo.retrieveAtomMany(results)
+            for pkg_id in sorted(results, key = atoms.get):
                 print_package_info(
                     pkg_id, entropy_client, inst_repo,
                     extended=verbose, strict_output=quiet,
@@ -17,7 +17,7 @@ from entropy.output import darkred, blue, brown, darkgreen, purple
 
 from solo.commands.descriptor import SoloCommandDescriptor
 from solo.commands.command import SoloCommand, sharedlock
-from solo.utils import print_table, print_package_info
+from solo.utils import print_table, print_packages, OutputPager
 
 import entropy.dep
 
@@ -36,12 +36,16 @@ Search for packages.
     SEE_ALSO = ""
 
     def __init__(self, args, quiet=False, verbose=False, installed=False,
-                 available=False, packages=None):
+                 available=False, packages=None, limit=None, offset=0,
+                 json_output=False):
         SoloCommand.__init__(self, args)
         self._quiet = quiet
         self._verbose = verbose
         self._installed = installed
         self._available = available
+        self._limit = limit
+        self._offset = offset
+        self._json = json_output
         if packages is not None:
             self._packages = packages
         else:
@@ -84,6 +88,8 @@ Search for packages.
                            default=self._available,
                            help=_('search among available packages only'))
 
+        self._setup_pagination_parser(parser)
+
         return parser
 
     def parse(self):
@@ -101,6 +107,9 @@ Search for packages.
         self._verbose = nsargs.verbose
         self._installed = nsargs.installed
         self._available = nsargs.available
+        self._limit = nsargs.limit
+        self._offset = nsargs.offset
+        self._json = nsargs.json
         self._packages = nsargs.string
         return self._call_shared, [self.search]
 
@@ -110,15 +119,16 @@ Search for packages.
         """
         args = [
             "--quiet", "-q", "--verbose", "-v",
-            "--installed", "--available"]
+            "--installed", "--available",
+            "--limit", "--offset", "--json"]
         args.sort()
         return self._bashcomp(sys.stdout, last_arg, args)
 
     def _search_string(self, entropy_client, inst_repo, string):
         """
-        Search method, returns search results.
+        Search method, yields (repository, package ids) search results,
+        one repository at a time. Package ids are sorted by atom.
         """
-        search_data = set()
         found = False
 
         def _adv_search(dbconn, package):
@@ -136,46 +146,46 @@ Search for packages.
                     pkg_ids.add(pkg_id)
             return pkg_ids
 
+        def _sorted(dbconn, pkg_ids):
+            atoms = dbconn.retrieveAtomMany(pkg_ids)
+            return sorted(pkg_ids, key = atoms.get)
+
         if not self._installed:
             for repo in entropy_client.repositories():
                 dbconn = entropy_client.open_repository(repo)
                 pkg_ids = _adv_search(dbconn, string)
                 if pkg_ids:
                     found = True
-                search_data.update(((x, repo) for x in pkg_ids))
+                    yield dbconn, _sorted(dbconn, pkg_ids)
 
         # try to actually match something in installed packages db
         if not found and (inst_repo is not None) \
             and not self._available:
             with inst_repo.shared():
                 pkg_ids = _adv_search(inst_repo, string)
+                if pkg_ids:
+                    pkg_ids = _sorted(inst_repo, pkg_ids)
             if pkg_ids:
-                found = True
-            search_data.update(
-                ((x, inst_repo.repository_id()) for x in pkg_ids))
-
-        with inst_repo.shared():
-            key_sorter = lambda x: \
-                entropy_client.open_repository(x[1]).retrieveAtom(x[0])
-            return sorted(search_data, key=key_sorter)
+                yield inst_repo, pkg_ids
 
     @sharedlock
     def search(self, entropy_client, inst_repo):
         """
         Solo Search command.
         """
-        if not self._quiet:
+        quiet = self._quiet or self._json
+        if not quiet:
             entropy_client.output(
                 "%s..." % (darkgreen(_("Searching")),),
                 header=darkred(" @@ "))
 
+        pager = OutputPager(offset=self._offset, limit=self._limit)
         matches_found = 0
         for string in self._packages:
-            results = self._search(
-                entropy_client, inst_repo, string)
-            matches_found += len(results)
+            matches_found += self._search(
+                entropy_client, inst_repo, string, pager)
 
-        if not self._quiet:
+        if not quiet:
             toc = []
             toc.append(("%s:" % (blue(_("Keywords")),),
                 purple(', '.join(self._packages))))
@@ -188,22 +198,26 @@ Search for packages.
             return 1
         return 0
 
-    def _search(self, entropy_client, inst_repo, string):
+    def _search(self, entropy_client, inst_repo, string, pager):
         """
-        Solo Search string command.
+        Solo Search string command. Results are printed while they are
+        found, return the number of matches.
         """
-        results = self._search_string(
-            entropy_client, inst_repo, string)
-
-        for pkg_id, pkg_repo in results:
-            repo = entropy_client.open_repository(pkg_repo)
-            print_package_info(
-                pkg_id, entropy_client, repo,
+        matches_found = 0
+        for repo, pkg_ids in self._search_string(
+                entropy_client, inst_repo, string):
+            matches_found += len(pkg_ids)
+            if pager.exhausted():
+                continue
+            print_packages(
+                pkg_ids, entropy_client, repo,
+                pager = pager,
+                json_output = self._json,
                 extended = self._verbose,
                 installed_search = repo is inst_repo,
                 quiet = self._quiet)
 
-        return results
+        return matches_found
 
 
 SoloCommandDescriptor.register(
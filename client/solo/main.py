@@ -12,6 +12,7 @@
 import os
 import sys
 import errno
+import atexit
 import pdb
 
 from entropy.i18n import _
@@ -22,6 +23,7 @@ from entropy.const import etpConst, const_convert_to_rawstring, \
     const_convert_to_unicode, const_debug_enabled, const_mkstemp
 from entropy.exceptions import SystemDatabaseError, OnlineMirrorError, \
     RepositoryError, PermissionDenied, FileNotFound, SPMError
+from entropy.tracing import Tracer
 
 import entropy.tools
 
@@ -246,12 +248,39 @@ def warn_live_system():
              " severely compromised")))
     print_warning("")
 
+def print_profile():
+    """
+    Print the tracing summary collected during the execution to stderr.
+    """
+    summary = Tracer().summary()
+    if not summary:
+        return
+
+    name_len = max([len(x[0]) for x in summary] + [len("phase")])
+    row_fmt = "%%-%ds %%10s %%12s %%12s\n" % (name_len,)
+    sys.stderr.write("\n" + row_fmt % ("phase", "calls", "total (s)", "max (s)"))
+    for name, count, total, max_duration in summary:
+        if total is None:
+            # instant events, like cache hits
+            total, max_duration = "-", "-"
+        else:
+            total = "%.4f" % (total,)
+            max_duration = "%.4f" % (max_duration,)
+        sys.stderr.write(row_fmt % (name, count, total, max_duration))
+    sys.stderr.flush()
+
 def main():
 
     is_color = "--color" in sys.argv
     if is_color:
         sys.argv.remove("--color")
 
+    is_profile = "--profile" in sys.argv
+    if is_profile:
+        sys.argv.remove("--profile")
+        Tracer().enable()
+        atexit.register(print_profile)
+
     if not is_color and not is_stdout_a_tty():
         nocolor()
 
@@ -259,17 +288,6 @@ def main():
 
     install_exception_handler()
 
-    descriptors = SoloCommandDescriptor.obtain()
-    args_map = {}
-    catch_all = None
-    for descriptor in descriptors:
-        klass = descriptor.get_class()
-        if klass.CATCH_ALL:
-            catch_all = klass
-        args_map[klass.NAME] = klass
-        for alias in klass.ALIASES:
-            args_map[alias] = klass
-
     args = sys.argv[1:]
     # convert args to unicode, to avoid passing
     # raw string stuff down to entropy layers
@@ -299,8 +317,12 @@ def main():
         last_arg = args[-1]
         cmd = args[0]
         args = args[1:]
-    cmd_class = args_map.get(cmd)
-    yell_class = args_map.get("yell")
+    # only import the modules implementing the requested command
+    catch_all = SoloCommandDescriptor.obtain_class("help")
+    cmd_class = None
+    if cmd is not None:
+        cmd_class = SoloCommandDescriptor.obtain_class(cmd)
+    yell_class = SoloCommandDescriptor.obtain_class("yell")
 
     if cmd_class is None:
         cmd_class = catch_all
@@ -11,7 +11,10 @@
 """
 import errno
 import os
+import sys
 import codecs
+import itertools
+import json
 import subprocess
 
 from entropy.const import etpConst, const_convert_to_unicode
@@ -293,12 +296,24 @@ def get_entropy_webservice(entropy_client, repository_id, tx_cb = False):
 def print_package_info(package_id, entropy_client, entropy_repository,
     installed_search = False, strict_output = False, extended = False,
     quiet = False, show_download_if_quiet = False, show_repo_if_quiet = False,
-    show_desc_if_quiet = False, show_slot_if_quiet = False):
+    show_desc_if_quiet = False, show_slot_if_quiet = False,
+    package_data = None):
     """
     Print Entropy Package Metadata in a pretty and uniform way.
+    package_data can be a (partial) getPackageData() dict, prefetched
+    through iter_package_data(), its values are used in place of the
+    related retrieve*() calls.
     """
+    if package_data is None:
+        package_data = {}
+
+    def _retrieve(key, retrieve_func):
+        if key in package_data:
+            return package_data[key]
+        return retrieve_func(package_id)
+
     if quiet:
-        atom = entropy_repository.retrieveAtom(package_id)
+        atom = _retrieve("atom", entropy_repository.retrieveAtom)
         if atom is None:
             return
         if not extended:
@@ -310,20 +325,22 @@ def print_package_info(package_id, entropy_client, entropy_repository,
 
         desc = ""
         if show_desc_if_quiet:
-            pkgdesc = entropy_repository.retrieveDescription(package_id)
+            pkgdesc = _retrieve(
+                "description", entropy_repository.retrieveDescription)
             if pkgdesc is None:
                 return
             desc = " %s" % (pkgdesc,)
 
         download = ""
         if show_download_if_quiet:
-            pkgdown = entropy_repository.retrieveDownloadURL(package_id)
+            pkgdown = _retrieve(
+                "download", entropy_repository.retrieveDownloadURL)
             if pkgdown is None:
                 return
             download = " %s" % (pkgdown,)
 
         if show_slot_if_quiet:
-            pkgslot = entropy_repository.retrieveSlot(package_id)
+            pkgslot = _retrieve("slot", entropy_repository.retrieveSlot)
             if pkgslot is None:
                 return
 
@@ -337,33 +354,35 @@ def print_package_info(package_id, entropy_client, entropy_repository,
 
     corrupted_str = _("n/a")
 
-    pkgatom = entropy_repository.retrieveAtom(package_id) or corrupted_str
+    pkgatom = _retrieve(
+        "atom", entropy_repository.retrieveAtom) or corrupted_str
 
-    pkghome = entropy_repository.retrieveHomepage(package_id)
+    pkghome = _retrieve("homepage", entropy_repository.retrieveHomepage)
     if pkghome is None:
         pkghome = corrupted_str
 
-    pkgslot = entropy_repository.retrieveSlot(package_id)
+    pkgslot = _retrieve("slot", entropy_repository.retrieveSlot)
     if pkgslot is None:
         pkgslot = corrupted_str
 
-    pkgver = entropy_repository.retrieveVersion(package_id)
+    pkgver = _retrieve("version", entropy_repository.retrieveVersion)
     if pkgver is None:
         pkgver = corrupted_str
 
-    pkgtag = entropy_repository.retrieveTag(package_id)
+    pkgtag = _retrieve("versiontag", entropy_repository.retrieveTag)
     if pkgtag is None:
         pkgtag = corrupted_str
 
-    pkgrev = entropy_repository.retrieveRevision(package_id)
+    pkgrev = _retrieve("revision", entropy_repository.retrieveRevision)
     if pkgrev is None:
         pkgrev = 0
 
-    pkgdesc = entropy_repository.retrieveDescription(package_id)
+    pkgdesc = _retrieve(
+        "description", entropy_repository.retrieveDescription)
     if pkgdesc is None:
         pkgdesc = corrupted_str
 
-    pkgbranch = entropy_repository.retrieveBranch(package_id)
+    pkgbranch = _retrieve("branch", entropy_repository.retrieveBranch)
     if pkgbranch is None:
         pkgbranch = corrupted_str
 
@@ -403,10 +422,11 @@ def print_package_info(package_id, entropy_client, entropy_repository,
         ", [" + purple(str(entropy_repository.repository_id())) + "] ")
 
     if not strict_output and extended:
-        pkgname = entropy_repository.retrieveName(package_id)
+        pkgname = _retrieve("name", entropy_repository.retrieveName)
         if pkgname is None:
             pkgname = corrupted_str
-        pkgcat = entropy_repository.retrieveCategory(package_id)
+        pkgcat = _retrieve(
+            "category", entropy_repository.retrieveCategory)
         if pkgcat is None:
             pkgcat = corrupted_str
 
@@ -453,11 +473,13 @@ def print_package_info(package_id, entropy_client, entropy_repository,
             pkgsize = entropy_repository.retrieveSize(package_id)
             pkgsize = entropy.tools.bytes_into_human(pkgsize)
 
-            pkgbin = entropy_repository.retrieveDownloadURL(package_id)
+            pkgbin = _retrieve(
+                "download", entropy_repository.retrieveDownloadURL)
             if pkgbin is None:
                 pkgbin = corrupted_str
 
-            pkgdigest = entropy_repository.retrieveDigest(package_id)
+            pkgdigest = _retrieve(
+                "digest", entropy_repository.retrieveDigest)
             if pkgdigest is None:
                 pkgdigest = corrupted_str
 
@@ -585,7 +607,7 @@ def print_package_info(package_id, entropy_client, entropy_repository,
             toc.append((darkgreen("       %s:" % (_("Created"),)),
                 purple(pkgcreatedate)))
 
-        pkglic = entropy_repository.retrieveLicense(package_id)
+        pkglic = _retrieve("license", entropy_repository.retrieveLicense)
         if pkglic is None:
             pkglic = corrupted_str
 
@@ -594,6 +616,117 @@ def print_package_info(package_id, entropy_client, entropy_repository,
 
     print_table(entropy_client, toc, cell_spacing = 3)
 
+#: package metadata prefetched by iter_package_data(), the
+#: getPackageData() "base" group keys used by print_package_info()
+PACKAGE_INFO_FIELDS = ("atom", "name", "category", "version", "versiontag",
+                       "revision", "slot", "branch", "description",
+                       "homepage", "license", "download", "digest", "size")
+
+#: number of packages whose metadata is fetched at once
+PACKAGE_BATCH_SIZE = 200
+
+def iter_package_data(package_ids, entropy_repository, fields = None,
+                      batch_size = PACKAGE_BATCH_SIZE):
+    """
+    Yield (package_id, metadata dict) tuples for the given package
+    identifiers, keeping their order. Metadata is fetched in batches
+    through getPackageDataMany() while the iterator is consumed.
+    Unavailable package identifiers are skipped.
+    """
+    if fields is None:
+        fields = PACKAGE_INFO_FIELDS
+
+    package_ids = iter(package_ids)
+    while True:
+        batch = list(itertools.islice(package_ids, batch_size))
+        if not batch:
+            break
+        batch_data = entropy_repository.getPackageDataMany(
+            batch, fields = fields)
+        for package_id in batch:
+            data = batch_data.get(package_id)
+            if data is not None:
+                yield package_id, data
+
+
+class OutputPager(object):
+
+    """
+    Apply --offset and --limit to one or more result streams, the
+    window is shared across all of them.
+    """
+
+    def __init__(self, offset = 0, limit = None):
+        self._skip = offset or 0
+        self._left = limit
+
+    def exhausted(self):
+        """
+        Return whether the output limit has been reached.
+        """
+        return self._left is not None and self._left <= 0
+
+    def page(self, iterable):
+        """
+        Yield the items of iterable falling into the output window.
+        """
+        for item in iterable:
+            if self.exhausted():
+                break
+            if self._skip > 0:
+                self._skip -= 1
+                continue
+            if self._left is not None:
+                self._left -= 1
+            yield item
+
+
+def print_package_json(package_id, entropy_repository, package_data,
+                       installed_search = False):
+    """
+    Print Entropy Package Metadata as a JSON object, on a single line.
+    """
+    record = {
+        "package_id": package_id,
+        "repository": entropy_repository.repository_id(),
+        "installed": installed_search,
+    }
+    record.update(package_data)
+    atom = record.get("atom")
+    if atom:
+        record["key"] = entropy.dep.dep_getkey(atom)
+    sys.stdout.write(json.dumps(record, sort_keys = True) + "\n")
+    sys.stdout.flush()
+
+def print_packages(package_ids, entropy_client, entropy_repository,
+                   pager = None, json_output = False, **kwargs):
+    """
+    Print the given package identifiers, streaming their metadata
+    (see iter_package_data()) into print_package_info() or, if
+    json_output is True, print_package_json(). The optional OutputPager
+    restricts the printed packages. Keyword arguments are passed to
+    print_package_info().
+
+    @return: number of printed packages
+    @rtype: int
+    """
+    if pager is not None:
+        package_ids = pager.page(package_ids)
+
+    count = 0
+    for package_id, data in iter_package_data(
+            package_ids, entropy_repository):
+        count += 1
+        if json_output:
+            print_package_json(
+                package_id, entropy_repository, data,
+                installed_search = kwargs.get("installed_search", False))
+        else:
+            print_package_info(
+                package_id, entropy_client, entropy_repository,
+                package_data = data, **kwargs)
+    return count
+
 def revgraph_packages(packages, entropy_client, complete = False,
     repository_ids = None, quiet = False):
 
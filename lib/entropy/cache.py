@@ -26,6 +26,7 @@ from entropy.const import etpConst, const_debug_write, \
     const_mkdtemp
 from entropy.core import Singleton
 from entropy.misc import TimeScheduled, ParallelTask, Lifo
+from entropy.tracing import Tracer
 import time
 import threading
 import copy
@@ -391,16 +392,23 @@ class EntropyCacher(Singleton):
         if cache_dir is None:
             cache_dir = self.current_directory()
 
+        tracer = Tracer()
         if EntropyCacher.STASHING_CACHE:
             # object is being saved on disk, it's in RAM atm
             ram_obj = self.__stashing_cache.get((key, cache_dir))
             if ram_obj is not None:
+                tracer.event("cache.hit", "cache", key = key)
                 return ram_obj
 
         l_o = entropy.dump.loadobj
         if not l_o:
             return
-        return l_o(key, dump_dir = cache_dir, aging_days = aging_days)
+        obj = l_o(key, dump_dir = cache_dir, aging_days = aging_days)
+        if obj is None:
+            tracer.event("cache.miss", "cache", key = key)
+        else:
+            tracer.event("cache.hit", "cache", key = key)
+        return obj
 
     @classmethod
     def clear_cache_item(cls, cache_item, cache_dir = None):
@@ -485,7 +493,7 @@ class MtimePingus(object):
         _hash = self._hash_key(action_string)
         with self.__dump_lock:
             entropy.dump.dumpobj(_hash, time.time(),
-                dump_dir = MtimePingus.PINGUS_DIR)
+                dump_dir = MtimePingus.PINGUS_DIR, portable = True)
 
     def pong(self, action_string):
         """
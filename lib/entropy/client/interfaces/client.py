@@ -13,20 +13,14 @@ import os
 import shutil
 import threading
 
-from entropy.core import Singleton
+from entropy.core import Singleton, LazyModule
 from entropy.locks import EntropyResourcesLock
-from entropy.fetchers import UrlFetcher, MultipleUrlFetcher
 from entropy.output import TextInterface, bold, red, darkred, blue
-from entropy.qa import QAInterface
-from entropy.security import System, Repository as RepositorySecurity
-from entropy.spm.plugins.factory import get_default_instance as get_spm, \
-    get_default_class as get_spm_default_class
 
 from entropy.client.interfaces.db import InstalledPackagesRepository
 from entropy.client.interfaces.dep import CalculatorsMixin
 from entropy.client.interfaces.methods import RepositoryMixin, MiscMixin, \
     MatchMixin
-from entropy.client.interfaces.package import PackageActionFactory
 from entropy.client.interfaces.repository import Repository
 
 from entropy.client.interfaces.settings import ClientSystemSettingsPlugin
@@ -34,9 +28,6 @@ from entropy.client.interfaces.sets import Sets
 
 from entropy.client.misc import sharedinstlock, ConfigurationUpdates
 
-from entropy.client.services.interfaces import \
-    ClientWebServiceFactory, RepositoryWebServiceFactory
-
 from entropy.const import etpConst, const_debug_write, \
     const_convert_to_unicode, const_setup_perms
 from entropy.core.settings.base import SystemSettings
@@ -48,6 +39,14 @@ import entropy.dump
 import entropy.dep
 import entropy.tools
 
+# subsystems loaded at first use, see the Client getter methods
+_fetchers = LazyModule("entropy.fetchers")
+_qa = LazyModule("entropy.qa")
+_security = LazyModule("entropy.security")
+_spm_factory = LazyModule("entropy.spm.plugins.factory")
+_package = LazyModule("entropy.client.interfaces.package")
+_services = LazyModule("entropy.client.services.interfaces")
+
 
 class Client(Singleton, TextInterface, CalculatorsMixin,
              RepositoryMixin, MiscMixin, MatchMixin):
@@ -91,6 +90,10 @@ class Client(Singleton, TextInterface, CalculatorsMixin,
         self._real_installed_repository = None
         self._real_installed_repository_lock = threading.RLock()
         self._treeupdates_repos = set()
+        self._library_providers = None
+        self._library_providers_lock = threading.Lock()
+        self._package_sets = None
+        self._package_sets_lock = threading.Lock()
         self._can_run_sys_set_hooks = False
         const_debug_write(__name__, "debug enabled")
 
@@ -114,12 +117,9 @@ class Client(Singleton, TextInterface, CalculatorsMixin,
         self._real_enabled_repos = None
         self._real_enabled_repos_lock = threading.RLock()
 
-        self._multiple_url_fetcher = multiple_url_fetcher
-        self._url_fetcher = url_fetcher
-        if url_fetcher is None:
-            self._url_fetcher = UrlFetcher
-        if multiple_url_fetcher is None:
-            self._multiple_url_fetcher = MultipleUrlFetcher
+        # None means entropy.fetchers defaults, see _url_fetcher
+        self._url_fetcher_class = url_fetcher
+        self._multiple_url_fetcher_class = multiple_url_fetcher
 
         self._do_open_installed_repo = True
         self._installed_repo_enable = True
@@ -436,13 +436,31 @@ class Client(Singleton, TextInterface, CalculatorsMixin,
             except (IOError, OSError):
                 return
 
+    @property
+    def _url_fetcher(self):
+        """
+        Return the UrlFetcher class used by Entropy Client.
+        """
+        if self._url_fetcher_class is None:
+            return _fetchers.UrlFetcher
+        return self._url_fetcher_class
+
+    @property
+    def _multiple_url_fetcher(self):
+        """
+        Return the MultipleUrlFetcher class used by Entropy Client.
+        """
+        if self._multiple_url_fetcher_class is None:
+            return _fetchers.MultipleUrlFetcher
+        return self._multiple_url_fetcher_class
+
     def QA(self):
         """
         Load Entropy QA interface object
 
         @rtype: entropy.qa.QAInterface
         """
-        qa_intf = QAInterface()
+        qa_intf = _qa.QAInterface()
         qa_intf.output = self.output
         qa_intf.ask_question = self.ask_question
         qa_intf.input_box = self.input_box
@@ -475,7 +493,7 @@ class Client(Singleton, TextInterface, CalculatorsMixin,
         """
         Load Entropy PackageActionFactory instance object
         """
-        return PackageActionFactory(self)
+        return _package.PackageActionFactory(self)
 
     def ConfigurationUpdates(self):
         """
@@ -487,13 +505,13 @@ class Client(Singleton, TextInterface, CalculatorsMixin,
         """
         Load Source Package Manager instance object
         """
-        return get_spm(self)
+        return _spm_factory.get_default_instance(self)
 
     def Spm_class(self):
         """
         Load Source Package Manager default plugin class
         """
-        return get_spm_default_class()
+        return _spm_factory.get_default_class()
 
     def Repositories(self, *args, **kwargs):
         """
@@ -513,7 +531,7 @@ class Client(Singleton, TextInterface, CalculatorsMixin,
         @return: Repository Security instance object
         @rtype: entropy.security.System
         """
-        return System(self, *args, **kwargs)
+        return _security.System(self, *args, **kwargs)
 
     def RepositorySecurity(self, keystore_dir = None):
         """
@@ -526,7 +544,7 @@ class Client(Singleton, TextInterface, CalculatorsMixin,
         """
         if keystore_dir is None:
             keystore_dir = etpConst['etpclientgpgdir']
-        return RepositorySecurity(keystore_dir = keystore_dir)
+        return _security.Repository(keystore_dir = keystore_dir)
 
     def Sets(self):
         """
@@ -546,7 +564,7 @@ class Client(Singleton, TextInterface, CalculatorsMixin,
         @return: WebServicesFactory instance object
         @rtype: entropy.client.services.interfaces.WebServicesFactory
         """
-        return ClientWebServiceFactory(self)
+        return _services.ClientWebServiceFactory(self)
 
     def RepositoryWebServices(self):
         """
@@ -558,4 +576,4 @@ class Client(Singleton, TextInterface, CalculatorsMixin,
         @return: RepositoryWebServiceFactory instance object
         @rtype: entropy.client.services.interfaces.RepositoryWebServiceFactory
         """
-        return RepositoryWebServiceFactory(self)
+        return _services.RepositoryWebServiceFactory(self)
@@ -18,6 +18,11 @@ import sys
 import threading
 import time
 
+try:
+    from Queue import Queue, Empty as QueueEmpty
+except ImportError:
+    from queue import Queue, Empty as QueueEmpty
+
 from entropy.const import const_debug_write, const_setup_perms, etpConst, \
     const_set_nice_level, const_setup_file, const_convert_to_unicode, \
     const_debug_enabled, const_mkdtemp, const_mkstemp, const_file_readable, \
@@ -29,21 +34,23 @@ from entropy.cache import EntropyCacher
 from entropy.db import EntropyRepository
 from entropy.exceptions import RepositoryError, SystemDatabaseError, \
     PermissionDenied
-from entropy.security import Repository as RepositorySecurity
 from entropy.misc import TimeScheduled, ParallelTask
-from entropy.fetchers import UrlFetcher
 from entropy.i18n import _
 from entropy.db.skel import EntropyRepositoryPlugin, EntropyRepositoryBase
 from entropy.db.exceptions import IntegrityError, OperationalError, Error, \
     DatabaseError
 from entropy.core.settings.base import SystemSettings
-from entropy.services.client import WebService
-from entropy.client.services.interfaces import RepositoryWebService, \
-    RepositoryWebServiceFactory
+from entropy.core import LazyModule
 
 import entropy.dep
 import entropy.tools
 
+# only needed when repositories are updated or verified
+_security = LazyModule("entropy.security")
+_webservice = LazyModule("entropy.services.client")
+_client_services = LazyModule("entropy.client.services.interfaces")
+_fetchers = LazyModule("entropy.fetchers")
+
 __all__ = ["CachedRepository", "ClientEntropyRepositoryPlugin",
     "InstalledPackagesRepository", "AvailablePackagesRepository",
     "GenericRepository"]
@@ -133,6 +140,9 @@ class InstalledPackagesRepository(CachedRepository):
         if entropy.tools.is_root() and os.path.isfile(self._db):
             const_setup_file(self._db, etpConst['entropygid'], 0o644,
                 uid = etpConst['uid'])
+            # opt-in, see EntropySQLiteRepository.ENABLE_WAL
+            if self.ENABLE_WAL:
+                self.enableWriteAheadLog()
 
     def handlePackage(self, pkg_data, revision = None,
                       formattedContent = False):
@@ -155,12 +165,25 @@ class AvailablePackagesRepositoryUpdater(object):
     AvailablePackagesRepository update logic class.
     The required logic for updating a repository is stored here.
     """
-    WEBSERV_CACHE_ID = 'webserv_repo/segment_'
+    # differential sync through the Web Service: number of concurrent
+    # segment fetchers, number of added packages above which the sync is
+    # considered not worth it, when no throughput has been measured yet,
+    # and the time budget used to derive it from the measured throughput.
+    WEBSERV_FETCH_THREADS = 4
+    WEBSERV_DEFAULT_THRESHOLD = 100
+    WEBSERV_THRESHOLD_BOUNDS = (20, 5000)
+    WEBSERV_SYNC_TIME_BUDGET = 60.0
+    WEBSERV_THROUGHPUT_ID = 'webserv_repo/throughput_'
 
-    FETCH_ERRORS = (
-        UrlFetcher.GENERIC_FETCH_WARN,
-        UrlFetcher.TIMEOUT_FETCH_ERROR,
-        UrlFetcher.GENERIC_FETCH_ERROR)
+    @property
+    def FETCH_ERRORS(self):
+        """
+        UrlFetcher download statuses meaning failure.
+        """
+        return (
+            _fetchers.UrlFetcher.GENERIC_FETCH_WARN,
+            _fetchers.UrlFetcher.TIMEOUT_FETCH_ERROR,
+            _fetchers.UrlFetcher.GENERIC_FETCH_ERROR)
 
     def __init__(self, entropy_client, repository_id, force, gpg):
         self.__force = force
@@ -209,7 +232,8 @@ class AvailablePackagesRepositoryUpdater(object):
             else:
                 # in case self._entropy is a simple TextInterface()
                 # like how it's called in remote_revision().
-                self.__webservices = RepositoryWebServiceFactory(self._entropy)
+                factory = _client_services.RepositoryWebServiceFactory
+                self.__webservices = factory(self._entropy)
                 # cross fingers!
 
         return self.__webservices
@@ -224,7 +248,7 @@ class AvailablePackagesRepositoryUpdater(object):
     def __get_webserv_repository_metadata(self):
         try:
             data = self._webservice.get_repository_metadata()
-        except WebService.WebServiceException as err:
+        except _webservice.WebService.WebServiceException as err:
             const_debug_write(__name__,
                 "__get_webserv_repository_metadata: error: %s" % (err,))
             data = {}
@@ -233,7 +257,7 @@ class AvailablePackagesRepositoryUpdater(object):
     def __get_webserv_repository_revision(self):
         try:
             revision = self._webservice.get_revision()
-        except WebService.WebServiceException as err:
+        except _webservice.WebService.WebServiceException as err:
             const_debug_write(__name__,
                 "__get_webserv_repository_revision: error: %s" % (err,))
             revision = None
@@ -242,12 +266,12 @@ class AvailablePackagesRepositoryUpdater(object):
     def __check_webserv_availability(self):
         try:
             webserv = self._webservices.new(self._repository_id)
-        except WebService.UnsupportedService:
+        except _webservice.WebService.UnsupportedService:
             return False
 
         try:
             available = webserv.update_service_available(cache = False)
-        except WebService.WebServiceException:
+        except _webservice.WebService.WebServiceException:
             available = False
         return available
 
@@ -272,7 +296,7 @@ class AvailablePackagesRepositoryUpdater(object):
 
         try:
             remote_package_ids = webserv.get_package_ids()
-        except WebService.WebServiceException as err:
+        except _webservice.WebService.WebServiceException as err:
             const_debug_write(__name__,
                 "__get_webserv_database_differences: error: %s" % (err,))
             return None, None
@@ -283,6 +307,175 @@ class AvailablePackagesRepositoryUpdater(object):
         added.sort()
         return added, removed
 
+    def __get_webserv_sync_threshold(self):
+        """
+        Return the maximum number of added packages for which the
+        differential sync through the Web Service is considered worth it,
+        based on the throughput measured during the previous syncs.
+        """
+        throughput = loadobj(
+            "%s%s" % (self.WEBSERV_THROUGHPUT_ID, self._repository_id,))
+        if not throughput:
+            return self.WEBSERV_DEFAULT_THRESHOLD
+        min_threshold, max_threshold = self.WEBSERV_THRESHOLD_BOUNDS
+        threshold = int(throughput * self.WEBSERV_SYNC_TIME_BUDGET)
+        return max(min_threshold, min(max_threshold, threshold))
+
+    def __update_webserv_throughput(self, packages, elapsed):
+        """
+        Update the measured Web Service sync throughput (packages per second)
+        with an exponentially weighted moving average.
+        """
+        if elapsed <= 0:
+            return
+        cache_id = "%s%s" % (self.WEBSERV_THROUGHPUT_ID, self._repository_id,)
+        throughput = float(packages) / elapsed
+        old_throughput = loadobj(cache_id)
+        if old_throughput:
+            throughput = (old_throughput + throughput) / 2
+        try:
+            dumpobj(cache_id, throughput)
+        except (IOError, OSError) as err:
+            const_debug_write(__name__,
+                "__update_webserv_throughput: error: %s" % (err,))
+
+    def __fetch_webserv_segments(self, webserv, segments):
+        """
+        Fetch the metadata of the given package identifier segments using
+        up to WEBSERV_FETCH_THREADS concurrent requests over pooled
+        Web Service connections. This is a generator yielding
+        (segment, package metadata, exception) tuples in completion order.
+        Closing the generator stops pending fetches.
+        """
+        segments_queue = Queue()
+        for segment in segments:
+            segments_queue.put(segment)
+        max_threads = min(self.WEBSERV_FETCH_THREADS, len(segments))
+        # bounded, so that fetchers wait for packages to be consumed
+        results_queue = Queue(max_threads * 2)
+        stop = threading.Event()
+
+        def _fetch():
+            while not stop.is_set():
+                try:
+                    segment = segments_queue.get_nowait()
+                except QueueEmpty:
+                    break
+
+                pkg_meta, error = None, None
+                # a pooled connection may have been closed remotely,
+                # retry once
+                for attempt in (1, 2):
+                    try:
+                        pkg_meta = webserv.get_packages_metadata(segment)
+                        error = None
+                        break
+                    except _webservice.WebService.RequestError as err:
+                        error = err
+                    except Exception as err:
+                        error = err
+                        break
+                results_queue.put((segment, pkg_meta, error))
+
+        webserv._set_connection_pool(max_threads)
+        threads = []
+        try:
+            for _idx in range(max_threads):
+                th = ParallelTask(_fetch)
+                th.daemon = True
+                th.start()
+                threads.append(th)
+
+            for _idx in range(len(segments)):
+                yield results_queue.get()
+
+        finally:
+            stop.set()
+            # make room for fetchers blocked on a full queue
+            while [th for th in threads if th.is_alive()]:
+                try:
+                    results_queue.get(timeout = 0.1)
+                except QueueEmpty:
+                    pass
+            for th in threads:
+                th.join()
+            webserv._set_connection_pool(0)
+
+    def __add_webserv_segments(self, mydbconn, fetcher, maxcount):
+        """
+        Add the packages whose metadata is yielded by the
+        __fetch_webserv_segments() generator to the repository.
+        Return True if all the packages have been added, otherwise False,
+        or None in case of Web Service errors.
+        """
+        count = 0
+        for segment, pkg_meta, err in fetcher:
+            count += 1
+            if err is not None:
+                const_debug_write(__name__,
+                    "__handle_webserv_database_sync: error: %s" % (err,))
+                mytxt = "%s: %s" % (
+                    blue(_("Web Service communication error")),
+                    err,
+                )
+                self._entropy.output(
+                    mytxt, importance = 1, level = "info",
+                    header = "\t", count = (count, maxcount,)
+                )
+                return None
+
+            if not pkg_meta:
+                const_debug_write(__name__,
+                    "__handle_webserv_database_sync: empty data: %s" % (
+                        pkg_meta,))
+                self._entropy.output(
+                    _("Web Service data error"), importance = 1,
+                    level = "info", header = "\t",
+                    count = (count, maxcount,)
+                )
+                return None
+
+            # JSON object keys are strings
+            pkg_meta = dict((int(k), v) for k, v in pkg_meta.items())
+            for package_id in segment:
+                mydata = pkg_meta.get(package_id)
+                if mydata is None:
+                    mytxt = "%s: %s" % (
+                        blue(_("Fetch error on segment while adding")),
+                        darkred(str(segment)),
+                    )
+                    self._entropy.output(
+                        mytxt, importance = 1, level = "warning",
+                        header = "  "
+                    )
+                    return False
+
+                mytxt = "%s %s" % (
+                    darkgreen("++"),
+                    teal(mydata['atom']),
+                )
+                self._entropy.output(
+                    mytxt, importance = 0, level = "info",
+                    header = "  ")
+                try:
+                    mydbconn.addPackage(
+                        mydata, revision = mydata['revision'],
+                        package_id = package_id,
+                        formatted_content = True
+                    )
+                except (Error,) as err:
+                    if const_debug_enabled():
+                        entropy.tools.print_traceback()
+                    self._entropy.output("%s: %s" % (
+                        blue(_("repository error while adding packages")),
+                        err,),
+                        importance = 1, level = "warning",
+                        header = "  "
+                    )
+                    return False
+
+        return True
+
     def __eapi1_eapi2_databases_alignment(self, dbfile, dbfile_old):
 
         dbconn = self._entropy.open_generic_repository(dbfile,
@@ -1334,7 +1527,7 @@ class AvailablePackagesRepositoryUpdater(object):
 
         try:
             repo_sec = self._entropy.RepositorySecurity()
-        except RepositorySecurity.GPGError:
+        except _security.Repository.GPGError:
             mytxt = "%s," % (
                 purple(_("This repository suports GPG-signed packages")),
             )
@@ -1368,7 +1561,7 @@ class AvailablePackagesRepositoryUpdater(object):
             try:
                 downloaded_key_fp = repo_tmp_sec.install_key(
                     self._repository_id, gpg_path)
-            except RepositorySecurity.GPGError:
+            except _security.Repository.GPGError:
                 downloaded_key_fp = None
 
             fingerprint = repo_sec.get_key_metadata(
@@ -1438,7 +1631,7 @@ class AvailablePackagesRepositoryUpdater(object):
             try:
                 fingerprint = repo_sec.install_key(self._repository_id,
                     gpg_path)
-            except RepositorySecurity.NothingImported as err:
+            except _security.Repository.NothingImported as err:
                 if try_ignore:
                     mytxt = "%s: %s" % (
                         darkred(_("Error during GPG key installation")),
@@ -1472,7 +1665,7 @@ class AvailablePackagesRepositoryUpdater(object):
                             pass
                 try_ignore = True
                 continue
-            except RepositorySecurity.GPGError as err:
+            except _security.Repository.GPGError as err:
                 mytxt = "%s: %s" % (
                     darkred(_("Error during GPG key installation")),
                     err,
@@ -1510,7 +1703,7 @@ class AvailablePackagesRepositoryUpdater(object):
 
         try:
             repo_sec = self._entropy.RepositorySecurity()
-        except RepositorySecurity.GPGServiceNotAvailable:
+        except _security.Repository.GPGServiceNotAvailable:
             # wtf! it was available a while ago!
             return 0 # GPG not available
 
@@ -1584,17 +1777,23 @@ class AvailablePackagesRepositoryUpdater(object):
         using a differential sync.
         """
         repo_db = None
+        status = False
         try:
             repo_db = self.__get_webserv_local_database()
             if repo_db is None:
                 raise AttributeError()
-            return self.__handle_webserv_database_sync(repo_db)
+            status = self.__handle_webserv_database_sync(repo_db)
+            return status
         except (DatabaseError, IntegrityError, OperationalError,
             AttributeError,):
             return False
         finally:
             if repo_db is not None:
-                repo_db.commit()
+                # the whole sync is a single transaction
+                if status:
+                    repo_db.commit()
+                else:
+                    repo_db.rollback()
                 repo_db.close()
 
         return False
@@ -1603,7 +1802,7 @@ class AvailablePackagesRepositoryUpdater(object):
 
         try:
             webserv = self._webservice
-        except WebService.UnsupportedService as err:
+        except _webservice.WebService.UnsupportedService as err:
             const_debug_write(__name__,
                 "__handle_webserv_database_sync: error: %s" % (err,))
             return False
@@ -1620,7 +1819,7 @@ class AvailablePackagesRepositoryUpdater(object):
             # nothing to sync, it seems, if force is True, fallback to EAPI2
             return False
 
-        threshold = 100
+        threshold = self.__get_webserv_sync_threshold()
         # is it worth it?
         if len(added_ids) > threshold:
             mytxt = "%s: %s (%s: %s/%s)" % (
@@ -1638,127 +1837,6 @@ class AvailablePackagesRepositoryUpdater(object):
             )
             return False
 
-        count = 0
-        chunk_size = RepositoryWebService.MAXIMUM_PACKAGE_REQUEST_SIZE
-        added_segments = []
-        mytmp = []
-
-        for package_id in added_ids:
-            count += 1
-            mytmp.append(package_id)
-            if count % chunk_size == 0:
-                added_segments.append(mytmp[:])
-                del mytmp[:]
-        if mytmp:
-            added_segments.append(mytmp[:])
-
-        def _do_fetch(fetch_sts_map, segment, count, maxcount):
-            try:
-                try:
-                    pkg_meta = webserv.get_packages_metadata(segment)
-                except WebService.WebServiceException as err:
-                    const_debug_write(__name__,
-                        "__handle_webserv_database_sync: error: %s" % (err,))
-                    mytxt = "%s: %s" % (
-                        blue(_("Web Service communication error")),
-                        err,
-                    )
-                    self._entropy.output(
-                        mytxt, importance = 1, level = "info",
-                        header = "\t", count = (count, maxcount,)
-                    )
-                    fetch_sts_map['error'] = True
-                    return
-                except KeyboardInterrupt:
-                    const_debug_write(__name__,
-                        "__handle_webserv_database_sync: keyboard interrupt")
-                    fetch_sts_map['error'] = True
-                    return
-
-                if not pkg_meta:
-                    const_debug_write(__name__,
-                        "__handle_webserv_database_sync: empty data: %s" % (
-                            pkg_meta,))
-                    self._entropy.output(
-                        _("Web Service data error"), importance = 1,
-                        level = "info", header = "\t",
-                        count = (count, maxcount,)
-                    )
-                    fetch_sts_map['error'] = True
-                    return
-
-                try:
-                    for package_id, pkg_data in pkg_meta.items():
-                        dumpobj(
-                            "%s%s" % (self.WEBSERV_CACHE_ID, package_id,),
-                            pkg_data,
-                            ignore_exceptions = False
-                        )
-                except (IOError, EOFError, OSError,) as e:
-                    mytxt = "%s: %s: %s." % (
-                        blue(_("Local status")),
-                        darkred("Error storing data"),
-                        e,
-                    )
-                    self._entropy.output(
-                        mytxt, importance = 1, level = "info",
-                        header = "\t", count = (count, maxcount,)
-                    )
-                    fetch_sts_map['error'] = True
-                    return
-
-                return
-            finally:
-                fetch_sts_map['sem'].release()
-
-        # do not exagerate or you're going to need a way to block
-        # further requests as long as some threads are still running
-        # to avoid timeout errors
-        max_threads = 4
-        fetch_sts_map = {
-            'sem': threading.Semaphore(max_threads),
-            'error': False,
-        }
-
-        # fetch and store
-        count = 0
-        maxcount = len(added_segments)
-        product = self._settings['repositories']['product']
-        segment = None
-        threads = []
-        for segment in added_segments:
-            count += 1
-            mytxt = "%s %s" % (blue(_("Fetching segments")), "...",)
-            self._entropy.output(
-                mytxt, importance = 0, level = "info",
-                header = "\t", back = True, count = (count, maxcount,)
-            )
-            fetch_sts_map['sem'].acquire()
-            if len(threads) >= max_threads:
-                const_debug_write(__name__,
-                    purple("joining all the parallel threads"))
-                # give them the chance to complete
-                # since long delays on socket could cause timeouts
-                for th in threads:
-                    th.join()
-                const_debug_write(__name__, purple("parallel threads joined"))
-                del threads[:]
-            if fetch_sts_map['error']:
-                return None
-            th = ParallelTask(_do_fetch, fetch_sts_map, segment, count,
-                maxcount)
-            th.daemon = True
-            th.start()
-            threads.append(th)
-
-        for th in threads:
-            th.join()
-
-        if fetch_sts_map['error']:
-            return None
-
-        del added_segments
-
         # get repository metadata
         repo_metadata = self.__get_webserv_repository_metadata()
         # this gives us the "checksum" data too
@@ -1811,44 +1889,26 @@ class AvailablePackagesRepositoryUpdater(object):
             )
             return None
 
-        # now that we have all stored, add
-        for package_id in added_ids:
-            mydata = self._cacher.pop("%s%s" % (self.WEBSERV_CACHE_ID,
-                package_id,))
-            if mydata is None:
-                mytxt = "%s: %s" % (
-                    blue(_("Fetch error on segment while adding")),
-                    darkred(str(segment)),
-                )
-                self._entropy.output(
-                    mytxt, importance = 1, level = "warning",
-                    header = "  "
-                )
-                return False
+        web_service = _client_services.RepositoryWebService
+        chunk_size = web_service.MAXIMUM_PACKAGE_REQUEST_SIZE
+        added_segments = [added_ids[x:x + chunk_size] for x in \
+            range(0, len(added_ids), chunk_size)]
 
-            mytxt = "%s %s" % (
-                darkgreen("++"),
-                teal(mydata['atom']),
-            )
-            self._entropy.output(
-                mytxt, importance = 0, level = "info",
-                header = "  ")
-            try:
-                mydbconn.addPackage(
-                    mydata, revision = mydata['revision'],
-                    package_id = package_id,
-                    formatted_content = True
-                )
-            except (Error,) as err:
-                if const_debug_enabled():
-                    entropy.tools.print_traceback()
-                self._entropy.output("%s: %s" % (
-                    blue(_("repository error while adding packages")),
-                    err,),
-                    importance = 1, level = "warning",
-                    header = "  "
-                )
-                return False
+        # fetch segments concurrently and add packages as soon as
+        # their metadata is available, everything is committed at the end
+        start_t = time.time()
+        fetcher = self.__fetch_webserv_segments(webserv, added_segments)
+        try:
+            status = self.__add_webserv_segments(mydbconn, fetcher,
+                len(added_segments))
+        finally:
+            fetcher.close()
+        if not status:
+            return status
+
+        if added_ids:
+            self.__update_webserv_throughput(len(added_ids),
+                time.time() - start_t)
 
         # now remove
         # preload atoms names to improve speed during removePackage
@@ -1872,7 +1932,7 @@ class AvailablePackagesRepositoryUpdater(object):
                 )
                 return False
 
-        mydbconn.commit()
+        # committed by the caller, if the checksums match
         mydbconn.clearCache()
         # now verify if both checksums match
         result = False
@@ -12,6 +12,7 @@
 import os
 import collections
 import hashlib
+import itertools
 
 from entropy.const import etpConst, const_debug_write, \
     const_isnumber, const_convert_to_rawstring, const_convert_to_unicode, \
@@ -27,6 +28,7 @@ from entropy.db.exceptions import IntegrityError, OperationalError, \
 from entropy.db.skel import EntropyRepositoryBase
 from entropy.client.interfaces.db import InstalledPackagesRepository
 from entropy.client.misc import sharedinstlock
+from entropy.tracing import traced
 
 import entropy.dep
 
@@ -168,6 +170,7 @@ class CalculatorsMixin:
             if reponame in conflictingRevisions:
                 return (results[reponame], reponame)
 
+    @traced("client.atom_match", "client")
     def atom_match(self, atom, match_slot = None, mask_filter = True,
             multi_match = False, multi_repo = False, match_repo = None,
             extended_results = False, use_cache = True):
@@ -1968,39 +1971,27 @@ class CalculatorsMixin:
         keyslot = repo.retrieveKeySlotAggregated(package_id)
         for needed, elfclass in bumped_needed_libs:
 
-            solved_neededs = []
             found = False
-            for s_repo_id in self._settings['repositories']['order']:
+            # providers are sorted by repository priority
+            providers = self.library_providers(needed, elfclass = elfclass)
+            for s_repo_id, repo_pkg_id, s_keyslot, _path in providers:
+                repo_pkg_match = (repo_pkg_id, s_repo_id)
 
-                s_repo = self.open_repository(s_repo_id)
-                solved_needed = s_repo.resolveNeeded(
-                    needed, elfclass = elfclass)
-                if solved_needed:
-                    solved_neededs.append((s_repo_id, solved_needed))
-
-                for repo_pkg_id in solved_needed:
-                    repo_pkg_match = (repo_pkg_id, s_repo_id)
-
-                    if package_match == repo_pkg_match:
-                        # myself? no!
-                        continue
-
-                    if repo_pkg_match not in matched_deps:
-                        # not a matched dep!
-                        continue
+                if package_match == repo_pkg_match:
+                    # myself? no!
+                    continue
 
-                    s_keyslot = s_repo.retrieveKeySlotAggregated(
-                        repo_pkg_id)
-                    if s_keyslot == keyslot:
-                        # do not pull anything inside the same keyslot!
-                        continue
+                if repo_pkg_match not in matched_deps:
+                    # not a matched dep!
+                    continue
 
-                    found_matches.add(repo_pkg_match)
-                    found = True
-                    break
+                if s_keyslot == keyslot:
+                    # do not pull anything inside the same keyslot!
+                    continue
 
-                if found:
-                    break
+                found_matches.add(repo_pkg_match)
+                found = True
+                break
 
             if not found:
                 # TODO: make it a real warning
@@ -3173,11 +3164,15 @@ class CalculatorsMixin:
         # get all the installed packages
         try:
             package_ids = collections.deque(
-                self.installed_repository().listAllPackageIds())
+                inst_repo.listAllPackageIds())
+            strict_data = inst_repo.getStrictDataMany(package_ids)
         except OperationalError:
             # client db is broken!
             raise SystemDatabaseError("installed packages repository is broken")
 
+        bulk_matches = self._calculate_updates_matches(
+            inst_repo, match_repos, strict_data)
+
         count = 0
         total = len(package_ids)
         last_count = 0
@@ -3216,69 +3211,18 @@ class CalculatorsMixin:
             try:
                 cl_pkgkey, cl_slot, cl_version, \
                     cl_tag, cl_revision, \
-                    cl_atom = self.installed_repository().getStrictData(
-                        package_id)
-            except TypeError:
-                # check against broken entries, or removed during iteration
+                    cl_atom = strict_data[package_id]
+            except KeyError:
+                # check against broken entries
                 continue
-            use_match_cache = True
-            do_continue = False
-
-            # try to search inside package tag, if it's available,
-            # otherwise, do the usual duties.
-            cl_pkgkey_tag = None
-            if cl_tag:
-                cl_pkgkey_tag = "%s%s%s" % (
-                    cl_pkgkey,
-                    etpConst['entropytagprefix'],
-                    cl_tag)
-
-            while True:
-                try:
-                    match = None
-                    if cl_pkgkey_tag is not None:
-                        # search with tag first, if nothing
-                        # pops up, fallback
-                        # to usual search?
-                        match = self.atom_match(
-                            cl_pkgkey_tag,
-                            match_slot = cl_slot,
-                            extended_results = True,
-                            use_cache = use_match_cache,
-                            match_repo = match_repos
-                        )
-                        try:
-                            if const_isnumber(match[1]):
-                                match = None
-                        except TypeError:
-                            if not use_match_cache:
-                                raise
-                            use_match_cache = False
-                            continue
-
-                    if match is None:
-                        match = self.atom_match(
-                            cl_pkgkey,
-                            match_slot = cl_slot,
-                            extended_results = True,
-                            use_cache = use_match_cache,
-                            match_repo = match_repos
-                        )
-                except OperationalError:
+            match = bulk_matches.get(package_id)
+            if match is None:
+                match = self._calculate_update_match(
+                    cl_pkgkey, cl_slot, cl_tag, match_repos)
+                if match is None:
                     # ouch, but don't crash here
-                    do_continue = True
-                    break
-                try:
-                    m_package_id = match[0][0]
-                except TypeError:
-                    if not use_match_cache:
-                        raise
-                    use_match_cache = False
                     continue
-                break
-
-            if do_continue:
-                continue
+            m_package_id = match[0][0]
 
             # now compare
             # version: cl_version
@@ -3318,8 +3262,7 @@ class CalculatorsMixin:
                     # first check branch
                     if package_id is not None:
 
-                        c_digest = self.installed_repository().retrieveDigest(
-                            package_id)
+                        c_digest = inst_repo.retrieveDigest(package_id)
                         # If the repo has been manually (user-side)
                         # regenerated, digest == "0". In this case
                         # skip the check.
@@ -3337,6 +3280,10 @@ class CalculatorsMixin:
                     fine.append(cl_atom)
                     continue
 
+            if package_id in bulk_matches:
+                # candidates are available, they are just masked
+                continue
+
             # don't take action if it's just masked
             maskedresults = self.atom_match(
                 cl_pkgkey, match_slot = cl_slot,
@@ -3350,17 +3297,27 @@ class CalculatorsMixin:
         if remove:
             remove = [
                 x for x in remove if not \
-                    self.installed_repository().retrieveReverseDependencies(x)]
+                    inst_repo.retrieveReverseDependencies(x)]
         else:
             remove = list(remove)
 
-        # sort data
-        upd_sorter = lambda x: self.open_repository(x[1]).retrieveAtom(x[0])
-        rm_sorter = lambda x: self.installed_repository().retrieveAtom(x)
-        update = sorted(update, key = upd_sorter)
+        # sort data, fetching atoms in one go per repository
+        repo_pkg_ids = {}
+        for pkg_id, repoid in itertools.chain(update, spm_fine):
+            obj = repo_pkg_ids.setdefault(repoid, set())
+            obj.add(pkg_id)
+        atoms = {}
+        for repoid, pkg_ids in repo_pkg_ids.items():
+            repo_atoms = self.open_repository(repoid).retrieveAtomMany(
+                pkg_ids)
+            for pkg_id, atom in repo_atoms.items():
+                atoms[(pkg_id, repoid)] = atom
+        inst_atoms = inst_repo.retrieveAtomMany(remove)
+
+        update = sorted(update, key = atoms.get)
         fine = sorted(fine)
-        spm_fine = sorted(spm_fine, key = upd_sorter)
-        remove = sorted(remove, key = rm_sorter)
+        spm_fine = sorted(spm_fine, key = atoms.get)
+        remove = sorted(remove, key = inst_atoms.get)
 
         outcome = {
             'update': update,
@@ -3385,6 +3342,170 @@ class CalculatorsMixin:
 
         return outcome
 
+    def _calculate_update_match(self, cl_pkgkey, cl_slot, cl_tag,
+                                match_repos):
+        """
+        Return the best package match for the given installed package
+        key, slot and tag, in atom_match() extended results format, or
+        None if the repositories are broken.
+        """
+        use_match_cache = True
+
+        # try to search inside package tag, if it's available,
+        # otherwise, do the usual duties.
+        cl_pkgkey_tag = None
+        if cl_tag:
+            cl_pkgkey_tag = "%s%s%s" % (
+                cl_pkgkey,
+                etpConst['entropytagprefix'],
+                cl_tag)
+
+        while True:
+            try:
+                match = None
+                if cl_pkgkey_tag is not None:
+                    # search with tag first, if nothing
+                    # pops up, fallback
+                    # to usual search?
+                    match = self.atom_match(
+                        cl_pkgkey_tag,
+                        match_slot = cl_slot,
+                        extended_results = True,
+                        use_cache = use_match_cache,
+                        match_repo = match_repos
+                    )
+                    try:
+                        if const_isnumber(match[1]):
+                            match = None
+                    except TypeError:
+                        if not use_match_cache:
+                            raise
+                        use_match_cache = False
+                        continue
+
+                if match is None:
+                    match = self.atom_match(
+                        cl_pkgkey,
+                        match_slot = cl_slot,
+                        extended_results = True,
+                        use_cache = use_match_cache,
+                        match_repo = match_repos
+                    )
+            except OperationalError:
+                return None
+            try:
+                match[0][0]
+            except TypeError:
+                if not use_match_cache:
+                    raise
+                use_match_cache = False
+                continue
+            return match
+
+    def _calculate_updates_matches(self, inst_repo, match_repos,
+                                   strict_data):
+        """
+        Compute the best package match of all the installed packages at
+        once, using EntropyRepositoryBase.listAllUpdateCandidates() and
+        the same selection rules of atom_match(), in bulk.
+
+        @param inst_repo: the installed packages repository
+        @type inst_repo: EntropyRepositoryBase
+        @param match_repos: repository identifiers, by priority
+        @type match_repos: tuple
+        @param strict_data: installed packages getStrictDataMany() output
+        @type strict_data: dict
+        @return: dict composed by installed package identifier as key and
+            atom_match() extended results as value. Installed packages
+            without candidates in any repository, or the whole set if
+            any repository is not supported by the backend, are not
+            returned and must go through atom_match().
+        @rtype: dict
+        """
+        candidates = {}
+        for repository_id in match_repos:
+            try:
+                repo = self.open_repository(repository_id)
+            except (RepositoryError, SystemDatabaseError):
+                # same as atom_match()
+                continue
+            try:
+                rows = inst_repo.listAllUpdateCandidates(repo)
+            except (OperationalError, DatabaseError):
+                rows = None
+            if rows is None:
+                return {}
+
+            # masking is applied here, maskFilter() is memoized
+            masked = {}
+            for package_id, pkg_id, version, tag, revision in rows:
+                is_masked = masked.get(pkg_id)
+                if is_masked is None:
+                    is_masked = repo.maskFilter(pkg_id)[0] == -1
+                    masked[pkg_id] = is_masked
+                obj = candidates.setdefault(package_id, {})
+                repo_obj = obj.setdefault(repository_id, [])
+                if not is_masked:
+                    repo_obj.append((pkg_id, version, tag, revision))
+
+        def _best(repo_candidates, match_tag):
+            # see EntropyRepositoryBase.atomMatch()
+            if match_tag:
+                repo_candidates = [x for x in repo_candidates if \
+                                       x[2] == match_tag]
+            if not repo_candidates:
+                return None
+            if len(repo_candidates) == 1:
+                return repo_candidates[0]
+
+            pkgdata = {}
+            for pkg_id, version, tag, revision in repo_candidates:
+                pkgdata[(version, tag, revision)] = pkg_id
+            versions = list(pkgdata.keys())
+            if not match_tag:
+                # prefer non-tagged packages, if both are available
+                non_tagged = [x for x in versions if not x[1]]
+                if non_tagged and len(non_tagged) != len(versions):
+                    versions = non_tagged
+            newer = entropy.dep.get_entropy_newer_version(versions)[0]
+            return (pkgdata[newer],) + newer
+
+        not_found = ((-1, None, None, None), 1)
+        matches = {}
+        for package_id, package_candidates in candidates.items():
+            try:
+                cl_tag = strict_data[package_id][3]
+            except KeyError:
+                continue
+
+            # search with tag first, fallback to the usual search
+            match_tags = (None,)
+            if cl_tag:
+                match_tags = (cl_tag, None)
+
+            match = None
+            for match_tag in match_tags:
+                repo_results = {}
+                for repository_id in match_repos:
+                    best = _best(
+                        package_candidates.get(repository_id, ()), match_tag)
+                    if best is not None:
+                        repo_results[repository_id] = best
+                if len(repo_results) == 1:
+                    repository_id = list(repo_results.keys())[0]
+                    match = (repo_results[repository_id], repository_id)
+                elif repo_results:
+                    match = self.__handle_multi_repo_matches(
+                        repo_results, True, match_repos)
+                if match is not None:
+                    break
+
+            if match is None:
+                match = not_found
+            matches[package_id] = match
+
+        return matches
+
     @sharedinstlock
     def calculate_orphaned_packages(self, use_cache = True):
         """
@@ -3450,7 +3571,6 @@ class CalculatorsMixin:
         if matchfilter is None:
             matchfilter = set()
         maskedtree = {}
-        mybuffer = Lifo()
         depcache = set()
         treelevel = -1
 
@@ -3470,72 +3590,63 @@ class CalculatorsMixin:
                 maskedtree[treelevel] = mydict
 
         excluded_deps = [etpConst['dependency_type_ids']['bdepend_id']]
-        mydeps = mydbconn.retrieveDependencies(match_id,
-            exclude_deptypes = excluded_deps)
-        for mydep in mydeps:
-            mybuffer.push(mydep)
+        mydeps = list(mydbconn.retrieveDependencies(match_id,
+            exclude_deptypes = excluded_deps))
 
-        try:
-            mydep = mybuffer.pop()
-        except ValueError:
-            mydep = None # stack empty
-
-        while mydep:
+        # walk the dependency graph one level at a time, so that
+        # dependencies can be fetched in batch for each repository.
+        while mydeps:
 
-            if mydep in depcache:
-                try:
-                    mydep = mybuffer.pop()
-                except ValueError:
-                    break # stack empty
-                continue
-            depcache.add(mydep)
+            next_matches = {}
+            for mydep in mydeps:
 
-            package_id, repoid = self.atom_match(mydep)
-            if (package_id, repoid) in matchfilter:
-                try:
-                    mydep = mybuffer.pop()
-                except ValueError:
-                    break # stack empty
-                continue
+                if mydep in depcache:
+                    continue
+                depcache.add(mydep)
 
-            if package_id != -1:
-                # doing even here because atomMatch with
-                # maskFilter = False can pull something different
-                matchfilter.add((package_id, repoid))
+                package_id, repoid = self.atom_match(mydep)
+                if (package_id, repoid) in matchfilter:
+                    continue
 
-            # collect masked
-            if package_id == -1:
-                package_id, repoid = self.atom_match(mydep,
-                    mask_filter = False)
                 if package_id != -1:
-                    treelevel += 1
-                    if treelevel not in maskedtree and not flat:
-                        maskedtree[treelevel] = {}
-                    dbconn = self.open_repository(repoid)
-                    vpackage_id, idreason = dbconn.maskFilter(package_id)
-                    if atoms:
-                        mydict = {dbconn.retrieveAtom(package_id): idreason}
-                    else:
-                        mydict = {(package_id, repoid): idreason}
+                    # doing even here because atomMatch with
+                    # maskFilter = False can pull something different
+                    matchfilter.add((package_id, repoid))
+
+                # collect masked
+                if package_id == -1:
+                    package_id, repoid = self.atom_match(mydep,
+                        mask_filter = False)
+                    if package_id != -1:
+                        treelevel += 1
+                        if treelevel not in maskedtree and not flat:
+                            maskedtree[treelevel] = {}
+                        dbconn = self.open_repository(repoid)
+                        vpackage_id, idreason = dbconn.maskFilter(package_id)
+                        if atoms:
+                            mydict = {
+                                dbconn.retrieveAtom(package_id): idreason}
+                        else:
+                            mydict = {(package_id, repoid): idreason}
 
-                    if flat:
-                        maskedtree.update(mydict)
-                    else:
-                        maskedtree[treelevel].update(mydict)
+                        if flat:
+                            maskedtree.update(mydict)
+                        else:
+                            maskedtree[treelevel].update(mydict)
+
+                # queue its deps for the next level
+                if package_id != -1:
+                    matchfilter.add((package_id, repoid))
+                    obj = next_matches.setdefault(repoid, [])
+                    obj.append(package_id)
 
-            # push its dep into the buffer
-            if package_id != -1:
-                matchfilter.add((package_id, repoid))
+            mydeps = []
+            for repoid, package_ids in next_matches.items():
                 dbconn = self.open_repository(repoid)
-                owndeps = dbconn.retrieveDependencies(package_id,
+                owndeps = dbconn.retrieveDependenciesMany(package_ids,
                     exclude_deptypes = excluded_deps)
-                for owndep in owndeps:
-                    mybuffer.push(owndep)
-
-            try:
-                mydep = mybuffer.pop()
-            except ValueError:
-                break # stack empty
+                for package_id in package_ids:
+                    mydeps.extend(owndeps[package_id])
 
         return maskedtree
 
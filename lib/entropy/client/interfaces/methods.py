@@ -26,7 +26,7 @@ import codecs
 import copy
 from datetime import datetime
 
-from entropy.i18n import _
+from entropy.i18n import _, ngettext
 from entropy.const import etpConst, const_debug_write, etpSys, \
     const_setup_file, initconfig_entropy_constants, const_pid_exists, \
     const_setup_perms, const_isstring, const_convert_to_unicode, \
@@ -38,22 +38,26 @@ from entropy.db.skel import EntropyRepositoryBase
 from entropy.db.exceptions import Error as EntropyRepositoryError
 from entropy.cache import EntropyCacher
 from entropy.misc import FlockFile
-from entropy.fetchers import UrlFetcher
 from entropy.client.interfaces.db import ClientEntropyRepositoryPlugin, \
     InstalledPackagesRepository, AvailablePackagesRepository, GenericRepository
-from entropy.client.mirrors import StatusInterface
-from entropy.client.misc import sharedinstlock
+from entropy.client.mirrors import StatusInterface, MirrorRanking
+from entropy.client.misc import sharedinstlock, PackageStore
 from entropy.output import purple, bold, red, blue, darkgreen, darkred, brown, \
     teal
-from entropy.client.interfaces.package.actions.action import PackageAction
 from entropy.core.settings.base import RepositoryConfigParser, SystemSettings
 
 from entropy.db.exceptions import IntegrityError, OperationalError, \
     DatabaseError
 
+from entropy.core import LazyModule
+
 import entropy.dep
 import entropy.tools
 
+# pulls in every package action, see Client.PackageActionFactory
+_package_action = LazyModule(
+    "entropy.client.interfaces.package.actions.action")
+
 
 class RepositoryMixin:
 
@@ -1030,6 +1034,69 @@ class RepositoryMixin:
 
         return sha.hexdigest()
 
+    def _library_providers_index(self):
+        """
+        Return the libraries (SONAMEs) provided by the packages in the
+        available repositories, merged into a single index.
+        The index is built once per repositories_checksum() value, kept
+        in memory and stored in the on-disk cache, under a single key
+        holding the checksum it was built for.
+
+        @return: dict composed by library name as key and list of
+            (ELF class, repository identifier, package identifier,
+            package key and slot, library path) tuples as value, sorted
+            by repository priority
+        @rtype: dict
+        """
+        checksum = self.repositories_checksum()
+        with self._library_providers_lock:
+            cached = self._library_providers
+            if cached is not None and cached[0] == checksum:
+                return cached[1]
+
+        cache_key = "library_providers"
+        index = None
+        if self.xcache:
+            cached = self._cacher.pop(cache_key)
+            if isinstance(cached, tuple) and len(cached) == 2 and \
+                    cached[0] == checksum:
+                index = cached[1]
+
+        if index is None:
+            index = {}
+            for repository_id in self.repositories():
+                repo = self.open_repository(repository_id)
+                for library, elfclass, package_id, keyslot, path in \
+                        repo.listAllProvidedLibraries():
+                    obj = index.setdefault(library, [])
+                    obj.append(
+                        (elfclass, repository_id, package_id, keyslot, path))
+            if self.xcache:
+                self._cacher.push(cache_key, (checksum, index))
+
+        with self._library_providers_lock:
+            self._library_providers = (checksum, index)
+        return index
+
+    def library_providers(self, library, elfclass = -1):
+        """
+        Return the packages providing the given library (SONAME) in the
+        available repositories. This is the cross-repository, indexed,
+        version of EntropyRepository.resolveNeeded().
+
+        @param library: library name (SONAME)
+        @type library: string
+        @keyword elfclass: the ELF class of the library, -1 for any
+        @type elfclass: int
+        @return: list (tuple) of (repository identifier, package identifier,
+            package key and slot, library path) tuples, sorted by
+            repository priority
+        @rtype: tuple
+        """
+        providers = self._library_providers_index().get(library, ())
+        return tuple(x[1:] for x in providers \
+                         if elfclass == -1 or x[0] == elfclass)
+
     def installed_repository(self):
         """
         Return Entropy Client installed packages repository.
@@ -1373,11 +1440,13 @@ class RepositoryMixin:
     def clean_downloaded_packages(self, dry_run = False, days_override = None,
                                   skip_available_packages = False):
         """
-        Clean Entropy Client downloaded packages older than the setting
-        specified by "packages-autoprune-days" in /etc/entropy/client.conf.
-        If setting is not set or invalid, this method will do nothing.
-        Otherwise, files older than given settings (representing time delta in
-        days) will be removed.
+        Clean Entropy Client downloaded packages. Package files are kept
+        in a content-addressed store (see entropy.client.misc.PackageStore)
+        which is pruned in least recently used order, until it fits the
+        size set by "packages-cache-size" in /etc/entropy/client.conf.
+        Package files not used for longer than the setting specified by
+        "packages-autoprune-days" are removed as well.
+        If none of the settings is set or valid, this method will do nothing.
 
         @keyword dry_run: do not remove files, just return them
         @type dry_run: bool
@@ -1396,18 +1465,21 @@ class RepositoryMixin:
         client_settings = self.ClientSettings()
         misc_settings = client_settings['misc']
         autoprune_days = misc_settings.get('autoprune_days', days_override)
-        if autoprune_days is None:
+        cache_size = misc_settings.get('packages_cache_size')
+        if autoprune_days is None and cache_size is None:
             # sorry, feature disabled or not available
             return []
-        if not const_isnumber(autoprune_days):
+        if autoprune_days is not None and not const_isnumber(autoprune_days):
             raise AttributeError("autoprune_days is invalid")
 
         repo_packages = set()
         if skip_available_packages:
+            action_class = _package_action.PackageAction
+            fetch_path = action_class.get_standard_fetch_disk_path
             for repository_id in self.repositories():
                 repo = self.open_repository(repository_id)
                 repo_packages.update(
-                    (PackageAction.get_standard_fetch_disk_path(x) for x in
+                    (fetch_path(x) for x in
                      repo.listAllDownloads(do_sort = False, full_path = True))
                 )
 
@@ -1421,6 +1493,8 @@ class RepositoryMixin:
                 return False
             if not const_file_writable(pkg_path):
                 return False
+            if autoprune_days is None:
+                return False
             try:
                 mtime = os.path.getmtime(pkg_path)
             except (OSError, IOError):
@@ -1433,8 +1507,8 @@ class RepositoryMixin:
             etpConst['currentarch']) for x in \
                 etpConst['packagesrelativepaths']]
 
-        def get_removable_packages():
-            removable_pkgs = set()
+        def get_downloaded_packages():
+            downloaded_pkgs = set()
             for pkg_dir in repo_pkgs_dirs:
                 try:
                     pkg_dir_list = os.listdir(pkg_dir)
@@ -1458,12 +1532,48 @@ class RepositoryMixin:
                         if os.path.realpath(x).startswith(branch_dir) \
                         and os.path.realpath(x).endswith(
                             etpConst['packagesext'])))
-                    removable_pkgs |= dir_repo_pkgs
-            return removable_pkgs
+                    downloaded_pkgs |= dir_repo_pkgs
+            return downloaded_pkgs
+
+        downloaded_pkgs = {}
+        for pkg_path in get_downloaded_packages():
+            try:
+                downloaded_pkgs[pkg_path] = os.stat(pkg_path)
+            except OSError:
+                continue
 
-        removable_pkgs = get_removable_packages()
-        removable_pkgs = sorted(filter(filter_expired_pkg,
-            removable_pkgs))
+        keep = set()
+        for pkg_path in repo_packages:
+            st = downloaded_pkgs.get(pkg_path)
+            if st is not None:
+                keep.add((st.st_dev, st.st_ino))
+
+        max_size, max_age = None, None
+        if cache_size is not None:
+            max_size = cache_size * 1024 * 1024
+        if autoprune_days is not None:
+            max_age = autoprune_days * 24 * 3600
+
+        package_store = PackageStore()
+        evicted = package_store.expired(
+            max_size = max_size, max_age = max_age, keep = keep)
+        evicted_inodes = set(((st.st_dev, st.st_ino) for _x, st in evicted))
+
+        removable_pkgs = []
+        linked_inodes = set()
+        for pkg_path, st in downloaded_pkgs.items():
+            inode = (st.st_dev, st.st_ino)
+            if inode in evicted_inodes:
+                linked_inodes.add(inode)
+                removable_pkgs.append(pkg_path)
+            elif st.st_nlink == 1 and filter_expired_pkg(pkg_path):
+                # not in the store, downloaded by older Entropy versions
+                removable_pkgs.append(pkg_path)
+
+        # store entries not linked to any download path
+        removable_pkgs.extend((path for path, st in evicted if
+                               (st.st_dev, st.st_ino) not in linked_inodes))
+        removable_pkgs.sort()
 
         if not removable_pkgs:
             return []
@@ -1496,6 +1606,12 @@ class RepositoryMixin:
                 except OSError:
                     pass
 
+        for store_pkg, _st in evicted:
+            try:
+                os.remove(store_pkg)
+            except OSError:
+                pass
+
         return successfully_removed
 
     def _run_repositories_post_branch_switch_hooks(self, old_branch, new_branch):
@@ -1861,81 +1977,64 @@ class MiscMixin:
     def benchmark_mirrors(self, mirrors):
         """
         Execute a throughput-oriented benchmark against the
-        list of given Entropy Packages mirrors. Return a new sorted list.
+        list of given Entropy Packages mirrors. All the mirrors are probed
+        concurrently and the results are fed to the download mirrors
+        ranking (see entropy.client.mirrors.MirrorRanking).
+        Return a new sorted list, the best mirror is the last one.
         """
-        # we believe that if a mirror does not respond in 6
-        # seconds, then we should give up.
-        reasonable_timeout = 6
-        mirror_stats = {}
         mirror_cache = set()
-        retries = 1
         mirror_test_file = "MIRROR_TEST"
 
+        probe_mirrors = []
         for mirror in mirrors:
+            url_data = entropy.tools.spliturl(mirror)
+            hostname = url_data.hostname
+            if hostname is None:
+                # mirror string is fucked up
+                continue
+            if hostname in mirror_cache:
+                continue
+            mirror_cache.add(hostname)
+            probe_mirrors.append(mirror)
 
-            tmp_fd, tmp_path = const_mkstemp(
-                prefix="entropy.client.methods.reorder_mirrors")
-            try:
+        mytxt = "%s: %s %s" % (
+            blue(_("Checking speed of")),
+            purple(str(len(probe_mirrors))),
+            blue(ngettext("mirror", "mirrors", len(probe_mirrors))),
+        )
+        self.output(
+            mytxt,
+            importance = 1,
+            level = "info",
+            header = purple(" @@ "),
+            back = True
+        )
 
-                url_data = entropy.tools.spliturl(mirror)
-                hostname = url_data.hostname
-                if hostname is None:
-                    # mirror string is fucked up
-                    continue
-                if hostname in mirror_cache:
-                    continue
-                mirror_cache.add(hostname)
-                mirror_url = mirror + "/" + mirror_test_file
+        ranking = MirrorRanking()
+        results = ranking.probe(probe_mirrors, mirror_test_file)
+        ranking.save()
 
-                mytxt = "%s: %s" % (
-                    blue(_("Checking speed of")),
-                    purple(hostname),
-                )
-                self.output(
-                    mytxt,
-                    importance = 1,
-                    level = "info",
-                    header = purple(" @@ "),
-                    back = True
-                )
+        for mirror in probe_mirrors:
+            result_speed = 0.0
+            outcome = results.get(mirror)
+            if outcome is not None:
+                _latency, result_speed = outcome
 
-                download_speeds = []
-                fetch_errors = (
-                    UrlFetcher.TIMEOUT_FETCH_ERROR,
-                    UrlFetcher.GENERIC_FETCH_ERROR)
-                for idx in range(retries):
-                    fetcher = self._url_fetcher(mirror_url, tmp_path,
-                        resume = False, show_speed = False,
-                        timeout = reasonable_timeout)
-                    rc = fetcher.download()
-                    if rc not in fetch_errors:
-                        download_speeds.append(fetcher.get_transfer_rate())
-
-                result_speed = 0.0
-                if download_speeds:
-                    download_speeds.sort(reverse=True)
-                    # take the best
-                    result_speed = download_speeds[0]
-                mirror_stats[mirror] = result_speed
-
-                mytxt = "%s: %s, %s/sec" % (
-                    blue(_("Mirror speed")),
-                    purple(hostname),
-                    teal(str(entropy.tools.bytes_into_human(result_speed))),
-                )
-                self.output(
-                    mytxt,
-                    importance = 1,
-                    level = "info",
-                    header = brown(" @@ ")
-                )
-            finally:
-                os.close(tmp_fd)
-                os.remove(tmp_path)
+            mytxt = "%s: %s, %s/sec" % (
+                blue(_("Mirror speed")),
+                purple(entropy.tools.spliturl(mirror).hostname),
+                teal(str(entropy.tools.bytes_into_human(result_speed))),
+            )
+            self.output(
+                mytxt,
+                importance = 1,
+                level = "info",
+                header = brown(" @@ ")
+            )
 
         # calculate new order
-        new_mirrors = sorted(mirror_stats.keys(),
-            key = lambda x: mirror_stats[x])
+        new_mirrors = sorted(probe_mirrors,
+            key = lambda x: ranking.score(x) or 0.0)
         return new_mirrors
 
     def reorder_mirrors(self, repository_id, dry_run = False):
@@ -120,7 +120,8 @@ class NoticeBoard(object):
                 "repository directory not available for %s" % (
                     self._repository_id,))
 
-        return dump_dumpobj(nb_path, metadata, complete_path = True)
+        return dump_dumpobj(nb_path, metadata, complete_path = True,
+            portable = True)
 
     def mark_read(self, item_id, read_status):
         """
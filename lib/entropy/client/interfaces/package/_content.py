@@ -11,10 +11,14 @@
 """
 import codecs
 import errno
+import mmap
+import struct
 import sys
 import os
 
-from entropy.const import etpConst, const_mkstemp
+from entropy.const import etpConst, const_mkstemp, \
+    const_convert_to_rawstring, const_convert_to_unicode
+from entropy.exceptions import CorruptionError
 
 import entropy.tools
 
@@ -316,6 +320,328 @@ class FileContentSafetyReader(object):
             self._file = None
 
 
+def _common_prefix_length(first, second, max_length):
+    """
+    Return the length of the common prefix of the given raw strings,
+    capped at max_length.
+    """
+    max_length = min(len(first), len(second), max_length)
+    idx = 0
+    while idx < max_length and first[idx] == second[idx]:
+        idx += 1
+    return idx
+
+
+class FileContentBinaryFormat(object):
+    """
+    Compact, binary representation of the "content" metadata.
+
+    All the integers are stored in network byte order. The file starts
+    with a header (magic string, format version), followed by the
+    entries, sorted by raw path. Each entry is made of:
+    <package_id><ftype length><shared prefix length><suffix length>
+    followed by the ftype and the path suffix. The path of an entry is
+    stored as the part that differs from the path of the previous entry.
+    Every BLOCK_SIZE entries a restart point, storing the full path,
+    is placed and its offset is recorded into the index that follows
+    the entries. The file ends with a fixed size trailer:
+    <index offset><entries count><block size><magic string>.
+    """
+
+    MAGIC = b"ECBF"
+    VERSION = 1
+    BLOCK_SIZE = 32
+    MAX_PATH_LENGTH = 0xFFFF
+
+    HEADER = struct.Struct("!4sH")
+    ENTRY = struct.Struct("!IBHH")
+    INDEX = struct.Struct("!Q")
+    TRAILER = struct.Struct("!QQI4s")
+
+
+class FileContentBinaryWriter(object):
+
+    TMP_SUFFIX = FileContentWriter.TMP_SUFFIX
+
+    def __init__(self, path, enc=None):
+        self._file = None
+        if enc is None:
+            self._enc = etpConst['conf_encoding']
+        else:
+            self._enc = enc
+        self._cpath = path
+        self._offset = 0
+        self._count = 0
+        self._index = []
+        self._last_path = None
+        # callers expect that file is created
+        # on open object instantiation, don't
+        # remove this or things like os.rename()
+        # will fail
+        self._open_f()
+
+    def _open_f(self):
+        if isinstance(self._cpath, int):
+            self._file = os.fdopen(self._cpath, "wb")
+        else:
+            self._file = open(self._cpath, "wb")
+
+        fmt = FileContentBinaryFormat
+        self._file.write(fmt.HEADER.pack(fmt.MAGIC, fmt.VERSION))
+        self._offset = fmt.HEADER.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, trace_obj):
+        self.close()
+
+    def write(self, package_id, path, ftype):
+        """
+        Write an entry to file. Entries must be written sorted by path.
+        """
+        self.write_raw(
+            package_id,
+            const_convert_to_rawstring(path, from_enctype=self._enc),
+            const_convert_to_rawstring(ftype, from_enctype=self._enc))
+
+    def write_raw(self, package_id, raw_path, raw_ftype):
+        """
+        Write an entry to file, path and ftype must be raw strings.
+        Entries must be written sorted by path.
+        """
+        if self._file is None:
+            raise IOError("FileContentBinaryWriter is closed")
+
+        fmt = FileContentBinaryFormat
+        if len(raw_path) > fmt.MAX_PATH_LENGTH:
+            raise ValueError("path too long: %r" % (raw_path,))
+
+        if self._last_path is not None and raw_path < self._last_path:
+            raise ValueError("content is not sorted: %r" % (raw_path,))
+
+        if self._count % fmt.BLOCK_SIZE == 0:
+            # restart point, store the full path
+            shared = 0
+            self._index.append(self._offset)
+        else:
+            shared = _common_prefix_length(
+                self._last_path, raw_path, fmt.MAX_PATH_LENGTH)
+
+        if package_id is None:
+            package_id = 0
+        suffix = raw_path[shared:]
+        self._file.write(fmt.ENTRY.pack(
+            package_id, len(raw_ftype), shared, len(suffix)))
+        self._file.write(raw_ftype)
+        self._file.write(suffix)
+
+        self._offset += fmt.ENTRY.size + len(raw_ftype) + len(suffix)
+        self._count += 1
+        self._last_path = raw_path
+
+    def close(self):
+        if self._file is not None:
+            fmt = FileContentBinaryFormat
+            index_offset = self._offset
+            for offset in self._index:
+                self._file.write(fmt.INDEX.pack(offset))
+            self._file.write(fmt.TRAILER.pack(
+                index_offset, self._count, fmt.BLOCK_SIZE, fmt.MAGIC))
+            self._file.flush()
+            self._file.close()
+            self._file = None
+
+
+class FileContentBinaryReader(object):
+    """
+    Read a content file generated by FileContentBinaryWriter through
+    mmap. Iterating over the object yields (package_id, path, ftype)
+    tuples, exactly like FileContentReader does, so both can be
+    used interchangeably.
+    """
+
+    def __init__(self, path, enc=None):
+        if enc is None:
+            self._enc = etpConst['conf_encoding']
+        else:
+            self._enc = enc
+        self._cpath = path
+        self._map = None
+        self._iter = None
+        self._count = 0
+        self._block_size = 0
+        self._index_offset = 0
+        self._blocks = 0
+
+    def _open_f(self):
+        fmt = FileContentBinaryFormat
+        if isinstance(self._cpath, int):
+            self._map = mmap.mmap(self._cpath, 0, access=mmap.ACCESS_READ)
+        else:
+            with open(self._cpath, "rb") as cont_f:
+                self._map = mmap.mmap(
+                    cont_f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        size = len(self._map)
+        if size < fmt.HEADER.size + fmt.TRAILER.size:
+            self.close()
+            raise CorruptionError("content file is truncated")
+
+        magic, version = fmt.HEADER.unpack_from(self._map, 0)
+        if magic != fmt.MAGIC or version != fmt.VERSION:
+            self.close()
+            raise CorruptionError("unsupported content file format")
+
+        (self._index_offset, self._count, self._block_size,
+         magic) = fmt.TRAILER.unpack_from(self._map, size - fmt.TRAILER.size)
+        if magic != fmt.MAGIC:
+            self.close()
+            raise CorruptionError("content file trailer is corrupted")
+
+        self._blocks = (size - fmt.TRAILER.size - self._index_offset) // \
+            fmt.INDEX.size
+
+    def _setup(self):
+        if self._map is None:
+            self._open_f()
+
+    def _block_offset(self, block):
+        fmt = FileContentBinaryFormat
+        return fmt.INDEX.unpack_from(
+            self._map, self._index_offset + block * fmt.INDEX.size)[0]
+
+    def _read_entry(self, offset, last_path):
+        """
+        Decode the entry at offset, return a (package_id, raw_path,
+        raw_ftype, next_offset) tuple.
+        """
+        entry = FileContentBinaryFormat.ENTRY
+        package_id, ftype_len, shared, suffix_len = entry.unpack_from(
+            self._map, offset)
+        offset += entry.size
+        raw_ftype = self._map[offset:offset + ftype_len]
+        offset += ftype_len
+        raw_path = self._map[offset:offset + suffix_len]
+        offset += suffix_len
+        if shared:
+            raw_path = last_path[:shared] + raw_path
+        return package_id, raw_path, raw_ftype, offset
+
+    def _read_block(self, block):
+        """
+        Decode a whole block of entries, return a list of
+        (package_id, raw_path, raw_ftype) tuples.
+        """
+        offset = self._block_offset(block)
+        entries = min(
+            self._block_size, self._count - block * self._block_size)
+        raw_path = None
+        items = []
+        for _count in range(entries):
+            package_id, raw_path, raw_ftype, offset = self._read_entry(
+                offset, raw_path)
+            items.append((package_id, raw_path, raw_ftype))
+        return items
+
+    def iter_raw(self, reverse=False):
+        """
+        Iterate over the content entries without decoding paths.
+        Yield (package_id, raw_path, raw_ftype) tuples, sorted by
+        path in ascending order (or descending, if reverse is True).
+        """
+        self._setup()
+        if reverse:
+            for block in range(self._blocks - 1, -1, -1):
+                for item in reversed(self._read_block(block)):
+                    yield item
+            return
+
+        offset = FileContentBinaryFormat.HEADER.size
+        raw_path = None
+        for _count in range(self._count):
+            package_id, raw_path, raw_ftype, offset = self._read_entry(
+                offset, raw_path)
+            yield package_id, raw_path, raw_ftype
+
+    def _iter_decoded(self, reverse=False):
+        enc = self._enc
+        for package_id, raw_path, raw_ftype in self.iter_raw(
+                reverse=reverse):
+            yield (package_id,
+                   const_convert_to_unicode(raw_path, enctype=enc),
+                   const_convert_to_unicode(raw_ftype, enctype=enc))
+
+    def search(self, path):
+        """
+        Look up the given path by binary searching the index.
+        Return a (package_id, path, ftype) tuple or None, if path
+        is not available.
+        """
+        self._setup()
+        raw_target = const_convert_to_rawstring(
+            path, from_enctype=self._enc)
+
+        # find the last restart point whose path is <= raw_target
+        low, high = 0, self._blocks
+        while low < high:
+            middle = (low + high) // 2
+            _package_id, raw_path, _raw_ftype, _offset = self._read_entry(
+                self._block_offset(middle), None)
+            if raw_path <= raw_target:
+                low = middle + 1
+            else:
+                high = middle
+        block = low - 1
+        if block < 0:
+            return None
+
+        for package_id, raw_path, raw_ftype in self._read_block(block):
+            if raw_path == raw_target:
+                return (package_id, path,
+                        const_convert_to_unicode(raw_ftype, enctype=self._enc))
+            if raw_path > raw_target:
+                break
+        return None
+
+    def __contains__(self, path):
+        return self.search(path) is not None
+
+    def __len__(self):
+        self._setup()
+        return self._count
+
+    def __iter__(self):
+        # reset the iterator status, this makes possible
+        # to reuse the iterator more than once, like
+        # FileContentReader does.
+        self._iter = self._iter_decoded()
+        return self
+
+    def __reversed__(self):
+        return self._iter_decoded(reverse=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, trace_obj):
+        self.close()
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        if self._iter is None:
+            self._iter = self._iter_decoded()
+        return next(self._iter)
+
+    def close(self):
+        self._iter = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
 def generate_content_safety_file(content_safety):
     """
     Generate a file containing the "content_safety" metadata,
@@ -500,3 +826,119 @@ def filter_content_file(content_file, filter_func):
         except OSError as err:
             if err.errno != errno.ENOENT:
                 raise
+
+
+def is_binary_content_file(content_file):
+    """
+    Return whether content_file has been generated by
+    FileContentBinaryWriter.
+    """
+    magic = FileContentBinaryFormat.MAGIC
+    try:
+        with open(content_file, "rb") as cont_f:
+            return cont_f.read(len(magic)) == magic
+    except (OSError, IOError) as err:
+        if err.errno != errno.ENOENT:
+            raise
+        return False
+
+
+def open_content_file(content_file, enc=None):
+    """
+    Return a content reader object for content_file, picking
+    either FileContentBinaryReader or FileContentReader depending on
+    the file format.
+    """
+    if is_binary_content_file(content_file):
+        return FileContentBinaryReader(content_file, enc=enc)
+    return FileContentReader(content_file, enc=enc)
+
+
+def convert_content_file(content_file, binary_content_file, enc=None):
+    """
+    Convert a text content file (as generated by generate_content_file())
+    to the binary format, sorting its entries by path. Return the number
+    of entries written.
+    """
+    if enc is None:
+        enc = etpConst['conf_encoding']
+
+    items = []
+    with FileContentReader(content_file, enc=enc) as tmp_r:
+        for _package_id, _path, _ftype in tmp_r:
+            items.append((
+                const_convert_to_rawstring(_path, from_enctype=enc),
+                _package_id,
+                const_convert_to_rawstring(_ftype, from_enctype=enc)))
+    items.sort(key=lambda x: x[0])
+
+    with FileContentBinaryWriter(binary_content_file, enc=enc) as tmp_w:
+        for raw_path, _package_id, raw_ftype in items:
+            tmp_w.write_raw(_package_id, raw_path, raw_ftype)
+    return len(items)
+
+
+def convert_binary_content_file(binary_content_file, content_file,
+                                enc=None):
+    """
+    Convert a binary content file back to the text format, the
+    path ordering is kept. Return the number of entries written.
+    """
+    count = 0
+    with FileContentWriter(content_file, enc=enc) as tmp_w:
+        with FileContentBinaryReader(binary_content_file, enc=enc) as tmp_r:
+            for _package_id, _path, _ftype in tmp_r:
+                tmp_w.write(_package_id, _path, _ftype)
+                count += 1
+    return count
+
+
+def merge_binary_content_file(content_file, sorted_content, enc=None):
+    """
+    Binary content file counterpart of merge_content_file().
+    Add sorted_content, a list of (path, ftype) sorted by path in
+    ascending order, to content_file keeping it ordered. Entries are
+    copied without being decoded. In case of duplicates, the ftype
+    already stored in content_file is kept.
+    It is O(n+m) where n = entries in content_file and
+    m = sorted_content length.
+    """
+    if enc is None:
+        enc = etpConst['conf_encoding']
+    tmp_content_file = content_file + FileContentBinaryWriter.TMP_SUFFIX
+
+    raw_sorted = [
+        (const_convert_to_rawstring(_path, from_enctype=enc),
+         const_convert_to_rawstring(_ftype, from_enctype=enc))
+        for _path, _ftype in sorted_content]
+
+    sorted_ptr = 0
+    sorted_len = len(raw_sorted)
+    _package_id = 0 # will be filled
+    try:
+        with FileContentBinaryWriter(tmp_content_file, enc=enc) as tmp_w:
+            with FileContentBinaryReader(content_file, enc=enc) as tmp_r:
+                for _package_id, raw_path, raw_ftype in tmp_r.iter_raw():
+
+                    while sorted_ptr < sorted_len:
+                        _sorted_path, _sorted_ftype = raw_sorted[sorted_ptr]
+                        if _sorted_path > raw_path:
+                            break
+                        if _sorted_path < raw_path:
+                            tmp_w.write_raw(
+                                _package_id, _sorted_path, _sorted_ftype)
+                        sorted_ptr += 1
+
+                    tmp_w.write_raw(_package_id, raw_path, raw_ftype)
+
+            # add the remainder
+            for _sorted_path, _sorted_ftype in raw_sorted[sorted_ptr:]:
+                tmp_w.write_raw(_package_id, _sorted_path, _sorted_ftype)
+
+        os.rename(tmp_content_file, content_file)
+    finally:
+        try:
+            os.remove(tmp_content_file)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    B{Entropy Package Manager Client Package Delta Interface}.
+
+"""
+import os
+import threading
+import time
+
+from entropy.const import const_debug_write, const_get_cpus, const_mkstemp
+from entropy.core import Singleton
+from entropy.dump import dumpobj, loadobj
+from entropy.client.mirrors import MirrorRanking
+from entropy.client.misc import PackageStore
+from entropy.misc import ParallelTask
+
+import entropy.tools
+
+
+class EdeltaStatistics(Singleton):
+
+    """
+    Measured cost of the Entropy package deltas (edelta): the size of a
+    delta relative to the package file it generates and the rate (package
+    bytes per second) a delta is applied at, by a single worker.
+    Both are exponentially weighted moving averages, updated by every
+    applied delta and persisted across Entropy Client sessions.
+    """
+
+    DUMP_ID = "edelta_statistics"
+
+    # weight given to the newest sample
+    ALPHA = 0.3
+
+    # used until real deltas have been measured
+    DEFAULT_RATIO = 0.4
+    DEFAULT_APPLY_RATE = 4194304.0
+
+    def init_singleton(self):
+        self._lock = threading.Lock()
+        self._stats = None
+        self._changed = False
+
+    def _load(self):
+        """
+        Load the statistics, must be called with the lock held.
+        """
+        if self._stats is None:
+            stats = loadobj(EdeltaStatistics.DUMP_ID)
+            if not isinstance(stats, dict):
+                stats = {}
+            self._stats = stats
+        return self._stats
+
+    def save(self):
+        """
+        Store the statistics to disk, if they changed.
+        """
+        with self._lock:
+            if not self._changed:
+                return
+            self._changed = False
+            stats = self._load().copy()
+        dumpobj(EdeltaStatistics.DUMP_ID, stats)
+
+    def clear(self):
+        """
+        Forget all the statistics.
+        """
+        with self._lock:
+            self._stats = {}
+            self._changed = True
+
+    def _average(self, key, sample):
+        stats = self._load()
+        old = stats.get(key)
+        if old is None:
+            stats[key] = float(sample)
+        else:
+            stats[key] = EdeltaStatistics.ALPHA * sample + \
+                (1.0 - EdeltaStatistics.ALPHA) * old
+        self._changed = True
+
+    def update(self, package_size, delta_size, elapsed):
+        """
+        Update the statistics with a new sample.
+
+        @param package_size: size of the generated package file, in bytes
+        @type package_size: int
+        @param delta_size: size of the applied delta, in bytes
+        @type delta_size: int
+        @param elapsed: time taken to apply the delta, in seconds
+        @type elapsed: float
+        """
+        if package_size <= 0:
+            return
+        with self._lock:
+            self._average('ratio', float(delta_size) / package_size)
+            if elapsed > 0:
+                self._average('apply_rate', package_size / elapsed)
+
+    def ratio(self):
+        """
+        Return the expected size of a delta, relative to the size of the
+        package file it generates.
+        """
+        with self._lock:
+            return self._load().get(
+                'ratio', EdeltaStatistics.DEFAULT_RATIO)
+
+    def apply_rate(self):
+        """
+        Return the expected amount of package bytes generated per second
+        by a single delta application.
+        """
+        with self._lock:
+            return self._load().get(
+                'apply_rate', EdeltaStatistics.DEFAULT_APPLY_RATE)
+
+
+class EdeltaEngine(object):
+
+    """
+    Entropy package delta (edelta) engine. It locates the package files
+    deltas can be applied to, decides whether fetching a delta is worth
+    the local CPU time needed to apply it and applies deltas concurrently,
+    within a CPU and memory budget.
+    """
+
+    # bspatch works on uncompressed tarballs, which are kept in memory
+    # together with the delta. This is the amount of memory needed by a
+    # delta application, relative to the size of the package files.
+    MEMORY_FACTOR = 4
+
+    # fraction of the available memory that deltas can use
+    MEMORY_RATIO = 0.5
+
+    def __init__(self, max_workers = None, memory_budget = None):
+        if max_workers is None:
+            max_workers = const_get_cpus()
+        if memory_budget is None:
+            available = EdeltaEngine._available_memory()
+            if available is not None:
+                memory_budget = int(available * EdeltaEngine.MEMORY_RATIO)
+        self._max_workers = max(max_workers, 1)
+        self._memory_budget = memory_budget
+
+    @staticmethod
+    def _available_memory():
+        """
+        Return the amount of memory available to new processes, in bytes,
+        or None, if unknown.
+        """
+        meminfo = {}
+        try:
+            with open("/proc/meminfo", "r") as mem_f:
+                for line in mem_f.readlines():
+                    data = line.split()
+                    if len(data) < 2:
+                        continue
+                    try:
+                        meminfo[data[0].rstrip(":")] = int(data[1]) * 1024
+                    except ValueError:
+                        continue
+        except (OSError, IOError):
+            return None
+
+        available = meminfo.get("MemAvailable")
+        if available is None and "MemFree" in meminfo:
+            available = meminfo["MemFree"] + meminfo.get("Cached", 0)
+        return available
+
+    @staticmethod
+    def locate_base(download_path, checksum, signatures, lock_func):
+        """
+        Locate the installed package file a delta can be applied to. It is
+        looked up at its download path first and then in the package files
+        store (see entropy.client.misc.PackageStore), where it may have
+        been downloaded from another repository or branch.
+
+        @param download_path: installed package file download path
+        @type download_path: string
+        @param checksum: installed package file md5
+        @type checksum: string
+        @param signatures: installed package file signatures, or None
+        @type signatures: dict
+        @param lock_func: function returning a FlockFile for a given path
+        @type lock_func: callable
+        @return: True, if a valid package file is at download_path
+        @rtype: bool
+        """
+        def _valid():
+            try:
+                return entropy.tools.compare_md5(download_path, checksum)
+            except (OSError, IOError) as err:
+                const_debug_write(
+                    __name__,
+                    "EdeltaEngine.locate_base, error: %s" % (err,))
+                return False
+
+        if _valid():
+            return True
+        if not signatures:
+            return False
+
+        lock = None
+        try:
+            lock = lock_func(download_path)
+            with lock.exclusive():
+                if not PackageStore().get(download_path, signatures):
+                    return False
+        finally:
+            if lock is not None:
+                lock.close()
+        return _valid()
+
+    def concurrency(self, count):
+        """
+        Return the number of deltas, out of count, applied at the same time.
+        """
+        return max(min(self._max_workers, count), 1)
+
+    def worthwhile(self, url, package_size, concurrency = 1):
+        """
+        Return whether fetching a delta and applying it is expected to be
+        faster than downloading the whole package file from the given URL,
+        comparing the transfer time saved (using the measured mirror
+        throughput) against the local CPU time needed to apply the delta.
+
+        @param url: package file URL
+        @type url: string
+        @param package_size: expected package file size, in bytes
+        @type package_size: int
+        @keyword concurrency: number of deltas applied at the same time
+        @type concurrency: int
+        @return: True, if the delta should be used
+        @rtype: bool
+        """
+        throughput = MirrorRanking().throughput(url)
+        if not throughput or not package_size:
+            # no data, deltas are usually worth it
+            return True
+
+        stats = EdeltaStatistics()
+        saved = package_size * (1.0 - stats.ratio()) / throughput
+        cost = float(package_size) / (stats.apply_rate() * concurrency)
+        const_debug_write(
+            __name__,
+            "EdeltaEngine.worthwhile(%s): saved %.2fs, cost %.2fs" % (
+                url, saved, cost))
+        return saved > cost
+
+    def _memory(self, base_path, delta_path):
+        """
+        Return the expected amount of memory needed to apply a delta.
+        """
+        size = 0
+        for path in (base_path, base_path, delta_path):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                continue
+        return size * EdeltaEngine.MEMORY_FACTOR
+
+    def _apply(self, base_path, delta_path, dest_path, lock_func):
+        """
+        Apply a delta, generating dest_path atomically.
+        """
+        lock = None
+        tmp_fd, tmp_path = None, None
+        try:
+            if lock_func is not None:
+                lock = lock_func(delta_path)
+                lock.acquire_shared()
+
+            tmp_fd, tmp_path = const_mkstemp(
+                dir=os.path.dirname(dest_path), suffix=".edelta_pkg_tmp")
+
+            start = time.time()
+            try:
+                entropy.tools.apply_entropy_delta(
+                    base_path,  # best effort read
+                    delta_path,  # shared lock
+                    tmp_path)  # atomically created path
+            except IOError as err:
+                const_debug_write(
+                    __name__,
+                    "EdeltaEngine._apply(%s), error: %s" % (dest_path, err))
+                return False
+            elapsed = time.time() - start
+
+            os.rename(tmp_path, dest_path)
+            tmp_path = None
+
+            try:
+                EdeltaStatistics().update(
+                    os.path.getsize(dest_path),
+                    os.path.getsize(delta_path), elapsed)
+            except OSError:
+                pass
+            return True
+
+        finally:
+            if tmp_fd is not None:
+                try:
+                    os.close(tmp_fd)
+                except OSError:
+                    pass
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            if lock is not None:
+                lock.release()
+                lock.close()
+
+    def apply(self, deltas, lock_func = None):
+        """
+        Apply the given deltas, concurrently, making sure that the expected
+        memory usage stays within the budget (a delta exceeding the budget
+        on its own is applied alone).
+
+        @param deltas: list of (key, base_path, delta_path, dest_path)
+            tuples
+        @type deltas: list
+        @keyword lock_func: function returning a FlockFile for a given path,
+            used to hold a shared lock on delta_path while reading it
+        @type lock_func: callable
+        @return: dict keyed by delta key, True if dest_path has been
+            generated
+        @rtype: dict
+        """
+        queue = list(deltas)
+        results = {}
+        cond = threading.Condition()
+        usage = {'memory': 0, 'running': 0}
+
+        def _worker():
+            while True:
+                with cond:
+                    if not queue:
+                        break
+                    key, base_path, delta_path, dest_path = queue.pop(0)
+
+                memory = self._memory(base_path, delta_path)
+                with cond:
+                    while self._memory_budget is not None \
+                            and usage['running'] \
+                            and usage['memory'] + memory > \
+                            self._memory_budget:
+                        cond.wait()
+                    usage['memory'] += memory
+                    usage['running'] += 1
+
+                outcome = False
+                try:
+                    outcome = self._apply(
+                        base_path, delta_path, dest_path, lock_func)
+                finally:
+                    with cond:
+                        usage['memory'] -= memory
+                        usage['running'] -= 1
+                        results[key] = outcome
+                        cond.notify_all()
+
+        try:
+            workers = self.concurrency(len(queue))
+            if workers < 2:
+                _worker()
+            else:
+                tasks = []
+                for _idx in range(workers):
+                    task = ParallelTask(_worker)
+                    task.daemon = True
+                    task.start()
+                    tasks.append(task)
+                for task in tasks:
+                    task.join()
+        finally:
+            EdeltaStatistics().save()
+
+        return results
@@ -19,6 +19,7 @@ from entropy.const import etpConst, etpSys, const_convert_to_rawstring, \
     const_mkstemp
 from entropy.output import brown, bold, darkred, red, teal, purple
 from entropy.i18n import _
+from entropy.tracing import Tracer
 
 import entropy.dep
 import entropy.tools
@@ -107,7 +108,10 @@ class Trigger(object):
         assert self._prepared, "prepare() not called"
 
         for trigger_func in self._triggers:
-            code = trigger_func()
+            func_name = getattr(trigger_func, "__name__", None)
+            with Tracer().span("trigger.%s" % (self._phase,), "client",
+                               function = func_name):
+                code = trigger_func()
             if code != 0:
                 return code
         return 0
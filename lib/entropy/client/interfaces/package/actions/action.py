@@ -19,6 +19,7 @@ from entropy.const import etpConst, const_convert_to_unicode, \
 from entropy.i18n import _
 from entropy.misc import FlockFile
 from entropy.output import darkred, blue, darkgreen
+from entropy.tracing import Tracer
 
 import entropy.dep
 
@@ -215,7 +216,10 @@ class PackageAction(object):
         Execute the action. Return an exit status.
         """
         acquired = False
-        exit_st = self._run()
+        with Tracer().span("action.%s" % (self.NAME,), "client",
+                           atom = self._atom_for_tracing()) as span:
+            exit_st = self._run()
+            span.set("exit_status", exit_st)
         if exit_st != 0:
             self._entropy.output(
                 blue(_("An error occurred. Action aborted.")),
@@ -234,6 +238,31 @@ class PackageAction(object):
         """
         raise NotImplementedError()
 
+    def _atom_for_tracing(self):
+        """
+        Return the package atom, for tracing purposes, or None.
+        """
+        if not Tracer().enabled():
+            return None
+        try:
+            repo = self._entropy.open_repository(self._repository_id)
+            return repo.retrieveAtom(self._package_id)
+        except Exception:
+            return None
+
+    def _run_phase(self, method):
+        """
+        Run an action phase method, returning its exit status, tracing it
+        as "<action name>.<phase name>" span.
+        """
+        phase = method.__name__.strip("_")
+        if phase.endswith("_phase"):
+            phase = phase[:-len("_phase")]
+        with Tracer().span("%s.%s" % (self.NAME, phase), "client") as span:
+            exit_st = method()
+            span.set("exit_status", exit_st)
+        return exit_st
+
     def finalize(self):
         """
         Finalize the object, release all its resources.
@@ -69,7 +69,7 @@ class _PackageConfigAction(PackageAction):
 
         exit_st = 0
         for method in self._meta['phases']:
-            exit_st = method()
+            exit_st = self._run_phase(method)
             if exit_st != 0:
                 break
         return exit_st
@@ -17,7 +17,8 @@ import stat
 
 from entropy.const import etpConst, const_debug_write, const_debug_enabled, \
     const_mkstemp
-from entropy.client.mirrors import StatusInterface
+from entropy.client.mirrors import StatusInterface, MirrorRanking
+from entropy.client.misc import PackageStore
 from entropy.exceptions import InterruptError
 from entropy.fetchers import UrlFetcher
 from entropy.i18n import _
@@ -28,6 +29,7 @@ import entropy.dep
 import entropy.tools
 
 from .action import PackageAction
+from ._edelta import EdeltaEngine
 
 
 class _PackageFetchAction(PackageAction):
@@ -144,7 +146,7 @@ class _PackageFetchAction(PackageAction):
 
         exit_st = 0
         for method in self._meta['phases']:
-            exit_st = method()
+            exit_st = self._run_phase(method)
             if exit_st != 0:
                 break
         return exit_st
@@ -183,23 +185,20 @@ class _PackageFetchAction(PackageAction):
         return uris
 
     def _approve_edelta_unlocked(self, url, checksum, installed_url,
-                                 installed_checksum, installed_download_path):
+                                 installed_checksum, installed_download_path,
+                                 installed_signatures = None):
         """
         Approve Entropy package delta support for given url, checking if
-        a previously fetched package is available.
+        a previously fetched package is available, either at its download
+        path or in the package files store.
 
         @return: edelta URL to download and previously downloaded package path
         or None if edelta is not available
         @rtype: tuple of strings or None
         """
-        edelta_local_approved = False
-        try:
-            edelta_local_approved = entropy.tools.compare_md5(
-                installed_download_path, installed_checksum)
-        except (OSError, IOError) as err:
-            const_debug_write(
-                __name__, "_approve_edelta_unlocked, error: %s" % (err,))
-            return
+        edelta_local_approved = EdeltaEngine.locate_base(
+            installed_download_path, installed_checksum,
+            installed_signatures, self.path_lock)
 
         if not edelta_local_approved:
             return
@@ -393,6 +392,14 @@ class _PackageFetchAction(PackageAction):
             installed_checksum = inst_repo.retrieveDigest(installed_package_id)
             installed_download_path = self.get_standard_fetch_disk_path(
                 installed_url)
+            sha1, sha256, sha512, gpg = inst_repo.retrieveSignatures(
+                installed_package_id)
+            installed_signatures = {
+                'sha1': sha1,
+                'sha256': sha256,
+                'sha512': sha512,
+                'gpg': gpg,
+            }
 
         if installed_download_path == download_path:
             # collision between what we need locally and what we need
@@ -422,12 +429,20 @@ class _PackageFetchAction(PackageAction):
 
                 edelta_url = self._approve_edelta_unlocked(
                     url, checksum, installed_url, installed_checksum,
-                    installed_download_path)
+                    installed_download_path,
+                    installed_signatures = installed_signatures)
 
                 if edelta_url is None:
                     # edelta not available, give up
                     return 1, 0.0
 
+                # the installed package file size is a good estimate
+                # of the size of the new one.
+                if not EdeltaEngine().worthwhile(
+                        url, os.path.getsize(installed_download_path)):
+                    # downloading the whole package file is faster
+                    return 1, 0.0
+
                 return self._try_edelta_fetch_unlocked(
                     edelta_url, edelta_download_path, download_path,
                     installed_download_path, resume)
@@ -486,24 +501,16 @@ class _PackageFetchAction(PackageAction):
                 # retry
                 continue
 
-            # now check
-            tmp_download_path = download_path + ".edelta_pkg_tmp"
             # yay, we can apply the delta and cook the new package file!
-            try:
-                entropy.tools.apply_entropy_delta(
-                    installed_download_path,
-                    delta_save, tmp_download_path)
-            except IOError:
+            applied = EdeltaEngine().apply(
+                [(delta_url, installed_download_path,
+                  delta_save, download_path)])
+            if not applied.get(delta_url):
                 # make sure this points to the hell
                 delta_resume = False
                 # retry
-                try:
-                    os.remove(tmp_download_path)
-                except (OSError, IOError):
-                    pass
                 continue
 
-            os.rename(tmp_download_path, download_path)
             edelta_approved = True
             break
 
@@ -515,9 +522,11 @@ class _PackageFetchAction(PackageAction):
 
     def _download_file(self, url, download_path, digest = None,
                        resume = True, package_id = None,
-                       repository_id = None):
+                       repository_id = None, mirror_urls = None):
         """
         Internal method. Try to download the package file.
+        Large files are downloaded in segments, spread across url and
+        the alternative mirror_urls, if any.
         """
 
         def do_stfu_rm(xpath):
@@ -550,9 +559,12 @@ class _PackageFetchAction(PackageAction):
         if os.path.isfile(download_path) and os.path.exists(download_path):
             existed_before = True
 
+        segment_threshold = self._settings['repositories']['segment_threshold']
         fetch_intf = self._entropy._url_fetcher(
             url, download_path, resume = resume,
-            abort_check_func = fetch_abort_function)
+            abort_check_func = fetch_abort_function,
+            mirror_urls = mirror_urls,
+            segment_threshold = segment_threshold)
 
         if (package_id is not None) and (repository_id is not None):
             self._setup_differential_download(
@@ -596,6 +608,9 @@ class _PackageFetchAction(PackageAction):
             # but file is already downloaded
             fetch_checksum = do_get_md5sum(download_path)
             if (fetch_checksum != digest) or fetch_checksum is None:
+                if fetch_intf.is_missing():
+                    # the mirror works, it just lacks the file
+                    return -1, data_transfer, resumed
                 return -3, data_transfer, resumed
 
         elif fetch_checksum == UrlFetcher.TIMEOUT_FETCH_ERROR:
@@ -634,18 +649,28 @@ class _PackageFetchAction(PackageAction):
             # copying packages, which would be useless. like it happens
             # with sabayon-weekly
             uris = self._build_uris_list(original_repo, repository_id)
+            original_count = len(
+                avail_data[repository_id]['plain_packages'])
         else:
             if original_repo in avail_data:
                 uris = avail_data[original_repo]['packages'][::-1]
+                original_count = len(uris)
                 if repository_id in avail_data:
                     uris += avail_data[repository_id]['packages'][::-1]
             elif original_repo in excluded_data:
                 uris = excluded_data[original_repo]['packages'][::-1]
+                original_count = len(uris)
                 if repository_id in avail_data:
                     uris += avail_data[repository_id]['packages'][::-1]
             else:
                 uris = avail_data[repository_id]['packages'][::-1]
+                original_count = len(uris)
 
+        # mirrors are ranked within their group, the original repository
+        # mirrors must be tried before the fallback ones.
+        ranking = MirrorRanking()
+        uris = ranking.sort(uris[:original_count]) + \
+            ranking.sort(uris[original_count:])
         remaining = set(uris)
         mirror_status = StatusInterface()
 
@@ -713,16 +738,20 @@ class _PackageFetchAction(PackageAction):
                     url, download_path, checksum, do_resume)
                 if exit_st > 0:
                     # fallback to package file download
+                    mirror_urls = [x + "/" + download for x in uris
+                                   if x != uri and x in remaining]
                     exit_st, data_transfer, resumed = self._download_file(
                         url,
                         download_path,
                         package_id = package_id,
                         repository_id = repository_id,
                         digest = checksum,
-                        resume = do_resume
+                        resume = do_resume,
+                        mirror_urls = mirror_urls
                     )
 
                 if exit_st == 0:
+                    ranking.update(uri, throughput = data_transfer)
                     txt = mirror_count_txt
                     txt += "%s: " % (
                         blue(_("Successfully downloaded from")),
@@ -804,6 +833,9 @@ class _PackageFetchAction(PackageAction):
                     mirror_status.set_working_mirror(None)
                     return 1
 
+                if exit_st != -1:
+                    # a missing file is not a mirror failure
+                    ranking.update(uri, failed = True)
                 remaining.discard(uri)
                 # make sure we don't have nasty issues
                 if not remaining:
@@ -850,14 +882,18 @@ class _PackageFetchAction(PackageAction):
                 level = "info",
                 header = red("   ## ")
             )
-            return self._download_package(
-                self._package_id,
-                self._repository_id,
-                download,
-                path,
-                checksum
-            )
+            try:
+                return self._download_package(
+                    self._package_id,
+                    self._repository_id,
+                    download,
+                    path,
+                    checksum
+                )
+            finally:
+                MirrorRanking().save()
 
+        package_store = PackageStore()
         locks = []
         try:
             download_path = self._get_download_path(
@@ -867,6 +903,8 @@ class _PackageFetchAction(PackageAction):
 
             with lock.exclusive():
 
+                package_store.get(download_path, self._meta['signatures'])
+
                 verify_st = 1
                 if self._stat_path(download_path):
                     verify_st = self._match_checksum(
@@ -876,6 +914,8 @@ class _PackageFetchAction(PackageAction):
                         self._meta['signatures'])
 
                 if verify_st != 0:
+                    package_store.discard(
+                        download_path, self._meta['signatures'])
                     download_st = _fetch(
                         download_path,
                         self._meta['download'],
@@ -892,6 +932,8 @@ class _PackageFetchAction(PackageAction):
                     _download_error(verify_st)
                     return verify_st
 
+                package_store.add(download_path, self._meta['signatures'])
+
             for extra_download in self._meta['extra_download']:
 
                 download_path = self._get_download_path(
@@ -908,6 +950,8 @@ class _PackageFetchAction(PackageAction):
 
                 with extra_lock.exclusive():
 
+                    package_store.get(download_path, signatures)
+
                     verify_st = 1
                     if self._stat_path(download_path):
                         verify_st = self._match_checksum(
@@ -917,6 +961,7 @@ class _PackageFetchAction(PackageAction):
                             signatures)
 
                     if verify_st != 0:
+                        package_store.discard(download_path, signatures)
                         download_st = _fetch(
                             download_path,
                             extra_download['download'],
@@ -933,6 +978,8 @@ class _PackageFetchAction(PackageAction):
                         _download_error(verify_st)
                         return verify_st
 
+                    package_store.add(download_path, signatures)
+
             return 0
 
         finally:
@@ -21,6 +21,7 @@ from entropy.const import etpConst, const_convert_to_unicode, \
 from entropy.exceptions import EntropyException
 from entropy.i18n import _
 from entropy.output import darkred, red, purple, brown, blue, darkgreen, teal
+from entropy.client.misc import ConfigurationJournal
 
 import entropy.dep
 import entropy.tools
@@ -257,7 +258,7 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             return exit_st
 
         for method in self._meta['phases']:
-            exit_st = method()
+            exit_st = self._run_phase(method)
             if exit_st != 0:
                 break
         return exit_st
@@ -1496,6 +1497,7 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             image_dir = const_convert_to_rawstring(image_dir,
                 from_enctype = etpConst['conf_encoding'])
         movefile = entropy.tools.movefile
+        config_journal = ConfigurationJournal()
 
         def workout_subdir(currentdir, subdir):
 
@@ -1941,11 +1943,10 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             item_inst = const_convert_to_unicode(item_inst)
             items_installed.add(item_inst)
 
-            if protected and \
-                    os.getenv("ENTROPY_CLIENT_ENABLE_OLD_FILEUPDATES"):
-                # add to disk cache
-                file_updates = self._entropy.PackageFileUpdates()
-                file_updates.add(tofile, quiet = True)
+            if protected:
+                # record the new configuration file update, so that
+                # ConfigurationFiles does not need to walk the filesystem
+                config_journal.add(tofile[len(sys_root):])
 
             return 0
 
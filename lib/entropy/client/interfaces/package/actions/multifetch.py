@@ -13,9 +13,11 @@ import contextlib
 import errno
 import os
 import threading
+import time
 
-from entropy.const import etpConst, const_setup_perms, const_mkstemp
-from entropy.client.mirrors import StatusInterface
+from entropy.const import etpConst, const_setup_perms
+from entropy.client.mirrors import StatusInterface, MirrorRanking
+from entropy.client.misc import PackageStore
 from entropy.exceptions import InterruptError
 from entropy.fetchers import UrlFetcher
 from entropy.output import blue, darkblue, bold, red, darkred, brown, darkgreen
@@ -26,6 +28,7 @@ import entropy.tools
 
 
 from .fetch import _PackageFetchAction
+from ._edelta import EdeltaEngine
 
 
 class _PackageMultiFetchAction(_PackageFetchAction):
@@ -147,7 +150,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
         exit_st = 0
         for method in self._meta['phases']:
-            exit_st = method()
+            exit_st = self._run_phase(method)
             if exit_st != 0:
                 break
         return exit_st
@@ -179,12 +182,25 @@ class _PackageMultiFetchAction(_PackageFetchAction):
         self._setup_url_directories(url_data)
 
         edelta_approvals = []
+        package_store = PackageStore()
         inst_repo = self._entropy.installed_repository()
         with inst_repo.shared():
 
             for (pkg_id, repository_id, url, download_path,
                  cksum, signs) in url_data:
 
+                lock = None
+                try:
+                    lock = self.path_lock(download_path)
+                    with lock.exclusive():
+                        in_store = package_store.get(download_path, signs)
+                finally:
+                    if lock is not None:
+                        lock.close()
+                if in_store:
+                    # available locally, no need to download anything
+                    continue
+
                 repo = self._entropy.open_repository(repository_id)
                 if cksum is None:
                     # cannot setup edelta without checksum, get from repository
@@ -209,6 +225,14 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                     installed_package_id)
                 installed_download_path = self.get_standard_fetch_disk_path(
                     installed_url)
+                sha1, sha256, sha512, gpg = inst_repo.retrieveSignatures(
+                    installed_package_id)
+                installed_signatures = {
+                    'sha1': sha1,
+                    'sha256': sha256,
+                    'sha512': sha512,
+                    'gpg': gpg,
+                }
 
                 if installed_download_path == download_path:
                     # collision between what we need locally and what we need
@@ -219,33 +243,60 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                 edelta_approvals.append(
                     (pkg_id, repository_id,
                      url, cksum, signs, download_path, installed_url,
-                     installed_checksum, installed_download_path))
+                     installed_checksum, installed_download_path,
+                     installed_signatures))
 
         if not edelta_approvals:
             return [], 0.0, 0
 
-        url_path_list = []
-        url_data_map = {}
-        url_data_map_idx = 0
-
+        edelta_candidates = []
         for tup in edelta_approvals:
 
             (pkg_id, repository_id, url,
              cksum, signs, download_path, installed_url,
-             installed_checksum, installed_download_path) = tup
+             installed_checksum, installed_download_path,
+             installed_signatures) = tup
 
             # installed_download_path is read in a fault-tolerant mode
             # so, there is no need for locking.
-            edelta_download_path = download_path
-            edelta_download_path += etpConst['packagesdeltaext']
-
             edelta_url = self._approve_edelta_unlocked(
                 url, cksum, installed_url, installed_checksum,
-                installed_download_path)
+                installed_download_path,
+                installed_signatures = installed_signatures)
             if edelta_url is None:
                 # no edelta support
                 continue
 
+            # the installed package file size is a good estimate
+            # of the size of the new one.
+            try:
+                package_size = os.path.getsize(installed_download_path)
+            except OSError:
+                continue
+            edelta_candidates.append((tup, edelta_url, package_size))
+
+        engine = EdeltaEngine()
+        concurrency = engine.concurrency(len(edelta_candidates))
+
+        url_path_list = []
+        url_data_map = {}
+        url_data_map_idx = 0
+
+        for tup, edelta_url, package_size in edelta_candidates:
+
+            (pkg_id, repository_id, url,
+             cksum, signs, download_path, _installed_url,
+             _installed_checksum, installed_download_path,
+             _installed_signatures) = tup
+
+            if not engine.worthwhile(
+                    url, package_size, concurrency = concurrency):
+                # downloading the whole package file is faster
+                continue
+
+            edelta_download_path = download_path
+            edelta_download_path += etpConst['packagesdeltaext']
+
             key = (edelta_url, edelta_download_path)
 
             url_path_list.append(key)
@@ -260,10 +311,10 @@ class _PackageMultiFetchAction(_PackageFetchAction):
             return [], 0.0, 0
 
         return self._try_edelta_multifetch_internal(
-            url_path_list, url_data_map, resume)
+            url_path_list, url_data_map, resume, engine)
 
     def _try_edelta_multifetch_internal(self, url_path_list,
-                                        url_data_map, resume):
+                                        url_data_map, resume, engine):
         """
         _try_edelta_multifetch(), assuming that the relevant file locks
         are held.
@@ -312,7 +363,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
             UrlFetcher.GENERIC_FETCH_WARN,
         )
 
-        valid_idxs = []
+        deltas = []
         for url_data_map_idx, cksum in tuple(data.items()):
 
             if cksum in fetch_errors:
@@ -323,44 +374,12 @@ class _PackageMultiFetchAction(_PackageFetchAction):
              orig_cksum, _signs, _edelta_url, edelta_download_path,
              installed_download_path) = url_data_map[url_data_map_idx]
 
-            dest_path_dir = os.path.dirname(dest_path)
+            deltas.append(
+                (url_data_map_idx, installed_download_path,
+                 edelta_download_path, dest_path))
 
-            lock = None
-            try:
-                lock = self.path_lock(edelta_download_path)
-                with lock.shared():
-
-                    tmp_fd, tmp_path = None, None
-                    try:
-                        tmp_fd, tmp_path = const_mkstemp(
-                            dir=dest_path_dir, suffix=".edelta_pkg_tmp")
-
-                        try:
-                            entropy.tools.apply_entropy_delta(
-                                installed_download_path,  # best effort read
-                                edelta_download_path,  # shared lock
-                                tmp_path)  # atomically created path
-                        except IOError:
-                            continue
-
-                        os.rename(tmp_path, dest_path)
-                        valid_idxs.append(url_data_map_idx)
-
-                    finally:
-                        if tmp_fd is not None:
-                            try:
-                                os.close(tmp_fd)
-                            except OSError:
-                                pass
-                        if tmp_path is not None:
-                            try:
-                                os.remove(tmp_path)
-                            except OSError:
-                                pass
-
-            finally:
-                if lock is not None:
-                    lock.close()
+        applied = engine.apply(deltas, lock_func = self.path_lock)
+        valid_idxs = sorted(x for x, y in applied.items() if y)
 
         fetched_url_data = []
         for url_data_map_idx in valid_idxs:
@@ -382,9 +401,11 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
         return fetched_url_data, data_transfer, 0
 
-    def _download_files(self, url_data, resume = True):
+    def _download_files(self, url_data, resume = True, mirror_urls = None):
         """
-        Effectively fetch the package files.
+        Effectively fetch the package files. mirror_urls is an optional
+        dict keyed by URL containing alternative URLs of the same file,
+        used by segmented downloads.
         """
         self._setup_url_directories(url_data)
 
@@ -404,6 +425,18 @@ class _PackageMultiFetchAction(_PackageFetchAction):
         validated_download_ids_lock = threading.Lock()
         validated_download_ids = set()
 
+        package_store = PackageStore()
+
+        # download samples fed to the mirrors ranking, keyed by
+        # download id, values are (start time, initial file size).
+        ranking = MirrorRanking()
+        download_samples = {}
+
+        fetch_errors = (
+            UrlFetcher.TIMEOUT_FETCH_ERROR,
+            UrlFetcher.GENERIC_FETCH_ERROR,
+        )
+
         # Note: the following two hooks are running in separate threads.
 
         def pre_download_hook(path, download_id):
@@ -411,6 +444,8 @@ class _PackageMultiFetchAction(_PackageFetchAction):
             (_hook_package_id, hook_repository_id, _hook_url,
              hook_download_path, hook_cksum, hook_signs) = path_data
 
+            package_store.get(hook_download_path, hook_signs)
+
             if self._stat_path(hook_download_path):
                 verify_st = self._match_checksum(
                     hook_download_path,
@@ -418,19 +453,51 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                     hook_cksum,
                     hook_signs)
                 if verify_st == 0:
+                    package_store.add(hook_download_path, hook_signs)
                     # UrlFetcher returns the md5 checksum on success
                     with validated_download_ids_lock:
                         validated_download_ids.add(download_id)
                     return hook_cksum
 
+                package_store.discard(hook_download_path, hook_signs)
+
+            initial_size = 0
+            if resume:
+                try:
+                    initial_size = os.path.getsize(hook_download_path)
+                except OSError:
+                    pass
+            with validated_download_ids_lock:
+                download_samples[download_id] = (time.time(), initial_size)
+
             # request the download
             return None
 
-        def post_download_hook(_path, _status, download_id):
+        def post_download_hook(_path, status, download_id):
             path_data = url_data[download_id - 1]
-            (_hook_package_id, hook_repository_id, _hook_url,
+            (_hook_package_id, hook_repository_id, hook_url,
              hook_download_path, hook_cksum, hook_signs) = path_data
 
+            with validated_download_ids_lock:
+                sample = download_samples.pop(download_id, None)
+            if sample is not None:
+                start_time, initial_size = sample
+                if status in fetch_errors:
+                    # a file missing from a mirror says nothing
+                    # about the mirror itself, see fetch.py
+                    if not fetch_intf.is_missing(download_id):
+                        ranking.update(hook_url, failed = True)
+                else:
+                    try:
+                        transferred = os.path.getsize(
+                            hook_download_path) - initial_size
+                    except OSError:
+                        transferred = 0
+                    elapsed = time.time() - start_time
+                    if transferred > 0 and elapsed > 0:
+                        ranking.update(
+                            hook_url, throughput = transferred / elapsed)
+
             with validated_download_ids_lock:
                 if hook_download_path in validated_download_ids:
                     # nothing to check, path already verified
@@ -445,6 +512,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                 hook_cksum,
                 hook_signs)
             if verify_st == 0:
+                package_store.add(hook_download_path, hook_signs)
                 with validated_download_ids_lock:
                     validated_download_ids.add(download_id)
 
@@ -474,7 +542,10 @@ class _PackageMultiFetchAction(_PackageFetchAction):
             url_fetcher_class = self._entropy._url_fetcher,
             download_context_func = download_context,
             pre_download_hook = pre_download_hook,
-            post_download_hook = post_download_hook)
+            post_download_hook = post_download_hook,
+            mirror_urls = mirror_urls,
+            segment_threshold = self._settings[
+                'repositories']['segment_threshold'])
         try:
             # make sure that we don't need to abort already
             # doing the check here avoids timeouts
@@ -520,6 +591,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
         excluded_data = self._settings['repositories']['excluded']
 
         repo_uris = {}
+        repo_originals = {}
         for pkg_id, repository_id, fname, cksum, _signatures in download_list:
             repo = self._entropy.open_repository(repository_id)
 
@@ -537,36 +609,77 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                 # copying packages, which would be useless. like it happens
                 # with sabayon-weekly
                 uris = self._build_uris_list(original_repo, repository_id)
+                original_count = len(
+                    avail_data[repository_id]['plain_packages'])
 
             else:
                 if original_repo in avail_data:
                     uris = avail_data[original_repo]['packages'][::-1]
+                    original_count = len(uris)
                     uris += avail_data[repository_id]['packages'][::-1]
                 elif original_repo in excluded_data:
                     uris = excluded_data[original_repo]['packages'][::-1]
+                    original_count = len(uris)
                     uris += avail_data[repository_id]['packages'][::-1]
                 else:
                     uris = avail_data[repository_id]['packages'][::-1]
+                    original_count = len(uris)
+
+            # mirrors serving the original repository of at least one
+            # package, the others are only used as fallback.
+            repo_originals.setdefault(repository_id, set()).update(
+                uris[:original_count])
 
             obj = repo_uris.setdefault(repository_id, [])
             # append at the beginning
             new_ones = [x for x in uris if x not in obj][::-1]
             for new_obj in new_ones:
-                obj.insert(0, new_obj)
-
-        remaining = repo_uris.copy()
+                # uris may list the same mirror twice
+                if new_obj not in obj:
+                    obj.insert(0, new_obj)
+
+        # mirrors are ranked within their group, the original repository
+        # mirrors must be tried before the fallback ones.
+        ranking = MirrorRanking()
+        for repository_id, uris in tuple(repo_uris.items()):
+            originals = repo_originals[repository_id]
+            repo_uris[repository_id] = ranking.sort(
+                [x for x in uris if x in originals]) + ranking.sort(
+                [x for x in uris if x not in originals])
+
+        remaining = dict((k, v[:]) for k, v in repo_uris.items())
         mirror_status = StatusInterface()
 
-        def get_best_mirror(repository_id):
-            try:
-                return remaining[repository_id][0]
-            except IndexError:
-                return None
+        # mirror assigned to every file, keyed by (repository_id, fname)
+        file_mirrors = {}
+
+        def assign_mirrors(down_list):
+            # split the downloads of every repository across
+            # its best mirrors, according to the mirrors ranking.
+            repo_files = {}
+            for _pkg_id, repository_id, fname, _cksum, _signs in down_list:
+                repo_files.setdefault(repository_id, []).append(fname)
+
+            file_mirrors.clear()
+            for repository_id, fnames in repo_files.items():
+                # fallback mirrors are used once the original
+                # ones are exhausted, like in fetch.py
+                originals = repo_originals[repository_id]
+                mirrors = [x for x in remaining[repository_id] \
+                               if x in originals]
+                if not mirrors:
+                    mirrors = remaining[repository_id]
+                mirrors = ranking.spread(mirrors, len(fnames))
+                for fname, mirror in zip(fnames, mirrors):
+                    file_mirrors[(repository_id, fname)] = mirror
+
+        def get_file_mirror(repository_id, fname):
+            return file_mirrors.get((repository_id, fname))
 
         def update_download_list(down_list, failed_down):
             newlist = []
             for pkg_id, repository_id, fname, cksum, signatures in down_list:
-                p_uri = get_best_mirror(repository_id)
+                p_uri = get_file_mirror(repository_id, fname)
                 p_uri = os.path.join(p_uri, fname)
                 if p_uri not in failed_down:
                     continue
@@ -614,7 +727,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
         def show_download_summary(down_list):
             for _pkg_id, repository_id, fname, _cksum, _signatures in down_list:
-                best_mirror = get_best_mirror(repository_id)
+                best_mirror = get_file_mirror(repository_id, fname)
                 mirrorcount = repo_uris[repository_id].index(best_mirror) + 1
                 basef = os.path.basename(fname)
 
@@ -633,7 +746,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
         def show_successful_download(down_list, data_transfer):
             for _pkg_id, repository_id, fname, _cksum, _signatures in down_list:
-                best_mirror = get_best_mirror(repository_id)
+                best_mirror = get_file_mirror(repository_id, fname)
                 mirrorcount = repo_uris[repository_id].index(best_mirror) + 1
                 basef = os.path.basename(fname)
 
@@ -666,8 +779,8 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                 )
 
         def show_download_error(down_list, p_exit_st):
-            for _pkg_id, repository_id, _fname, _cksum, _signs in down_list:
-                best_mirror = get_best_mirror(repository_id)
+            for _pkg_id, repository_id, fname, _cksum, _signs in down_list:
+                best_mirror = get_file_mirror(repository_id, fname)
                 mirrorcount = repo_uris[repository_id].index(best_mirror) + 1
 
                 txt = "( mirror #%s ) %s: %s" % (
@@ -702,11 +815,14 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                     header = red("   ## ")
                 )
 
-        def remove_failing_mirrors(repos):
-            for repository_id in repos:
-                get_best_mirror(repository_id)
-                if remaining[repository_id]:
-                    remaining[repository_id].pop(0)
+        def remove_failing_mirrors(down_list):
+            for _pkg_id, repository_id, fname, _cksum, _signs in down_list:
+                try:
+                    remaining[repository_id].remove(
+                        get_file_mirror(repository_id, fname))
+                except ValueError:
+                    # already removed
+                    pass
 
         def check_remaining_mirror_failure(repos):
             return [x for x in repos if not remaining.get(x)]
@@ -719,21 +835,30 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
             while True:
                 fetch_files_list = []
+                # alternative URLs of every file, for segmented downloads
+                mirror_urls = {}
 
-                for pkg_id, repository_id, fname, cksum, signs in d_list:
-                    best_mirror = get_best_mirror(repository_id)
-                    # set working mirror, dont care if its None
-                    mirror_status.set_working_mirror(best_mirror)
-                    if best_mirror is not None:
-                        mirror_fail_check(repository_id, best_mirror)
-                        best_mirror = get_best_mirror(repository_id)
+                for repository_id in set([x[1] for x in d_list]):
+                    for mirror in remaining[repository_id][:]:
+                        mirror_fail_check(repository_id, mirror)
 
-                    if best_mirror is None:
+                    if not remaining[repository_id]:
                         # at least one package failed to download
                         # properly, give up with everything
+                        mirror_status.set_working_mirror(None)
                         return 3, d_list
 
+                assign_mirrors(d_list)
+
+                for pkg_id, repository_id, fname, cksum, signs in d_list:
+                    best_mirror = get_file_mirror(repository_id, fname)
+                    mirror_status.set_working_mirror(best_mirror)
+
                     myuri = os.path.join(best_mirror, fname)
+                    mirror_urls[myuri] = [
+                        os.path.join(x, fname)
+                        for x in remaining[repository_id]
+                        if x != best_mirror]
                     pkg_path = self.get_standard_fetch_disk_path(fname)
                     fetch_files_list.append(
                         (pkg_id, repository_id, myuri, pkg_path, cksum, signs)
@@ -757,7 +882,8 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                         (exit_st, failed_downloads,
                          data_transfer) = self._download_files(
                              updated_fetch_files_list,
-                             resume = do_resume)
+                             resume = do_resume,
+                             mirror_urls = mirror_urls)
 
                 if exit_st == 0:
                     show_successful_download(
@@ -785,7 +911,7 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                     return 1, []
 
                 myrepos = set([x[1] for x in d_list])
-                remove_failing_mirrors(myrepos)
+                remove_failing_mirrors(d_list)
 
                 # make sure we don't have nasty issues
                 remaining_failure = check_remaining_mirror_failure(
@@ -823,8 +949,11 @@ class _PackageMultiFetchAction(_PackageFetchAction):
             header = red("   ## ")
         )
 
-        exit_st, err_list = self._download_packages(
-            self._meta['multi_fetch_list'])
+        try:
+            exit_st, err_list = self._download_packages(
+                self._meta['multi_fetch_list'])
+        finally:
+            MirrorRanking().save()
         if exit_st == 0:
             return 0
 
@@ -327,7 +327,7 @@ class _PackageRemoveAction(_PackageInstallRemoveAction):
 
         exit_st = 0
         for method in self._meta['phases']:
-            exit_st = method()
+            exit_st = self._run_phase(method)
             if exit_st != 0:
                 break
         return exit_st
@@ -15,12 +15,14 @@
 import errno
 import os
 import codecs
+import hashlib
 
 from entropy.i18n import _
 from entropy.const import etpConst, const_setup_perms, \
-    const_convert_to_unicode, const_isunicode
+    const_convert_to_unicode, const_isunicode, const_convert_to_rawstring
 from entropy.exceptions import InvalidPackageSet
 from entropy.core.settings.base import SystemSettings
+from entropy.output import darkred, purple, brown
 
 import entropy.dep
 
@@ -40,58 +42,246 @@ class Sets(object):
         self._entropy = entropy_client
         self._settings = SystemSettings()
 
+    def _index_key(self):
+        """
+        Return the package sets index cache key, based on the
+        repositories checksum and on the user defined package sets.
+        """
+        sha = hashlib.sha1()
+        sha.update(const_convert_to_rawstring(
+            self._entropy.repositories_checksum()))
+
+        sys_pkgsets = self._settings['system_package_sets']
+        for set_name in sorted(sys_pkgsets.keys()):
+            cache_s = "{%s:%s}" % (
+                set_name, ";".join(sorted(sys_pkgsets[set_name])))
+            sha.update(const_convert_to_rawstring(
+                cache_s, from_enctype = etpConst['conf_encoding']))
+
+        return sha.hexdigest()
+
+    def _lookup(self, set_name, definitions):
+        """
+        Return the content of the given package set (without the
+        "@" prefix), or None if not found. Package sets restricted to
+        a list of repositories (set@repo1,repo2) are matched through
+        match().
+        """
+        _set_name, repos = entropy.dep.dep_get_match_in_repos(set_name)
+        if repos is None:
+            return definitions.get(set_name)
+
+        set_data = self.match(set_name)
+        if not set_data:
+            return None
+        return set_data[2]
+
+    def _flatten(self, set_name, definitions, expanded, path):
+        """
+        Recursively expand the given package set (without the "@"
+        prefix), storing the results into expanded.
+
+        @raise entropy.exceptions.InvalidPackageSet: if the package set,
+            or one of the nested ones, is not found or if a circular
+            reference is found.
+        """
+        pkgs = expanded.get(set_name)
+        if pkgs is not None:
+            return pkgs
+
+        set_prefix = Sets.SET_PREFIX
+        if set_name in path:
+            cycle = path[path.index(set_name):]
+            # always start from the same element, so that the
+            # same circular reference is reported only once
+            first = cycle.index(min(cycle))
+            cycle = cycle[first:] + cycle[:first]
+            cycle.append(cycle[0])
+            raise InvalidPackageSet(
+                'corrupted, circular reference: %s' % (
+                    " -> ".join(set_prefix + x for x in cycle),))
+
+        set_data = self._lookup(set_name, definitions)
+        if not set_data:
+            raise InvalidPackageSet(
+                'not found: %s%s' % (set_prefix, set_name,))
+
+        pkgs = set()
+        path.append(set_name)
+        try:
+            for fset in set_data: # recursively
+                if fset.startswith(set_prefix):
+                    pkgs |= self._flatten(
+                        fset.lstrip(set_prefix), definitions,
+                        expanded, path)
+                else:
+                    pkgs.add(fset)
+        finally:
+            path.pop()
+
+        pkgs = frozenset(pkgs)
+        expanded[set_name] = pkgs
+        return pkgs
+
+    def _build_index(self):
+        """
+        Expand all the available package sets, see _index().
+        """
+        definitions = {}
+        # user defined package sets take precedence, see match()
+        sys_pkgsets = self._settings['system_package_sets']
+        for set_name, set_data in sys_pkgsets.items():
+            if set_data is not None:
+                definitions[set_name] = frozenset(set_data)
+
+        valid_repos = self._entropy.filter_repositories(
+            self._entropy.repositories())
+        for repository_id in valid_repos:
+            repo = self._entropy.open_repository(repository_id)
+            for set_name, set_data in repo.retrievePackageSets().items():
+                if set_data and set_name not in definitions:
+                    definitions[set_name] = frozenset(set_data)
+
+        expanded = {}
+        errors = {}
+        for set_name in sorted(definitions.keys()):
+            try:
+                self._flatten(set_name, definitions, expanded, [])
+            except InvalidPackageSet as err:
+                errors[set_name] = "%s" % (err,)
+
+        # report circular references once, when the index is built
+        cycles = set(x for x in errors.values() if "circular" in x)
+        for cycle in sorted(cycles):
+            self._entropy.output(
+                "%s: %s" % (
+                    purple(_("Invalid package set")),
+                    darkred(cycle),),
+                importance = 1,
+                level = "warning",
+                header = brown(" !!! ")
+            )
+
+        return {
+            'definitions': definitions,
+            'expanded': expanded,
+            'errors': errors,
+        }
+
+    def _index(self):
+        """
+        Return the package sets index, a dictionary containing the
+        package sets definitions ("definitions"), their fully expanded
+        content ("expanded"), the expansion errors ("errors") and the
+        package matches of the expanded sets ("matches", only kept
+        in memory).
+        The index is built once per repositories checksum and user
+        defined package sets content, kept in memory and stored in
+        the on-disk cache.
+        """
+        index_key = self._index_key()
+        with self._entropy._package_sets_lock:
+            cached = self._entropy._package_sets
+            if cached is not None and cached[0] == index_key:
+                return cached[1]
+
+        cache_key = "package_sets/%s" % (index_key,)
+        index = None
+        xcache = self._entropy.xcache
+        if xcache:
+            index = self._entropy._cacher.pop(cache_key)
+
+        if index is None:
+            index = self._build_index()
+            if xcache:
+                self._entropy._cacher.push(cache_key, index)
+        index = dict(index, matches = {})
+
+        with self._entropy._package_sets_lock:
+            self._entropy._package_sets = (index_key, index)
+        return index
+
     def expand(self, package_set, raise_exceptions = True):
         """
         Expand given package set into a set of package matches, recursively.
+        Package sets are expanded once per repositories and user defined
+        package sets status, results are cached.
 
         @param package_set: the package set name (including its "@" prefix)
         @type package_set: string
         @keyword raise_exceptions: if True, the function is allowed to turn
-            possible warnings (max recursion reached, invalid package set) into
+            possible warnings (circular reference, invalid package set) into
             errors (raising entropy.exceptions.InvalidPackageSet)
         @type raise_exceptions: bool
 
         @raise entropy.exceptions.InvalidPackageSet: if raise_exceptions is
-            True and a maximum recursion level has been reached or a package set
+            True and a circular reference has been found or a package set
             is not found.
         """
-        max_recursion_level = 50
-        recursion_level = 0
         set_prefix = Sets.SET_PREFIX
-
-        def do_expand(myset, recursion_level, max_recursion_level):
-            recursion_level += 1
-            if recursion_level > max_recursion_level:
-                raise InvalidPackageSet(
-                    'corrupted, too many recursions: %s' % (myset,))
-
-            set_data = self.match(myset)
-            if not set_data:
-                raise InvalidPackageSet('not found: %s' % (myset,))
-            set_from, package_set, mydata = set_data
-
-            mypkgs = set()
-            for fset in mydata: # recursively
-                if fset.startswith(set_prefix):
-                    mypkgs |= do_expand(fset, recursion_level,
-                        max_recursion_level)
-                else:
-                    mypkgs.add(fset)
-
-            return mypkgs
-
         if not package_set.startswith(set_prefix):
             package_set = "%s%s" % (set_prefix, package_set,)
+        set_name = package_set.lstrip(set_prefix)
+
+        index = self._index()
+        pkgs = index['expanded'].get(set_name)
+        if pkgs is not None:
+            return set(pkgs)
+
+        error = index['errors'].get(set_name)
+        if error is None:
+            # not a known package set or set@repo1,repo2 syntax
+            try:
+                return set(self._flatten(
+                    set_name, index['definitions'],
+                    dict(index['expanded']), []))
+            except InvalidPackageSet as err:
+                error = "%s" % (err,)
+
+        if raise_exceptions:
+            raise InvalidPackageSet(error)
+        return set()
+
+    def matches(self, package_set, raise_exceptions = True):
+        """
+        Expand given package set and return the best package matches
+        of its content, skipping the packages that cannot be matched.
+        Results are cached, see expand().
 
-        try:
-            mylist = do_expand(package_set, recursion_level,
-                max_recursion_level)
-        except InvalidPackageSet:
-            if raise_exceptions:
-                raise
-            mylist = set()
-
-        return mylist
+        @param package_set: the package set name (including its "@" prefix)
+        @type package_set: string
+        @keyword raise_exceptions: see expand()
+        @type raise_exceptions: bool
+        @return: list (tuple) of package matches
+        @rtype: tuple
+
+        @raise entropy.exceptions.InvalidPackageSet: see expand()
+        """
+        pkgs = self.expand(package_set, raise_exceptions = raise_exceptions)
+
+        # matches depend on the packages configuration (masking, etc)
+        client_settings = self._entropy._settings_client_plugin
+        matches_key = (
+            frozenset(pkgs),
+            self._settings.packages_configuration_hash(),
+            client_settings.packages_configuration_hash())
+
+        index = self._index()
+        with self._entropy._package_sets_lock:
+            set_matches = index['matches'].get(matches_key)
+        if set_matches is not None:
+            return set_matches
+
+        set_matches = []
+        for pkg in sorted(pkgs):
+            pkg_id, pkg_repo = self._entropy.atom_match(pkg)
+            if pkg_id != -1:
+                set_matches.append((pkg_id, pkg_repo))
+        set_matches = tuple(set_matches)
+
+        with self._entropy._package_sets_lock:
+            index['matches'][matches_key] = set_matches
+        return set_matches
 
     def available(self, match_repo = None):
         """
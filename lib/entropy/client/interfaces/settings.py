@@ -391,6 +391,7 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             'configprotectmask': set(),
             'configprotectskip': set(),
             'autoprune_days': None, # disabled by default
+            'packages_cache_size': None, # in megabytes, unlimited by default
             'edelta_support': False, # disabled by default
         }
 
@@ -414,6 +415,11 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             if int_setting is not None:
                 data['autoprune_days'] = int_setting
 
+        def _packages_cache_size(setting):
+            int_setting = entropy.tools.setting_to_int(setting, 0, None)
+            if int_setting is not None:
+                data['packages_cache_size'] = int_setting
+
         def _packagesdelta(setting):
             bool_setting = entropy.tools.setting_to_bool(setting)
             if bool_setting is not None:
@@ -480,6 +486,7 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             'forcedupdates': _forcedupdates,
             'forced-updates': _forcedupdates,
             'packages-autoprune-days': _autoprune,
+            'packages-cache-size': _packages_cache_size,
             'packages-delta': _packagesdelta,
             # backward compatibility
             'packagehashes': _packagehashes,
@@ -9,7 +9,19 @@
     B{Entropy Package Manager Client Download Mirrors Interface}.
 
 """
-from entropy.core import Singleton
+import threading
+import time
+
+from entropy.const import const_debug_write
+from entropy.core import Singleton, LazyModule
+from entropy.dump import dumpobj, loadobj
+from entropy.misc import ParallelTask
+
+import entropy.tools
+
+# only needed by mirror probes
+_fetchers = LazyModule("entropy.fetchers")
+
 
 class StatusInterface(Singleton, dict):
 
@@ -38,4 +50,295 @@ class StatusInterface(Singleton, dict):
 
     def clear(self):
         self.__last_mirrorname = None
-        return dict.clear(self)
\ No newline at end of file
+        return dict.clear(self)
+
+class MirrorRanking(Singleton):
+
+    """
+    Adaptive download mirrors ranking.
+
+    Every mirror (identified by its protocol and network location) is
+    given a score computed from exponentially weighted moving averages of
+    its throughput, latency and failure rate. The averages are updated by
+    the mirror probes (see probe()) and by every real download, and they
+    are persisted across Entropy Client sessions.
+    """
+
+    DUMP_ID = "mirror_ranking"
+
+    # weight given to the newest sample
+    ALPHA = 0.3
+
+    # amount of bytes used to blend latency and throughput into a score.
+    # The score is the inverse of the time needed to fetch this much data.
+    REFERENCE_SIZE = 1048576
+
+    # statistics older than this (in seconds) are not trusted anymore
+    MAX_AGE = 30 * 24 * 3600
+
+    # maximum number of mirrors a multi-file download is split across,
+    # only mirrors scoring at least SPREAD_RATIO of the best one are used.
+    SPREAD_MIRRORS = 3
+    SPREAD_RATIO = 0.5
+
+    PROBE_SIZE = 262144
+    PROBE_TIMEOUT = 6
+
+    def init_singleton(self):
+        self._lock = threading.Lock()
+        self._stats = None
+        self._changed = False
+
+    @staticmethod
+    def key(url):
+        """
+        Return the ranking key of the given mirror or download URL.
+        """
+        url_data = entropy.tools.spliturl(url)
+        return "%s://%s" % (url_data.scheme, url_data.netloc.lower())
+
+    def _load(self):
+        """
+        Load the mirror statistics, must be called with the lock held.
+        """
+        if self._stats is None:
+            stats = loadobj(MirrorRanking.DUMP_ID)
+            if not isinstance(stats, dict):
+                stats = {}
+            self._stats = stats
+        return self._stats
+
+    def save(self):
+        """
+        Store the mirror statistics to disk, if they changed.
+        """
+        with self._lock:
+            if not self._changed:
+                return
+            self._changed = False
+            stats = dict((k, v.copy()) for k, v in self._load().items())
+        dumpobj(MirrorRanking.DUMP_ID, stats)
+
+    def clear(self):
+        """
+        Forget all the mirror statistics.
+        """
+        with self._lock:
+            self._stats = {}
+            self._changed = True
+
+    def _average(self, old, sample):
+        if old is None:
+            return float(sample)
+        return MirrorRanking.ALPHA * sample + \
+            (1.0 - MirrorRanking.ALPHA) * old
+
+    def update(self, url, throughput = None, latency = None,
+               failed = False):
+        """
+        Update the statistics of the given mirror with a new sample.
+
+        @param url: mirror or download URL
+        @type url: string
+        @keyword throughput: measured throughput, in bytes per second
+        @type throughput: float
+        @keyword latency: measured latency, in seconds
+        @type latency: float
+        @keyword failed: True if the mirror failed to serve the request
+        @type failed: bool
+        """
+        key = MirrorRanking.key(url)
+        with self._lock:
+            stats = self._load()
+            entry = stats.get(key)
+            if entry is None or self._expired(entry):
+                entry = {
+                    'throughput': None,
+                    'latency': None,
+                    'failures': None,
+                }
+                stats[key] = entry
+
+            if failed:
+                entry['failures'] = self._average(entry['failures'], 1.0)
+            else:
+                if throughput is not None and throughput > 0:
+                    entry['throughput'] = self._average(
+                        entry['throughput'], throughput)
+                if latency is not None and latency >= 0:
+                    entry['latency'] = self._average(
+                        entry['latency'], latency)
+                entry['failures'] = self._average(entry['failures'], 0.0)
+
+            entry['mtime'] = time.time()
+            self._changed = True
+
+    def _expired(self, entry):
+        return (time.time() - entry.get('mtime', 0)) > MirrorRanking.MAX_AGE
+
+    def _score(self, key):
+        """
+        Return the score of the mirror with the given key, or None,
+        if unknown. Must be called with the lock held.
+        """
+        entry = self._load().get(key)
+        if entry is None or self._expired(entry):
+            return None
+
+        elapsed = 0.0
+        if entry['latency'] is not None:
+            elapsed += entry['latency']
+        if entry['throughput']:
+            elapsed += MirrorRanking.REFERENCE_SIZE / entry['throughput']
+        failures = entry['failures'] or 0.0
+
+        if elapsed <= 0.0:
+            if failures:
+                # only failures have been recorded
+                return 0.0
+            return None
+        return (1.0 - failures) / elapsed
+
+    def score(self, url):
+        """
+        Return the score of the given mirror (the higher the better) or
+        None, if there are no statistics available for it.
+
+        @param url: mirror or download URL
+        @type url: string
+        @return: the mirror score or None
+        @rtype: float or None
+        """
+        with self._lock:
+            return self._score(MirrorRanking.key(url))
+
+    def throughput(self, url):
+        """
+        Return the average throughput of the given mirror, in bytes per
+        second, or None, if there are no statistics available for it.
+
+        @param url: mirror or download URL
+        @type url: string
+        @return: the mirror throughput or None
+        @rtype: float or None
+        """
+        with self._lock:
+            entry = self._load().get(MirrorRanking.key(url))
+            if entry is None or self._expired(entry):
+                return None
+            return entry['throughput']
+
+    def _scores(self, mirrors):
+        """
+        Return a list of scores for the given mirrors, unknown mirrors
+        get the average score, so that they are given a chance.
+        """
+        with self._lock:
+            scores = [self._score(MirrorRanking.key(x)) for x in mirrors]
+        known = [x for x in scores if x is not None]
+        if not known:
+            return None
+        average = sum(known) / len(known)
+        return [average if x is None else x for x in scores]
+
+    def sort(self, mirrors):
+        """
+        Return a new list of mirrors sorted by score, the best first.
+        Mirrors with the same score keep their relative order.
+
+        @param mirrors: list of mirror URLs
+        @type mirrors: list
+        @return: sorted list of mirror URLs
+        @rtype: list
+        """
+        scores = self._scores(mirrors)
+        if scores is None:
+            return list(mirrors)
+        order = sorted(range(len(mirrors)), key = lambda x: -scores[x])
+        return [mirrors[x] for x in order]
+
+    def spread(self, mirrors, count):
+        """
+        Distribute count downloads across the best mirrors of the given
+        list (which is expected to be sorted, the best first), proportionally
+        to their score. Return a list of count mirror URLs.
+
+        @param mirrors: list of mirror URLs, sorted by preference
+        @type mirrors: list
+        @param count: number of downloads
+        @type count: int
+        @return: list of mirror URLs, one per download
+        @rtype: list
+        """
+        if not mirrors:
+            return []
+
+        candidates = mirrors[:MirrorRanking.SPREAD_MIRRORS]
+        scores = self._scores(candidates)
+        if scores is None or scores[0] <= 0.0:
+            return [mirrors[0]] * count
+
+        threshold = scores[0] * MirrorRanking.SPREAD_RATIO
+        weighted = [(x, y) for x, y in zip(candidates, scores)
+                    if y >= threshold]
+
+        loads = [0] * len(weighted)
+        spread = []
+        for _idx in range(count):
+            best_idx = min(
+                range(len(weighted)),
+                key = lambda x: (loads[x] + 1) / weighted[x][1])
+            loads[best_idx] += 1
+            spread.append(weighted[best_idx][0])
+        return spread
+
+    def probe(self, mirrors, path, size = None, timeout = None):
+        """
+        Concurrently probe the given mirrors by fetching (part of) the
+        file at the given relative path, and update their statistics.
+
+        @param mirrors: list of mirror URLs
+        @type mirrors: list
+        @param path: path of the test file, relative to the mirror URL
+        @type path: string
+        @keyword size: maximum amount of bytes to fetch from every mirror
+        @type size: int
+        @keyword timeout: probe timeout (in seconds)
+        @type timeout: int
+        @return: dict keyed by mirror URL containing (latency, throughput)
+            tuples or None for the mirrors that failed
+        @rtype: dict
+        """
+        if size is None:
+            size = MirrorRanking.PROBE_SIZE
+        if timeout is None:
+            timeout = MirrorRanking.PROBE_TIMEOUT
+
+        tasks = []
+        for mirror in mirrors:
+            task = ParallelTask(
+                _fetchers.UrlFetcher.probe, mirror + "/" + path,
+                size = size, timeout = timeout)
+            task.daemon = True
+            task.start()
+            tasks.append((mirror, task))
+
+        results = {}
+        for mirror, task in tasks:
+            task.join()
+            outcome = task.get_rc()
+            if outcome is None:
+                const_debug_write(__name__,
+                    "MirrorRanking.probe: %s failed" % (mirror,))
+                self.update(mirror, failed = True)
+                results[mirror] = None
+                continue
+
+            latency, transferred, elapsed = outcome
+            throughput = None
+            if elapsed > 0:
+                throughput = transferred / elapsed
+            self.update(mirror, throughput = throughput, latency = latency)
+            results[mirror] = (latency, throughput)
+
+        return results
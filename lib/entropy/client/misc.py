@@ -10,18 +10,39 @@
 
 """
 
+import errno
 import os
+import re
+import stat
 import sys
 import shutil
 import subprocess
+import threading
+import time
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
 
 from entropy.core.settings.base import SystemSettings
 from entropy.const import etpConst, const_convert_to_rawstring, \
-    const_convert_to_unicode, const_debug_write
+    const_convert_to_unicode, const_debug_write, const_get_cpus, \
+    const_is_python3, const_setup_perms
 from entropy.output import darkred, darkgreen, brown
 from entropy.tools import getstatusoutput, rename_keep_permissions
+from entropy.misc import ParallelTask, FlockFile
 from entropy.i18n import _
 
+import entropy.tools
+
+try:
+    _scandir = os.scandir
+except AttributeError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
 
 def sharedinstlock(method):
     """
@@ -57,6 +78,450 @@ def exclusiveinstlock(method):
     return wrapped
 
 
+class ConfigurationJournal(object):
+
+    """
+    Journal of the configuration file updates (._cfgXXXX_ files)
+    written by Entropy Client while merging packages, used by
+    ConfigurationFiles to avoid walking all the CONFIG_PROTECT
+    directories.
+
+    The journal is a plain text file containing one path per line,
+    relative to the system root, plus a header line storing the time
+    of the last full filesystem scan. Access is serialized through
+    flock().
+    """
+
+    _SCAN_HEADER = const_convert_to_rawstring("#scan ")
+    _NEWLINE = const_convert_to_rawstring("\n")
+
+    @staticmethod
+    def path():
+        """
+        Return the path to the journal file.
+        """
+        return os.path.join(
+            etpConst['entropyworkdir'], "client", "config_updates.journal")
+
+    def __init__(self, path=None):
+        if path is None:
+            path = ConfigurationJournal.path()
+        self._path = path
+
+    def _open(self, readonly=False):
+        """
+        Open the journal file and return a FlockFile object.
+        Raise IOError or OSError if the file cannot be opened.
+        """
+        if readonly:
+            return FlockFile(self._path, fobj=open(self._path, "rb"))
+
+        dir_path = os.path.dirname(self._path)
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path, 0o755)
+        return FlockFile(self._path, fobj=open(self._path, "a+b"))
+
+    def add(self, path):
+        """
+        Record a new configuration file update.
+
+        @param path: path to the ._cfgXXXX_ file, relative to the
+            system root
+        @type path: string
+        @return: True if the journal has been updated
+        @rtype: bool
+        """
+        try:
+            path = const_convert_to_rawstring(
+                path, from_enctype=etpConst['conf_encoding'])
+        except (UnicodeEncodeError,):
+            path = const_convert_to_rawstring(
+                path, from_enctype=sys.getfilesystemencoding())
+        if self._NEWLINE in path:
+            return False
+
+        try:
+            lock = self._open()
+        except (IOError, OSError) as err:
+            const_debug_write(
+                __name__, "ConfigurationJournal.add, error: "
+                "%s" % (repr(err),))
+            return False
+
+        try:
+            with lock.exclusive():
+                fobj = lock.get_file()
+                fobj.write(path + self._NEWLINE)
+                fobj.flush()
+        finally:
+            lock.close()
+        return True
+
+    def _parse(self, data):
+        """
+        Parse the journal content, return a tuple composed by the
+        time of the last full scan (or None) and the list of paths.
+        """
+        last_scan = None
+        paths = []
+        for line in data.split(self._NEWLINE):
+            if not line:
+                continue
+            if line.startswith(self._SCAN_HEADER):
+                try:
+                    last_scan = float(line[len(self._SCAN_HEADER):])
+                except ValueError:
+                    continue
+                continue
+            paths.append(line)
+        return last_scan, paths
+
+    def read(self):
+        """
+        Read the journal content.
+
+        @return: tuple composed by the time of the last full scan (or
+            None) and the list of recorded paths (raw strings), or None
+            if the journal is not available.
+        @rtype: tuple or None
+        """
+        if not os.path.isfile(self._path):
+            return None
+
+        try:
+            lock = self._open(readonly=True)
+        except (IOError, OSError) as err:
+            const_debug_write(
+                __name__, "ConfigurationJournal.read, error: "
+                "%s" % (repr(err),))
+            return None
+
+        try:
+            with lock.shared():
+                fobj = lock.get_file()
+                fobj.seek(0)
+                data = fobj.read()
+        finally:
+            lock.close()
+
+        return self._parse(data)
+
+    def update(self, add=None, discard=None, last_scan=None):
+        """
+        Atomically update the journal content, paths recorded
+        in the meantime by add() are preserved. Duplicated entries
+        are removed.
+
+        @keyword add: list of paths (raw strings) relative to the
+            system root to record
+        @type add: list
+        @keyword discard: list of paths (raw strings) relative to the
+            system root to drop
+        @type discard: list
+        @keyword last_scan: time of the last full scan, if None, the
+            current value is kept
+        @type last_scan: float
+        @return: True if the journal has been written
+        @rtype: bool
+        """
+        discard = frozenset(discard or [])
+
+        try:
+            lock = self._open()
+        except (IOError, OSError) as err:
+            const_debug_write(
+                __name__, "ConfigurationJournal.update, error: "
+                "%s" % (repr(err),))
+            return False
+
+        try:
+            with lock.exclusive():
+                fobj = lock.get_file()
+                fobj.seek(0)
+                cur_last_scan, paths = self._parse(fobj.read())
+                if last_scan is None:
+                    last_scan = cur_last_scan
+
+                lines = []
+                if last_scan is not None:
+                    lines.append(
+                        self._SCAN_HEADER + const_convert_to_rawstring(
+                            repr(float(last_scan))))
+
+                seen = set()
+                for path in paths + list(add or []):
+                    if path in discard or path in seen:
+                        continue
+                    seen.add(path)
+                    lines.append(path)
+
+                fobj.seek(0)
+                fobj.truncate()
+                for line in lines:
+                    fobj.write(line + self._NEWLINE)
+                fobj.flush()
+        finally:
+            lock.close()
+        return True
+
+
+class PackageStore(object):
+
+    """
+    Content-addressed store of the downloaded package files, shared
+    across repositories and branches.
+
+    Package files are stored once, keyed by the sha256 (or sha1) digest
+    found in the repository metadata, and the per-repository download
+    paths are hardlinks to the store entries. This way, the same package
+    file mirrored under several repositories or branches is downloaded
+    and kept on disk only once. The last access time of the entries is
+    used to implement LRU eviction.
+    """
+
+    # digests usable as store keys, by preference
+    DIGESTS = ("sha256", "sha1")
+
+    @staticmethod
+    def path():
+        """
+        Return the path to the store directory.
+        """
+        return os.path.join(etpConst['entropypackagesworkdir'], "store")
+
+    def __init__(self, path=None):
+        if path is None:
+            path = PackageStore.path()
+        self._path = path
+
+    def _entry(self, signatures):
+        """
+        Return the store entry path for the package file having the
+        given signatures (as returned by retrieveSignatures()), or None
+        if no usable digest is available.
+        """
+        if not isinstance(signatures, dict):
+            return None
+        for digest_type in PackageStore.DIGESTS:
+            digest = signatures.get(digest_type)
+            if digest and re.match("^[0-9a-f]+$", digest):
+                return os.path.join(
+                    self._path, digest_type, digest[:2],
+                    digest + etpConst['packagesext'])
+        return None
+
+    def _touch(self, entry_path):
+        """
+        Mark the store entry as recently used. The modification time is
+        kept, it is used to validate the package file checksum.
+        """
+        try:
+            st = os.stat(entry_path)
+            os.utime(entry_path, (time.time(), st.st_mtime))
+        except (OSError, IOError):
+            pass
+
+    def _link(self, src_path, dest_path):
+        """
+        Atomically make dest_path a hardlink to src_path.
+        """
+        tmp_path = "%s.store.%s" % (dest_path, os.getpid())
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        os.link(src_path, tmp_path)
+        try:
+            os.rename(tmp_path, dest_path)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+
+    def get(self, download_path, signatures):
+        """
+        Make the package file available at download_path, if it is in the
+        store. The caller is expected to hold the download_path lock and to
+        verify the package file checksum afterwards.
+
+        @param download_path: package file download path
+        @type download_path: string
+        @param signatures: package file signatures
+        @type signatures: dict
+        @return: True, if the package file has been found in the store
+        @rtype: bool
+        """
+        entry_path = self._entry(signatures)
+        if entry_path is None:
+            return False
+
+        try:
+            entry_st = os.stat(entry_path)
+        except OSError:
+            return False
+
+        try:
+            st = os.stat(download_path)
+            linked = (st.st_dev, st.st_ino) == (
+                entry_st.st_dev, entry_st.st_ino)
+        except OSError:
+            linked = False
+
+        if not linked:
+            try:
+                download_dir = os.path.dirname(download_path)
+                if not os.path.isdir(download_dir):
+                    os.makedirs(download_dir, 0o775)
+                    const_setup_perms(download_dir, etpConst['entropygid'])
+                self._link(entry_path, download_path)
+            except OSError as err:
+                # different filesystem, missing directory, etc
+                const_debug_write(
+                    __name__,
+                    "PackageStore.get(%s): cannot link: %s" % (
+                        download_path, err))
+                return False
+
+        self._touch(entry_path)
+        return True
+
+    def add(self, download_path, signatures):
+        """
+        Add a verified package file to the store. If the store contains the
+        package file already, download_path is replaced by a hardlink to it.
+
+        @param download_path: package file download path
+        @type download_path: string
+        @param signatures: package file signatures
+        @type signatures: dict
+        @return: True, if the package file is now in the store
+        @rtype: bool
+        """
+        entry_path = self._entry(signatures)
+        if entry_path is None:
+            return False
+
+        try:
+            st = os.stat(download_path)
+            try:
+                entry_st = os.stat(entry_path)
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+                entry_st = None
+
+            if entry_st is None:
+                entry_dir = os.path.dirname(entry_path)
+                if not os.path.isdir(entry_dir):
+                    os.makedirs(entry_dir, 0o775)
+                    const_setup_perms(entry_dir, etpConst['entropygid'])
+                self._link(download_path, entry_path)
+
+            elif (st.st_dev, st.st_ino) != (
+                    entry_st.st_dev, entry_st.st_ino):
+                self._link(entry_path, download_path)
+
+        except OSError as err:
+            const_debug_write(
+                __name__,
+                "PackageStore.add(%s): error: %s" % (download_path, err))
+            return False
+
+        self._touch(entry_path)
+        return True
+
+    def discard(self, download_path, signatures):
+        """
+        Drop the store entry of a package file that failed verification
+        and make sure that download_path does not share its data with
+        anything else, so that downloads cannot alter the store.
+
+        @param download_path: package file download path
+        @type download_path: string
+        @param signatures: package file signatures
+        @type signatures: dict
+        """
+        try:
+            st = os.stat(download_path)
+        except OSError:
+            return
+
+        entry_path = self._entry(signatures)
+        if entry_path is not None:
+            try:
+                entry_st = os.stat(entry_path)
+                if (st.st_dev, st.st_ino) == (
+                        entry_st.st_dev, entry_st.st_ino):
+                    os.remove(entry_path)
+            except OSError:
+                pass
+
+        try:
+            if os.stat(download_path).st_nlink > 1:
+                os.remove(download_path)
+        except OSError:
+            pass
+
+    def entries(self):
+        """
+        Return a list of (path, stat result) tuples describing all the
+        store entries.
+        """
+        entries = []
+        for cur_dir, _dirs, files in os.walk(self._path):
+            for name in files:
+                if not name.endswith(etpConst['packagesext']):
+                    continue
+                path = os.path.join(cur_dir, name)
+                try:
+                    entries.append((path, os.stat(path)))
+                except OSError:
+                    continue
+        return entries
+
+    def expired(self, max_size=None, max_age=None, keep=None):
+        """
+        Return the store entries that should be evicted, least recently
+        used first, in order to keep the store within the given size budget
+        and to drop the entries that have not been used recently.
+
+        @keyword max_size: store size budget, in bytes
+        @type max_size: int
+        @keyword max_age: evict entries not used for more than the given
+            amount of seconds
+        @type max_age: int
+        @keyword keep: set of (st_dev, st_ino) tuples of entries that must
+            not be evicted
+        @type keep: set
+        @return: list of (path, stat result) tuples
+        @rtype: list
+        """
+        if keep is None:
+            keep = set()
+
+        entries = self.entries()
+        entries.sort(key=lambda x: x[1].st_atime)
+        total_size = sum(st.st_size for _path, st in entries)
+        expiration = None
+        if max_age is not None:
+            expiration = time.time() - max_age
+
+        evicted = []
+        for path, st in entries:
+            if (st.st_dev, st.st_ino) in keep:
+                continue
+
+            evict = False
+            if expiration is not None and st.st_atime < expiration:
+                evict = True
+            if max_size is not None and total_size > max_size:
+                evict = True
+
+            if evict:
+                evicted.append((path, st))
+                total_size -= st.st_size
+        return evicted
+
+
 class ConfigurationFiles(dict):
 
     """
@@ -71,10 +536,24 @@ class ConfigurationFiles(dict):
 
     This API is process and thread safe with regards to the Installed
     Packages Repository. There is no need to do external locking on it.
+
+    Updates are looked up in the ConfigurationJournal, the
+    CONFIG_PROTECT directories are walked only if the journal is not
+    available, if the last full scan is older than
+    JOURNAL_RESCAN_INTERVAL or if rescan is True.
     """
 
-    def __init__(self, entropy_client, quiet=False):
+    # set to False to always walk the CONFIG_PROTECT directories
+    JOURNAL = True
+
+    # seconds after which a full scan is executed anyway, in order
+    # to pick up the files not written by Entropy (for instance,
+    # by the Source Package Manager)
+    JOURNAL_RESCAN_INTERVAL = 7 * 24 * 3600
+
+    def __init__(self, entropy_client, quiet=False, rescan=False):
         self._quiet = quiet
+        self._rescan = rescan
         self._entropy = entropy_client
         self._settings = SystemSettings()
         dict.__init__(self)
@@ -172,6 +651,11 @@ class ConfigurationFiles(dict):
         Determine if source file path equals destination file path,
         thus it can be automerged.
         """
+        if const_is_python3():
+            # paths are raw strings, they cannot be used in commands
+            source = self._unicode_path(source)
+            destination = self._unicode_path(destination)
+
         def _vanished():
             # file went away? not really needed, but...
             if not os.path.lexists(source):
@@ -218,7 +702,7 @@ class ConfigurationFiles(dict):
     def _load_maybe_add(self, currentdir, item, filepath, number):
         """
         Scan given path and store config file update information
-        if needed.
+        if needed. Return True if the update has been stored.
         """
         try:
             tofile = item[10:]
@@ -228,7 +712,7 @@ class ConfigurationFiles(dict):
                 __name__, "load_maybe_add, IndexError: "
                 "%s, locals: %s" % (
                     repr(err), locals()))
-            return
+            return False
 
         try:
             int(number)
@@ -238,7 +722,7 @@ class ConfigurationFiles(dict):
                 __name__, "load_maybe_add, ValueError: "
                 "%s, locals: %s" % (
                     repr(err), locals()))
-            return
+            return False
 
         tofilepath = os.path.join(currentdir, tofile)
         # tofile is the target filename now
@@ -266,7 +750,7 @@ class ConfigurationFiles(dict):
                     __name__, "load_maybe_add, IOError: "
                     "%s, locals: %s" % (
                         repr(err), locals()))
-            return
+            return False
 
         # store
         save_filepath = self._strip_root(
@@ -287,16 +771,104 @@ class ConfigurationFiles(dict):
                 importance = 0,
                 level = "info"
             )
+        return True
+
+    @staticmethod
+    def _is_update_file(item):
+        """
+        Return True if the given file name (raw string) is a valid
+        configuration file update name (._cfgXXXX_<name>).
+        """
+        if not item.startswith(const_convert_to_rawstring("._cfg")):
+            return False
+
+        number = item[5:9]
+        try:
+            int(number)
+        except ValueError:
+            return False # not a valid etc-update file
+        if item[9:10] != const_convert_to_rawstring("_"):
+            return False # no valid format provided
+        return True
+
+    def _journal(self):
+        """
+        Return the ConfigurationJournal object in use.
+        """
+        return ConfigurationJournal()
 
     def _load(self):
         """
         Load configuration file updates reading from disk.
         """
+        journal = None
+        last_scan, paths = None, []
+        if self.JOURNAL:
+            journal = self._journal()
+            data = journal.read()
+            if data is not None:
+                last_scan, paths = data
+
+        scan = journal is None or self._rescan or last_scan is None or \
+            abs(time.time() - last_scan) > self.JOURNAL_RESCAN_INTERVAL
+
+        if scan:
+            last_scan = time.time()
+            stored = self._load_scan()
+        else:
+            last_scan = None
+            stored = self._load_journal(paths)
+
+        if journal is None:
+            return
+
+        root = self._encode_path(ConfigurationFiles.root())
+        stored = [x[len(root):] for x in stored]
+        if scan or stored != paths:
+            # drop merged, removed and automerged files, entries
+            # recorded by ConfigurationJournal.add() in the meantime
+            # are kept
+            journal.update(
+                add=stored, discard=set(paths) - set(stored),
+                last_scan=last_scan)
+
+    def _load_journal(self, paths):
+        """
+        Load configuration file updates from the paths recorded
+        in the ConfigurationJournal. Return the list of stored paths.
+        """
+        stored = []
+        name_cache = set()
+        root = self._encode_path(ConfigurationFiles.root())
+
+        for path in paths:
+            filepath = root + path
+            if filepath in name_cache:
+                continue # skip, already done
+            name_cache.add(filepath)
+
+            currentdir, item = os.path.split(filepath)
+            if not self._is_update_file(item):
+                continue
+            if not os.path.lexists(filepath):
+                continue # merged or removed in the meantime
+
+            number = item[5:9]
+            if self._load_maybe_add(currentdir, item, filepath, number):
+                stored.append(filepath)
+
+        return stored
+
+    def _load_scan(self):
+        """
+        Load configuration file updates walking the CONFIG_PROTECT
+        directories. Return the list of stored paths.
+        """
+        stored = []
         name_cache = set()
         client_conf_protect = self._get_config_protect()
         # NOTE: with Python 3.x we can remove const_convert...
         # and avoid using _encode_path.
-        cfg_pfx = const_convert_to_rawstring("._cfg")
 
         for path in client_conf_protect:
             path = self._encode_path(path)
@@ -314,16 +886,7 @@ class ConfigurationFiles(dict):
                         if path != item:
                             continue
 
-                    if not item.startswith(cfg_pfx):
-                        continue
-
-                    # further check then
-                    number = item[5:9]
-                    try:
-                        int(number)
-                    except ValueError:
-                        continue # not a valid etc-update file
-                    if item[9] != "_": # no valid format provided
+                    if not self._is_update_file(item):
                         continue
 
                     filepath = os.path.join(currentdir, item)
@@ -331,8 +894,12 @@ class ConfigurationFiles(dict):
                         continue # skip, already done
                     name_cache.add(filepath)
 
-                    self._load_maybe_add(
-                        currentdir, item, filepath, number)
+                    number = item[5:9]
+                    if self._load_maybe_add(
+                            currentdir, item, filepath, number):
+                        stored.append(filepath)
+
+        return stored
 
     def _backup(self, dest_path):
         """
@@ -455,8 +1022,262 @@ class ConfigurationUpdates:
         self._entropy = entropy_client
         self._settings = self._entropy.Settings()
 
-    def get(self, quiet=False):
+    def get(self, quiet=False, rescan=False):
         """
         Return a new ConfigurationFiles object.
+
+        @keyword quiet: do not print any output
+        @type quiet: bool
+        @keyword rescan: walk all the CONFIG_PROTECT directories instead
+            of reading the ConfigurationJournal
+        @type rescan: bool
+        """
+        return self._config_class(
+            self._entropy, quiet=quiet, rescan=rescan)
+
+
+class OrphanedFiles(object):
+
+    """
+    Entropy orphaned files scanner. It walks the system directories
+    (SystemSettings 'system_dirs') looking for files not owned by any
+    installed package, skipping the ones matching 'system_dirs_mask'.
+
+    Directories are listed in parallel by a pool of threads, masks are
+    compiled into a prefix tuple and a single regular expression, while
+    the files owned by packages are streamed out of the installed
+    packages repository in one query and subtracted in bulk.
+
+        >>> scanner = OrphanedFiles(entropy_client)
+        >>> orphans = scanner.scan()
+    """
+
+    def __init__(self, entropy_client, system_dirs=None,
+                 system_dirs_mask=None, max_workers=None):
+        self._entropy = entropy_client
+        self._settings = self._entropy.Settings()
+        if system_dirs is None:
+            system_dirs = self._settings['system_dirs']
+        if system_dirs_mask is None:
+            system_dirs_mask = self._settings['system_dirs_mask']
+        if max_workers is None:
+            max_workers = min(max(const_get_cpus() * 2, 2), 8)
+        self._system_dirs = list(system_dirs)
+        self._system_dirs_mask = list(system_dirs_mask)
+        self._max_workers = max_workers
+        self._prefixes, self._regexp = self._compile_masks(
+            self._system_dirs_mask)
+
+    @staticmethod
+    def _compile_masks(system_dirs_mask):
+        """
+        Compile the given masks into a tuple of path prefixes, usable
+        with str.startswith(), and a single regular expression (or None).
+        """
+        prefixes = []
+        regexps = []
+        for mask in system_dirs_mask:
+            mask = const_convert_to_unicode(mask)
+            if entropy.tools.is_valid_path(mask):
+                prefixes.append(mask)
+            # masks are regular expressions as well
+            regexps.append("(?:%s)" % (mask,))
+
+        regexp = None
+        if regexps:
+            regexp = re.compile("|".join(regexps))
+        return tuple(prefixes), regexp
+
+    def _is_masked(self, path):
+        """
+        Return whether the given (unicode) path is masked.
+        """
+        if self._prefixes and path.startswith(self._prefixes):
+            return True
+        if self._regexp is not None and self._regexp.match(path):
+            return True
+        return False
+
+    @staticmethod
+    def _list_directory(directory):
+        """
+        Return the list of subdirectories and the list of files
+        contained in directory. Symlinks are not returned.
+        """
+        subdirs = []
+        files = []
+        if _scandir is not None:
+            for entry in _scandir(directory):
+                if entry.is_symlink():
+                    continue
+                if entry.is_dir():
+                    subdirs.append(entry.path)
+                else:
+                    files.append(entry.path)
+            return subdirs, files
+
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            if stat.S_ISLNK(st.st_mode):
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                subdirs.append(path)
+            else:
+                files.append(path)
+        return subdirs, files
+
+    def collect(self, progress=None):
+        """
+        Walk the system directories and return the set of files found,
+        masked files excluded.
+
+        @keyword progress: callable accepting a file path, called every
+            500 collected files. It is called from the scanning threads,
+            concurrently, so it must be thread-safe.
+        @type progress: callable
+        @return: set of unicode file paths
+        @rtype: set
+        @raise Exception: the first exception raised while scanning, the
+            scan is stopped as soon as it happens
         """
-        return self._config_class(self._entropy)
+        dirs_queue = Queue()
+        file_data = set()
+        data_lock = threading.Lock()
+        counter = [0]
+        # first exception raised by a scanning thread
+        errors = []
+
+        for xdir in self._system_dirs:
+            # make sure it's bytes (raw encoding
+            # as per EntropyRepository.retrieveContent())
+            xdir = const_convert_to_rawstring(
+                xdir, from_enctype=etpConst['conf_raw_encoding'])
+            if os.path.isdir(xdir):
+                dirs_queue.put(xdir)
+
+        def _scan():
+            found_files = set()
+            while True:
+                directory = dirs_queue.get()
+                if directory is None:
+                    dirs_queue.task_done()
+                    break
+
+                try:
+                    if errors:
+                        # scan failed, just drain the queue
+                        continue
+
+                    try:
+                        subdirs, files = self._list_directory(directory)
+                    except (OSError, IOError):
+                        continue
+
+                    for subdir in subdirs:
+                        subdir_utf = const_convert_to_unicode(subdir)
+                        # prune directories masked by prefix
+                        if self._prefixes and (
+                                subdir_utf + os.path.sep).startswith(
+                                    self._prefixes):
+                            continue
+                        dirs_queue.put(subdir)
+
+                    for filename in files:
+                        filename_utf = const_convert_to_unicode(filename)
+                        if self._is_masked(filename_utf):
+                            continue
+                        found_files.add(filename_utf)
+
+                    if progress is not None and files:
+                        with data_lock:
+                            before = counter[0]
+                            counter[0] += len(files)
+                            notify = before // 500 != counter[0] // 500
+                        if notify:
+                            progress(const_convert_to_unicode(files[-1]))
+                except BaseException as err:
+                    with data_lock:
+                        if not errors:
+                            errors.append(err)
+                finally:
+                    dirs_queue.task_done()
+
+            with data_lock:
+                file_data.update(found_files)
+
+        workers = []
+        for _idx in range(self._max_workers):
+            th = ParallelTask(_scan)
+            th.daemon = True
+            th.start()
+            workers.append(th)
+
+        dirs_queue.join()
+        for th in workers:
+            dirs_queue.put(None)
+        for th in workers:
+            th.join()
+
+        if errors:
+            raise errors[0]
+        return file_data
+
+    def owned_files(self, inst_repo):
+        """
+        Return an iterator over the files owned by installed packages,
+        together with their aliases: the path with its directory
+        resolved and the paths reachable through the system reverse
+        symlinks ('system_rev_symlinks').
+
+        @param inst_repo: the installed packages repository
+        @type inst_repo: EntropyRepositoryBase
+        @return: iterator of paths
+        @rtype: iterator
+        """
+        reverse_symlink_map = self._settings['system_rev_symlinks']
+        sym_dirs = tuple(reverse_symlink_map.keys())
+        realpath_cache = {}
+
+        for path in inst_repo.listAllFilesIter():
+            # reverse sym
+            if sym_dirs and path.startswith(sym_dirs):
+                for sym_dir in sym_dirs:
+                    if path.startswith(sym_dir):
+                        for sym_child in reverse_symlink_map[sym_dir]:
+                            yield sym_child + path[len(sym_dir):]
+
+            # real path also, memoized per directory
+            dirname, basename = os.path.split(path)
+            dirname_real = realpath_cache.get(dirname)
+            if dirname_real is None:
+                dirname_real = os.path.realpath(dirname)
+                realpath_cache[dirname] = dirname_real
+            yield os.path.join(dirname_real, basename)
+            yield path
+
+    def scan(self, inst_repo=None, progress=None):
+        """
+        Return the set of orphaned files found on the system.
+
+        @keyword inst_repo: the installed packages repository, if None
+            the one provided by the Entropy Client instance is used
+            (and locked in shared mode), otherwise the caller is
+            expected to hold its lock
+        @type inst_repo: EntropyRepositoryBase
+        @keyword progress: see collect()
+        @type progress: callable
+        @return: set of unicode file paths
+        @rtype: set
+        """
+        file_data = self.collect(progress=progress)
+        if inst_repo is None:
+            inst_repo = self._entropy.installed_repository()
+            with inst_repo.shared():
+                file_data.difference_update(self.owned_files(inst_repo))
+        else:
+            file_data.difference_update(self.owned_files(inst_repo))
+        return file_data
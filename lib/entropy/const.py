@@ -428,6 +428,8 @@ def const_default_settings(rootdir):
         'packages_website_url': "https://packages.sabayon.org",
         'changelog_filename': "ChangeLog",
         'changelog_filename_compressed': "ChangeLog.bz2",
+        # month -> byte offsets index of the uncompressed ChangeLog
+        'changelog_index_filename': "ChangeLog.index",
         'changelog_date_format': "%a, %d %b %Y %X +0000",
         # enable/disable packages RSS feed feature
         'rss-feed': True,
@@ -612,6 +614,9 @@ def const_default_settings(rootdir):
 
         # entropy client packages download speed limit (in kb/sec)
         'downloadspeedlimit': None,
+        # entropy client packages larger than this (in kb) are
+        # downloaded in segments, using multiple connections (0 = disabled)
+        'segmented_download_threshold': 8192,
 
         # data storage directory, useful to speed up
         # entropy client across multiple issued commands
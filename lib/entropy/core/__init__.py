@@ -65,6 +65,41 @@ class Singleton(object):
         """
         pass
 
+class LazyModule(object):
+
+    """
+    Module proxy that imports the module it stands for at the first
+    attribute access. Use it for heavy subsystems that are not needed
+    by every caller, in order to reduce the startup time.
+
+    Example:
+
+        security = LazyModule("entropy.security")
+        repo_sec = security.Repository()
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, "_LazyModule__name", name)
+        object.__setattr__(self, "_LazyModule__module", None)
+
+    def __load(self):
+        module = self.__module
+        if module is None:
+            __import__(self.__name)
+            module = sys.modules[self.__name]
+            object.__setattr__(self, "_LazyModule__module", module)
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self.__load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.__load(), name, value)
+
+    def __repr__(self):
+        return "<LazyModule %s, loaded: %s>" % (
+            self.__name, self.__module is not None)
+
 class EntropyPluginStore(object):
 
     """
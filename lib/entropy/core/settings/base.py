@@ -1825,6 +1825,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
             'default_repository': etpConst['officialrepositoryid'],
             'transfer_limit': etpConst['downloadspeedlimit'],
             'timeout': etpConst['default_download_timeout'],
+            'segment_threshold': etpConst['segmented_download_threshold'],
             'security_advisories_url': etpConst['securityurl'],
             'developer_repo': False,
             'differential_update': True,
@@ -1929,6 +1930,14 @@ class SystemSettings(Singleton, EntropyPluginStore):
             except ValueError:
                 return
 
+        def _segment_threshold(line, setting):
+            try:
+                myval = int(setting)
+            except ValueError:
+                return
+            if myval >= 0:
+                data['segment_threshold'] = myval
+
         def _security_url(setting):
             data['security_advisories_url'] = setting
 
@@ -1948,6 +1957,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
             # backward compatibility
             'downloadtimeout': _down_timeout,
             'download-timeout': _down_timeout,
+            'segmented-download-threshold': _segment_threshold,
             # backward compatibility
             'securityurl': _security_url,
             'security-url': _security_url,
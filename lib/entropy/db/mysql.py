@@ -74,26 +74,26 @@ class MySQLCursorWrapper(SQLCursorWrapper):
     def execute(self, *args, **kwargs):
         # force oursql to empty the resultset
         self._cur = self._cur.connection.cursor()
-        self._proxy_call(self._cur.execute, *args, **kwargs)
+        self._query_call(self._cur.execute, *args, **kwargs)
         return self
 
     def executemany(self, *args, **kwargs):
         # force oursql to empty the resultset
         self._cur = self._cur.connection.cursor()
-        self._proxy_call(self._cur.executemany, *args, **kwargs)
+        self._query_call(self._cur.executemany, *args, **kwargs)
         return self
 
     def close(self, *args, **kwargs):
         return self._proxy_call(self._cur.close, *args, **kwargs)
 
     def fetchone(self, *args, **kwargs):
-        return self._proxy_call(self._cur.fetchone, *args, **kwargs)
+        return self._fetch_call(self._cur.fetchone, *args, **kwargs)
 
     def fetchall(self, *args, **kwargs):
-        return self._proxy_call(self._cur.fetchall, *args, **kwargs)
+        return self._fetch_call(self._cur.fetchall, *args, **kwargs)
 
     def fetchmany(self, *args, **kwargs):
-        return self._proxy_call(self._cur.fetchmany, *args, **kwargs)
+        return self._fetch_call(self._cur.fetchmany, *args, **kwargs)
 
     def executescript(self, script):
         for sql in script.split(";"):
@@ -110,13 +110,16 @@ class MySQLCursorWrapper(SQLCursorWrapper):
 
     def __iter__(self):
         cur = iter(self._cur)
-        return MySQLCursorWrapper(cur, self._excs)
+        wrapper = MySQLCursorWrapper(cur, self._excs, self._errno)
+        wrapper._owner = self._owner
+        wrapper._query_stat = self._query_stat
+        return wrapper
 
     def __next__(self):
-        return self.wrap(next, self._cur)
+        return self._fetch_call(next, self._cur)
 
     def next(self):
-        return self.wrap(self._cur.next)
+        return self._fetch_call(self._cur.next)
 
 
 class MySQLConnectionWrapper(SQLConnectionWrapper):
@@ -682,6 +685,7 @@ class EntropyMySQLRepository(EntropySQLRepository):
                 cursor = MySQLCursorWrapper(
                     cursor, self.ModuleProxy.exceptions(),
                     self.ModuleProxy().errno())
+                cursor._owner = (self.name, None)
                 cursor_pool[c_key] = cursor, threads
                 self._start_cleanup_monitor(current_thread, c_key)
 
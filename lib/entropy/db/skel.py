@@ -25,17 +25,24 @@ from entropy.const import etpConst, const_cmp, const_debug_write, \
 from entropy.output import TextInterface, brown, bold, red, blue, purple, \
     darkred, darkgreen
 from entropy.cache import EntropyCacher
-from entropy.core import EntropyPluginStore
+from entropy.tracing import traced
+from entropy.core import EntropyPluginStore, LazyModule
 from entropy.core.settings.base import SystemSettings
 from entropy.exceptions import RepositoryPluginError
-from entropy.spm.plugins.factory import get_default_instance as get_spm, \
-    get_default_class as get_spm_class
 from entropy.db.exceptions import OperationalError
 from entropy.db.cache import EntropyRepositoryCachePolicies
 
 import entropy.dep
 import entropy.tools
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+# Source Package Manager plugins are only needed by a few methods
+_spm_factory = LazyModule("entropy.spm.plugins.factory")
+
 class EntropyRepositoryPlugin(object):
     """
     This is the base class for implementing EntropyRepository plugin hooks.
@@ -358,6 +365,46 @@ class EntropyRepositoryPluginStore(EntropyPluginStore):
         meta[key] = value
 
 
+class LazyPackageData(Mapping):
+    """
+    Read-only package metadata mapping returned by
+    EntropyRepositoryBase.getLazyPackageData(). It exposes the same keys
+    of the dict returned by getPackageData(), but every group of metadata
+    (see EntropyRepositoryBase.PACKAGE_DATA_GROUPS) is fetched from the
+    repository on first access.
+    Use dict(obj) to get a getPackageData() compatible dict.
+    """
+
+    def __init__(self, repository, package_id, fields, **kwargs):
+        self._repo = repository
+        self._package_id = package_id
+        self._fields = fields
+        self._kwargs = kwargs
+        self._data = {}
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        try:
+            return self._data[key]
+        except KeyError:
+            pass
+        group = self._repo.PACKAGE_DATA_FIELD_GROUPS[key]
+        self._data.update(self._repo._getPackageDataGroup(
+            self._package_id, group, **self._kwargs))
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return "<LazyPackageData %s@%s, loaded: %s>" % (
+            self._package_id, self._repo.name, sorted(self._data.keys()))
+
+
 class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
     """
     EntropyRepository interface base class.
@@ -370,6 +417,46 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
     # You can extend this with custom settings for your Repository
     SETTING_KEYS = ("arch", "schema_revision")
 
+    # getPackageData() metadata, grouped by the query (or set of
+    # queries) fetching them, see _getPackageDataGroup().
+    PACKAGE_DATA_GROUPS = (
+        ("base", ("atom", "name", "version", "versiontag", "description",
+                  "category", "chost", "cflags", "cxxflags", "homepage",
+                  "license", "branch", "download", "digest", "slot",
+                  "etpapi", "datecreation", "size", "revision")),
+        ("counter", ("counter",)),
+        ("trigger", ("trigger",)),
+        ("disksize", ("disksize",)),
+        ("changelog", ("changelog",)),
+        ("injected", ("injected",)),
+        ("systempackage", ("systempackage",)),
+        ("config_protect", ("config_protect",)),
+        ("config_protect_mask", ("config_protect_mask",)),
+        ("useflags", ("useflags",)),
+        ("keywords", ("keywords",)),
+        ("sources", ("sources", "mirrorlinks")),
+        ("needed_libs", ("needed", "needed_libs")),
+        ("provided_libs", ("provided_libs",)),
+        ("provide_extended", ("provide_extended",)),
+        ("conflicts", ("conflicts",)),
+        ("licensedata", ("licensedata",)),
+        ("content", ("content",)),
+        ("content_safety", ("content_safety",)),
+        ("pkg_dependencies", ("pkg_dependencies",)),
+        ("signatures", ("signatures",)),
+        ("spm_phases", ("spm_phases",)),
+        ("spm_repository", ("spm_repository",)),
+        ("desktop_mime", ("desktop_mime",)),
+        ("provided_mime", ("provided_mime",)),
+        ("original_repository", ("original_repository",)),
+        ("extra_download", ("extra_download",)),
+    )
+    PACKAGE_DATA_FIELD_GROUPS = dict(
+        (field, group) for group, fields in PACKAGE_DATA_GROUPS
+        for field in fields)
+    PACKAGE_DATA_FIELDS = tuple(
+        field for group, fields in PACKAGE_DATA_GROUPS for field in fields)
+
     class ModuleProxy(object):
 
         @staticmethod
@@ -1700,6 +1787,35 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def getStrictDataMany(self, package_ids):
+        """
+        Batch version of getStrictData().
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and
+            getStrictData() tuple as value. Unavailable package identifiers
+            are not returned.
+        @rtype: dict
+        """
+        return self._retrieveMany(self.getStrictData, package_ids)
+
+    def listAllUpdateCandidates(self, repository):
+        """
+        Return, for every package in this repository, the packages in the
+        given repository having the same key and slot, computed in bulk.
+        This is used by the Entropy Client updates calculation, which
+        falls back to atomMatch() if the backend returns None.
+
+        @param repository: the repository to look for candidates into
+        @type repository: EntropyRepositoryBase
+        @return: tuple of (package_id, candidate package_id, version,
+            versiontag, revision) tuples, or None if the backend is
+            unable to compute them
+        @rtype: tuple or None
+        """
+        return None
+
     def getStrictScopeData(self, package_id):
         """
         Get a restricted (optimized) set of package metadata for provided
@@ -1743,6 +1859,33 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def getBaseDataMany(self, package_ids):
+        """
+        Batch version of getBaseData().
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and
+            getBaseData() tuple as value. Unavailable package identifiers
+            are not returned.
+        @rtype: dict
+        """
+        return self._retrieveMany(self.getBaseData, package_ids)
+
+    def _retrieveMany(self, method, package_ids, skip_none = True,
+                      **kwargs):
+        """
+        Default implementation of the batch (*Many()) methods, calling
+        the given single package method for each package identifier.
+        """
+        result = {}
+        for package_id in package_ids:
+            value = method(package_id, **kwargs)
+            if value is None and skip_none:
+                continue
+            result[package_id] = value
+        return result
+
     def getTriggerData(self, package_id, content = True):
         """
         Get a set of basic package metadata for provided package identifier.
@@ -1809,7 +1952,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
     def getPackageData(self, package_id, get_content = True,
             content_insert_formatted = False, get_changelog = True,
-            get_content_safety = True):
+            get_content_safety = True, fields = None):
         """
         Reconstruct all the package metadata belonging to provided package
         identifier into a dict object.
@@ -1824,7 +1967,13 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         @type get_changelog: bool
         @keyword get_content_safety: return content_safety metadata or {}
         @type get_content_safety: bool
-        @return: package metadata in dict() form
+        @keyword fields: if not None, only return the given metadata keys
+            (see PACKAGE_DATA_FIELDS), only the queries needed to get
+            them are executed.
+        @type fields: iterable
+        @return: package metadata in dict() form, or None if package_id
+            is not available
+        @raise AttributeError: if fields contains unsupported keys
 
         >>> data = {
             'atom': atom,
@@ -1878,107 +2027,275 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         @rtype: dict
         """
+        groups = self._getPackageDataGroups(fields)
         data = {}
-        try:
-            atom, name, version, versiontag, \
-            description, category, chost, \
-            cflags, cxxflags, homepage, \
-            mylicense, branch, download, \
-            digest, slot, etpapi, \
-            datecreation, size, revision  = self.getBaseData(package_id)
-        except TypeError:
+        if "base" not in groups and not self.isPackageIdAvailable(
+                package_id):
             return None
 
-        content = {}
-        if get_content:
-            content = self.retrieveContent(
-                package_id, extended = True,
-                formatted = True, insert_formatted = content_insert_formatted
-            )
+        for group in groups:
+            group_data = self._getPackageDataGroup(
+                package_id, group, get_content = get_content,
+                content_insert_formatted = content_insert_formatted,
+                get_changelog = get_changelog,
+                get_content_safety = get_content_safety)
+            if group_data is None:
+                return None
+            data.update(group_data)
 
-        sources = self.retrieveSources(package_id)
-        mirrornames = set()
-        for x in sources:
-            if x.startswith("mirror://"):
-                mirrornames.add(x.split("/")[2])
-
-        sha1, sha256, sha512, gpg = self.retrieveSignatures(package_id)
-        signatures = {
-            'sha1': sha1,
-            'sha256': sha256,
-            'sha512': sha512,
-            'gpg': gpg,
-        }
+        if fields is not None:
+            for key in set(data.keys()) - set(fields):
+                del data[key]
+        return data
 
-        changelog = None
-        if get_changelog:
-            changelog = self.retrieveChangelog(package_id)
-        content_safety = {}
-        if get_content_safety:
-            content_safety = self.retrieveContentSafety(package_id)
-
-        deps = self.retrieveDependencies(
-            package_id, extended = True,
-            resolve_conditional_deps = False)
-
-        needed_libs = self.retrieveNeededLibraries(package_id)
-        compat_needed_libs = tuple(
-            sorted((soname, elfclass) for _x, _x, soname, elfclass, _x
-                    in needed_libs)
-        )
+    def getLazyPackageData(self, package_id, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True, fields = None):
+        """
+        Same as getPackageData() but return a read-only LazyPackageData
+        mapping object that fetches the metadata on first access, one
+        group of metadata at a time.
 
-        data = {
-            'atom': atom,
-            'name': name,
-            'version': version,
-            'versiontag': versiontag,
-            'description': description,
-            'category': category,
-            'chost': chost,
-            'cflags': cflags,
-            'cxxflags': cxxflags,
-            'homepage': homepage,
-            'license': mylicense,
-            'branch': branch,
-            'download': download,
-            'digest': digest,
-            'slot': slot,
-            'etpapi': etpapi,
-            'datecreation': datecreation,
-            'size': size,
-            'revision': revision,
-            # risky to add to the sql above, still
-            'counter': self.retrieveSpmUid(package_id),
-            'trigger': self.retrieveTrigger(package_id),
-            'disksize': self.retrieveOnDiskSize(package_id),
-            'changelog': changelog,
-            'injected': self.isInjected(package_id),
-            'systempackage': self.isSystemPackage(package_id),
-            'config_protect': self.retrieveProtect(package_id),
-            'config_protect_mask': self.retrieveProtectMask(package_id),
-            'useflags': self.retrieveUseflags(package_id),
-            'keywords': self.retrieveKeywords(package_id),
-            'sources': sources,
-            'needed': compat_needed_libs,
-            'needed_libs': needed_libs,
-            'provided_libs': self.retrieveProvidedLibraries(package_id),
-            'provide_extended': self.retrieveProvide(package_id),
-            'conflicts': self.retrieveConflicts(package_id),
-            'licensedata': self.retrieveLicenseData(package_id),
-            'content': content,
-            'content_safety': content_safety,
-            'pkg_dependencies': deps,
-            'mirrorlinks': [[x, self.retrieveMirrorData(x)] for x in mirrornames],
-            'signatures': signatures,
-            'spm_phases': self.retrieveSpmPhases(package_id),
-            'spm_repository': self.retrieveSpmRepository(package_id),
-            'desktop_mime': self.retrieveDesktopMime(package_id),
-            'provided_mime': self.retrieveProvidedMime(package_id),
-            'original_repository': self.getInstalledPackageRepository(package_id),
-            'extra_download': self.retrieveExtraDownload(package_id),
+        @param package_id: package indentifier
+        @type package_id: int
+        @keyword fields: if not None, only expose the given metadata keys
+        @type fields: iterable
+        @return: LazyPackageData object, or None if package_id is not
+            available
+        @rtype: LazyPackageData
+        @raise AttributeError: if fields contains unsupported keys
+        """
+        self._getPackageDataGroups(fields)
+        if not self.isPackageIdAvailable(package_id):
+            return None
+        if fields is None:
+            fields = self.PACKAGE_DATA_FIELDS
+        return LazyPackageData(
+            self, package_id, frozenset(fields), get_content = get_content,
+            content_insert_formatted = content_insert_formatted,
+            get_changelog = get_changelog,
+            get_content_safety = get_content_safety)
+
+    def getPackageDataMany(self, package_ids, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True, fields = None):
+        """
+        Batch version of getPackageData(). Metadata groups having a batch
+        query implementation (see _getPackageDataGroupMany()) are fetched
+        for all the package identifiers at once.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @keyword fields: if not None, only return the given metadata keys
+        @type fields: iterable
+        @return: dict composed by package identifier as key and package
+            metadata dict as value. Unavailable package identifiers
+            are not returned.
+        @rtype: dict
+        @raise AttributeError: if fields contains unsupported keys
+        """
+        groups = self._getPackageDataGroups(fields)
+        kwargs = {
+            'get_content': get_content,
+            'content_insert_formatted': content_insert_formatted,
+            'get_changelog': get_changelog,
+            'get_content_safety': get_content_safety,
         }
 
-        return data
+        if "base" in groups:
+            # this also filters out unavailable package identifiers
+            groups.remove("base")
+            result = self._getPackageDataGroupMany(
+                package_ids, "base", **kwargs)
+        else:
+            result = dict((x, {}) for x in package_ids if \
+                              self.isPackageIdAvailable(x))
+
+        package_ids = list(result.keys())
+        for group in groups:
+            group_data = self._getPackageDataGroupMany(
+                package_ids, group, **kwargs)
+            for package_id, data in group_data.items():
+                result[package_id].update(data)
+
+        if fields is not None:
+            fields = set(fields)
+            for data in result.values():
+                for key in set(data.keys()) - fields:
+                    del data[key]
+        return result
+
+    def _getPackageDataGroups(self, fields):
+        """
+        Return the list of PACKAGE_DATA_GROUPS names needed to
+        get the given getPackageData() metadata keys.
+        """
+        if fields is None:
+            return [group for group, _fields in self.PACKAGE_DATA_GROUPS]
+
+        groups = []
+        for field in fields:
+            group = self.PACKAGE_DATA_FIELD_GROUPS.get(field)
+            if group is None:
+                raise AttributeError("invalid field: %s" % (field,))
+            if group not in groups:
+                groups.append(group)
+        return groups
+
+    def _getPackageDataGroupMany(self, package_ids, group, **kwargs):
+        """
+        Return the given group of getPackageData() metadata for all the
+        package identifiers in package_ids, in dict form (package
+        identifier as key). Subclasses can reimplement this to
+        provide batch queries.
+        """
+        result = {}
+        if group == "base":
+            base_data = self.getBaseDataMany(package_ids)
+            for package_id, base in base_data.items():
+                result[package_id] = self._getPackageDataBase(base)
+            return result
+
+        elif group == "needed_libs":
+            needed_data = self.retrieveNeededLibrariesMany(package_ids)
+            for package_id, needed_libs in needed_data.items():
+                compat_needed_libs = tuple(
+                    sorted((soname, elfclass) for _x, _x, soname, elfclass, _x
+                            in needed_libs)
+                )
+                result[package_id] = {
+                    'needed': compat_needed_libs,
+                    'needed_libs': needed_libs,
+                }
+            return result
+
+        elif group == "provided_libs":
+            provided_data = self.retrieveProvidedLibrariesMany(package_ids)
+            for package_id, provided_libs in provided_data.items():
+                result[package_id] = {'provided_libs': provided_libs}
+            return result
+
+        elif group == "pkg_dependencies":
+            deps_data = self.retrieveDependenciesMany(
+                package_ids, extended = True,
+                resolve_conditional_deps = False)
+            for package_id, deps in deps_data.items():
+                result[package_id] = {'pkg_dependencies': deps}
+            return result
+
+        for package_id in package_ids:
+            data = self._getPackageDataGroup(package_id, group, **kwargs)
+            if data is not None:
+                result[package_id] = data
+        return result
+
+    def _getPackageDataBase(self, base_data):
+        """
+        Turn a getBaseData() tuple into the related getPackageData()
+        metadata dict.
+        """
+        fields = self.PACKAGE_DATA_GROUPS[0][1]
+        return dict(zip(fields, base_data))
+
+    def _getPackageDataGroup(self, package_id, group, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True):
+        """
+        Return the given group of getPackageData() metadata (see
+        PACKAGE_DATA_GROUPS) in dict form, or None if package_id is
+        not available.
+        """
+        if group == "base":
+            base_data = self.getBaseData(package_id)
+            if base_data is None:
+                return None
+            return self._getPackageDataBase(base_data)
+
+        elif group == "content":
+            content = {}
+            if get_content:
+                content = self.retrieveContent(
+                    package_id, extended = True,
+                    formatted = True,
+                    insert_formatted = content_insert_formatted)
+            return {'content': content}
+
+        elif group == "content_safety":
+            content_safety = {}
+            if get_content_safety:
+                content_safety = self.retrieveContentSafety(package_id)
+            return {'content_safety': content_safety}
+
+        elif group == "changelog":
+            changelog = None
+            if get_changelog:
+                changelog = self.retrieveChangelog(package_id)
+            return {'changelog': changelog}
+
+        elif group == "sources":
+            sources = self.retrieveSources(package_id)
+            mirrornames = set()
+            for x in sources:
+                if x.startswith("mirror://"):
+                    mirrornames.add(x.split("/")[2])
+            return {
+                'sources': sources,
+                'mirrorlinks': [[x, self.retrieveMirrorData(x)]
+                                for x in mirrornames],
+            }
+
+        elif group == "signatures":
+            sha1, sha256, sha512, gpg = self.retrieveSignatures(package_id)
+            return {
+                'signatures': {
+                    'sha1': sha1,
+                    'sha256': sha256,
+                    'sha512': sha512,
+                    'gpg': gpg,
+                },
+            }
+
+        elif group == "needed_libs":
+            needed_libs = self.retrieveNeededLibraries(package_id)
+            compat_needed_libs = tuple(
+                sorted((soname, elfclass) for _x, _x, soname, elfclass, _x
+                        in needed_libs)
+            )
+            return {
+                'needed': compat_needed_libs,
+                'needed_libs': needed_libs,
+            }
+
+        elif group == "pkg_dependencies":
+            return {
+                'pkg_dependencies': self.retrieveDependencies(
+                    package_id, extended = True,
+                    resolve_conditional_deps = False),
+            }
+
+        getters = {
+            # risky to add to the base data sql, still
+            'counter': self.retrieveSpmUid,
+            'trigger': self.retrieveTrigger,
+            'disksize': self.retrieveOnDiskSize,
+            'injected': self.isInjected,
+            'systempackage': self.isSystemPackage,
+            'config_protect': self.retrieveProtect,
+            'config_protect_mask': self.retrieveProtectMask,
+            'useflags': self.retrieveUseflags,
+            'keywords': self.retrieveKeywords,
+            'provided_libs': self.retrieveProvidedLibraries,
+            'provide_extended': self.retrieveProvide,
+            'conflicts': self.retrieveConflicts,
+            'licensedata': self.retrieveLicenseData,
+            'spm_phases': self.retrieveSpmPhases,
+            'spm_repository': self.retrieveSpmRepository,
+            'desktop_mime': self.retrieveDesktopMime,
+            'provided_mime': self.retrieveProvidedMime,
+            'original_repository': self.getInstalledPackageRepository,
+            'extra_download': self.retrieveExtraDownload,
+        }
+        return {group: getters[group](package_id)}
 
     def getPackageXmlData(self, package_ids, get_content=True,
                           get_changelog=True, get_content_safety=True):
@@ -2428,7 +2745,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         Routine that takes all the executed actions and updates configuration
         files.
         """
-        spm_class = get_spm_class()
+        spm_class = _spm_factory.get_default_class()
         updated_files = set()
 
         actions_map = {}
@@ -2545,7 +2862,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             header = darkred(" * ")
         )
         try:
-            spm = get_spm(self)
+            spm = _spm_factory.get_default_instance(self)
             spm.packages_repositories_metadata_update(actions)
         except Exception:
             entropy.tools.print_traceback()
@@ -2972,6 +3289,19 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveAtomMany(self, package_ids):
+        """
+        Batch version of retrieveAtom().
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and
+            atom string as value. Unavailable package identifiers
+            are not returned.
+        @rtype: dict
+        """
+        return self._retrieveMany(self.retrieveAtom, package_ids)
+
     def retrieveBranch(self, package_id):
         """
         Return "branch" metadatum for given package identifier.
@@ -3078,6 +3408,19 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveDigestMany(self, package_ids):
+        """
+        Batch version of retrieveDigest().
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and
+            md5 checksum as value. Unavailable package identifiers
+            are not returned.
+        @rtype: dict
+        """
+        return self._retrieveMany(self.retrieveDigest, package_ids)
+
     def retrieveSignatures(self, package_id):
         """
         Return package file extra hashes (sha1, sha256, sha512) for given
@@ -3150,6 +3493,19 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveKeySlotMany(self, package_ids):
+        """
+        Batch version of retrieveKeySlot().
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and
+            (package_key, package_slot,) tuple as value. Unavailable package
+            identifiers are not returned.
+        @rtype: dict
+        """
+        return self._retrieveMany(self.retrieveKeySlot, package_ids)
+
     def retrieveKeySlotAggregated(self, package_id):
         """
         Return package key and package slot string (aggregated form through
@@ -3185,6 +3541,19 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveVersionMany(self, package_ids):
+        """
+        Batch version of retrieveVersion().
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and
+            package version as value. Unavailable package identifiers
+            are not returned.
+        @rtype: dict
+        """
+        return self._retrieveMany(self.retrieveVersion, package_ids)
+
     def retrieveRevision(self, package_id):
         """
         Return package Entropy-revision for given package identifier.
@@ -3306,6 +3675,20 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveNeededLibrariesMany(self, package_ids):
+        """
+        Batch version of retrieveNeededLibraries().
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and
+            retrieveNeededLibraries() frozenset as value. Every given package
+            identifier is returned.
+        @rtype: dict
+        """
+        return self._retrieveMany(
+            self.retrieveNeededLibraries, package_ids, skip_none = False)
+
     def retrieveProvidedLibraries(self, package_id):
         """
         Return list of library names (from NEEDED ELF metadata) provided by
@@ -3319,6 +3702,20 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveProvidedLibrariesMany(self, package_ids):
+        """
+        Batch version of retrieveProvidedLibraries().
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and
+            retrieveProvidedLibraries() frozenset as value. Every given
+            package identifier is returned.
+        @rtype: dict
+        """
+        return self._retrieveMany(
+            self.retrieveProvidedLibraries, package_ids, skip_none = False)
+
     def retrieveConflicts(self, package_id):
         """
         Return list of conflicting dependencies for given package identifier.
@@ -3475,6 +3872,27 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveDependenciesMany(self, package_ids, extended = False,
+        deptype = None, exclude_deptypes = None,
+        resolve_conditional_deps = True):
+        """
+        Batch version of retrieveDependencies(). Keyword arguments have
+        the same meaning.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and
+            retrieveDependencies() data as value. Every given package
+            identifier is returned.
+        @rtype: dict
+        @raise AttributeError: if exclude_deptypes contains illegal values
+        """
+        return self._retrieveMany(
+            self.retrieveDependencies, package_ids, skip_none = False,
+            extended = extended, deptype = deptype,
+            exclude_deptypes = exclude_deptypes,
+            resolve_conditional_deps = resolve_conditional_deps)
+
     def retrieveKeywords(self, package_id):
         """
         Return package SPM keyword list for given package identifier.
@@ -3663,6 +4081,19 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveSlotMany(self, package_ids):
+        """
+        Batch version of retrieveSlot().
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and
+            package slot as value. Unavailable package identifiers
+            are not returned.
+        @rtype: dict
+        """
+        return self._retrieveMany(self.retrieveSlot, package_ids)
+
     def retrieveTag(self, package_id):
         """
         Return "tag" metadatum for given package identifier.
@@ -4423,6 +4854,18 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def listAllProvidedLibraries(self):
+        """
+        List all the libraries (from NEEDED ELF metadata) provided by the
+        packages in repository, along with the package key and slot.
+
+        @return: list (tuple) of tuples of length 5 composed by library
+            name, ELF class, package identifier, package key and slot
+            (as returned by retrieveKeySlotAggregated()) and library path
+        @rtype: tuple
+        """
+        raise NotImplementedError()
+
     def listAllSpmUids(self):
         """
         List all Source Package Manager unique package identifiers bindings
@@ -4482,6 +4925,17 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def listAllFilesIter(self):
+        """
+        Return an iterator over all the file paths owned by packages
+        stored in repository, streamed out of a single query.
+        Duplicates are not filtered out.
+
+        @return: iterator of file paths
+        @rtype: iterator
+        """
+        raise NotImplementedError()
+
     def listAllCategories(self, order_by = None):
         """
         List all categories available in repository.
@@ -4999,6 +5453,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         return ""
 
+    @traced("db.atom_match", "db")
     def atomMatch(self, atom, matchSlot = None, multiMatch = False,
         maskFilter = True, extendedResults = False, useCache = True):
         """
@@ -21,9 +21,11 @@ from entropy.const import etpConst, const_debug_write, \
     const_get_buffer, const_convert_to_rawstring, const_is_python3, \
     const_get_stringtype
 from entropy.exceptions import SystemDatabaseError, SPMError
-from entropy.spm.plugins.factory import get_default_instance as get_spm
 from entropy.output import bold, red
 from entropy.misc import ParallelTask
+from entropy.tracing import Tracer
+from entropy.core import LazyModule
+from entropy.db.stats import SQLQueryStatistics
 
 from entropy.i18n import _
 
@@ -36,6 +38,9 @@ from entropy.db.exceptions import Warning, Error, InterfaceError, \
     DatabaseError, DataError, OperationalError, IntegrityError, \
     InternalError, ProgrammingError, NotSupportedError
 
+# only used by regenerateSpmUidMapping()
+_spm_factory = LazyModule("entropy.spm.plugins.factory")
+
 
 class SQLConnectionWrapper(object):
 
@@ -147,9 +152,19 @@ class SQLCursorWrapper(object):
     and then raise entropy.db.exceptions exceptions.
     """
 
+    # collectors, they are singletons, bound once here to keep
+    # the query overhead low when they are disabled
+    _tracer = Tracer()
+    _query_stats = SQLQueryStatistics()
+
     def __init__(self, cursor, exceptions):
         self._cur = cursor
         self._excs = exceptions
+        # (repository name, repository path), set by the repository
+        # and used by the query statistics collector
+        self._owner = None
+        # statistics entry of the last executed query, if collected
+        self._query_stat = None
 
     def _proxy_call(self, method, *args, **kwargs):
         """
@@ -191,6 +206,48 @@ class SQLCursorWrapper(object):
     def wrap(self, method, *args, **kwargs):
         return self._proxy_call(method, *args, **kwargs)
 
+    def _query_call(self, method, *args, **kwargs):
+        """
+        Same as _proxy_call(), for query execution methods, which are
+        traced as "db.query" spans when tracing is enabled and accounted
+        in the SQL query statistics when these are enabled.
+        """
+        tracer = self._tracer
+        query_stats = self._query_stats
+        # the statistics entry of a previous query must not be
+        # accounted the rows of this one
+        self._query_stat = None
+        if not (tracer.enabled() or query_stats.enabled()):
+            return self._proxy_call(method, *args, **kwargs)
+
+        sql = args and args[0] or kwargs.get("sql")
+        if not query_stats.enabled():
+            with tracer.span("db.query", "db", sql = sql):
+                return self._proxy_call(method, *args, **kwargs)
+
+        start = time.time()
+        try:
+            with tracer.span("db.query", "db", sql = sql):
+                return self._proxy_call(method, *args, **kwargs)
+        finally:
+            params = args[1:2] and args[1] or kwargs.get("parameters")
+            self._query_stat = query_stats.record(
+                self._owner, sql, params, time.time() - start)
+
+    def _fetch_call(self, method, *args, **kwargs):
+        """
+        Same as _proxy_call(), for result fetching methods, which are
+        accounted in the SQL query statistics of the executed query.
+        """
+        query_stat = self._query_stat
+        query_stats = self._query_stats
+        if query_stat is None or not query_stats.enabled():
+            return self._proxy_call(method, *args, **kwargs)
+        start = time.time()
+        result = self._proxy_call(method, *args, **kwargs)
+        query_stats.fetched(query_stat, result, time.time() - start)
+        return result
+
     def execute(self, *args, **kwargs):
         raise NotImplementedError()
 
@@ -606,6 +663,10 @@ class EntropySQLRepository(EntropyRepositoryBase):
     # "UPDATE OR REPLACE" dialect
     _UPDATE_OR_REPLACE = None
 
+    # maximum number of parameters bound to a single query
+    # by batch methods, the SQLite default limit is 999.
+    _MAX_QUERY_PARAMETERS = 900
+
     _MAIN_THREAD = threading.current_thread()
 
     @classmethod
@@ -794,27 +855,34 @@ class EntropySQLRepository(EntropyRepositoryBase):
                     "ident are gone, i canz kill thread "
                     "ids: %s." % (hex(th_ident),))
 
-            # WARNING !! BEHAVIOUR CHANGE
-            # no more implicit commit()
-            # caller has to do it!
+            self._releaseConnection(conn)
+
+    def _releaseConnection(self, conn):
+        """
+        Release a Connection object no longer bound to any thread.
+        Subclasses can reimplement this to recycle connections.
+        """
+        # WARNING !! BEHAVIOUR CHANGE
+        # no more implicit commit()
+        # caller has to do it!
+        try:
+            conn.close()
+        except OperationalError as err:
+            if const_debug_enabled():
+                const_debug_write(
+                    __name__,
+                    "_cleanup_killer_1: %s" % (err,))
             try:
+                conn.interrupt()
                 conn.close()
             except OperationalError as err:
+                # heh, unable to close due to
+                # unfinalized statements
+                # interpreter shutdown?
                 if const_debug_enabled():
                     const_debug_write(
                         __name__,
-                        "_cleanup_killer_1: %s" % (err,))
-                try:
-                    conn.interrupt()
-                    conn.close()
-                except OperationalError as err:
-                    # heh, unable to close due to
-                    # unfinalized statements
-                    # interpreter shutdown?
-                    if const_debug_enabled():
-                        const_debug_write(
-                            __name__,
-                            "_cleanup_killer_2: %s" % (err,))
+                        "_cleanup_killer_2: %s" % (err,))
 
     def _concatOperator(self, fields):
         """
@@ -900,6 +968,28 @@ class EntropySQLRepository(EntropyRepositoryBase):
             content |= set(x)
         return frozenset(content)
 
+    def _chunks(self, items):
+        """
+        Split items into lists of at most _MAX_QUERY_PARAMETERS
+        elements, to be used with "IN (...)" batch queries.
+        """
+        items = list(items)
+        size = self._MAX_QUERY_PARAMETERS
+        for idx in range(0, len(items), size):
+            yield items[idx:idx + size]
+
+    def _executeMany(self, sql, package_ids):
+        """
+        Execute the given batch query once per chunk of package_ids
+        (see _chunks()) and yield the resulting rows. The query must
+        contain a "IN (%s)" placeholder.
+        """
+        for chunk in self._chunks(package_ids):
+            cur = self._cursor().execute(
+                sql % (", ".join(["?"] * len(chunk)),), chunk)
+            for row in cur:
+                yield row
+
     def _cur2tuple(self, cur):
         """
         Flatten out a cursor content (usually some kind of list of lists)
@@ -2525,6 +2615,19 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """ % (concat,), (package_id,))
         return cur.fetchone()
 
+    def getStrictDataMany(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        concat = self._concatOperator(("category", "'/'", "name"))
+        sql = """
+        SELECT idpackage, %s, slot, version, versiontag, revision, atom
+        FROM baseinfo
+        WHERE idpackage IN (%%s)
+        """ % (concat,)
+        return dict((row[0], tuple(row[1:])) for row in \
+                        self._executeMany(sql, package_ids))
+
     def getStrictScopeData(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -2582,6 +2685,42 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute(sql, (package_id,))
         return cur.fetchone()
 
+    def getBaseDataMany(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        sql = """
+        SELECT
+            baseinfo.idpackage,
+            baseinfo.atom,
+            baseinfo.name,
+            baseinfo.version,
+            baseinfo.versiontag,
+            extrainfo.description,
+            baseinfo.category,
+            extrainfo.chost,
+            extrainfo.cflags,
+            extrainfo.cxxflags,
+            extrainfo.homepage,
+            baseinfo.license,
+            baseinfo.branch,
+            extrainfo.download,
+            extrainfo.digest,
+            baseinfo.slot,
+            baseinfo.etpapi,
+            extrainfo.datecreation,
+            extrainfo.size,
+            baseinfo.revision
+        FROM
+            baseinfo,
+            extrainfo
+        WHERE
+            baseinfo.idpackage IN (%s)
+            AND baseinfo.idpackage = extrainfo.idpackage
+        """
+        return dict((row[0], tuple(row[1:])) for row in \
+                        self._executeMany(sql, package_ids))
+
     def retrieveRepositoryUpdatesDigest(self, repository):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -2755,6 +2894,14 @@ class EntropySQLRepository(EntropyRepositoryBase):
         if atom:
             return atom[0]
 
+    def retrieveAtomMany(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        return dict(self._executeMany("""
+        SELECT idpackage, atom FROM baseinfo WHERE idpackage IN (%s)
+        """, package_ids))
+
     def retrieveBranch(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -2865,6 +3012,14 @@ class EntropySQLRepository(EntropyRepositoryBase):
             return digest[0]
         return None
 
+    def retrieveDigestMany(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        return dict(self._executeMany("""
+        SELECT idpackage, digest FROM extrainfo WHERE idpackage IN (%s)
+        """, package_ids))
+
     def retrieveSignatures(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -2943,6 +3098,18 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """ % (concat,), (package_id,))
         return cur.fetchone()
 
+    def retrieveKeySlotMany(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        concat = self._concatOperator(("category", "'/'", "name"))
+        sql = """
+        SELECT idpackage, %s, slot FROM baseinfo
+        WHERE idpackage IN (%%s)
+        """ % (concat,)
+        return dict((pkg_id, (key, slot)) for pkg_id, key, slot in \
+                        self._executeMany(sql, package_ids))
+
     def retrieveKeySlotAggregated(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -2987,6 +3154,14 @@ class EntropySQLRepository(EntropyRepositoryBase):
             return version[0]
         return None
 
+    def retrieveVersionMany(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        return dict(self._executeMany("""
+        SELECT idpackage, version FROM baseinfo WHERE idpackage IN (%s)
+        """, package_ids))
+
     def retrieveRevision(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3145,6 +3320,20 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """, (package_id,))
         return frozenset(cur)
 
+    def retrieveNeededLibrariesMany(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        package_ids = list(package_ids)
+        data = dict((x, set()) for x in package_ids)
+        for row in self._executeMany("""
+        SELECT idpackage, lib_user_path, lib_user_soname, soname,
+            elfclass, rpath
+        FROM needed_libs WHERE idpackage IN (%s)
+        """, package_ids):
+            data[row[0]].add(tuple(row[1:]))
+        return dict((x, frozenset(y)) for x, y in data.items())
+
     def retrieveProvidedLibraries(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3155,6 +3344,19 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """, (package_id,))
         return frozenset(cur)
 
+    def retrieveProvidedLibrariesMany(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        package_ids = list(package_ids)
+        data = dict((x, set()) for x in package_ids)
+        for row in self._executeMany("""
+        SELECT idpackage, library, path, elfclass FROM provided_libs
+        WHERE idpackage IN (%s)
+        """, package_ids):
+            data[row[0]].add(tuple(row[1:]))
+        return dict((x, frozenset(y)) for x, y in data.items())
+
     def retrieveConflicts(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3280,6 +3482,47 @@ class EntropySQLRepository(EntropyRepositoryBase):
                     cur, [self]))
         return iter_obj(cur)
 
+    def retrieveDependenciesMany(self, package_ids, extended = False,
+        deptype = None, exclude_deptypes = None,
+        resolve_conditional_deps = True):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        depstring = ''
+        if deptype is not None:
+            depstring = 'AND dependencies.type = %d' % (deptype,)
+
+        excluded_deptypes_query = ""
+        if exclude_deptypes is not None:
+            for dep_type in exclude_deptypes:
+                excluded_deptypes_query += " AND dependencies.type != %d" % (
+                    dep_type,)
+
+        package_ids = list(package_ids)
+        data = dict((x, []) for x in package_ids)
+        for pkg_id, dependency, dep_type in self._executeMany("""
+        SELECT dependencies.idpackage, dependenciesreference.dependency,
+            dependencies.type
+        FROM dependencies,dependenciesreference
+        WHERE dependencies.idpackage IN (%%s) AND
+        dependencies.iddependency =
+        dependenciesreference.iddependency %s %s""" % (
+                depstring, excluded_deptypes_query,), package_ids):
+            if extended:
+                data[pkg_id].append((dependency, dep_type))
+            else:
+                data[pkg_id].append(dependency)
+
+        iter_obj = frozenset
+        if extended:
+            iter_obj = tuple
+        result = {}
+        for pkg_id, deps in data.items():
+            if resolve_conditional_deps:
+                deps = entropy.dep.expand_dependencies(deps, [self])
+            result[pkg_id] = iter_obj(deps)
+        return result
+
     def retrieveKeywords(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3554,6 +3797,14 @@ class EntropySQLRepository(EntropyRepositoryBase):
             return slot[0]
         return None
 
+    def retrieveSlotMany(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        return dict(self._executeMany("""
+        SELECT idpackage, slot FROM baseinfo WHERE idpackage IN (%s)
+        """, package_ids))
+
     def retrieveTag(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -4710,6 +4961,24 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """)
         return tuple(cur)
 
+    def listAllProvidedLibraries(self):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        concat = self._concatOperator(
+            ("baseinfo.category",
+             "'/'",
+             "baseinfo.name",
+             "'%s'" % (etpConst['entropyslotprefix'],),
+             "baseinfo.slot"))
+        cur = self._cursor().execute("""
+        SELECT provided_libs.library, provided_libs.elfclass,
+            provided_libs.idpackage, %s, provided_libs.path
+        FROM provided_libs, baseinfo
+        WHERE provided_libs.idpackage = baseinfo.idpackage
+        """ % (concat,))
+        return tuple(cur)
+
     def listAllDownloads(self, do_sort = True, full_path = False):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -4771,6 +5040,18 @@ class EntropySQLRepository(EntropyRepositoryBase):
             return self._cur2frozenset(cur)
         return self._cur2tuple(cur)
 
+    def listAllFilesIter(self):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        self._connection().unicode()
+
+        cur = self._cursor().execute("""
+        SELECT file FROM content
+        """)
+        for path, in cur:
+            yield path
+
     def listAllCategories(self, order_by = None):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -5461,7 +5742,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
-        spm = get_spm(self)
+        spm = _spm_factory.get_default_instance(self)
 
         # this is necessary now, counters table should be empty
         self._cursor().executescript("""
@@ -21,11 +21,12 @@ except ImportError:
     import _thread as thread
 import threading
 import subprocess
+import weakref
 
 from entropy.const import etpConst, const_convert_to_unicode, \
     const_get_buffer, const_convert_to_rawstring, const_pid_exists, \
-    const_is_python3, const_debug_write, const_file_writable, \
-    const_setup_directory, const_setup_file
+    const_is_python3, const_debug_write, const_debug_enabled, \
+    const_file_writable, const_setup_directory, const_setup_file
 from entropy.exceptions import SystemDatabaseError
 from entropy.output import bold, red, blue, purple
 from entropy.locks import ResourceLock
@@ -33,6 +34,7 @@ from entropy.locks import ResourceLock
 from entropy.db.exceptions import Warning, Error, InterfaceError, \
     DatabaseError, DataError, OperationalError, IntegrityError, \
     InternalError, ProgrammingError, NotSupportedError, LockAcquireError
+from entropy.db.skel import EntropyRepositoryBase
 from entropy.db.sql import EntropySQLRepository, SQLConnectionWrapper, \
     SQLCursorWrapper
 
@@ -54,28 +56,38 @@ class SQLiteCursorWrapper(SQLCursorWrapper):
     def __init__(self, cursor, exceptions):
         super(SQLiteCursorWrapper, self).__init__(cursor, exceptions)
 
+    def _derive(self, cursor):
+        """
+        Return a new SQLiteCursorWrapper for the given cursor, inheriting
+        the query statistics state.
+        """
+        wrapper = SQLiteCursorWrapper(cursor, self._excs)
+        wrapper._owner = self._owner
+        wrapper._query_stat = self._query_stat
+        return wrapper
+
     def execute(self, *args, **kwargs):
-        cur = self._proxy_call(self._cur.execute, *args, **kwargs)
-        return SQLiteCursorWrapper(cur, self._excs)
+        cur = self._query_call(self._cur.execute, *args, **kwargs)
+        return self._derive(cur)
 
     def executemany(self, *args, **kwargs):
-        cur = self._proxy_call(self._cur.executemany, *args, **kwargs)
-        return SQLiteCursorWrapper(cur, self._excs)
+        cur = self._query_call(self._cur.executemany, *args, **kwargs)
+        return self._derive(cur)
 
     def close(self, *args, **kwargs):
         return self._proxy_call(self._cur.close, *args, **kwargs)
 
     def fetchone(self, *args, **kwargs):
-        return self._proxy_call(self._cur.fetchone, *args, **kwargs)
+        return self._fetch_call(self._cur.fetchone, *args, **kwargs)
 
     def fetchall(self, *args, **kwargs):
-        return self._proxy_call(self._cur.fetchall, *args, **kwargs)
+        return self._fetch_call(self._cur.fetchall, *args, **kwargs)
 
     def fetchmany(self, *args, **kwargs):
-        return self._proxy_call(self._cur.fetchmany, *args, **kwargs)
+        return self._fetch_call(self._cur.fetchmany, *args, **kwargs)
 
     def executescript(self, *args, **kwargs):
-        return self._proxy_call(self._cur.executescript, *args, **kwargs)
+        return self._query_call(self._cur.executescript, *args, **kwargs)
 
     def callproc(self, *args, **kwargs):
         return self._proxy_call(self._cur.callproc, *args, **kwargs)
@@ -85,13 +97,13 @@ class SQLiteCursorWrapper(SQLCursorWrapper):
 
     def __iter__(self):
         cur = iter(self._cur)
-        return SQLiteCursorWrapper(cur, self._excs)
+        return self._derive(cur)
 
     def __next__(self):
-        return self.wrap(next, self._cur)
+        return self._fetch_call(next, self._cur)
 
     def next(self):
-        return self.wrap(self._cur.next)
+        return self._fetch_call(self._cur.next)
 
 
 class SQLiteConnectionWrapper(SQLConnectionWrapper):
@@ -120,6 +132,220 @@ class SQLiteConnectionWrapper(SQLConnectionWrapper):
         return self._con.iterdump()
 
 
+class SQLiteConnectionPool(object):
+
+    """
+    Bounded pool of SQLite connections to the same database file,
+    shared among threads and EntropySQLiteRepository instances.
+    A connection is handed out to a thread for its whole lifetime
+    (as per the per-thread cursor model of EntropySQLRepository) and
+    goes back to the pool once the thread is gone, the repository
+    is closed or the repository object is garbage collected without
+    being closed. When the pool is exhausted, acquire() does not wait
+    and returns a new (overflow) connection that is not pooled, so
+    that long-lived threads holding connections cannot stall others.
+    Connections to a database file that has been replaced in the
+    meantime (different inode) are discarded.
+    """
+
+    def __init__(self, path, size):
+        self._path = path
+        self._size = size
+        self._lock = threading.Lock()
+        self._idle = collections.deque()
+        self._file_ids = {}
+        # busy connection -> weak reference to its owner
+        self._busy = {}
+        # connections whose owner has been garbage collected, filled
+        # by the weakref callbacks, which must not take self._lock
+        self._orphans = collections.deque()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'overflows': 0,
+            'discarded': 0,
+            'orphaned': 0,
+        }
+
+    def _file_id(self):
+        """
+        Return the identity of the database file currently on disk.
+        """
+        try:
+            st = os.stat(self._path)
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino
+
+    def _owner_ref(self, conn, owner):
+        """
+        Return a weak reference to the owner of a busy connection,
+        the connection is given back to the pool once owner is collected.
+        """
+        orphans = self._orphans
+
+        def _collected(_ref):
+            orphans.append(conn)
+
+        return weakref.ref(owner, _collected)
+
+    def _release_orphans(self):
+        """
+        Give back the connections whose owner has been garbage collected.
+        """
+        while True:
+            try:
+                conn = self._orphans.popleft()
+            except IndexError:
+                break
+            with self._lock:
+                self._stats['orphaned'] += 1
+            self.release(conn)
+
+    def acquire(self, factory, owner):
+        """
+        Return a connection from the pool, or a new one built by calling
+        factory(). The connection goes back to the pool when release()
+        is called or when owner is garbage collected. If the pool is
+        exhausted, the returned connection is not pooled and release()
+        returns False for it.
+        """
+        self._release_orphans()
+
+        file_id = self._file_id()
+        conn = None
+        stale = []
+        reservation = None
+
+        with self._lock:
+            while self._idle:
+                idle_conn = self._idle.pop()
+                if file_id is not None and \
+                        self._file_ids[idle_conn] == file_id:
+                    conn = idle_conn
+                    break
+                del self._file_ids[idle_conn]
+                stale.append(idle_conn)
+                self._stats['discarded'] += 1
+
+            if conn is not None:
+                self._stats['hits'] += 1
+                self._busy[conn] = self._owner_ref(conn, owner)
+            else:
+                self._stats['misses'] += 1
+                if len(self._busy) >= self._size:
+                    self._stats['overflows'] += 1
+                else:
+                    # hold the slot while the connection is created
+                    reservation = object()
+                    self._busy[reservation] = None
+
+        for stale_conn in stale:
+            self._close(stale_conn)
+
+        if conn is not None:
+            return conn
+        if reservation is None:
+            return factory()
+
+        try:
+            conn = factory()
+        finally:
+            with self._lock:
+                del self._busy[reservation]
+                if conn is not None:
+                    self._busy[conn] = self._owner_ref(conn, owner)
+                    self._file_ids[conn] = file_id
+        return conn
+
+    def release(self, conn):
+        """
+        Give a connection back to the pool. Return False if the
+        connection does not belong to this pool.
+        """
+        with self._lock:
+            if self._busy.pop(conn, None) is None:
+                # idle connections are already back in the pool
+                return conn in self._file_ids
+
+        reusable = self._reset(conn)
+
+        with self._lock:
+            keep = reusable and \
+                len(self._idle) + len(self._busy) < self._size
+            if keep:
+                self._idle.append(conn)
+            else:
+                del self._file_ids[conn]
+
+        if not keep:
+            self._close(conn)
+        return True
+
+    def _reset(self, conn):
+        """
+        Reset the state of a connection given back to the pool, so that
+        it does not leak into the next user: any leftover transaction is
+        dropped (the caller is in charge of committing, as per close()),
+        attached databases are detached and temporary tables are dropped.
+        Return False if the connection cannot be reused.
+        """
+        def _execute(cursor, sql):
+            conn._proxy_call(conn._excs, cursor.execute, sql)
+            return conn._proxy_call(conn._excs, cursor.fetchall)
+
+        try:
+            conn.rollback()
+            cursor = conn.cursor()
+            try:
+                attached = [const_convert_to_unicode(x[1]) for x in \
+                                _execute(cursor, "PRAGMA database_list")]
+                for name in attached:
+                    if name in ("main", "temp"):
+                        continue
+                    _execute(cursor, 'DETACH DATABASE "%s"' % (
+                        name.replace('"', '""'),))
+
+                tables = [const_convert_to_unicode(x[0]) for x in \
+                              _execute(cursor, """
+                SELECT name FROM sqlite_temp_master WHERE type = 'table'
+                """)]
+                for table in tables:
+                    _execute(cursor, 'DROP TABLE temp."%s"' % (
+                        table.replace('"', '""'),))
+            finally:
+                cursor.close()
+        except Error as err:
+            const_debug_write(
+                __name__,
+                "SQLiteConnectionPool: cannot reset: %s" % (err,))
+            return False
+        return True
+
+    def _close(self, conn):
+        """
+        Close a connection no longer tracked by the pool.
+        """
+        try:
+            conn.close()
+        except Error as err:
+            const_debug_write(
+                __name__,
+                "SQLiteConnectionPool: cannot close: %s" % (err,))
+
+    def stats(self):
+        """
+        Return the pool usage metrics.
+        """
+        self._release_orphans()
+        with self._lock:
+            stats = self._stats.copy()
+            stats['size'] = self._size
+            stats['busy'] = len(self._busy)
+            stats['idle'] = len(self._idle)
+        return stats
+
+
 class EntropySQLiteRepository(EntropySQLRepository):
 
     """
@@ -141,7 +367,24 @@ class EntropySQLiteRepository(EntropySQLRepository):
     _CACHE_SIZE = 8192
 
     SETTING_KEYS = ("arch", "on_delete_cascade", "schema_revision",
-        "_baseinfo_extrainfo_2010")
+        "_baseinfo_extrainfo_2010", "_content_dirs")
+
+    # opt-in content metadata layout interning directory paths,
+    # see _migrateContentDirs()
+    ENABLE_CONTENT_DIRS = os.getenv("ETP_REPO_CONTENT_DIRS")
+
+    # read-only repositories share a bounded pool of connections
+    # per database file, see SQLiteConnectionPool.
+    DISABLE_CONNECTION_POOL = os.getenv("ETP_REPO_NO_POOL")
+    _CONNECTION_POOL_SIZE = 8
+    _CONNECTION_POOLS = {}
+    _CONNECTION_POOLS_LOCK = threading.Lock()
+    # tuning of pooled connections
+    _CACHED_STATEMENTS = 256
+    _MMAP_SIZE = 256 * 1024 * 1024
+
+    # opt-in Write-Ahead Logging journal mode, see enableWriteAheadLog()
+    ENABLE_WAL = os.getenv("ETP_REPO_WAL")
 
     class SQLiteProxy(object):
 
@@ -318,9 +561,11 @@ class EntropySQLiteRepository(EntropySQLRepository):
             del cached
             return obj
 
+        # views are considered too, content and contentsafety
+        # are views when _content_dirs is enabled.
         cur = self._cursor().execute("""
-        SELECT name FROM SQLITE_MASTER WHERE type = "table" AND name = (?)
-        LIMIT 1
+        SELECT name FROM SQLITE_MASTER WHERE type IN ("table", "view")
+        AND name = (?) LIMIT 1
         """, (table,))
         rslt = cur.fetchone()
         exists = rslt is not None
@@ -379,38 +624,40 @@ class EntropySQLiteRepository(EntropySQLRepository):
         current_thread = threading.current_thread()
         c_key = self._cursor_connection_pool_key()
 
-        _init_db = False
-        cursor = None
         with self._cursor_pool_mutex():
-            threads = set()
-            cursor_pool = self._cursor_pool()
-            cursor_data = cursor_pool.get(c_key)
+            cursor_data = self._cursor_pool().get(c_key)
             if cursor_data is not None:
                 cursor, threads = cursor_data
-            # handle possible thread ident clashing
-            # in the cleanup thread function, because
-            # thread idents are recycled
-            # on thread termination
-            threads.add(current_thread)
+                # handle possible thread ident clashing
+                # in the cleanup thread function, because
+                # thread idents are recycled
+                # on thread termination
+                threads.add(current_thread)
+                return cursor
+
+        # the connection may come from a shared pool, waiting for
+        # other threads to release theirs, the cursor pool mutex
+        # must not be held here. c_key is bound to this thread anyway.
+        conn = self._connection_impl(_from_cursor=True)
+
+        with self._cursor_pool_mutex():
+            cursor = SQLiteCursorWrapper(
+                conn.cursor(),
+                self.ModuleProxy.exceptions())
+            cursor._owner = (self.name, self._db)
+            # !!! enable foreign keys pragma !!! do not remove this
+            # otherwise removePackage won't work properly
+            cursor.execute("pragma foreign_keys = 1").fetchall()
+            # setup temporary tables and indices storage
+            # to in-memory value
+            # http://www.sqlite.org/pragma.html#pragma_temp_store
+            cursor.execute("pragma temp_store = 2").fetchall()
+            self._cursor_pool()[c_key] = cursor, set([current_thread])
+            self._start_cleanup_monitor(current_thread, c_key)
 
-            if cursor is None:
-                conn = self._connection_impl(_from_cursor=True)
-                cursor = SQLiteCursorWrapper(
-                    conn.cursor(),
-                    self.ModuleProxy.exceptions())
-                # !!! enable foreign keys pragma !!! do not remove this
-                # otherwise removePackage won't work properly
-                cursor.execute("pragma foreign_keys = 1").fetchall()
-                # setup temporary tables and indices storage
-                # to in-memory value
-                # http://www.sqlite.org/pragma.html#pragma_temp_store
-                cursor.execute("pragma temp_store = 2").fetchall()
-                cursor_pool[c_key] = cursor, threads
-                self._start_cleanup_monitor(current_thread, c_key)
-                _init_db = True
         # memory databases are critical because every new cursor brings
         # up a totally empty repository. So, enforce initialization.
-        if _init_db and self._is_memory():
+        if self._is_memory():
             self.initializeRepository()
         return cursor
 
@@ -423,6 +670,15 @@ class EntropySQLiteRepository(EntropySQLRepository):
         current_thread = threading.current_thread()
         c_key = self._cursor_connection_pool_key()
 
+        pooled_conn = None
+        pool = self._connectionPool()
+        if pool is not None:
+            with self._connection_pool_mutex():
+                acquire = c_key not in self._connection_pool()
+            if acquire:
+                # outside the connection pool mutex, see _cursor()
+                pooled_conn = pool.acquire(self._pooledConnection, self)
+
         conn = None
         with self._connection_pool_mutex():
             threads = set()
@@ -437,17 +693,24 @@ class EntropySQLiteRepository(EntropySQLRepository):
             threads.add(current_thread)
 
             if conn is None:
-                # check_same_thread still required for
-                # conn.close() called from
-                # arbitrary thread
-                conn = SQLiteConnectionWrapper.connect(
-                    self.ModuleProxy, self._sqlite,
-                    SQLiteConnectionWrapper,
-                    self._db, timeout=300.0,
-                    check_same_thread=False)
+                if pooled_conn is not None:
+                    conn = pooled_conn
+                    pooled_conn = None
+                else:
+                    # check_same_thread still required for
+                    # conn.close() called from
+                    # arbitrary thread
+                    conn = SQLiteConnectionWrapper.connect(
+                        self.ModuleProxy, self._sqlite,
+                        SQLiteConnectionWrapper,
+                        self._db, timeout=300.0,
+                        check_same_thread=False)
                 connection_pool[c_key] = conn, threads
                 if not _from_cursor:
                     self._start_cleanup_monitor(current_thread, c_key)
+
+        if pooled_conn is not None:
+            self._releaseConnection(pooled_conn)
         return conn
 
     def _connection(self):
@@ -456,6 +719,91 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """
         return self._connection_impl()
 
+    def _connectionPool(self):
+        """
+        Return the SQLiteConnectionPool object shared by all the read-only
+        instances of this repository file, or None if connections must
+        not be pooled.
+        """
+        if self.DISABLE_CONNECTION_POOL or not self._readonly:
+            return None
+        if self._temporary or self._is_memory():
+            return None
+
+        key = (self._db, os.getpid())
+        with self._CONNECTION_POOLS_LOCK:
+            pool = self._CONNECTION_POOLS.get(key)
+            if pool is None:
+                pool = SQLiteConnectionPool(
+                    self._db, self._CONNECTION_POOL_SIZE)
+                self._CONNECTION_POOLS[key] = pool
+        return pool
+
+    def _pooledConnection(self):
+        """
+        Create a new Connection object for the connection pool.
+        """
+        conn = SQLiteConnectionWrapper.connect(
+            self.ModuleProxy, self._sqlite,
+            SQLiteConnectionWrapper,
+            self._db, timeout=300.0,
+            check_same_thread=False,
+            cached_statements=self._CACHED_STATEMENTS)
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA mmap_size = %d" % (self._MMAP_SIZE,))
+        # Read-only repositories are still written by privileged
+        # code paths (schema updates, indexing), only make it explicit
+        # when the file cannot be written anyway.
+        if not const_file_writable(self._db):
+            cursor.execute("PRAGMA query_only = 1")
+        cursor.close()
+        return conn
+
+    def _releaseConnection(self, conn):
+        """
+        Reimplemented from EntropySQLRepository.
+        Pooled connections are given back to their pool.
+        """
+        with self._CONNECTION_POOLS_LOCK:
+            pool = self._CONNECTION_POOLS.get((self._db, os.getpid()))
+        if pool is not None and pool.release(conn):
+            return
+        super(EntropySQLiteRepository, self)._releaseConnection(conn)
+
+    @classmethod
+    def connectionPoolStats(cls):
+        """
+        Return the usage metrics of the read-only connection pools
+        allocated by this process, for debugging purposes.
+
+        @return: dict composed by repository file path as key and
+            metrics dict (hits, misses, overflows, discarded, orphaned,
+            size, busy, idle) as value
+        @rtype: dict
+        """
+        pid = os.getpid()
+        with cls._CONNECTION_POOLS_LOCK:
+            pools = [(path, pool) for (path, pool_pid), pool in \
+                         cls._CONNECTION_POOLS.items() if pool_pid == pid]
+        return dict((path, pool.stats()) for path, pool in pools)
+
+    def enableWriteAheadLog(self):
+        """
+        Switch the repository file to the Write-Ahead Logging journal
+        mode, which lets readers and the writer proceed concurrently.
+        The setting is persistent. Readers of a WAL repository need
+        write access to the -shm file, so this is meant for repositories
+        only written and read by privileged processes.
+
+        @return: True, if the journal mode is now WAL
+        @rtype: bool
+        """
+        if self._is_memory():
+            return False
+        cur = self._cursor().execute("PRAGMA journal_mode = WAL")
+        mode = cur.fetchone()
+        return mode is not None and mode[0].lower() == "wal"
+
     def __show_info(self):
         first_part = "<EntropySQLiteRepository instance at %s, %s" % (
             hex(id(self)), self._db,)
@@ -684,6 +1032,10 @@ class EntropySQLiteRepository(EntropySQLRepository):
         super(EntropySQLiteRepository, self).close(safe=safe)
 
         self._cleanup_all(_cleanup_main_thread=not safe)
+        if const_debug_enabled():
+            const_debug_write(
+                __name__,
+                "connection pools: %s" % (self.connectionPoolStats(),))
         if self._temporary and (not self._is_memory()) and \
             os.path.isfile(self._db):
             try:
@@ -708,6 +1060,13 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """
         my = self.Schema()
         self.dropAllIndexes()
+        # drop views first (and their triggers), _content_dirs
+        # replaces the content tables with views.
+        cur = self._cursor().execute("""
+        SELECT name FROM SQLITE_MASTER WHERE type = "view"
+        """)
+        for view in self._cur2tuple(cur):
+            self._cursor().execute("DROP VIEW IF EXISTS %s" % (view,))
         for table in self._listAllTables():
             try:
                 self._cursor().execute("DROP TABLE %s" % (table,))
@@ -1082,6 +1441,60 @@ class EntropySQLiteRepository(EntropySQLRepository):
         del cached
         return obj
 
+    def getStrictDataMany(self, package_ids):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must use the in-memory cache to do some memoization.
+        We must handle _baseinfo_extrainfo_2010.
+        """
+        if (self.directed() or self.cache_policy_none()) and \
+                self._isBaseinfoExtrainfo2010():
+            return super(EntropySQLiteRepository, self).getStrictDataMany(
+                package_ids)
+        # getStrictData() memoizes the whole table at the first call
+        return EntropyRepositoryBase.getStrictDataMany(self, package_ids)
+
+    def listAllUpdateCandidates(self, repository):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        The given repository is ATTACHed to this repository connection
+        so that candidates are found by a single join.
+        Return None if repository is not an on-disk SQLite repository,
+        if any of them is using the old-style schema or if the database
+        cannot be attached (for instance, inside a transaction).
+        """
+        if not isinstance(repository, EntropySQLiteRepository):
+            return None
+        if repository._is_memory() or self._is_memory():
+            return None
+        if not (self._isBaseinfoExtrainfo2010() and \
+                    repository._isBaseinfoExtrainfo2010()):
+            return None
+
+        cur = self._cursor()
+        alias = "etp_update_candidates"
+        try:
+            cur.execute("ATTACH DATABASE ? AS %s" % (alias,),
+                        (repository._db,))
+        except (OperationalError, DatabaseError) as err:
+            const_debug_write(__name__,
+                "listAllUpdateCandidates, cannot attach %s: %s" % (
+                    repository._db, err,))
+            return None
+
+        try:
+            cur.execute("""
+            SELECT installed.idpackage, candidate.idpackage,
+                candidate.version, candidate.versiontag, candidate.revision
+            FROM main.baseinfo AS installed, %s.baseinfo AS candidate
+            WHERE candidate.name = installed.name
+            AND candidate.category = installed.category
+            AND candidate.slot = installed.slot
+            """ % (alias,))
+            return tuple(cur)
+        finally:
+            cur.execute("DETACH DATABASE %s" % (alias,))
+
     def getStrictScopeData(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1135,6 +1548,17 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """, (package_id,))
         return cur.fetchone()
 
+    def getBaseDataMany(self, package_ids):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle backward compatibility.
+        """
+        if self._isBaseinfoExtrainfo2010():
+            return super(EntropySQLiteRepository, self).getBaseDataMany(
+                package_ids)
+        # fallback to the one by one implementation
+        return EntropyRepositoryBase.getBaseDataMany(self, package_ids)
+
     def getBaseData(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1204,6 +1628,17 @@ class EntropySQLiteRepository(EntropySQLRepository):
         del cached
         return obj
 
+    def retrieveDigestMany(self, package_ids):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must use the in-memory cache to do some memoization.
+        """
+        if self.directed() or self.cache_policy_none():
+            return super(EntropySQLiteRepository, self).retrieveDigestMany(
+                package_ids)
+        # retrieveDigest() memoizes the whole table at the first call
+        return EntropyRepositoryBase.retrieveDigestMany(self, package_ids)
+
     def retrieveExtraDownload(self, package_id, down_type = None):
         """
         Reimplemented from EntropySQLRepository.
@@ -1284,6 +1719,19 @@ class EntropySQLiteRepository(EntropySQLRepository):
         del cached
         return obj
 
+    def retrieveKeySlotMany(self, package_ids):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must use the in-memory cache to do some memoization.
+        We must handle _baseinfo_extrainfo_2010.
+        """
+        if (self.directed() or self.cache_policy_none()) and \
+                self._isBaseinfoExtrainfo2010():
+            return super(EntropySQLiteRepository, self).retrieveKeySlotMany(
+                package_ids)
+        # retrieveKeySlot() memoizes the whole table at the first call
+        return EntropyRepositoryBase.retrieveKeySlotMany(self, package_ids)
+
     def retrieveKeySlotAggregated(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -1356,6 +1804,17 @@ class EntropySQLiteRepository(EntropySQLRepository):
         del cached
         return obj
 
+    def retrieveVersionMany(self, package_ids):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must use the in-memory cache to do some memoization.
+        """
+        if self.directed() or self.cache_policy_none():
+            return super(EntropySQLiteRepository, self).retrieveVersionMany(
+                package_ids)
+        # retrieveVersion() memoizes the whole table at the first call
+        return EntropyRepositoryBase.retrieveVersionMany(self, package_ids)
+
     def retrieveRevision(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1456,6 +1915,25 @@ class EntropySQLiteRepository(EntropySQLRepository):
                     data, [self]))
         return iter_obj(data)
 
+    def retrieveDependenciesMany(self, package_ids, extended = False,
+        deptype = None, exclude_deptypes = None,
+        resolve_conditional_deps = True):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must use the in-memory cache to do some memoization.
+        """
+        if self.directed() or self.cache_policy_none():
+            sup = super(EntropySQLiteRepository, self)
+            return sup.retrieveDependenciesMany(
+                package_ids, extended = extended, deptype = deptype,
+                exclude_deptypes = exclude_deptypes,
+                resolve_conditional_deps = resolve_conditional_deps)
+        # retrieveDependencies() memoizes the whole table at the first call
+        return EntropyRepositoryBase.retrieveDependenciesMany(
+            self, package_ids, extended = extended, deptype = deptype,
+            exclude_deptypes = exclude_deptypes,
+            resolve_conditional_deps = resolve_conditional_deps)
+
     def retrieveDesktopMime(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1559,6 +2037,17 @@ class EntropySQLiteRepository(EntropySQLRepository):
         del cached
         return obj
 
+    def retrieveSlotMany(self, package_ids):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must use the in-memory cache to do some memoization.
+        """
+        if self.directed() or self.cache_policy_none():
+            return super(EntropySQLiteRepository, self).retrieveSlotMany(
+                package_ids)
+        # retrieveSlot() memoizes the whole table at the first call
+        return EntropyRepositoryBase.retrieveSlotMany(self, package_ids)
+
     def retrieveTag(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1920,6 +2409,8 @@ class EntropySQLiteRepository(EntropySQLRepository):
 
             if current_schema_rev == EntropySQLiteRepository._SCHEMA_REVISION \
                     and not os.getenv("ETP_REPO_SCHEMA_UPDATE"):
+                if self.ENABLE_CONTENT_DIRS and not self._isContentDirs():
+                    return True
                 return False
             return True
 
@@ -2008,6 +2499,9 @@ class EntropySQLiteRepository(EntropySQLRepository):
 
         self._foreignKeySupport()
 
+        # opt-in, see ENABLE_CONTENT_DIRS
+        self._migrateContentDirs()
+
         self._readonly = old_readonly
         self._connection().commit()
 
@@ -2381,6 +2875,80 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 raise
             # table doesn't exist, ignore
 
+    def dropContent(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if not self._isContentDirs():
+            return super(EntropySQLiteRepository, self).dropContent()
+
+        # avoid going through the view triggers, one row at a time
+        self._cursor().executescript("""
+        DELETE FROM contentfiles;
+        DELETE FROM contentsafetyfiles;
+        DELETE FROM dirs;
+        """)
+
+    def isFileAvailable(self, path, get_id = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if not self._isContentDirs():
+            return super(EntropySQLiteRepository, self).isFileAvailable(
+                path, get_id = get_id)
+
+        dirname, basename = self._splitContentPath(path)
+        cur = self._cursor().execute("""
+        SELECT contentfiles.idpackage FROM dirs, contentfiles
+        WHERE dirs.dir = ? AND contentfiles.iddir = dirs.iddir
+        AND contentfiles.basename = ?""", (dirname, basename))
+        result = self._cur2frozenset(cur)
+        if get_id:
+            return result
+        elif result:
+            return True
+        return False
+
+    def searchBelongs(self, bfile, like = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if like or not self._isContentDirs():
+            # LIKE matching goes through the content view
+            return super(EntropySQLiteRepository, self).searchBelongs(
+                bfile, like = like)
+
+        dirname, basename = self._splitContentPath(bfile)
+        cur = self._cursor().execute("""
+        SELECT contentfiles.idpackage FROM dirs, contentfiles, baseinfo
+        WHERE dirs.dir = ? AND contentfiles.iddir = dirs.iddir
+        AND contentfiles.basename = ?
+        AND contentfiles.idpackage = baseinfo.idpackage""",
+            (dirname, basename))
+        return self._cur2frozenset(cur)
+
+    def searchContentSafety(self, sfile):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if not self._isContentDirs():
+            return super(EntropySQLiteRepository, self).searchContentSafety(
+                sfile)
+
+        dirname, basename = self._splitContentPath(sfile)
+        cur = self._cursor().execute("""
+        SELECT contentsafetyfiles.idpackage, contentsafetyfiles.sha256,
+            contentsafetyfiles.mtime
+        FROM dirs, contentsafetyfiles
+        WHERE dirs.dir = ? AND contentsafetyfiles.iddir = dirs.iddir
+        AND contentsafetyfiles.basename = ?""", (dirname, basename))
+        return tuple(({'package_id': x, 'path': sfile, 'sha256': z,
+                       'mtime': m} for x, z, m in cur))
+
     def dropAllIndexes(self):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -2406,6 +2974,26 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self.__createCategoriesIndex()
             self.__createCompileFlagsIndex()
 
+    def _createContentIndex(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if not self._isContentDirs():
+            return super(EntropySQLiteRepository,
+                         self)._createContentIndex()
+
+        self._cursor().executescript("""
+        CREATE INDEX IF NOT EXISTS contentfilesindex_couple
+            ON contentfiles ( idpackage );
+        CREATE INDEX IF NOT EXISTS contentfilesindex_file
+            ON contentfiles ( iddir, basename );
+        CREATE INDEX IF NOT EXISTS contentsafetyfilesindex_couple
+            ON contentsafetyfiles ( idpackage );
+        CREATE INDEX IF NOT EXISTS contentsafetyfilesindex_file
+            ON contentsafetyfiles ( iddir, basename );
+        """)
+
     def __createCompileFlagsIndex(self):
         try:
             self._cursor().execute("""
@@ -2585,6 +3173,192 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._setSetting("_baseinfo_extrainfo_2010", "1")
         self._connection().commit()
 
+    @staticmethod
+    def _splitContentPath(path):
+        """
+        Split a content path into its directory (including the
+        trailing slash) and its base name, the same way the
+        _content_dirs triggers do. The concatenation of the two
+        returns the original path.
+        """
+        idx = path.rfind("/") + 1
+        return path[:idx], path[idx:]
+
+    def _isContentDirs(self):
+        """
+        Return whether the _content_dirs setting is found via
+        getSetting(), in other words, whether the content and
+        contentsafety metadata are stored in the contentfiles and
+        contentsafetyfiles tables with directory paths interned
+        into the dirs table.
+        """
+        try:
+            self.getSetting("_content_dirs")
+            return True
+        except KeyError:
+            return False
+
+    def _migrateContentDirs(self):
+        """
+        Migrate the content and contentsafety tables to the _content_dirs
+        layout, which stores (idpackage, iddir, basename, ...) rows and
+        interns directory paths into the dirs table. The migration is
+        opt-in: it is only executed if ETP_REPO_CONTENT_DIRS is set.
+        content and contentsafety are then replaced by views (with
+        INSTEAD OF triggers) exposing the old layout, so both reads and
+        writes keep working unchanged.
+        """
+        if not self.ENABLE_CONTENT_DIRS:
+            return
+        if self._isContentDirs():
+            return
+        if not self._doesTableExist("content"):
+            return
+        if not self._doesTableExist("contentsafety"):
+            return
+
+        mytxt = "%s: [%s] %s" % (
+            bold(_("ATTENTION")),
+            purple(self.name),
+            red(_("updating repository metadata layout, please wait!")),
+        )
+        self.output(
+            mytxt,
+            importance = 1,
+            level = "warning")
+
+        # the directory of a path is obtained by stripping all the
+        # trailing characters that are not a slash.
+        self._cursor().execute("pragma foreign_keys = OFF").fetchall()
+        self._cursor().executescript("""
+            BEGIN TRANSACTION;
+
+            DROP TABLE IF EXISTS dirs;
+            CREATE TABLE dirs (
+                iddir INTEGER PRIMARY KEY AUTOINCREMENT,
+                dir VARCHAR UNIQUE
+            );
+            DROP TABLE IF EXISTS contentfiles;
+            CREATE TABLE contentfiles (
+                idpackage INTEGER,
+                iddir INTEGER,
+                basename VARCHAR,
+                type VARCHAR,
+                FOREIGN KEY(idpackage)
+                    REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+            );
+            DROP TABLE IF EXISTS contentsafetyfiles;
+            CREATE TABLE contentsafetyfiles (
+                idpackage INTEGER,
+                iddir INTEGER,
+                basename VARCHAR,
+                mtime FLOAT,
+                sha256 VARCHAR,
+                FOREIGN KEY(idpackage)
+                    REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+            );
+
+            INSERT OR IGNORE INTO dirs (dir)
+                SELECT DISTINCT rtrim(file, replace(file, '/', ''))
+                FROM content;
+            INSERT OR IGNORE INTO dirs (dir)
+                SELECT DISTINCT rtrim(file, replace(file, '/', ''))
+                FROM contentsafety;
+
+            INSERT INTO contentfiles
+                SELECT content.idpackage, dirs.iddir,
+                    substr(content.file, length(dirs.dir) + 1),
+                    content.type
+                FROM content, dirs
+                WHERE dirs.dir = rtrim(
+                    content.file, replace(content.file, '/', ''));
+            INSERT INTO contentsafetyfiles
+                SELECT contentsafety.idpackage, dirs.iddir,
+                    substr(contentsafety.file, length(dirs.dir) + 1),
+                    contentsafety.mtime, contentsafety.sha256
+                FROM contentsafety, dirs
+                WHERE dirs.dir = rtrim(
+                    contentsafety.file, replace(contentsafety.file, '/', ''));
+
+            DROP TABLE content;
+            DROP TABLE contentsafety;
+
+            CREATE VIEW content AS
+                SELECT contentfiles.idpackage AS idpackage,
+                    dirs.dir || contentfiles.basename AS file,
+                    contentfiles.type AS type
+                FROM contentfiles, dirs
+                WHERE contentfiles.iddir = dirs.iddir;
+
+            CREATE TRIGGER content_insert INSTEAD OF INSERT ON content
+            BEGIN
+                INSERT OR IGNORE INTO dirs (dir)
+                    VALUES (rtrim(NEW.file, replace(NEW.file, '/', '')));
+                INSERT INTO contentfiles
+                    SELECT NEW.idpackage, dirs.iddir,
+                        substr(NEW.file, length(dirs.dir) + 1), NEW.type
+                    FROM dirs
+                    WHERE dirs.dir = rtrim(
+                        NEW.file, replace(NEW.file, '/', ''));
+            END;
+
+            CREATE TRIGGER content_delete INSTEAD OF DELETE ON content
+            BEGIN
+                DELETE FROM contentfiles
+                WHERE idpackage = OLD.idpackage
+                    AND type IS OLD.type
+                    AND iddir = (SELECT iddir FROM dirs WHERE dir = rtrim(
+                        OLD.file, replace(OLD.file, '/', '')))
+                    AND basename = substr(OLD.file, length(rtrim(
+                        OLD.file, replace(OLD.file, '/', ''))) + 1);
+            END;
+
+            CREATE VIEW contentsafety AS
+                SELECT contentsafetyfiles.idpackage AS idpackage,
+                    dirs.dir || contentsafetyfiles.basename AS file,
+                    contentsafetyfiles.mtime AS mtime,
+                    contentsafetyfiles.sha256 AS sha256
+                FROM contentsafetyfiles, dirs
+                WHERE contentsafetyfiles.iddir = dirs.iddir;
+
+            CREATE TRIGGER contentsafety_insert
+                INSTEAD OF INSERT ON contentsafety
+            BEGIN
+                INSERT OR IGNORE INTO dirs (dir)
+                    VALUES (rtrim(NEW.file, replace(NEW.file, '/', '')));
+                INSERT INTO contentsafetyfiles
+                    SELECT NEW.idpackage, dirs.iddir,
+                        substr(NEW.file, length(dirs.dir) + 1),
+                        NEW.mtime, NEW.sha256
+                    FROM dirs
+                    WHERE dirs.dir = rtrim(
+                        NEW.file, replace(NEW.file, '/', ''));
+            END;
+
+            CREATE TRIGGER contentsafety_delete
+                INSTEAD OF DELETE ON contentsafety
+            BEGIN
+                DELETE FROM contentsafetyfiles
+                WHERE idpackage = OLD.idpackage
+                    AND iddir = (SELECT iddir FROM dirs WHERE dir = rtrim(
+                        OLD.file, replace(OLD.file, '/', '')))
+                    AND basename = substr(OLD.file, length(rtrim(
+                        OLD.file, replace(OLD.file, '/', ''))) + 1);
+            END;
+
+            COMMIT;
+        """)
+        self._cursor().execute("pragma foreign_keys = ON").fetchall()
+
+        self._clearLiveCache("_doesTableExist")
+        self._clearLiveCache("_doesColumnInTableExist")
+        self._setSetting("_content_dirs", "1")
+        self._connection().commit()
+
+        if self._indexing:
+            self._createContentIndex()
+            self._connection().commit()
+
     def _foreignKeySupport(self):
 
         # entropy.qa uses this name, must skip migration
@@ -2603,6 +3377,9 @@ class EntropySQLiteRepository(EntropySQLRepository):
         for table in tables:
             if not self._doesTableExist(table):
                 continue
+            if table == "content" and self._isContentDirs():
+                # content is a view, contentfiles has foreign keys
+                continue
 
             cur = self._cursor().execute("""
             PRAGMA foreign_key_list(%s)
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    B{Entropy Repository SQL query statistics}.
+
+    Opt-in collector of per-statement SQL statistics. Queries are
+    normalized (literals and IN lists are replaced with placeholders)
+    and aggregated by repository, keeping the number of executions,
+    the total time spent executing and fetching and the number of rows
+    returned. The report runs EXPLAIN QUERY PLAN against the slowest
+    statements of SQLite repositories.
+    Collection is disabled by default and costs an attribute lookup per
+    query when disabled. It can be enabled at runtime through
+    SQLQueryStatistics().enable() or by setting the ETP_SQL_STATS
+    environment variable: if its value is "-", the report is printed to
+    stderr at exit, otherwise the collected data is saved to the given
+    path and can be inspected later through "equo cache sqlstats".
+
+"""
+import os
+import re
+import sys
+import json
+import atexit
+import sqlite3
+import threading
+
+from entropy.core import Singleton
+from entropy.const import const_debug_write, const_isnumber, \
+    const_isunicode, const_convert_to_unicode
+
+
+class SQLQueryStat(object):
+
+    """
+    Aggregated statistics of a normalized SQL statement.
+    """
+
+    __slots__ = ("repository", "path", "sql", "sample", "params",
+                 "count", "time", "rows")
+
+    def __init__(self, repository, path, sql, sample, params):
+        self.repository = repository
+        self.path = path
+        self.sql = sql
+        self.sample = sample
+        self.params = params
+        self.count = 0
+        self.time = 0.0
+        self.rows = 0
+
+    def fetched(self, result, elapsed):
+        """
+        Account the result of a cursor fetch method. Must be called with
+        the collector lock held, see SQLQueryStatistics.fetched().
+
+        @param result: the fetch method return value
+        @type result: object
+        @param elapsed: time spent fetching, in seconds
+        @type elapsed: float
+        """
+        if result is None:
+            rows = 0
+        elif isinstance(result, list):
+            rows = len(result)
+        else:
+            rows = 1
+        self.rows += rows
+        self.time += elapsed
+
+    def to_dict(self):
+        """
+        Return a JSON serializable representation of the object.
+        """
+        return dict((x, getattr(self, x)) for x in self.__slots__)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a SQLQueryStat object from to_dict() output.
+        """
+        obj = cls(data['repository'], data['path'], data['sql'],
+                  data['sample'], data['params'])
+        obj.count = data['count']
+        obj.time = data['time']
+        obj.rows = data['rows']
+        return obj
+
+
+class SQLQueryStatistics(Singleton):
+
+    """
+    Entropy Repository SQL query statistics collector.
+    """
+
+    # environment variable enabling the collector, see module docstring
+    ENV_VAR = "ETP_SQL_STATS"
+
+    # maximum number of memoized statement normalizations
+    MAX_NORMALIZED = 10000
+
+    _WHITESPACE_RE = re.compile(r"\s+")
+    _STRING_RE = re.compile(r"'(?:[^']|'')*'")
+    _NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+    _IN_LIST_RE = re.compile(
+        r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+
+    # maximum length of the statements shown in the report
+    MAX_SQL_LENGTH = 500
+
+    # statements that can be passed to EXPLAIN QUERY PLAN
+    _EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE",
+                    "REPLACE", "WITH")
+
+    def init_singleton(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._stats = {}
+        self._normalized = {}
+        self._enabled = False
+        self._path = os.getenv(SQLQueryStatistics.ENV_VAR)
+        if self._path:
+            self.enable()
+            atexit.register(self._atexit_dump)
+
+    def enable(self):
+        """
+        Enable statistics collection.
+        """
+        self._enabled = True
+
+    def disable(self):
+        """
+        Disable statistics collection, collected data is kept.
+        """
+        self._enabled = False
+
+    def enabled(self):
+        """
+        Return whether statistics collection is enabled.
+
+        @rtype: bool
+        """
+        return self._enabled
+
+    def clear(self):
+        """
+        Drop all the collected data.
+        """
+        with self._lock:
+            self._stats.clear()
+
+    def normalize(self, sql):
+        """
+        Normalize a SQL statement, replacing literals with placeholders,
+        collapsing IN lists and whitespaces, so that statements differing
+        just by their values are aggregated together.
+
+        @param sql: SQL statement
+        @type sql: string
+        @return: the normalized statement
+        @rtype: string
+        """
+        normalized = self._normalized.get(sql)
+        if normalized is not None:
+            return normalized
+
+        normalized = self._WHITESPACE_RE.sub(" ", sql).strip()
+        normalized = self._STRING_RE.sub("?", normalized)
+        normalized = self._NUMBER_RE.sub("?", normalized)
+        normalized = self._IN_LIST_RE.sub("IN (...)", normalized)
+        normalized = normalized.rstrip(";").rstrip()
+
+        if len(self._normalized) >= SQLQueryStatistics.MAX_NORMALIZED:
+            self._normalized.clear()
+        self._normalized[sql] = normalized
+        return normalized
+
+    def _sample_params(self, params):
+        """
+        Return the query parameters if they are JSON serializable
+        scalars, otherwise None.
+        """
+        if not isinstance(params, (list, tuple)):
+            return None
+        for param in params:
+            if param is None or const_isnumber(param):
+                continue
+            if const_isunicode(param):
+                continue
+            if isinstance(param, str):
+                continue
+            return None
+        return list(params)
+
+    def record(self, owner, sql, params, elapsed):
+        """
+        Account a query execution.
+
+        @param owner: (repository name, repository path) tuple, or None
+        @type owner: tuple
+        @param sql: the executed SQL statement
+        @type sql: string
+        @param params: the query parameters, if any
+        @type params: list or tuple
+        @param elapsed: execution time, in seconds
+        @type elapsed: float
+        @return: the statistics entry the query has been aggregated to,
+            fetch statistics are accounted through its fetched() method
+        @rtype: SQLQueryStat
+        """
+        if owner is None:
+            repository, path = None, None
+        else:
+            repository, path = owner
+        if not sql:
+            sql = ""
+        if not const_isunicode(sql):
+            sql = const_convert_to_unicode(sql)
+        normalized = self.normalize(sql)
+
+        key = (repository, normalized)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = SQLQueryStat(repository, path, normalized, sql,
+                                    self._sample_params(params))
+                self._stats[key] = stat
+            stat.count += 1
+            stat.time += elapsed
+        return stat
+
+    def fetched(self, stat, result, elapsed):
+        """
+        Account the result of a cursor fetch method to the statistics
+        entry returned by record(), if collection is still enabled.
+
+        @param stat: the statistics entry of the executed query
+        @type stat: SQLQueryStat
+        @param result: the fetch method return value
+        @type result: object
+        @param elapsed: time spent fetching, in seconds
+        @type elapsed: float
+        """
+        if not self._enabled:
+            return
+        with self._lock:
+            stat.fetched(result, elapsed)
+
+    def statistics(self):
+        """
+        Return the collected statistics, sorted by total time (descending).
+
+        @return: list of SQLQueryStat objects
+        @rtype: list
+        """
+        with self._lock:
+            stats = list(self._stats.values())
+        stats.sort(key = lambda x: (-x.time, -x.count, x.sql))
+        return stats
+
+    def save(self, path):
+        """
+        Save the collected statistics to file, in JSON format.
+
+        @param path: destination path
+        @type path: string
+        @raise IOError: if the file cannot be written
+        @raise OSError: same as above
+        """
+        data = [x.to_dict() for x in self.statistics()]
+        tmp_path = "%s.%s.tmp" % (path, os.getpid())
+        with open(tmp_path, "w") as stats_f:
+            json.dump(data, stats_f)
+        os.rename(tmp_path, path)
+
+    def load(self, path):
+        """
+        Load statistics previously written by save() and merge them with
+        the collected ones.
+
+        @param path: statistics file path
+        @type path: string
+        @raise IOError: if the file cannot be read
+        @raise OSError: same as above
+        @raise ValueError: if the file content is invalid
+        """
+        with open(path, "r") as stats_f:
+            data = json.load(stats_f)
+
+        with self._lock:
+            for item in data:
+                stat = SQLQueryStat.from_dict(item)
+                key = (stat.repository, stat.sql)
+                current = self._stats.get(key)
+                if current is None:
+                    self._stats[key] = stat
+                    continue
+                current.count += stat.count
+                current.time += stat.time
+                current.rows += stat.rows
+
+    def _explain(self, stat):
+        """
+        Return the EXPLAIN QUERY PLAN output lines of the given
+        statement, or None if the statement cannot be explained.
+        """
+        path = stat.path
+        if not path or not os.path.isfile(path):
+            return None
+        if stat.sample.lstrip().split(" ", 1)[0].upper() \
+                not in self._EXPLAINABLE:
+            return None
+        if ";" in stat.sql:
+            # scripts cannot be explained
+            return None
+
+        params = stat.params
+        if params is None:
+            # run the normalized statement with NULL parameters, the plan
+            # does not depend on them
+            sql = stat.sql.replace("IN (...)", "IN (?)")
+            params = [None] * sql.count("?")
+        else:
+            sql = stat.sample
+
+        try:
+            conn = sqlite3.connect(path)
+            try:
+                cur = conn.execute("EXPLAIN QUERY PLAN " + sql, params)
+                return [" ".join(str(x) for x in row[1:]) for \
+                            row in cur.fetchall()]
+            finally:
+                conn.close()
+        except (sqlite3.Error, sqlite3.Warning) as err:
+            return ["cannot explain: %s" % (err,)]
+
+    def report(self, out = None, limit = 20, explain = 5):
+        """
+        Write a human readable report of the collected statistics.
+
+        @keyword out: file object to write to, stdout if None
+        @type out: file
+        @keyword limit: maximum number of statements reported
+        @type limit: int
+        @keyword explain: number of the slowest statements passed to
+            EXPLAIN QUERY PLAN
+        @type explain: int
+        """
+        if out is None:
+            out = sys.stdout
+        stats = self.statistics()
+
+        total_time = sum(x.time for x in stats)
+        total_count = sum(x.count for x in stats)
+        out.write("SQL query statistics: %d statements, %d queries, "
+                  "%.3fs\n" % (len(stats), total_count, total_time))
+
+        for index, stat in enumerate(stats[:limit]):
+            out.write("\n%3d. [%s] %d calls, %.3fs total, %.3fms avg, "
+                      "%d rows\n" % (
+                    index + 1, stat.repository, stat.count, stat.time,
+                    stat.time * 1000.0 / max(stat.count, 1), stat.rows))
+            sql = stat.sql
+            if len(sql) > SQLQueryStatistics.MAX_SQL_LENGTH:
+                sql = sql[:SQLQueryStatistics.MAX_SQL_LENGTH] + "..."
+            out.write("     %s\n" % (sql,))
+            if index >= explain:
+                continue
+            plan = self._explain(stat)
+            if plan:
+                for line in plan:
+                    out.write("       | %s\n" % (line,))
+        out.flush()
+
+    def _atexit_dump(self):
+        """
+        Write the report or save the statistics at exit,
+        if ETP_SQL_STATS is set.
+        """
+        path = self._path
+        if path == "-":
+            self.report(out = sys.stderr)
+            return
+        if os.getpid() != self._pid:
+            # forked process, do not overwrite the parent statistics
+            path = "%s.%s" % (path, os.getpid())
+        try:
+            self.save(path)
+        except (IOError, OSError) as err:
+            const_debug_write(__name__,
+                "cannot write SQL statistics to %s: %s" % (path, err,))
@@ -21,16 +21,31 @@
     they must be "pickable". Please read Python Library reference for
     more information.
 
+    dumpobj() writes a small header (format version, codec, codec version
+    and interpreter version) followed by the payload, encoded with the
+    fastest codec available for the running interpreter: marshal, if the
+    object is only made of builtin types, or the highest binary pickle
+    protocol. loadobj() handles objects that cannot be decoded by the
+    running interpreter as missing and transparently loads header-less
+    pickle files (as written by older versions and with portable=True).
+
 """
 
 import sys
 import os
+import errno
+import marshal
+import struct
 import time
 
 from entropy.const import etpConst, const_setup_file, const_is_python3, \
     const_mkstemp
-# Always use MAX pickle protocol to <=2, to allow Python 2 and 3 support
+# pickle protocol used by serialize() and serialize_string(),
+# their output is readable by any Python 2 and 3 interpreter
 COMPAT_PICKLE_PROTOCOL = 0
+# pickle protocol used by dumpobj(portable = True), readable by any
+# Python 2 and 3 interpreter as well
+PORTABLE_PICKLE_PROTOCOL = 2
 
 if const_is_python3():
     import pickle
@@ -40,8 +55,22 @@ else:
     except ImportError:
         import pickle
 
-pickle.HIGHEST_PROTOCOL = COMPAT_PICKLE_PROTOCOL
-pickle.DEFAULT_PROTOCOL = COMPAT_PICKLE_PROTOCOL
+# dumpobj() header: magic, format version, codec, codec version,
+# writer Python major and minor version
+DUMP_MAGIC = b"ETPDUMP"
+DUMP_FORMAT_VERSION = 1
+DUMP_CODEC_PICKLE = 0
+DUMP_CODEC_MARSHAL = 1
+_DUMP_HEADER = struct.Struct("!7sBBBBB")
+
+if const_is_python3():
+    _MARSHAL_TYPES = frozenset([
+        type(None), bool, int, float, str, bytes,
+        tuple, list, dict, set, frozenset])
+else:
+    _MARSHAL_TYPES = frozenset([
+        type(None), bool, int, long, float, str, unicode,
+        tuple, list, dict, set, frozenset])
 
 D_EXT = etpConst['cachedumpext']
 D_DIR = etpConst['dumpstoragedir']
@@ -50,8 +79,88 @@ if E_GID == None:
     E_GID = 0
 
 
+def _is_marshallable(my_object):
+    """
+    Return whether the given object is made only of builtin types that
+    marshal can encode without loss (marshal silently turns buffer
+    objects and some subclasses into their base types).
+    """
+    marshal_types = _MARSHAL_TYPES
+    stack = [my_object]
+    while stack:
+        obj = stack.pop()
+        obj_type = type(obj)
+        if obj_type not in marshal_types:
+            return False
+        if obj_type is dict:
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif obj_type in (tuple, list, set, frozenset):
+            stack.extend(obj)
+    return True
+
+def _write_object(dmp_f, my_object, portable):
+    """
+    Write the dumpobj() representation of my_object to dmp_f.
+    """
+    if portable:
+        if const_is_python3():
+            pickle.dump(my_object, dmp_f,
+                protocol = PORTABLE_PICKLE_PROTOCOL, fix_imports = True)
+        else:
+            pickle.dump(my_object, dmp_f, PORTABLE_PICKLE_PROTOCOL)
+        return
+
+    major, minor = sys.version_info[:2]
+    if _is_marshallable(my_object):
+        dmp_f.write(_DUMP_HEADER.pack(
+                DUMP_MAGIC, DUMP_FORMAT_VERSION, DUMP_CODEC_MARSHAL,
+                marshal.version, major, minor))
+        dmp_f.write(marshal.dumps(my_object))
+        return
+
+    dmp_f.write(_DUMP_HEADER.pack(
+            DUMP_MAGIC, DUMP_FORMAT_VERSION, DUMP_CODEC_PICKLE,
+            pickle.HIGHEST_PROTOCOL, major, minor))
+    pickle.dump(my_object, dmp_f, pickle.HIGHEST_PROTOCOL)
+
+def _read_object(dmp_f):
+    """
+    Read an object written by _write_object() (or a plain pickle) from
+    dmp_f. Return None if the object cannot be decoded by the running
+    interpreter.
+    """
+    # small cache files are the common case, read them in one go
+    data = dmp_f.read()
+    if not data.startswith(DUMP_MAGIC):
+        # header-less pickle
+        return unserialize_string(data)
+
+    header_size = _DUMP_HEADER.size
+    if len(data) < header_size:
+        return None
+    (_magic, format_version, codec, codec_version,
+     major, minor) = _DUMP_HEADER.unpack(data[:header_size])
+    if format_version != DUMP_FORMAT_VERSION:
+        return None
+
+    if codec == DUMP_CODEC_MARSHAL:
+        # the marshal format is interpreter specific
+        if (major, minor) != sys.version_info[:2]:
+            return None
+        if codec_version != marshal.version:
+            return None
+        return marshal.loads(data[header_size:])
+
+    if codec == DUMP_CODEC_PICKLE:
+        if codec_version > pickle.HIGHEST_PROTOCOL:
+            return None
+        return unserialize_string(data[header_size:])
+
+    return None
+
 def dumpobj(name, my_object, complete_path = False, ignore_exceptions = True,
-    dump_dir = None, custom_permissions = None):
+    dump_dir = None, custom_permissions = None, portable = False):
     """
     Dump pickable object to file
 
@@ -70,6 +179,11 @@ def dumpobj(name, my_object, complete_path = False, ignore_exceptions = True,
     @type dump_dir: string
     @keyword custom_permissions: give custom permission bits
     @type custom_permissions: octal
+    @keyword portable: write a plain pickle that can be loaded by any
+        Python interpreter and older Entropy versions, instead of the
+        fastest format for the running interpreter. Use it for persistent
+        data, rather than caches.
+    @type portable: bool
     @return: None
     @rtype: None
     @raise EOFError: could be caused by pickle.dump, ignored if
@@ -114,16 +228,13 @@ def dumpobj(name, my_object, complete_path = False, ignore_exceptions = True,
             # is causing EBADF. There is probably a race
             # condition down in the stack.
             with open(tmp_dmpfile, "wb") as dmp_f:
-                if const_is_python3():
-                    pickle.dump(my_object, dmp_f,
-                        protocol = COMPAT_PICKLE_PROTOCOL, fix_imports = True)
-                else:
-                    pickle.dump(my_object, dmp_f)
+                _write_object(dmp_f, my_object, portable)
 
             const_setup_file(tmp_dmpfile, E_GID, custom_permissions)
             os.rename(tmp_dmpfile, dmpfile)
 
-        except RuntimeError:
+        except (RuntimeError, ValueError):
+            # ValueError: marshal, object too deep or too large
             try:
                 os.remove(dmpfile)
             except OSError:
@@ -236,7 +347,8 @@ def loadobj(name, complete_path = False, dump_dir = None, aging_days = None):
     @keyword aging_days: if int, consider the cached file invalid
         if older than aging_days.
     @type aging_days: int
-    @return: object or None
+    @return: object or None (also if the object has been written by
+        an incompatible interpreter)
     @rtype: any Python pickable object or None
     """
     if dump_dir is None:
@@ -269,11 +381,7 @@ def loadobj(name, complete_path = False, dump_dir = None, aging_days = None):
             with open(dmpfile, "rb") as dmp_f:
                 obj = None
                 try:
-                    if const_is_python3():
-                        obj = pickle.load(dmp_f, fix_imports = True,
-                            encoding = etpConst['conf_raw_encoding'])
-                    else:
-                        obj = pickle.load(dmp_f)
+                    obj = _read_object(dmp_f)
                 except (ValueError, EOFError, IOError,
                     OSError, pickle.UnpicklingError, TypeError,
                     AttributeError, ImportError, SystemError,):
@@ -72,12 +72,18 @@ class UrlFetcher(TextInterface):
     TIMEOUT_FETCH_ERROR = "-4"
     GENERIC_FETCH_WARN = "-2"
 
+    # segmented downloads: number of concurrent connections and
+    # minimum size of a segment (in bytes).
+    SEGMENT_CONNECTIONS = 4
+    SEGMENT_MIN_SIZE = 1048576
+
     def __init__(self, url, path_to_save, checksum = True,
                  show_speed = True, resume = True,
                  abort_check_func = None, disallow_redirect = False,
                  thread_stop_func = None, speed_limit = None,
                  timeout = None, download_context_func = None,
-                 pre_download_hook = None, post_download_hook = None):
+                 pre_download_hook = None, post_download_hook = None,
+                 mirror_urls = None, segment_threshold = 0):
         """
         Entropy URL downloader constructor.
 
@@ -124,6 +130,14 @@ class UrlFetcher(TextInterface):
             The function takes a path (the download path) and the download
             status and the download id as arguments.
         @type post_download_hook: callable
+        @keyword mirror_urls: list of alternative URLs of the same file,
+            used to spread segmented downloads across several mirrors and
+            to retry the failed segments.
+        @type mirror_urls: list
+        @keyword segment_threshold: minimum size (in kb) of the files that
+            are downloaded in segments, through multiple concurrent HTTP
+            Range requests. 0 (the default) disables segmented downloads.
+        @type segment_threshold: int
         """
         self.__supported_uris = {
             'file': self._urllib_download,
@@ -145,6 +159,9 @@ class UrlFetcher(TextInterface):
                 self.__system_settings['repositories']['timeout']
         else:
             self.__timeout = timeout
+
+        self.__segment_threshold = segment_threshold
+        self.__mirror_urls = mirror_urls or []
         self.__th_id = 0
 
         if download_context_func is None:
@@ -181,6 +198,7 @@ class UrlFetcher(TextInterface):
         self.__use_md5_checksum = False
         self.__md5_checksum = hashlib.new("md5")
         self.__resumed = False
+        self.__missing = False
         self.__buffersize = 8192
         self.__status = None
         self.__remotefile = None
@@ -326,6 +344,66 @@ class UrlFetcher(TextInterface):
         protocol = UrlFetcher._get_url_protocol(url)
         return UrlFetcher._supported_differential_download.get(protocol, False)
 
+    @staticmethod
+    def probe(url, size = 65536, timeout = None):
+        """
+        Probe the given URL by fetching at most size bytes of it through
+        a ranged request, without writing anything to disk. This is used
+        to quickly estimate the latency and throughput of download mirrors.
+        Only the protocols supported by urllib are handled.
+
+        @param url: URL to probe
+        @type url: string
+        @keyword size: maximum amount of bytes to fetch
+        @type size: int
+        @keyword timeout: custom request timeout value (in seconds), if None
+            the value is read from Entropy configuration files.
+        @type timeout: int
+        @return: tuple composed by latency (seconds until the first chunk of
+            data has been received), amount of bytes read and total elapsed
+            time (seconds) or None, if the probe failed
+        @rtype: tuple or None
+        """
+        system_settings = SystemSettings()
+        if timeout is None:
+            timeout = system_settings['repositories']['timeout']
+        UrlFetcher._setup_urllib_proxy_data(
+            system_settings['system']['proxy'])
+
+        url_protocol = UrlFetcher._get_url_protocol(url)
+        if url_protocol in ("http", "https"):
+            headers = {
+                'User-Agent': "Entropy/%s" % (etpConst['entropyversion'],),
+                'Range': "bytes=0-%d" % (size - 1,),
+            }
+            req = urlmod.Request(url, headers = headers)
+        else:
+            req = url
+
+        remotefile = None
+        start_time = time.time()
+        try:
+            remotefile = urlmod.urlopen(req, None, timeout)
+            data = remotefile.read(min(size, 8192))
+            latency = time.time() - start_time
+            transferred = len(data)
+            while data and transferred < size:
+                data = remotefile.read(min(size - transferred, 8192))
+                transferred += len(data)
+        except (httplib.HTTPException, urlmod_error.URLError,
+                socket.error, socket.timeout, ValueError) as err:
+            const_debug_write(__name__,
+                "UrlFetcher.probe(%s): error: %s" % (url, repr(err),))
+            return None
+        finally:
+            if remotefile is not None:
+                try:
+                    remotefile.close()
+                except (IOError, OSError, socket.error):
+                    pass
+
+        return latency, transferred, time.time() - start_time
+
     def set_id(self, th_id):
         """
         Set instance id (usually the thread identifier).
@@ -548,8 +626,15 @@ class UrlFetcher(TextInterface):
         """
         Setup urllib proxy data
         """
+        UrlFetcher._setup_urllib_proxy_data(
+            self.__system_settings['system']['proxy'])
+
+    @staticmethod
+    def _setup_urllib_proxy_data(proxy_data):
+        """
+        Setup urllib proxy data using the given proxy configuration.
+        """
         mydict = {}
-        proxy_data = self.__system_settings['system']['proxy']
         if proxy_data['ftp']:
             mydict['ftp'] = proxy_data['ftp']
         if proxy_data['http']:
@@ -610,6 +695,9 @@ class UrlFetcher(TextInterface):
                     req = url
                     u_agent_error = True
                     continue
+                if e.code in (404, 410):
+                    # the mirror is fine, the file is not there
+                    self.__missing = True
                 self.__urllib_close(True)
                 self.__status = UrlFetcher.GENERIC_FETCH_ERROR
                 do_return = True
@@ -659,6 +747,9 @@ class UrlFetcher(TextInterface):
         except ValueError:
             pass
 
+        if self.__segmented_download_wanted(url_protocol):
+            return self.__segmented_download(user_agent)
+
         try:
             # i don't remember why this is needed
             # the whole code here is crap and written at
@@ -759,14 +850,7 @@ class UrlFetcher(TextInterface):
                 return self.__status
 
             self.__urllib_commit(rsx)
-            if self.__show_speed:
-                self.handle_statistics(self.__th_id, self.__downloadedsize,
-                    self.__remotesize, self.__average, self.__oldaverage,
-                    self.__updatestep, self.__show_speed, self.__datatransfer,
-                    self.__time_remaining, self.__time_remaining_secs
-                )
-                self.update()
-                self.__oldaverage = self.__average
+            self.__urllib_statistics()
             if self.__speedlimit:
                 while self.__datatransfer > self.__speedlimit*1000:
                     time.sleep(0.1)
@@ -785,6 +869,9 @@ class UrlFetcher(TextInterface):
         self.__md5_checksum.update(mybuffer)
         # update progress info
         self.__downloadedsize = self.__localfile.tell()
+        self.__urllib_update_average()
+
+    def __urllib_update_average(self):
         kbytecount = float(self.__downloadedsize)/1000
         # avoid race condition with test and eval not being atomic
         # this will always work
@@ -797,6 +884,278 @@ class UrlFetcher(TextInterface):
         self.__average = average
         self._update_speed()
 
+    def __urllib_statistics(self):
+        if self.__show_speed:
+            self.handle_statistics(self.__th_id, self.__downloadedsize,
+                self.__remotesize, self.__average, self.__oldaverage,
+                self.__updatestep, self.__show_speed, self.__datatransfer,
+                self.__time_remaining, self.__time_remaining_secs
+            )
+            self.update()
+            self.__oldaverage = self.__average
+
+    def __segmented_download_wanted(self, url_protocol):
+        """
+        Return whether the file should be downloaded in segments,
+        see __segmented_download().
+        """
+        if url_protocol not in ("http", "https"):
+            return False
+        if not self.__segment_threshold:
+            return False
+
+        accept_ranges = self.__remotefile.headers.get("accept-ranges", "")
+        if accept_ranges.strip().lower() != "bytes":
+            return False
+
+        remaining = self.__remotesize - self.__startingposition
+        return remaining >= self.__segment_threshold * 1000
+
+    def __segmented_download(self, user_agent):
+        """
+        Download the file in segments, through HTTP Range requests issued
+        by concurrent connections to the download URL and to the
+        alternative mirror URLs. Segments are written into the preallocated
+        local file and the failed ones are retried on the other URLs.
+        """
+        try:
+            self.__remotefile.close()
+        except socket.error:
+            pass
+        self.__remotefile = None
+
+        total_size = self.__remotesize
+        start_position = self.__startingposition
+        self.__remotesize = float(total_size)/1000
+        # the md5 is calculated at the end, data is not written in order
+        self.__use_md5_checksum = False
+
+        try:
+            self.__localfile.close()
+            self.__localfile = open(self.__path_to_save, "r+b")
+            self.__localfile.truncate(total_size)
+        except (IOError, OSError) as err:
+            const_debug_write(__name__,
+                "__segmented_download: cannot preallocate %s: %s" % (
+                    self.__path_to_save, repr(err),))
+            self.__urllib_close(True)
+            self.__status = UrlFetcher.GENERIC_FETCH_ERROR
+            return self.__status
+
+        remaining = total_size - start_position
+        segment_size = max(
+            UrlFetcher.SEGMENT_MIN_SIZE,
+            remaining // (UrlFetcher.SEGMENT_CONNECTIONS * 4) + 1)
+        segments = []
+        for offset in range(start_position, total_size, segment_size):
+            segments.append(
+                (offset, min(offset + segment_size, total_size), frozenset()))
+
+        urls = [self.__url]
+        for url in self.__mirror_urls:
+            if url not in urls:
+                urls.append(url)
+
+        state = {
+            'lock': threading.Lock(),
+            'segments': segments,
+            'pending': 0,
+            'downloaded': 0,
+            'urls': urls,
+            'broken': set(),
+            'user_agent': user_agent,
+            'total_size': total_size,
+            'status': None,
+            'last_status': None,
+            'stop': False,
+        }
+
+        threads = []
+        connections = min(UrlFetcher.SEGMENT_CONNECTIONS, len(segments))
+        for url_index in range(connections):
+            thread = threading.Thread(
+                target = self.__segmented_worker,
+                args = (state, url_index))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        def _close(errored):
+            state['stop'] = True
+            for thread in threads:
+                thread.join()
+            # the download is incomplete, do not leave holes
+            # around and keep what we had.
+            try:
+                self.__localfile.truncate(start_position)
+            except (IOError, OSError):
+                pass
+            self.__urllib_close(errored)
+
+        try:
+            while True:
+                alive = [x for x in threads if x.is_alive()]
+                if not alive:
+                    break
+                alive[0].join(self.__updatestep)
+
+                if self.__abort_check_func != None:
+                    self.__abort_check_func()
+                if self.__thread_stop_func != None:
+                    self.__thread_stop_func()
+
+                with state['lock']:
+                    self.__downloadedsize = start_position + \
+                        state['downloaded']
+                self.__urllib_update_average()
+                self.__urllib_statistics()
+
+        except KeyboardInterrupt:
+            _close(False)
+            raise
+
+        except Exception:
+            _close(True)
+            self.__status = UrlFetcher.GENERIC_FETCH_ERROR
+            return self.__status
+
+        self.__downloadedsize = start_position + state['downloaded']
+        self.__urllib_update_average()
+        if state['status'] is not None or state['segments'] or \
+                self.__downloadedsize != total_size:
+            _close(True)
+            self.__status = state['status']
+            if self.__status is None:
+                self.__status = UrlFetcher.GENERIC_FETCH_ERROR
+            return self.__status
+
+        self.__urllib_close(False)
+        return self.__prepare_return()
+
+    def __segmented_worker(self, state, url_index):
+        """
+        Segmented download worker thread body, it keeps fetching segments
+        until there are no more left.
+        """
+        urls = state['urls']
+        # every worker starts from a different URL
+        urls = urls[url_index % len(urls):] + urls[:url_index % len(urls)]
+
+        while True:
+            with state['lock']:
+                if state['stop']:
+                    return
+                segment = None
+                if state['segments']:
+                    segment = state['segments'].pop(0)
+                    state['pending'] += 1
+                elif not state['pending']:
+                    return
+
+            if segment is None:
+                # other workers may hand failed segments back
+                time.sleep(0.1)
+                continue
+
+            start, end, failed = segment
+            with state['lock']:
+                candidates = [x for x in urls if x not in failed
+                              and x not in state['broken']]
+                if not candidates:
+                    # no more URLs to retry this segment with
+                    state['pending'] -= 1
+                    state['segments'].append(segment)
+                    if state['status'] is None:
+                        state['status'] = state['last_status']
+                    state['stop'] = True
+                    return
+
+            url = candidates[0]
+            position, status = self.__fetch_segment(state, url, start, end)
+            with state['lock']:
+                state['pending'] -= 1
+                if status is not None:
+                    state['last_status'] = status
+                    if position < end:
+                        state['segments'].append(
+                            (position, end, failed | frozenset([url])))
+
+    def __fetch_segment(self, state, url, start, end):
+        """
+        Fetch the [start, end) byte range of the file from the given URL
+        and write it to the local file. Return a tuple composed by the
+        position reached and the error status (None, on success).
+        """
+        headers = {
+            'User-Agent': state['user_agent'],
+            'Range': "bytes=%d-%d" % (start, end - 1),
+        }
+
+        position = start
+        remotefile = None
+        try:
+            request = urlmod.Request(self.__encode_url(url), headers = headers)
+            remotefile = urlmod.urlopen(request, None, self.__timeout)
+
+            content_range = remotefile.headers.get("content-range", "")
+            if remotefile.getcode() != 206 or \
+                    not content_range.startswith("bytes %d-" % (start,)):
+                # Range requests are not supported, stop using this URL
+                with state['lock']:
+                    state['broken'].add(url)
+                return position, UrlFetcher.GENERIC_FETCH_ERROR
+
+            remote_size = content_range.rpartition("/")[2].strip()
+            if remote_size != str(state['total_size']):
+                # a different (or half synced) file, stop using this URL
+                with state['lock']:
+                    state['broken'].add(url)
+                return position, UrlFetcher.GENERIC_FETCH_ERROR
+
+            if self.__disallow_redirect and \
+                    (self.__encode_url(url) != remotefile.geturl()):
+                with state['lock']:
+                    state['broken'].add(url)
+                return position, UrlFetcher.GENERIC_FETCH_ERROR
+
+            while position < end:
+                if state['stop']:
+                    return position, UrlFetcher.GENERIC_FETCH_ERROR
+
+                data = remotefile.read(min(65536, end - position))
+                if not data:
+                    # connection closed prematurely
+                    return position, UrlFetcher.GENERIC_FETCH_ERROR
+
+                with state['lock']:
+                    self.__localfile.seek(position)
+                    self.__localfile.write(data)
+                    state['downloaded'] += len(data)
+                position += len(data)
+
+                while self.__speedlimit and not state['stop'] and \
+                        self.__datatransfer > self.__speedlimit*1000:
+                    time.sleep(0.1)
+
+        except socket.timeout:
+            return position, UrlFetcher.TIMEOUT_FETCH_ERROR
+
+        except (httplib.HTTPException, urlmod_error.URLError,
+                socket.error, IOError, ValueError) as err:
+            const_debug_write(__name__,
+                "__fetch_segment(%s, %s, %s): error: %s" % (
+                    url, start, end, repr(err),))
+            return position, UrlFetcher.GENERIC_FETCH_ERROR
+
+        finally:
+            if remotefile is not None:
+                try:
+                    remotefile.close()
+                except socket.error:
+                    pass
+
+        return position, None
+
     def __urllib_close(self, errored):
         self._update_speed()
         try:
@@ -889,6 +1248,13 @@ class UrlFetcher(TextInterface):
         """
         return self.__resumed
 
+    def is_missing(self):
+        """
+        Return whether given download failed because the remote file
+        does not exist (HTTP 404 or 410).
+        """
+        return self.__missing
+
     def handle_statistics(self, th_id, downloaded_size, total_size,
             average, old_average, update_step, show_speed, data_transfer,
             time_remaining, time_remaining_secs):
@@ -976,7 +1342,8 @@ class MultipleUrlFetcher(TextInterface):
                  abort_check_func = None, disallow_redirect = False,
                  url_fetcher_class = None, timeout = None,
                  download_context_func = None,
-                 pre_download_hook = None, post_download_hook = None):
+                 pre_download_hook = None, post_download_hook = None,
+                 mirror_urls = None, segment_threshold = 0):
         """
         @param url_path_list: list of tuples composed by url and
             path to save, for eg. [(url,path_to_save,),...]
@@ -1020,6 +1387,13 @@ class MultipleUrlFetcher(TextInterface):
             The function takes a path (the download path) and the download
             status and the download id as arguments.
         @type post_download_hook: callable
+        @keyword mirror_urls: dict keyed by URL (as found in url_path_list)
+            containing the list of alternative URLs of the same file,
+            see UrlFetcher.
+        @type mirror_urls: dict
+        @keyword segment_threshold: minimum size (in kb) of the files that
+            are downloaded in segments, see UrlFetcher.
+        @type segment_threshold: int
         """
         self._progress_data = {}
         self._url_path_list = url_path_list
@@ -1034,12 +1408,15 @@ class MultipleUrlFetcher(TextInterface):
         self.__download_context_func = download_context_func
         self.__pre_download_hook = pre_download_hook
         self.__post_download_hook = post_download_hook
+        self.__mirror_urls = mirror_urls or {}
+        self.__segment_threshold = segment_threshold
 
         # important to have a declaration here
         self.__data_transfer = 0
         self.__average = 0
         self.__old_average = 0
         self.__time_remaining_secs = 0
+        self.__downloaders = {}
 
         self.__url_fetcher = url_fetcher_class
         if self.__url_fetcher == None:
@@ -1053,6 +1430,7 @@ class MultipleUrlFetcher(TextInterface):
         self._progress_data.clear()
         self._progress_data_lock = threading.Lock()
         self.__thread_pool = {}
+        self.__downloaders = {}
         self.__download_statuses = {}
         self.__show_progress = False
         self.__stop_threads = False
@@ -1128,9 +1506,12 @@ class MultipleUrlFetcher(TextInterface):
                 timeout = self.__timeout,
                 download_context_func = self.__download_context_func,
                 pre_download_hook = self.__pre_download_hook,
-                post_download_hook = self.__post_download_hook
+                post_download_hook = self.__post_download_hook,
+                mirror_urls = self.__mirror_urls.get(url),
+                segment_threshold = self.__segment_threshold
             )
             downloader.set_id(th_id)
+            self.__downloaders[th_id] = downloader
 
             def do_download(ds, dth_id, downloader):
                 ds[dth_id] = downloader.download()
@@ -1182,6 +1563,22 @@ class MultipleUrlFetcher(TextInterface):
         """
         return self.__data_transfer
 
+    def is_missing(self, download_id):
+        """
+        Return whether the download with the given id failed because the
+        remote file does not exist (HTTP 404 or 410), see
+        UrlFetcher.is_missing().
+
+        @param download_id: download id, as passed to the download hooks
+        @type download_id: int
+        @return: True, if the remote file does not exist
+        @rtype: bool
+        """
+        downloader = self.__downloaders.get(download_id)
+        if downloader is None:
+            return False
+        return downloader.is_missing()
+
     def get_average(self):
         """
         Get current download percentage.
@@ -1295,7 +1295,20 @@ class QAInterface(TextInterface, EntropyPluginStore):
         """
         results = []
 
+        indexed = set(entropy_client.repositories())
+        providers = {}
+        if indexed.intersection(repositories):
+            for repository_id, pkg_id, _keyslot, path in \
+                    entropy_client.library_providers(
+                        library_name, elfclass = elfclass):
+                obj = providers.setdefault(repository_id, [])
+                obj.append((pkg_id, repository_id, path))
+
         for repository_id in repositories:
+            if repository_id in indexed:
+                results.extend(providers.get(repository_id, []))
+                continue
+
             repo = entropy_client.open_repository(repository_id)
             data_solved = repo.resolveNeeded(library_name,
                 elfclass = elfclass, extended = True)
@@ -1363,17 +1376,35 @@ class QAInterface(TextInterface, EntropyPluginStore):
         @rtype: tuple
         """
 
-        def populate_caches(pkg_id, repo, provided_libs, scope_cache):
+        def group_by_repository(package_matches):
             """
-            Populate provided_libs and scope_cache structures.
+            Group package matches by repository, to be able to use
+            the batch repository methods.
             """
-            provided_libs_set = repo.retrieveProvidedLibraries(pkg_id)
-            for pkg_lib, pkg_libpath, pkg_elfclass in provided_libs_set:
-                obj = provided_libs.setdefault((pkg_lib, pkg_elfclass), set())
-                obj.add(pkg_libpath)
+            repo_map = {}
+            for pkg_id, repo_id in package_matches:
+                obj = repo_map.setdefault(repo_id, [])
+                obj.append(pkg_id)
+            return repo_map
 
-            key, slot = repo.retrieveKeySlot(pkg_id)
-            scope_cache.add((key, slot))
+        def populate_caches(package_matches, provided_libs, scope_cache):
+            """
+            Populate provided_libs and scope_cache structures.
+            """
+            repo_map = group_by_repository(package_matches)
+            for repo_id, pkg_ids in repo_map.items():
+                repo = entropy_client.open_repository(repo_id)
+                provided_libs_map = repo.retrieveProvidedLibrariesMany(
+                    pkg_ids)
+                for provided_libs_set in provided_libs_map.values():
+                    for pkg_lib, pkg_libpath, pkg_elfclass in \
+                            provided_libs_set:
+                        obj = provided_libs.setdefault(
+                            (pkg_lib, pkg_elfclass), set())
+                        obj.add(pkg_libpath)
+
+                scope_cache.update(
+                    repo.retrieveKeySlotMany(pkg_ids).values())
 
         repos = list(entropy_client.repositories())
         package_id, repository_id = package_match
@@ -1393,15 +1424,16 @@ class QAInterface(TextInterface, EntropyPluginStore):
         dependencies = self.get_deep_dependency_list(entropy_client,
             package_match, atoms = True)
 
+        dependency_matches = []
         for dependency in dependencies:
             pkg_id, repo_id = entropy_client.atom_match(dependency)
             if pkg_id == -1:
                 continue
-            dep_repo = entropy_client.open_repository(repo_id)
-            populate_caches(pkg_id, dep_repo, provided_libs, scope_cache)
+            dependency_matches.append((pkg_id, repo_id))
 
         # add myself to the provided libs metadata
-        populate_caches(package_id, dbconn, provided_libs, scope_cache)
+        dependency_matches.append(package_match)
+        populate_caches(dependency_matches, provided_libs, scope_cache)
 
         packages_cache = set()
         package_map = {}
@@ -1473,13 +1505,17 @@ class QAInterface(TextInterface, EntropyPluginStore):
         # now reduce dependencies
 
         r_deplist = set()
-        for key, package_matches in package_map.items():
-            for package_match in package_matches:
-                pkg_id, pkg_repo = package_match
-                pkg_dbconn = entropy_client.open_repository(pkg_repo)
-                r_deplist |= pkg_dbconn.retrieveDependencies(pkg_id,
-                    exclude_deptypes = \
-                        [etpConst['dependency_type_ids']['bdepend_id']])
+        r_matches = set()
+        for package_matches in package_map.values():
+            r_matches.update(package_matches)
+        repo_map = group_by_repository(r_matches)
+        for pkg_repo, pkg_ids in repo_map.items():
+            pkg_dbconn = entropy_client.open_repository(pkg_repo)
+            deps_map = pkg_dbconn.retrieveDependenciesMany(pkg_ids,
+                exclude_deptypes = \
+                    [etpConst['dependency_type_ids']['bdepend_id']])
+            for deps in deps_map.values():
+                r_deplist |= deps
 
         r_keyslots = set()
         for r_dep in r_deplist:
@@ -544,6 +544,14 @@ class ServerPackagesRepositoryUpdater(object):
             if not download:
                 critical.append(data['database_changelog_file'])
 
+        database_changelog_index = \
+            self._entropy._get_local_repository_changelog_index_file(
+                self._repository_id)
+        if os.path.isfile(database_changelog_index) or download:
+            data['database_changelog_index_file'] = database_changelog_index
+            if not download:
+                critical.append(data['database_changelog_index_file'])
+
         pkglist_file = self._entropy._get_local_pkglist_file(
             self._repository_id)
         data['pkglist_file'] = pkglist_file
@@ -1011,7 +1019,8 @@ class ServerPackagesRepositoryUpdater(object):
         msg = msg.rstrip()
 
         def _write_changelog_entry(changelog_f, atom, pkg_meta):
-            this_time = time.strftime(etpConst['changelog_date_format'])
+            now = time.localtime()
+            this_time = time.strftime(etpConst['changelog_date_format'], now)
             changelog_str = const_convert_to_unicode("""\
 commit %s; %s; %s
 Machine: %s; %s; %s
@@ -1025,6 +1034,8 @@ Name:    %s
 
             # append at the bottom and don't care here
             changelog_f.write(changelog_str)
+            # return the month and byte length, for the ChangeLog index
+            return time.strftime("%Y%m", now), len(changelog_str.encode(enc))
 
         if db_actions is None:
             light_items = None
@@ -1036,9 +1047,34 @@ Name:    %s
                     self._repository_id)
             enc = etpConst['conf_encoding']
 
+            changelog_index_path = \
+                self._entropy._get_local_repository_changelog_index_file(
+                    self._repository_id)
+
+            # load the month -> offsets index of the current ChangeLog,
+            # rebuild it if missing or stale
+            try:
+                changelog_size = os.path.getsize(changelog_path)
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+                changelog_size = 0
+            changelog_index = entropy.tools.read_changelog_index(
+                changelog_index_path)
+            if changelog_index is None or \
+                    changelog_index[0] != changelog_size:
+                if changelog_size:
+                    with open(changelog_path, "rb") as changelog_f:
+                        changelog_index = \
+                            entropy.tools.build_changelog_index(changelog_f)
+                else:
+                    changelog_index = (0, [])
+            changelog_size, changelog_ranges = changelog_index
+
             tmp_fd, tmp_path = const_mkstemp(
                 dir=os.path.dirname(changelog_path))
 
+            changelog_entries = []
             with entropy.tools.codecs_fdopen(tmp_fd, "w", enc) as tmp_f:
 
                 # write new changelog entries here
@@ -1046,7 +1082,8 @@ Name:    %s
                 atoms.sort()
                 for atom in atoms:
                     pkg_meta = light_items[atom]
-                    _write_changelog_entry(tmp_f, atom, pkg_meta)
+                    changelog_entries.append(
+                        _write_changelog_entry(tmp_f, atom, pkg_meta))
 
                 # append the rest of the file
                 try:
@@ -1066,6 +1103,14 @@ Name:    %s
             # atomicity
             os.rename(tmp_path, changelog_path)
 
+            changelog_size += sum(x[1] for x in changelog_entries)
+            changelog_ranges = entropy.tools.prepend_changelog_index(
+                changelog_ranges, changelog_entries)
+            entropy.tools.write_changelog_index(changelog_index_path,
+                changelog_size, changelog_ranges)
+            const_setup_file(changelog_index_path,
+                etpConst['entropygid'], 0o664)
+
         ServerRssMetadata().clear()
         EntropyCacher.clear_cache_item(rss_dump_name,
             cache_dir = self._entropy.CACHE_DIR)
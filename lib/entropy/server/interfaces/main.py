@@ -1665,6 +1665,10 @@ class ServerConfigurationFiles(ConfigurationFiles):
     our repository identifiers
     """
 
+    # packages are not merged by Entropy Server, so the
+    # journal would be empty, always walk the filesystem.
+    JOURNAL = False
+
     @property
     def _repository_ids(self):
         """
@@ -1950,6 +1954,11 @@ class Server(Client):
         return os.path.join(self._get_local_repository_dir(repository_id,
             branch = branch), etpConst['changelog_filename_compressed'])
 
+    def _get_local_repository_changelog_index_file(self, repository_id,
+        branch = None):
+        return os.path.join(self._get_local_repository_dir(repository_id,
+            branch = branch), etpConst['changelog_index_filename'])
+
     def _get_local_repository_rsslight_file(self, repository_id, branch = None):
         srv_set = self._settings[Server.SYSTEM_SETTINGS_PLG_ID]['server']
         return os.path.join(self._get_local_repository_dir(repository_id,
@@ -16,6 +16,7 @@ import os
 import errno
 import json
 import threading
+import time
 import hashlib
 
 import socket
@@ -145,6 +146,10 @@ class WebService(object):
     WEB_SERVICE_NOT_FOUND_CODE = 404
     WEB_SERVICE_RESPONSE_ERROR_CODE = 503
 
+    # Pooled keep-alive connections idle for longer than this (in seconds)
+    # are not reused, the remote end may have already closed them
+    CONNECTION_POOL_IDLE_TIMEOUT = 5.0
+
 
     class WebServiceException(EntropyException):
         """
@@ -253,6 +258,9 @@ class WebService(object):
         @rtype repository_id: string
         """
         self._cache_dir_lock = threading.RLock()
+        self._connection_pool = []
+        self._connection_pool_size = 0
+        self._connection_pool_lock = threading.Lock()
         self._transfer_callback = None
         self._entropy = entropy_client
         self._repository_id = repository_id
@@ -358,6 +366,61 @@ class WebService(object):
         """
         self._default_timeout_secs = float(secs)
 
+    def _set_connection_pool(self, size):
+        """
+        Enable HTTP keep-alive connection pooling, keeping up to size idle
+        connections around so that subsequent (even concurrent) requests
+        can reuse them. A size of 0 disables pooling and closes the idle
+        connections.
+
+        @param size: maximum number of idle connections to keep
+        @type size: int
+        """
+        with self._connection_pool_lock:
+            self._connection_pool_size = size
+            while len(self._connection_pool) > size:
+                connection, _last_used = self._connection_pool.pop(0)
+                connection.close()
+
+    def _get_connection(self, function_name, timeout):
+        """
+        Return an HTTP connection to the Web Service, picking it from the
+        connection pool, if possible.
+        """
+        now = time.time()
+        with self._connection_pool_lock:
+            while self._connection_pool:
+                connection, last_used = self._connection_pool.pop()
+                if now - last_used > self.CONNECTION_POOL_IDLE_TIMEOUT:
+                    connection.close()
+                    continue
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                return connection
+
+        if self._request_protocol == "http":
+            return httplib.HTTPConnection(self._request_host,
+                timeout = timeout)
+        elif self._request_protocol == "https":
+            return httplib.HTTPSConnection(self._request_host,
+                timeout = timeout)
+        raise WebService.RequestError("invalid request protocol",
+            method = function_name)
+
+    def _release_connection(self, connection, reusable):
+        """
+        Give back an HTTP connection obtained through _get_connection().
+        The connection is closed unless it is reusable and the connection
+        pool has room for it.
+        """
+        if reusable:
+            with self._connection_pool_lock:
+                if len(self._connection_pool) < self._connection_pool_size:
+                    self._connection_pool.append((connection, time.time()))
+                    return
+        connection.close()
+
     def _set_transfer_callback(self, callback):
         """
         Set a transfer progress callback function.
@@ -507,16 +570,9 @@ class WebService(object):
             " tx_callback: %s, timeout: %s" % (self._request_host, request_path,
                 params, self._transfer_callback, timeout,))
         connection = None
+        reusable = False
         try:
-            if self._request_protocol == "http":
-                connection = httplib.HTTPConnection(self._request_host,
-                    timeout = timeout)
-            elif self._request_protocol == "https":
-                connection = httplib.HTTPSConnection(self._request_host,
-                    timeout = timeout)
-            else:
-                raise WebService.RequestError("invalid request protocol",
-                    method = function_name)
+            connection = self._get_connection(function_name, timeout)
 
             headers = {
                 "Accept": "text/plain",
@@ -663,6 +719,8 @@ class WebService(object):
 
             if self._transfer_callback is not None:
                 self._transfer_callback(total_length, total_length, True)
+            # response fully read, the connection can serve other requests
+            reusable = not response.will_close
 
             if const_is_python3():
                 outcome = const_convert_to_unicode(outcome)
@@ -675,7 +733,7 @@ class WebService(object):
                 method = function_name)
         finally:
             if connection is not None:
-                connection.close()
+                self._release_connection(connection, reusable)
 
     def _setup_credentials(self, request_params):
         """
@@ -1094,7 +1152,8 @@ class AuthenticationStorage(Singleton):
             auth_file = self._get_authfile()
             if auth_file is not None:
                 entropy.dump.dumpobj(auth_file, self._authstore,
-                    complete_path = True, custom_permissions = 0o600)
+                    complete_path = True, custom_permissions = 0o600,
+                    portable = True)
         # make sure
         if auth_file is not None:
             try:
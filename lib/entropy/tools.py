@@ -2252,6 +2252,143 @@ def get_year():
     """
     return time.strftime("%Y")
 
+_changelog_months = {}
+def changelog_date_to_month(date_str):
+    """
+    Convert a repository ChangeLog "Date:" value (see
+    etpConst['changelog_date_format']) into its "YYYYMM" month key.
+    Results are memoized per month and year, so that time.strptime() is
+    only called once for every month found in a ChangeLog.
+
+    @param date_str: ChangeLog date string
+    @type date_str: string
+    @return: month key or None, if date_str is invalid
+    @rtype: string or None
+    """
+    parts = date_str.split()
+    if len(parts) < 4:
+        return None
+    key = (parts[2], parts[3])
+    month = _changelog_months.get(key)
+    if month is None:
+        try:
+            time_obj = time.strptime(date_str,
+                etpConst['changelog_date_format'])
+        except ValueError:
+            return None
+        month = "%04d%02d" % (time_obj.tm_year, time_obj.tm_mon)
+        _changelog_months[key] = month
+    return month
+
+def build_changelog_index(changelog_f):
+    """
+    Scan a repository ChangeLog file object (opened in binary mode) and
+    build its month index, a list of (month, start offset, end offset)
+    tuples ordered by offset, as stored by write_changelog_index().
+
+    @param changelog_f: ChangeLog file object
+    @type changelog_f: file object
+    @return: tuple composed by the ChangeLog size and its month index
+    @rtype: tuple
+    """
+    enc = etpConst['conf_encoding']
+    commit_header = const_convert_to_rawstring("commit ")
+    date_header = const_convert_to_rawstring("Date:")
+
+    ranges = []
+    cur_month, cur_start = None, 0
+    commit_start = 0
+    offset = 0
+    for line in changelog_f:
+        if line.startswith(commit_header):
+            commit_start = offset
+        elif line.startswith(date_header):
+            date_str = line[len(date_header):].decode(enc, "replace")
+            month = changelog_date_to_month(date_str.strip())
+            if month is not None and month != cur_month:
+                if cur_month is not None:
+                    ranges.append((cur_month, cur_start, commit_start))
+                cur_month, cur_start = month, commit_start
+        offset += len(line)
+
+    if cur_month is not None:
+        ranges.append((cur_month, cur_start, offset))
+    return offset, ranges
+
+def prepend_changelog_index(ranges, entries):
+    """
+    Update a ChangeLog month index after new entries have been written
+    at the top of the ChangeLog file.
+
+    @param ranges: the current month index
+    @type ranges: list
+    @param entries: list of (month, byte length) tuples, one per new
+        entry, in file order
+    @type entries: list
+    @return: the new month index
+    @rtype: list
+    """
+    new_ranges = []
+    offset = 0
+    for month, length in entries:
+        if new_ranges and new_ranges[-1][0] == month:
+            new_ranges[-1] = (month, new_ranges[-1][1], offset + length)
+        else:
+            new_ranges.append((month, offset, offset + length))
+        offset += length
+
+    for month, start, end in ranges:
+        if new_ranges and new_ranges[-1][0] == month:
+            new_ranges[-1] = (month, new_ranges[-1][1], end + offset)
+        else:
+            new_ranges.append((month, start + offset, end + offset))
+    return new_ranges
+
+def read_changelog_index(index_path):
+    """
+    Read a ChangeLog month index written by write_changelog_index().
+
+    @param index_path: path to the index file
+    @type index_path: string
+    @return: tuple composed by the indexed ChangeLog size and the month
+        index or None, if the file is not available or invalid
+    @rtype: tuple or None
+    """
+    try:
+        with open(index_path, "r") as index_f:
+            header = index_f.readline().split()
+            if len(header) != 2 or header[0] != "size":
+                return None
+            size = int(header[1])
+            ranges = []
+            for line in index_f.readlines():
+                month, start, end = line.split()
+                ranges.append((month, int(start), int(end)))
+    except (IOError, OSError) as err:
+        if err.errno != errno.ENOENT:
+            raise
+        return None
+    except ValueError:
+        return None
+    return size, ranges
+
+def write_changelog_index(index_path, size, ranges):
+    """
+    Atomically write a ChangeLog month index.
+
+    @param index_path: path to the index file
+    @type index_path: string
+    @param size: size of the indexed ChangeLog, used to detect stale indexes
+    @type size: int
+    @param ranges: list of (month, start offset, end offset) tuples
+    @type ranges: list
+    """
+    lines = ["size %d\n" % (size,)]
+    for month, start, end in ranges:
+        lines.append("%s %d %d\n" % (month, start, end))
+    atomic_write(index_path, const_convert_to_unicode("".join(lines)),
+        etpConst['conf_encoding'])
+
 def convert_seconds_to_fancy_output(seconds):
     """
     Convert seconds (int) into a more fancy and human readable output.
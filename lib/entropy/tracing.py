@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    B{Entropy Package Manager tracing facilities}.
+
+    Lightweight tracing API made of named spans (with attributes and
+    duration) and instant events. Tracing is disabled by default and
+    costs a function call when disabled.
+    It can be enabled at runtime through Tracer().enable() or by setting
+    the ETP_TRACE environment variable to a file path: in this case, all
+    the collected events are written there in Chrome Trace Event format
+    (loadable by chrome://tracing) at exit.
+
+    Example:
+
+        from entropy.tracing import Tracer
+        with Tracer().span("fetch", "client", atom=atom):
+            do_something()
+
+"""
+import os
+import json
+import time
+import atexit
+import threading
+
+from entropy.core import Singleton
+from entropy.const import const_debug_write
+
+
+class _NullSpan(object):
+
+    """
+    Span returned when tracing is disabled, it does nothing.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, key, value):
+        """
+        Set a span attribute.
+        """
+
+
+class TraceSpan(object):
+
+    """
+    A named, timed, operation. Use it as context manager.
+    """
+
+    __slots__ = ("_tracer", "name", "category", "attrs", "start")
+
+    def __init__(self, tracer, name, category, attrs):
+        self._tracer = tracer
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.time()
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self._tracer._complete(self, end)
+        return False
+
+    def set(self, key, value):
+        """
+        Set a span attribute.
+
+        @param key: attribute name
+        @type key: string
+        @param value: attribute value, must be JSON serializable
+        @type value: object
+        """
+        self.attrs[key] = value
+
+
+class Tracer(Singleton):
+
+    """
+    Entropy Tracer, collects spans and events, provides a per-name
+    summary of them and exports them in Chrome Trace Event format.
+    """
+
+    # environment variable containing the trace export file path
+    ENV_VAR = "ETP_TRACE"
+
+    # maximum number of events kept for the export, the summary is
+    # always complete
+    MAX_EVENTS = 500000
+
+    _NULL_SPAN = _NullSpan()
+
+    def init_singleton(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._base_time = time.time()
+        self._events = []
+        self._stats = {}
+        self._enabled = False
+        self._record = False
+        self._trace_path = os.getenv(Tracer.ENV_VAR)
+        if self._trace_path:
+            self.enable(record = True)
+            atexit.register(self._atexit_dump)
+
+    def enable(self, record = False):
+        """
+        Enable tracing.
+
+        @keyword record: keep the single events around, for dump()
+        @type record: bool
+        """
+        self._record = self._record or record
+        self._enabled = True
+
+    def disable(self):
+        """
+        Disable tracing, collected data is kept.
+        """
+        self._enabled = False
+
+    def enabled(self):
+        """
+        Return whether tracing is enabled.
+
+        @rtype: bool
+        """
+        return self._enabled
+
+    def clear(self):
+        """
+        Drop all the collected data.
+        """
+        with self._lock:
+            del self._events[:]
+            self._stats.clear()
+
+    def span(self, name, category, **attrs):
+        """
+        Return a new span context manager.
+
+        @param name: span name, spans are aggregated by name in summary()
+        @type name: string
+        @param category: span category (for example: "db", "client")
+        @type category: string
+        @return: span object
+        @rtype: TraceSpan
+        """
+        if not self._enabled:
+            return Tracer._NULL_SPAN
+        return TraceSpan(self, name, category, attrs)
+
+    def event(self, name, category, **attrs):
+        """
+        Record an instant event, like a cache hit.
+
+        @param name: event name, events are aggregated by name in summary()
+        @type name: string
+        @param category: event category
+        @type category: string
+        """
+        if not self._enabled:
+            return
+        self._add(name, category, time.time(), None, attrs)
+
+    def traced(self, name, category):
+        """
+        Decorator wrapping every call of the decorated function into a span.
+
+        @param name: span name
+        @type name: string
+        @param category: span category
+        @type category: string
+        """
+        def _decorator(func):
+            def _wrapper(*args, **kwargs):
+                if not self._enabled:
+                    return func(*args, **kwargs)
+                with TraceSpan(self, name, category, {}):
+                    return func(*args, **kwargs)
+            _wrapper.__name__ = func.__name__
+            _wrapper.__doc__ = func.__doc__
+            return _wrapper
+        return _decorator
+
+    def _complete(self, span, end):
+        """
+        Record a completed span.
+        """
+        self._add(span.name, span.category, span.start, end - span.start,
+                  span.attrs)
+
+    def _add(self, name, category, start, duration, attrs):
+        """
+        Record a span (or an instant event, if duration is None).
+        """
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = [0, None, None]
+                self._stats[name] = stats
+            stats[0] += 1
+            if duration is not None:
+                stats[1] = (stats[1] or 0.0) + duration
+                if stats[2] is None or duration > stats[2]:
+                    stats[2] = duration
+
+            if not self._record or len(self._events) >= Tracer.MAX_EVENTS:
+                return
+
+            event = {
+                'name': name,
+                'cat': category,
+                'ts': int((start - self._base_time) * 1000000),
+                'pid': self._pid,
+                'tid': threading.current_thread().ident,
+            }
+            if duration is None:
+                event['ph'] = "i"
+                event['s'] = "t"
+            else:
+                event['ph'] = "X"
+                event['dur'] = int(duration * 1000000)
+            if attrs:
+                event['args'] = attrs
+            self._events.append(event)
+
+    def summary(self):
+        """
+        Return a summary of the collected spans and events, aggregated by
+        name and sorted by total duration (descending).
+
+        @return: list of (name, count, total seconds, max seconds) tuples,
+            durations are None for instant events
+        @rtype: list
+        """
+        with self._lock:
+            items = [(name, count, total, max_duration) for name, \
+                         (count, total, max_duration) in self._stats.items()]
+        items.sort(key = lambda x: (-(x[2] or 0.0), -x[1], x[0]))
+        return items
+
+    def dump(self, path = None):
+        """
+        Write the collected events to file in Chrome Trace Event format.
+
+        @keyword path: destination path, if None, ETP_TRACE value is used
+        @type path: string
+        @raise IOError: if the file cannot be written
+        @raise OSError: same as above
+        """
+        if path is None:
+            path = self._trace_path
+        with self._lock:
+            events = list(self._events)
+        data = {
+            'traceEvents': events,
+            'displayTimeUnit': "ms",
+        }
+        tmp_path = "%s.%s.tmp" % (path, os.getpid())
+        with open(tmp_path, "w") as trace_f:
+            json.dump(data, trace_f, default = repr)
+        os.rename(tmp_path, path)
+
+    def _atexit_dump(self):
+        """
+        Export the trace at exit, if ETP_TRACE is set.
+        """
+        path = self._trace_path
+        if os.getpid() != self._pid:
+            # forked process, do not overwrite the parent trace
+            path = "%s.%s" % (path, os.getpid())
+        try:
+            self.dump(path = path)
+        except (IOError, OSError) as err:
+            const_debug_write(__name__,
+                "cannot write trace to %s: %s" % (path, err,))
+
+
+def traced(name, category):
+    """
+    Decorator wrapping every call of the decorated function into a span,
+    see Tracer.traced().
+
+    @param name: span name
+    @type name: string
+    @param category: span category
+    @type category: string
+    """
+    return Tracer().traced(name, category)
@@ -8,17 +8,26 @@ import unittest
 import os
 import shutil
 import signal
+import threading
 import time
 
 from entropy.client.interfaces import Client
 from entropy.client.interfaces.db import InstalledPackagesRepository
+from entropy.client.misc import OrphanedFiles, ConfigurationFiles, \
+    ConfigurationJournal, PackageStore
 from entropy.client.interfaces.package.actions._triggers import Trigger
+from entropy.client.interfaces.package.actions._edelta import EdeltaEngine, \
+    EdeltaStatistics
+from entropy.client.mirrors import MirrorRanking
+from entropy.client.interfaces.package import _content as Content
 from entropy.cache import EntropyCacher
-from entropy.const import etpConst, const_mkdtemp
+from entropy.const import etpConst, const_mkdtemp, \
+    const_convert_to_rawstring
 from entropy.output import set_mute
 from entropy.core.settings.base import SystemSettings
 from entropy.db import EntropyRepository
-from entropy.exceptions import RepositoryError, EntropyPackageException
+from entropy.exceptions import RepositoryError, EntropyPackageException, \
+    InvalidPackageSet
 import entropy.tools
 import tests._misc as _misc
 
@@ -172,6 +181,271 @@ class EntropyClientTest(unittest.TestCase):
             self.assertEqual(os.path.getmtime(real_path), cs_info['mtime'])
         shutil.rmtree(tmp_dir)
 
+    def test_content_binary_format(self):
+        dbconn = self.Client._init_generic_temp_repository(
+            self.mem_repoid, self.mem_repo_desc, temp_file = ":memory:")
+        test_pkg = _misc.get_test_entropy_package5()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = dbconn.addPackage(data)
+        content = list(dbconn.retrieveContent(
+            idpackage, extended = True, order_by = "file"))
+
+        tmp_dir = const_mkdtemp()
+        text_path = os.path.join(tmp_dir, "content.txt")
+        bin_path = os.path.join(tmp_dir, "content.bin")
+        with Content.FileContentWriter(text_path) as tmp_w:
+            for path, ftype in reversed(content):
+                tmp_w.write(idpackage, path, ftype)
+
+        count = Content.convert_content_file(text_path, bin_path)
+        self.assertEqual(count, len(content))
+        self.assertTrue(Content.is_binary_content_file(bin_path))
+        self.assertFalse(Content.is_binary_content_file(text_path))
+
+        with Content.open_content_file(bin_path) as tmp_r:
+            items = [(path, ftype) for _pkg_id, path, ftype in tmp_r]
+            self.assertEqual(items, sorted(content))
+            for path, ftype in content:
+                self.assertEqual(
+                    tmp_r.search(path), (idpackage, path, ftype))
+            self.assertEqual(tmp_r.search("/not/available"), None)
+
+        new_content = [("/usr/share/entropy-binary-test", "obj")]
+        Content.merge_binary_content_file(bin_path, new_content)
+        with Content.FileContentBinaryReader(bin_path) as tmp_r:
+            self.assertEqual(len(tmp_r), len(content) + 1)
+            self.assertTrue("/usr/share/entropy-binary-test" in tmp_r)
+
+        Content.convert_binary_content_file(bin_path, text_path)
+        with Content.FileContentReader(text_path) as tmp_r:
+            items = [(path, ftype) for _pkg_id, path, ftype in tmp_r]
+            self.assertEqual(items, sorted(content + new_content))
+        shutil.rmtree(tmp_dir)
+
+    def test_orphaned_files(self):
+        dbconn = self.Client._init_generic_temp_repository(
+            self.mem_repoid, self.mem_repo_desc, temp_file = ":memory:")
+        test_pkg = _misc.get_test_entropy_package5()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = dbconn.addPackage(data)
+
+        tmp_dir = os.path.realpath(const_mkdtemp())
+        owned_path = os.path.join(tmp_dir, "owned", "file")
+        orphan_path = os.path.join(tmp_dir, "orphan", "file")
+        masked_path = os.path.join(tmp_dir, "masked", "file")
+        regexp_path = os.path.join(tmp_dir, "owned", "file.pyc")
+        for path in (owned_path, orphan_path, masked_path, regexp_path):
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "w") as f_out:
+                f_out.write("orphan")
+        os.symlink(orphan_path, os.path.join(tmp_dir, "orphan", "link"))
+        dbconn.insertContent(idpackage, {owned_path: "obj"})
+
+        scanner = OrphanedFiles(self.Client, system_dirs = [tmp_dir],
+            system_dirs_mask = [os.path.join(tmp_dir, "masked"),
+                                ".*\\.pyc$"])
+        self.assertEqual(scanner.collect(),
+            set([owned_path, orphan_path]))
+        self.assertTrue(owned_path in set(scanner.owned_files(dbconn)))
+        self.assertEqual(scanner.scan(inst_repo = dbconn),
+            set([orphan_path]))
+        shutil.rmtree(tmp_dir)
+
+    def test_orphaned_files_errors(self):
+        tmp_dir = os.path.realpath(const_mkdtemp())
+        for idx in range(4):
+            sub_dir = os.path.join(tmp_dir, "dir%d" % (idx,))
+            os.makedirs(sub_dir)
+            for file_idx in range(200):
+                with open(os.path.join(
+                        sub_dir, "file%d" % (file_idx,)), "w") as f_out:
+                    f_out.write("orphan")
+
+        def _progress(path):
+            raise ValueError(path)
+
+        # errors raised by the scanning threads reach the caller
+        scanner = OrphanedFiles(self.Client, system_dirs = [tmp_dir],
+            system_dirs_mask = [], max_workers = 4)
+        self.assertRaises(ValueError, scanner.collect, progress = _progress)
+        self.assertEqual(len(scanner.collect()), 800)
+        shutil.rmtree(tmp_dir)
+
+    def test_configuration_journal(self):
+        tmp_dir = os.path.realpath(const_mkdtemp())
+        journal_path = os.path.join(tmp_dir, "journal")
+        update_path = os.path.join(tmp_dir, "etc", "._cfg0000_foo.conf")
+        dest_path = os.path.join(tmp_dir, "etc", "foo.conf")
+        gone_path = os.path.join(tmp_dir, "etc", "._cfg0001_bar.conf")
+        os.makedirs(os.path.dirname(update_path))
+        with open(update_path, "w") as f_out:
+            f_out.write("option = new\n")
+        with open(dest_path, "w") as f_out:
+            f_out.write("option = old\n")
+
+        journal = ConfigurationJournal(path = journal_path)
+        self.assertEqual(journal.read(), None)
+        last_scan = time.time()
+        self.assertTrue(journal.update(last_scan = last_scan))
+        for path in (update_path, update_path, gone_path):
+            self.assertTrue(journal.add(path))
+        self.assertEqual(journal.read()[1], [
+            const_convert_to_rawstring(x) for x in
+            (update_path, update_path, gone_path)])
+
+        class JournalConfigurationFiles(ConfigurationFiles):
+            def _journal(self):
+                return ConfigurationJournal(path = journal_path)
+
+        # the journal is fresh, so CONFIG_PROTECT is not walked and
+        # vanished or duplicated entries are dropped.
+        updates = JournalConfigurationFiles(self.Client, quiet = True)
+        self.assertEqual(list(updates.keys()), [update_path])
+        self.assertEqual(updates[update_path]['destination'], dest_path)
+        self.assertEqual(journal.read(),
+            (last_scan, [const_convert_to_rawstring(update_path)]))
+
+        self.assertTrue(updates.merge(update_path))
+        updates = JournalConfigurationFiles(self.Client, quiet = True)
+        self.assertEqual(dict(updates), {})
+        self.assertEqual(journal.read(), (last_scan, []))
+        shutil.rmtree(tmp_dir)
+
+    def test_edelta_engine(self):
+        stats = EdeltaStatistics()
+        ranking = MirrorRanking()
+        stats.clear()
+        ranking.clear()
+        try:
+            engine = EdeltaEngine(max_workers = 4)
+            self.assertEqual(engine.concurrency(0), 1)
+            self.assertEqual(engine.concurrency(2), 2)
+            self.assertEqual(engine.concurrency(10), 4)
+
+            url = "http://mirror.example.org/packages/foo.tbz2"
+            size = 10 * 1024 * 1024
+            # nothing known about the mirror, deltas are used
+            self.assertTrue(engine.worthwhile(url, size))
+            ranking.update(url, throughput = 100000)
+            self.assertTrue(engine.worthwhile(url, size))
+
+            # fast mirror, slow delta application
+            ranking.clear()
+            ranking.update(url, throughput = 50 * 1024 * 1024)
+            stats.update(size, size // 2, 10.0)
+            self.assertFalse(engine.worthwhile(url, size))
+            self.assertFalse(engine.worthwhile(url, size, concurrency = 4))
+        finally:
+            stats.clear()
+            ranking.clear()
+
+    def test_edelta_engine_apply(self):
+        tmp_dir = const_mkdtemp()
+        base_path = os.path.join(tmp_dir, "base" + etpConst['packagesext'])
+        with open(base_path, "wb") as f_out:
+            f_out.write(b"x" * 1024)
+        delta_path = base_path + etpConst['packagesdeltaext']
+        with open(delta_path, "wb") as f_out:
+            f_out.write(b"not a delta")
+
+        class _Engine(EdeltaEngine):
+
+            def __init__(self, *args, **kwargs):
+                super(_Engine, self).__init__(*args, **kwargs)
+                self.running = 0
+                self.max_running = 0
+                self._counter_lock = threading.Lock()
+
+            def _apply(self, base_path, delta_path, dest_path, lock_func):
+                with self._counter_lock:
+                    self.running += 1
+                    self.max_running = max(self.running, self.max_running)
+                time.sleep(0.2)
+                with self._counter_lock:
+                    self.running -= 1
+                return dest_path.endswith("0")
+
+        deltas = [(x, base_path, delta_path,
+                   os.path.join(tmp_dir, "dest%d" % (x,))) for x in range(4)]
+
+        engine = _Engine(max_workers = 4, memory_budget = None)
+        results = engine.apply(deltas)
+        self.assertEqual(results, {0: True, 1: False, 2: False, 3: False})
+        self.assertEqual(engine.max_running, 4)
+
+        # every delta exceeds the memory budget, one at a time
+        engine = _Engine(max_workers = 4, memory_budget = 1024)
+        results = engine.apply(deltas)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(engine.max_running, 1)
+
+        # invalid deltas do not generate anything
+        engine = EdeltaEngine(max_workers = 2)
+        results = engine.apply(deltas[:2])
+        self.assertEqual(results, {0: False, 1: False})
+        self.assertEqual(sorted(os.listdir(tmp_dir)),
+                         sorted([os.path.basename(base_path),
+                                 os.path.basename(delta_path)]))
+        shutil.rmtree(tmp_dir)
+
+    def test_package_store(self):
+        tmp_dir = os.path.realpath(const_mkdtemp())
+        store = PackageStore(path = os.path.join(tmp_dir, "store"))
+        ext = etpConst['packagesext']
+        path_a = os.path.join(tmp_dir, "repo_a", "5", "foo" + ext)
+        path_b = os.path.join(tmp_dir, "repo_b", "6", "foo" + ext)
+        os.makedirs(os.path.dirname(path_a))
+        with open(path_a, "wb") as f_out:
+            f_out.write(b"package data")
+        signatures = {
+            'sha1': entropy.tools.sha1(path_a),
+            'sha256': entropy.tools.sha256(path_a),
+            'sha512': None,
+            'gpg': None,
+        }
+
+        self.assertFalse(store.add(path_a, {'sha1': None}))
+        self.assertFalse(store.get(path_b, signatures))
+        self.assertTrue(store.add(path_a, signatures))
+        self.assertEqual(len(store.entries()), 1)
+
+        # the same package file, under another repository and branch,
+        # is a hardlink to the store entry
+        self.assertTrue(store.get(path_b, signatures))
+        st_a, st_b = os.stat(path_a), os.stat(path_b)
+        self.assertEqual(st_a.st_ino, st_b.st_ino)
+        self.assertEqual(st_a.st_nlink, 3)
+
+        # a corrupted package file is dropped from the store and
+        # download paths do not share data anymore
+        store.discard(path_b, signatures)
+        self.assertFalse(os.path.lexists(path_b))
+        self.assertEqual(store.entries(), [])
+        self.assertEqual(os.stat(path_a).st_nlink, 1)
+
+        # least recently used entries are evicted first
+        self.assertTrue(store.add(path_a, signatures))
+        path_c = os.path.join(tmp_dir, "repo_a", "5", "bar" + ext)
+        with open(path_c, "wb") as f_out:
+            f_out.write(b"another package data")
+        signatures_c = {'sha1': entropy.tools.sha1(path_c)}
+        self.assertTrue(store.add(path_c, signatures_c))
+        entry_a, entry_c = [x for x, _st in sorted(
+            store.entries(), key = lambda x: x[1].st_size)]
+        os.utime(entry_a, (time.time() - 3600, os.stat(entry_a).st_mtime))
+
+        self.assertEqual(store.expired(), [])
+        self.assertEqual([x for x, _st in store.expired(max_size = 30)],
+                         [entry_a])
+        self.assertEqual([x for x, _st in store.expired(max_age = 60)],
+                         [entry_a])
+        keep = set([(st_a.st_dev, st_a.st_ino)])
+        self.assertEqual([x for x, _st in store.expired(
+            max_size = 30, keep = keep)], [entry_c])
+        self.assertEqual(len(store.expired(max_size = 0)), 2)
+        shutil.rmtree(tmp_dir)
+
     def test_memory_repository(self):
         dbconn = self.Client._init_generic_temp_repository(
             self.mem_repoid, self.mem_repo_desc, temp_file = ":memory:")
@@ -193,6 +467,37 @@ class EntropyClientTest(unittest.TestCase):
             set_mute(False)
         self.assertRaises(RepositoryError, test_load)
 
+    def test_package_sets_expand(self):
+        dbconn = self.Client._init_generic_temp_repository(
+            self.mem_repoid, self.mem_repo_desc, temp_file = ":memory:")
+        dbconn.insertPackageSets({
+            "base": set(["app-misc/foo", "@extra"]),
+            "extra": set(["app-misc/bar", "app-misc/baz"]),
+            "loop1": set(["app-misc/foo", "@loop2"]),
+            "loop2": set(["@loop1"]),
+            "broken": set(["@missing"]),
+        })
+        sets = self.Client.Sets()
+
+        expected = set(["app-misc/foo", "app-misc/bar", "app-misc/baz"])
+        self.assertEqual(sets.expand("@base"), expected)
+        self.assertEqual(sets.expand("base"), expected)
+        # results are cached and callers get their own copy
+        sets.expand("@base").add("app-misc/other")
+        self.assertEqual(self.Client.Sets().expand("@base"), expected)
+        self.assertEqual(sets.expand("@base@%s" % (self.mem_repoid,)),
+                         expected)
+
+        self.assertRaises(InvalidPackageSet, sets.expand, "@loop1")
+        self.assertRaises(InvalidPackageSet, sets.expand, "@broken")
+        self.assertRaises(InvalidPackageSet, sets.expand, "@nothere")
+        self.assertEqual(sets.expand("@loop2", raise_exceptions = False),
+                         set())
+        self.assertEqual(sets.matches("@extra"), ())
+
+        self.Client.remove_repository(self.mem_repoid)
+        self.assertRaises(InvalidPackageSet, sets.expand, "@base")
+
     def test_package_repository(self):
         test_pkg = _misc.get_test_entropy_package()
         # this might fail on 32bit arches
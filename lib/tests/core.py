@@ -4,8 +4,11 @@ sys.path.insert(0, 'client')
 sys.path.insert(0, '../../client')
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
+import os
+import subprocess
 import unittest
-from entropy.core import EntropyPluginStore, Singleton
+import entropy
+from entropy.core import EntropyPluginStore, Singleton, LazyModule
 from entropy.core.settings.base import SystemSettings
 import tests._misc as _misc
 
@@ -43,6 +46,57 @@ class CoreTest(unittest.TestCase):
         obj2 = myself()
         self.assertTrue(obj is obj2)
 
+    def test_lazy_module(self):
+        mod_name = "entropy.core.settings.plugins.skel"
+        already_loaded = mod_name in sys.modules
+        proxy = LazyModule(mod_name)
+        self.assertEqual(mod_name in sys.modules, already_loaded)
+
+        klass = proxy.SystemSettingsPlugin
+        self.assertTrue(mod_name in sys.modules)
+        self.assertTrue(klass is sys.modules[mod_name].SystemSettingsPlugin)
+
+        broken = LazyModule("entropy.this_module_does_not_exist")
+        self.assertRaises(ImportError, getattr, broken, "foo")
+
+    def test_client_import_budget(self):
+        # subsystems that must not be imported by a bare
+        # "import entropy.client.interfaces", they are loaded
+        # on first use by the Client getters.
+        lazy_mods = ["entropy.qa", "entropy.security",
+                     "entropy.client.services.interfaces",
+                     "entropy.client.interfaces.package",
+                     "entropy.fetchers", "entropy.spm.plugins.factory"]
+        code = """
+import sys, time
+t = time.time()
+import entropy.client.interfaces
+elapsed = time.time() - t
+print(repr(elapsed))
+for mod in %r:
+    if mod in sys.modules:
+        print(mod)
+""" % (lazy_mods,)
+
+        lib_dir = os.path.dirname(os.path.dirname(
+                os.path.abspath(entropy.__file__)))
+        env = os.environ.copy()
+        env["PYTHONPATH"] = lib_dir
+        proc = subprocess.Popen(
+            [sys.executable, "-c", code], env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = proc.communicate()
+        self.assertEqual(proc.returncode, 0, stderr)
+
+        lines = stdout.decode("utf-8").split()
+        elapsed = float(lines[0])
+        self.assertEqual(lines[1:], [])
+
+        # generous default, meant to catch gross regressions only
+        budget = float(os.getenv("ETP_TEST_IMPORT_BUDGET", "3.0"))
+        self.assertTrue(elapsed < budget,
+            "import took %.3fs, budget %.3fs" % (elapsed, budget))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import gc
 import sys
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
@@ -14,6 +15,7 @@ from entropy.output import set_mute
 from entropy.core.settings.base import SystemSettings
 from entropy.misc import ParallelTask
 from entropy.db import EntropyRepository
+from entropy.db.stats import SQLQueryStatistics
 import tests._misc as _misc
 
 import entropy.dep
@@ -243,6 +245,237 @@ class EntropyRepositoryTest(unittest.TestCase):
             content,
             tuple(sorted(orig_content, key = lambda x: x[0])))
 
+    def test_content_dirs(self):
+        test_pkg = _misc.get_test_package3()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+        content = self.test_db.retrieveContent(
+            idpackage, extended = True, order_by="file")
+        content_safety = self.test_db.retrieveContentSafety(idpackage)
+
+        old_content_dirs = EntropyRepository.ENABLE_CONTENT_DIRS
+        EntropyRepository.ENABLE_CONTENT_DIRS = "1"
+        try:
+            self.test_db._databaseSchemaUpdates()
+        finally:
+            EntropyRepository.ENABLE_CONTENT_DIRS = old_content_dirs
+        self.assertTrue(self.test_db._isContentDirs())
+
+        self.assertEqual(content, self.test_db.retrieveContent(
+            idpackage, extended = True, order_by="file"))
+        self.assertEqual(content_safety,
+            self.test_db.retrieveContentSafety(idpackage))
+        self.assertEqual(self.test_db.searchBelongs("/usr/sbin/htdbm"),
+            frozenset([idpackage]))
+        self.assertTrue(self.test_db.isFileAvailable("/usr/sbin/htdbm"))
+        self.assertFalse(self.test_db.isFileAvailable("/usr/sbin/htdbm3"))
+
+        # writes go through the content view triggers
+        self.test_db.removePackage(idpackage)
+        self.assertFalse(self.test_db.isFileAvailable("/usr/sbin/htdbm"))
+        idpackage = self.test_db.addPackage(data)
+        self.assertEqual(content, self.test_db.retrieveContent(
+            idpackage, extended = True, order_by="file"))
+
+    def test_package_data_fields(self):
+        test_pkg = _misc.get_test_package3()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+        pkg_data = self.test_db.getPackageData(idpackage)
+
+        fields = ("atom", "slot", "needed", "mirrorlinks", "useflags")
+        self.assertEqual(
+            self.test_db.getPackageData(idpackage, fields = fields),
+            dict((x, pkg_data[x]) for x in fields))
+        self.assertRaises(AttributeError, self.test_db.getPackageData,
+            idpackage, fields = ("foo",))
+        self.assertTrue(self.test_db.getPackageData(
+                idpackage + 1, fields = fields) is None)
+
+        lazy_data = self.test_db.getLazyPackageData(idpackage)
+        self.assertEqual(lazy_data["slot"], pkg_data["slot"])
+        self.assertEqual(dict(lazy_data), pkg_data)
+        lazy_data = self.test_db.getLazyPackageData(
+            idpackage, fields = ("slot",))
+        self.assertFalse("atom" in lazy_data)
+        self.assertEqual(len(lazy_data), 1)
+
+        many = self.test_db.getPackageDataMany(
+            [idpackage, idpackage + 1], fields = fields)
+        self.assertEqual(list(many.keys()), [idpackage])
+        self.assertEqual(many[idpackage],
+            dict((x, pkg_data[x]) for x in fields))
+        self.assertEqual(
+            self.test_db.getPackageDataMany([idpackage])[idpackage],
+            pkg_data)
+
+    def test_retrieve_many(self):
+        package_ids = []
+        for test_pkg in (_misc.get_test_package(),
+                         _misc.get_test_package3()):
+            data = self.Spm.extract_package_metadata(test_pkg)
+            package_ids.append(self.test_db.addPackage(data))
+        missing_id = max(package_ids) + 1
+
+        for method in ("getStrictData", "retrieveAtom", "retrieveDigest",
+                       "retrieveKeySlot", "retrieveVersion", "retrieveSlot"):
+            single = getattr(self.test_db, method)
+            many = getattr(self.test_db, method + "Many")
+            self.assertEqual(many(package_ids + [missing_id]),
+                dict((x, single(x)) for x in package_ids))
+
+        for method in ("retrieveNeededLibraries",
+                       "retrieveProvidedLibraries", "retrieveDependencies"):
+            single = getattr(self.test_db, method)
+            many = getattr(self.test_db, method + "Many")
+            self.assertEqual(many(package_ids + [missing_id]),
+                dict((x, single(x)) for x in package_ids + [missing_id]))
+
+        bdepend_id = etpConst['dependency_type_ids']['bdepend_id']
+        deps = self.test_db.retrieveDependenciesMany(
+            package_ids, exclude_deptypes = [bdepend_id])
+        for package_id in package_ids:
+            self.assertEqual(deps[package_id],
+                self.test_db.retrieveDependencies(
+                    package_id, exclude_deptypes = [bdepend_id]))
+
+    def test_connection_pool(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+
+        fd, db_path = const_mkstemp()
+        os.close(fd)
+        writer = self.Client.open_generic_repository(db_path)
+        writer.initializeRepository()
+        package_id = writer.addPackage(data)
+        writer.commit()
+
+        reader = self.Client.open_generic_repository(
+            db_path, read_only = True)
+        self.assertTrue(reader._connectionPool() is not None)
+        self.assertTrue(writer._connectionPool() is None)
+
+        def select_pkg():
+            self.assertTrue(package_id in reader.listAllPackageIds())
+
+        tasks = [ParallelTask(select_pkg) for x in range(12)]
+        for task in tasks:
+            task.start()
+        for task in tasks:
+            task.join()
+
+        stats = EntropyRepository.connectionPoolStats()[db_path]
+        self.assertTrue(stats['hits'] + stats['misses'] >= len(tasks))
+        self.assertTrue(
+            stats['misses'] - stats['overflows'] <= stats['size'] + 1)
+        self.assertTrue(stats['busy'] <= stats['size'])
+
+        reader.close()
+        writer.close()
+        os.remove(db_path)
+
+    def test_connection_pool_leaked_instance(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+
+        fd, db_path = const_mkstemp()
+        os.close(fd)
+        writer = self.Client.open_generic_repository(db_path)
+        writer.initializeRepository()
+        package_id = writer.addPackage(data)
+        writer.commit()
+        writer.close()
+
+        reader = self.Client.open_generic_repository(
+            db_path, read_only = True)
+        self.assertTrue(package_id in reader.listAllPackageIds())
+        cur = reader._cursor()
+        cur.execute("ATTACH DATABASE ? AS leaked", (db_path,))
+        cur.execute("CREATE TEMP TABLE leaked_tmp (x INTEGER)")
+        del cur
+
+        stats = EntropyRepository.connectionPoolStats()[db_path]
+        self.assertEqual(stats['busy'], 1)
+
+        # dropped without calling close()
+        del reader
+        gc.collect()
+
+        stats = EntropyRepository.connectionPoolStats()[db_path]
+        self.assertEqual(stats['orphaned'], 1)
+        self.assertEqual(stats['busy'], 0)
+        self.assertEqual(stats['idle'], 1)
+
+        # the released connection is reused, without the previous state
+        reader = self.Client.open_generic_repository(
+            db_path, read_only = True)
+        self.assertTrue(package_id in reader.listAllPackageIds())
+        stats = EntropyRepository.connectionPoolStats()[db_path]
+        self.assertEqual(stats['hits'], 1)
+        cur = reader._cursor()
+        databases = [x[1] for x in cur.execute("PRAGMA database_list")]
+        self.assertFalse("leaked" in databases)
+        cur.execute("SELECT name FROM sqlite_temp_master")
+        self.assertEqual(cur.fetchall(), [])
+        del cur
+
+        # an exhausted pool does not wait, overflow connections
+        # are not pooled
+        pool = reader._connectionPool()
+        conns = [pool.acquire(reader._pooledConnection, reader) for x in \
+                     range(stats['size'] - stats['busy'] + 1)]
+        stats = EntropyRepository.connectionPoolStats()[db_path]
+        self.assertEqual(stats['overflows'], 1)
+        self.assertFalse(pool.release(conns[-1]))
+        conns[-1].close()
+        for conn in conns[:-1]:
+            self.assertTrue(pool.release(conn))
+
+        reader.close()
+        os.remove(db_path)
+
+    def test_update_candidates(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+
+        # in-memory repositories cannot be attached
+        self.assertEqual(
+            self.test_db.listAllUpdateCandidates(self.test_db2), None)
+
+        repos = []
+        for x in range(2):
+            fd, db_path = const_mkstemp()
+            os.close(fd)
+            repo = self.Client.open_generic_repository(db_path)
+            repo.initializeRepository()
+            repos.append((repo, db_path))
+        installed, available = [x[0] for x in repos]
+
+        package_id = installed.addPackage(data)
+        installed.commit()
+        self.assertEqual(installed.listAllUpdateCandidates(available), ())
+
+        new_data = data.copy()
+        new_data['version'] = "1.2.4"
+        new_data['revision'] = 1
+        new_package_id = available.addPackage(new_data)
+        other_data = data.copy()
+        other_data['slot'] = "other"
+        available.addPackage(other_data)
+        available.commit()
+
+        self.assertEqual(
+            installed.listAllUpdateCandidates(available),
+            ((package_id, new_package_id, "1.2.4", new_data['versiontag'],
+              1),))
+        # the repository must be detached
+        self.assertEqual(
+            len(installed.listAllUpdateCandidates(available)), 1)
+
+        for repo, db_path in repos:
+            repo.close()
+            os.remove(db_path)
+
     def test_db_creation(self):
         self.assertTrue(isinstance(self.test_db, EntropyRepository))
         self.assertEqual(self.test_db_name, self.test_db.repository_id())
@@ -823,6 +1056,19 @@ class EntropyRepositoryTest(unittest.TestCase):
             '/usr/share/man/man3', '/lib64/libz.so.1'])
         )
 
+    def test_list_provided_libraries(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+        keyslot = self.test_db.retrieveKeySlotAggregated(idpackage)
+        out = sorted(self.test_db.listAllProvidedLibraries())
+        self.assertEqual(out, sorted(
+            (lib, elfclass, idpackage, keyslot, path) for \
+                lib, path, elfclass in data['provided_libs']))
+        for lib, elfclass, package_id, _keyslot, path in out:
+            self.assertTrue((package_id, path) in self.test_db.resolveNeeded(
+                lib, elfclass = elfclass, extended = True))
+
     def test_list_categories(self):
         test_pkg = _misc.get_test_package()
         data = self.Spm.extract_package_metadata(test_pkg)
@@ -1075,6 +1321,48 @@ class EntropyRepositoryTest(unittest.TestCase):
 
         test_db.release_exclusive(opaque_exclusive)
 
+    def test_sql_query_statistics(self):
+        stats = SQLQueryStatistics()
+        self.assertEqual(
+            stats.normalize(
+                "SELECT  atom FROM baseinfo\n WHERE idpackage IN (1, 2,3) "
+                "AND name = 'foo''s' LIMIT 1;"),
+            "SELECT atom FROM baseinfo WHERE idpackage IN (...) "
+            "AND name = ? LIMIT ?")
+
+        stats.clear()
+        stats.enable()
+        try:
+            for package_id in range(5):
+                cur = self.test_db._cursor().execute(
+                    "SELECT idpackage FROM baseinfo WHERE idpackage = %d"
+                    % (package_id,))
+                cur.fetchall()
+        finally:
+            stats.disable()
+
+        items = [x for x in stats.statistics() if \
+                     x.sql.startswith("SELECT idpackage FROM baseinfo")]
+        self.assertEqual(len(items), 1)
+        item = items[0]
+        self.assertEqual(item.repository, self.test_db_name)
+        self.assertEqual(item.count, 5)
+        self.assertEqual(item.rows, 0)
+        self.assertEqual(
+            item.sql, "SELECT idpackage FROM baseinfo WHERE idpackage = ?")
+
+        # rows fetched once collection is disabled are not accounted
+        stats.enable()
+        try:
+            cur = self.test_db._cursor().execute("SELECT 1")
+        finally:
+            stats.disable()
+        self.assertEqual(cur.fetchall(), [(1,)])
+        items = [x for x in stats.statistics() if x.sql == "SELECT ?"]
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0].rows, 0)
+        stats.clear()
+
     def test_locking_file(self):
 
         fd, db_file = const_mkstemp()
@@ -4,17 +4,107 @@ import os
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
 import unittest
+import hashlib
+import threading
+import time
 import tests._misc as _misc
+from entropy.const import const_is_python3
+from entropy.client.mirrors import MirrorRanking
 from entropy.fetchers import UrlFetcher, MultipleUrlFetcher
 from entropy.output import set_mute
 import entropy.tools
 
+if const_is_python3():
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+else:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+
+class _MirrorHandler(BaseHTTPRequestHandler):
+    """
+    Minimal HTTP mirror serving a MIRROR_TEST file, with Range support.
+    """
+
+    def do_GET(self):
+        payload = self.server.payload
+        if self.server.broken or self.path != "/MIRROR_TEST":
+            self.send_error(404)
+            return
+        time.sleep(self.server.delay)
+
+        start, end = 0, len(payload) - 1
+        byte_range = self.headers.get("Range")
+        if byte_range and byte_range.startswith("bytes="):
+            first, last = byte_range[len("bytes="):].split("-")
+            start = int(first)
+            if last:
+                end = min(int(last), end)
+            self.server.ranges.append((start, end))
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (
+                start, end, len(payload)))
+        else:
+            self.send_response(200)
+
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if byte_range and self.server.truncate:
+            # simulate a connection dropped half way through
+            end = start + (end - start) // 2
+        self.wfile.write(payload[start:end + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+class _MirrorServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, delay = 0.0, broken = False, payload = None,
+                 truncate = False):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), _MirrorHandler)
+        if payload is None:
+            payload = b"\0" * 524288
+        self.payload = payload
+        self.delay = delay
+        self.broken = broken
+        self.truncate = truncate
+        self.ranges = []
+        self.url = "http://127.0.0.1:%d" % (self.server_address[1],)
+
+    def handle_error(self, request, client_address):
+        # clients close connections early on purpose
+        pass
+
+
 class FetchersTest(unittest.TestCase):
 
     def setUp(self):
         self._random_file = _misc.get_random_file()
         self._random_file_md5 = _misc.get_random_file_md5()
 
+    def _start_mirrors(self, *mirrors_args, **kwargs):
+        servers = []
+        for mirror_args in mirrors_args:
+            delay, broken = mirror_args[:2]
+            truncate = mirror_args[2:] == (True,)
+            server = _MirrorServer(delay = delay, broken = broken,
+                                   truncate = truncate, **kwargs)
+            task = threading.Thread(target = server.serve_forever)
+            task.daemon = True
+            task.start()
+            servers.append(server)
+        return servers
+
+    def _stop_mirrors(self, servers):
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
     def test_urlfetcher_file_fetch(self):
 
         file_path = "file://" + os.path.realpath(self._random_file)
@@ -47,6 +137,187 @@ class FetchersTest(unittest.TestCase):
         self.assertEqual(rc.pop(1), ck_sum)
         os.remove(path_to_save)
 
+    def test_urlfetcher_segmented_fetch(self):
+        payload = os.urandom(3 * 1048576 + 1234)
+        ck_sum = hashlib.md5(payload).hexdigest()
+        servers = self._start_mirrors(
+            (0.0, False, True), (0.0, False), payload = payload)
+        path_to_save = os.path.join(os.path.dirname(self._random_file),
+            "test_urlfetcher_segmented")
+        try:
+            flaky, working = servers
+            urls = [x.url + "/MIRROR_TEST" for x in servers]
+
+            # below the threshold, a single stream is used
+            fetcher = UrlFetcher(urls[1], path_to_save,
+                show_speed = False, resume = False,
+                segment_threshold = 4096)
+            self.assertEqual(fetcher.download(), ck_sum)
+            self.assertEqual(working.ranges, [])
+
+            # segments cut short by the flaky mirror are retried
+            # on the working one
+            fetcher = UrlFetcher(urls[0], path_to_save,
+                show_speed = False, resume = False,
+                mirror_urls = urls[1:], segment_threshold = 1024)
+            self.assertEqual(fetcher.download(), ck_sum)
+            self.assertTrue(len(flaky.ranges) > 0)
+            self.assertTrue(len(working.ranges) > 1)
+            with open(path_to_save, "rb") as saved_f:
+                self.assertEqual(saved_f.read(), payload)
+
+            # a file that cannot be fully fetched is not left around
+            os.remove(path_to_save)
+            fetcher = UrlFetcher(urls[0], path_to_save,
+                show_speed = False, resume = False,
+                segment_threshold = 1024)
+            self.assertEqual(fetcher.download(),
+                             UrlFetcher.GENERIC_FETCH_ERROR)
+            self.assertFalse(os.path.lexists(path_to_save))
+
+            set_mute(True)
+            fetcher = MultipleUrlFetcher([(urls[0], path_to_save,)],
+                show_speed = False, resume = False,
+                mirror_urls = {urls[0]: urls[1:]}, segment_threshold = 1024)
+            rc = fetcher.download()
+            set_mute(False)
+            self.assertEqual(rc.pop(1), ck_sum)
+        finally:
+            self._stop_mirrors(servers)
+            if os.path.lexists(path_to_save):
+                os.remove(path_to_save)
+
+    def test_urlfetcher_segmented_fetch_stale_mirror(self):
+        payload = os.urandom(3 * 1048576)
+        ck_sum = hashlib.md5(payload).hexdigest()
+        working = self._start_mirrors((0.0, False), payload = payload)
+        # a mirror serving another version of the file, same name
+        stale = self._start_mirrors(
+            (0.0, False), payload = os.urandom(len(payload) + 4096))
+        servers = working + stale
+        path_to_save = os.path.join(os.path.dirname(self._random_file),
+            "test_urlfetcher_segmented_stale")
+        try:
+            urls = [x.url + "/MIRROR_TEST" for x in servers]
+            fetcher = UrlFetcher(urls[0], path_to_save,
+                show_speed = False, resume = False,
+                mirror_urls = urls[1:], segment_threshold = 1024)
+            self.assertEqual(fetcher.download(), ck_sum)
+            # the stale mirror is dropped after its first reply
+            self.assertTrue(
+                len(stale[0].ranges) <= UrlFetcher.SEGMENT_CONNECTIONS)
+        finally:
+            self._stop_mirrors(servers)
+            if os.path.lexists(path_to_save):
+                os.remove(path_to_save)
+
+    def test_urlfetcher_probe(self):
+        servers = self._start_mirrors((0.0, False), (0.0, True))
+        try:
+            working, broken = servers
+            outcome = UrlFetcher.probe(
+                working.url + "/MIRROR_TEST", size = 65536, timeout = 5)
+            self.assertNotEqual(outcome, None)
+            latency, transferred, elapsed = outcome
+            self.assertEqual(transferred, 65536)
+            self.assertTrue(0 <= latency <= elapsed)
+
+            outcome = UrlFetcher.probe(
+                broken.url + "/MIRROR_TEST", timeout = 5)
+            self.assertEqual(outcome, None)
+
+            # a missing file is told apart from a mirror failure
+            path_to_save = os.path.join(
+                os.path.dirname(self._random_file), "test_urlfetcher_probe")
+            fetcher = UrlFetcher(working.url + "/MISSING", path_to_save,
+                show_speed = False, resume = False)
+            self.assertEqual(fetcher.download(),
+                             UrlFetcher.GENERIC_FETCH_ERROR)
+            self.assertTrue(fetcher.is_missing())
+            fetcher = UrlFetcher("http://127.0.0.1:1/MIRROR_TEST",
+                path_to_save, show_speed = False, resume = False)
+            self.assertEqual(fetcher.download(),
+                             UrlFetcher.GENERIC_FETCH_ERROR)
+            self.assertFalse(fetcher.is_missing())
+            if os.path.lexists(path_to_save):
+                os.remove(path_to_save)
+
+            # and it is available to the download hooks
+            missing = {}
+            def post_download_hook(_path, _status, download_id):
+                missing[download_id] = multi_fetcher.is_missing(download_id)
+            multi_fetcher = MultipleUrlFetcher(
+                [(working.url + "/MISSING", path_to_save + "1"),
+                 ("http://127.0.0.1:1/MIRROR_TEST", path_to_save + "2")],
+                show_speed = False, resume = False,
+                post_download_hook = post_download_hook)
+            multi_fetcher.download()
+            self.assertEqual(missing, {1: True, 2: False})
+            for path in (path_to_save + "1", path_to_save + "2"):
+                if os.path.lexists(path):
+                    os.remove(path)
+        finally:
+            self._stop_mirrors(servers)
+
+    def test_mirror_ranking(self):
+        ranking = MirrorRanking()
+        ranking.clear()
+        servers = self._start_mirrors(
+            (0.5, False), (0.0, True), (0.0, False))
+        try:
+            slow, broken, fast = [x.url for x in servers]
+            mirrors = [slow, broken, fast]
+
+            start_time = time.time()
+            results = ranking.probe(mirrors, "MIRROR_TEST", timeout = 5)
+            # mirrors are probed concurrently
+            self.assertTrue(time.time() - start_time < 1.5)
+            self.assertEqual(results[broken], None)
+            self.assertNotEqual(results[fast], None)
+            self.assertNotEqual(results[slow], None)
+
+            self.assertEqual(ranking.sort(mirrors), [fast, slow, broken])
+            self.assertEqual(ranking.score(broken), 0.0)
+            # the slow mirror is not worth splitting downloads across
+            self.assertEqual(ranking.spread([fast, slow], 3), [fast] * 3)
+            # unknown mirrors keep their relative position
+            unknown = "http://127.0.0.1:1"
+            self.assertEqual(ranking.sort([unknown, broken]),
+                             [unknown, broken])
+
+            # scores are updated from real downloads too
+            fast_score = ranking.score(fast + "/packages/foo.tbz2")
+            ranking.update(fast + "/packages/foo.tbz2", failed = True)
+            self.assertTrue(ranking.score(fast) < fast_score)
+        finally:
+            self._stop_mirrors(servers)
+            ranking.clear()
+
+    def test_mirror_ranking_spread(self):
+        ranking = MirrorRanking()
+        ranking.clear()
+        try:
+            mirrors = ["http://a.example.org/pkgs", "http://b.example.org",
+                       "http://c.example.org", "http://d.example.org"]
+            for mirror, throughput in zip(mirrors, (4e6, 2e6, 1e6, 8e5)):
+                ranking.update(mirror, throughput = throughput, latency = 0.0)
+
+            self.assertEqual(ranking.sort(mirrors[::-1]), mirrors)
+            spread = ranking.spread(mirrors, 6)
+            self.assertEqual(spread.count(mirrors[0]), 4)
+            self.assertEqual(spread.count(mirrors[1]), 2)
+            self.assertEqual(spread.count(mirrors[2]), 0)
+
+            # exponentially weighted average
+            ranking.update(mirrors[3], throughput = 1.8e6)
+            expected = MirrorRanking.ALPHA * 1.8e6 + \
+                (1 - MirrorRanking.ALPHA) * 8e5
+            self.assertAlmostEqual(
+                ranking.score(mirrors[3]),
+                expected / MirrorRanking.REFERENCE_SIZE)
+        finally:
+            ranking.clear()
+
 if __name__ == '__main__':
     unittest.main()
     raise SystemExit(0)
@@ -9,6 +9,8 @@ import json
 from entropy.const import const_convert_to_unicode, const_mkstemp
 from entropy.misc import Lifo, TimeScheduled, ParallelTask, EmailSender, \
     FastRSS, FlockFile
+from entropy.tracing import Tracer
+import entropy.dump
 
 class MiscTest(unittest.TestCase):
 
@@ -255,6 +257,91 @@ class MiscTest(unittest.TestCase):
 
         os.remove(tmp_path)
 
+    def test_dump_formats(self):
+        builtin_obj = {
+            'updates': [(1, "repo"), (2, "repo")],
+            'masked': set([(3, "repo")]),
+            'atom': const_convert_to_unicode("app-misc/foo"),
+            'found': (None, True, 1.5),
+        }
+        other_obj = {'error': ValueError("foo")}
+
+        tmp_fd, tmp_path = const_mkstemp()
+        os.close(tmp_fd)
+        try:
+            for obj in (builtin_obj, other_obj):
+                for portable in (False, True):
+                    entropy.dump.dumpobj(tmp_path, obj, complete_path = True,
+                        portable = portable)
+                    with open(tmp_path, "rb") as tmp_f:
+                        header = tmp_f.read(len(entropy.dump.DUMP_MAGIC))
+                    self.assertEqual(
+                        header == entropy.dump.DUMP_MAGIC, not portable)
+                    new_obj = entropy.dump.loadobj(tmp_path,
+                        complete_path = True)
+                    self.assertEqual(sorted(new_obj.keys()),
+                        sorted(obj.keys()))
+                    for key, value in obj.items():
+                        self.assertEqual(repr(new_obj[key]), repr(value))
+
+            # old files, written using pickle protocol 0
+            with open(tmp_path, "wb") as tmp_f:
+                entropy.dump.pickle.dump(builtin_obj, tmp_f, 0)
+            self.assertEqual(
+                entropy.dump.loadobj(tmp_path, complete_path = True),
+                builtin_obj)
+
+            # written by a different interpreter
+            with open(tmp_path, "wb") as tmp_f:
+                tmp_f.write(entropy.dump._DUMP_HEADER.pack(
+                        entropy.dump.DUMP_MAGIC,
+                        entropy.dump.DUMP_FORMAT_VERSION,
+                        entropy.dump.DUMP_CODEC_MARSHAL,
+                        0, 1, 0))
+                tmp_f.write(b"garbage")
+            self.assertEqual(
+                entropy.dump.loadobj(tmp_path, complete_path = True), None)
+        finally:
+            os.remove(tmp_path)
+
+    def test_tracer(self):
+        tracer = Tracer()
+        enabled = tracer.enabled()
+        tracer.clear()
+        try:
+            tracer.disable()
+            with tracer.span("test.disabled", "test"):
+                pass
+            self.assertEqual(tracer.summary(), [])
+
+            tracer.enable(record = True)
+            for x in range(3):
+                with tracer.span("test.span", "test", x = x) as span:
+                    span.set("y", x)
+            tracer.event("test.event", "test")
+            summary = dict((x[0], x[1:]) for x in tracer.summary())
+            self.assertEqual(summary["test.span"][0], 3)
+            self.assertTrue(summary["test.span"][1] >= 0.0)
+            self.assertEqual(summary["test.event"], (1, None, None))
+
+            tmp_fd, tmp_path = const_mkstemp()
+            os.close(tmp_fd)
+            try:
+                tracer.dump(path = tmp_path)
+                with open(tmp_path, "r") as tmp_f:
+                    events = json.load(tmp_f)['traceEvents']
+            finally:
+                os.remove(tmp_path)
+            spans = [x for x in events if x['name'] == "test.span"]
+            self.assertEqual([x['args'] for x in spans],
+                [{'x': x, 'y': x} for x in range(3)])
+            self.assertEqual(set(x['ph'] for x in events),
+                set(["X", "i"]))
+        finally:
+            tracer.clear()
+            if not enabled:
+                tracer.disable()
+
 
 if __name__ == '__main__':
     unittest.main()
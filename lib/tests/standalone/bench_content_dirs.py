@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the default content metadata layout with the _content_dirs one
+(see EntropySQLiteRepository._migrateContentDirs()) on copies of a real
+repository: database size and file lookup latency.
+
+Usage: python bench_content_dirs.py [<repository file> [<samples>]]
+The installed packages repository is used by default.
+"""
+import sys
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from entropy.const import etpConst
+from entropy.db import EntropyRepository
+
+
+def _open(path, content_dirs):
+    EntropyRepository.ENABLE_CONTENT_DIRS = content_dirs
+    repo = EntropyRepository(
+        readOnly = False, dbFile = path, name = "bench",
+        xcache = False, indexing = True)
+    repo.createAllIndexes()
+    repo.commit()
+    repo.vacuum()
+    return repo
+
+
+def _time_lookups(repo, paths):
+    results = {}
+    for name, func in (("isFileAvailable", repo.isFileAvailable),
+                       ("searchBelongs", repo.searchBelongs)):
+        t1 = time.time()
+        for path in paths:
+            func(path)
+        results[name] = (time.time() - t1) / len(paths) * 1000000.0
+    return results
+
+
+def main(args):
+    repo_path = etpConst['etpdatabaseclientfilepath']
+    samples = 2000
+    if args:
+        repo_path = args[0]
+    if len(args) > 1:
+        samples = int(args[1])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_content_dirs")
+    try:
+        plain_path = os.path.join(tmp_dir, "plain.db")
+        dirs_path = os.path.join(tmp_dir, "content_dirs.db")
+        shutil.copy2(repo_path, plain_path)
+        shutil.copy2(repo_path, dirs_path)
+
+        plain = _open(plain_path, None)
+        t1 = time.time()
+        dirs = _open(dirs_path, "1")
+        migration_time = time.time() - t1
+
+        files = list(plain.listAllFiles(clean = True))
+        paths = random.sample(files, min(samples, len(files)))
+        # lookup misses as well
+        paths += [x + "~missing" for x in paths[:len(paths) // 4]]
+
+        plain_t = _time_lookups(plain, paths)
+        dirs_t = _time_lookups(dirs, paths)
+
+        for path in paths[:50]:
+            assert plain.searchBelongs(path) == dirs.searchBelongs(path)
+
+        plain_size = os.path.getsize(plain_path)
+        dirs_size = os.path.getsize(dirs_path)
+        plain.close()
+        dirs.close()
+
+        sys.stdout.write("repository: %s, %d files, %d lookups\n" % (
+            repo_path, len(files), len(paths)))
+        sys.stdout.write("migration time: %.2fs\n" % (migration_time,))
+        sys.stdout.write("size: %.2f MiB -> %.2f MiB (%.1f%%)\n" % (
+            plain_size / 1048576.0, dirs_size / 1048576.0,
+            dirs_size * 100.0 / plain_size))
+        for name in sorted(plain_t.keys()):
+            sys.stdout.write("%s: %.1fus -> %.1fus per lookup\n" % (
+                name, plain_t[name], dirs_t[name]))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,740 @@
+# -*- coding: utf-8 -*-
+"""
+Entropy performance benchmark suite.
+
+Generate synthetic repositories (through the addPackage() API) of the
+given sizes, with a dependency graph made of a few widely used libraries
+and many leaf applications, then time the repository, dependency solver
+and package installation hot paths, with warm and cold caches.
+Everything runs offline, package files are taken from lib/tests/packages.
+Generated repositories are stored in the work directory and reused by
+the following runs, if --work-dir is given.
+
+Results can be saved as JSON baseline and compared with a previously
+saved one, the exit status is 1 if any benchmark regressed by more than
+the given threshold.
+
+Usage: python benchmark.py [--sizes 1000,10000,50000] [--repeat <n>]
+           [--only <benchmark>[,<benchmark>...]] [--work-dir <dir>]
+           [--save <baseline.json>] [--compare <baseline.json>]
+           [--threshold <ratio>]
+"""
+import sys
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import time
+
+from entropy.const import etpConst, etpSys, const_mkdtemp, \
+    const_convert_to_rawstring
+# set unit testing mode
+etpSys['unittest'] = True
+
+from entropy.output import set_mute
+from entropy.cache import EntropyCacher
+from entropy.client.interfaces import Client
+from entropy.client.interfaces.db import InstalledPackagesRepository
+from entropy.graph import TopologicalSorter
+
+import entropy.dep
+import entropy.dump
+import entropy.tools
+
+import tests._misc as _misc
+
+# bump this when the generated repositories change
+GENERATOR_VERSION = 1
+BASELINE_VERSION = 1
+REPOSITORY_ID = "benchmark"
+
+_CATEGORIES = ("sys-libs", "sys-apps", "dev-libs", "dev-lang", "dev-util",
+               "dev-python", "media-libs", "media-sound", "media-video",
+               "net-libs", "net-misc", "x11-libs", "x11-apps", "kde-base",
+               "gnome-base", "app-misc", "app-text", "app-editors",
+               "games-action", "www-client")
+
+_TEST_PACKAGES = ("sys-libs:zlib-1.2.3-r1~1.tbz2",
+                  "xfce-extra:xfce4-verve-0.3.6~4.tbz2",
+                  "virtual:poppler-qt3-0.10.6~1.tbz2",
+                  "media-gfx:pdf2svg-0.2.1~3.tbz2",
+                  "mail-mta:ssmtp-2.62-r7~0.tbz2")
+
+
+def _package_name(index):
+    return "%s/pkg%d" % (_CATEGORIES[index % len(_CATEGORIES)], index)
+
+
+def _package_data(index, version, slot, deps, provided, needed):
+    """
+    Build synthetic package metadata suitable for addPackage().
+    """
+    category, name = _package_name(index).split("/")
+    content = {"/usr/share/doc/%s-%s" % (name, version): "dir"}
+    for num in range(6):
+        content["/usr/share/%s/file%d" % (name, num)] = "obj"
+    content["/usr/bin/%s" % (name,)] = "obj"
+    for soname in provided:
+        content["/usr/lib64/%s" % (soname,)] = "obj"
+
+    return {
+        'atom': "%s/%s-%s" % (category, name, version),
+        'name': name,
+        'version': version,
+        'versiontag': '',
+        'revision': 0,
+        'category': category,
+        'description': "synthetic package %s" % (name,),
+        'homepage': "http://www.sabayon.org",
+        'license': "GPL-2",
+        'branch': etpConst['branch'],
+        'slot': slot,
+        'etpapi': etpConst['etpapi'],
+        'datecreation': "1300000000",
+        'size': "10000",
+        'disksize': 20000,
+        'digest': "0" * 32,
+        'signatures': {
+            'sha1': "0" * 40,
+            'sha256': "0" * 64,
+            'sha512': "0" * 128,
+            'gpg': None,
+        },
+        'download': "packages/amd64/5/%s:%s-%s.tbz2" % (
+            category, name, version),
+        'chost': "x86_64-pc-linux-gnu",
+        'cflags': "-O2 -pipe",
+        'cxxflags': "-O2 -pipe",
+        'counter': -1,
+        'trigger': const_convert_to_rawstring(""),
+        'changelog': None,
+        'injected': False,
+        'systempackage': index < 20,
+        'config_protect': "/etc",
+        'config_protect_mask': "",
+        'useflags': set(["ssl", "-gtk"]),
+        'keywords': set(["amd64"]),
+        'sources': set(),
+        'needed': tuple(),
+        'needed_libs': tuple(
+            ("/usr/bin/%s" % (name,), "", soname, 2, "") for
+            soname in needed),
+        'provided_libs': set(
+            (soname, "/usr/lib64/%s" % (soname,), 2) for
+            soname in provided),
+        'provide_extended': set(),
+        'conflicts': set(),
+        'licensedata': {},
+        'content': content,
+        'content_safety': {},
+        'pkg_dependencies': tuple(deps),
+        'mirrorlinks': [],
+        'spm_phases': None,
+        'spm_repository': None,
+        'desktop_mime': [],
+        'provided_mime': [],
+        'original_repository': None,
+        'extra_download': [],
+    }
+
+
+def _generate(size, seed, repo, installed_repo):
+    """
+    Fill the given repositories with a synthetic dependency graph of
+    size packages. Low indexes are libraries, used by many packages,
+    (dependency targets are biased towards them), high indexes are
+    leaf applications. Some packages have two versions or two slots,
+    a few dependencies go back up the graph creating cycles.
+    The installed packages repository gets about 70% of the packages,
+    a quarter of them at an older version.
+    """
+    rng = random.Random(seed)
+    rdepend = etpConst['dependency_type_ids']['rdepend_id']
+    pdepend = etpConst['dependency_type_ids']['pdepend_id']
+    bdepend = etpConst['dependency_type_ids']['bdepend_id']
+
+    index = 0
+    count = 0
+    while count < size:
+        is_lib = index % 5 == 0
+        provided = []
+        if is_lib:
+            provided.append("libpkg%d.so.1" % (index,))
+
+        deps = []
+        needed = []
+        if index:
+            for _dep in range(rng.choice((0, 1, 2, 3, 4, 5, 6, 8, 12))):
+                target = int(index * rng.random() ** 3)
+                target_name = _package_name(target)
+                if rng.random() < 0.3:
+                    dep = ">=%s-1.0" % (target_name,)
+                else:
+                    dep = target_name
+                if target % 5 == 0:
+                    needed.append("libpkg%d.so.1" % (target,))
+                dep_type = rdepend
+                if rng.random() < 0.1:
+                    dep_type = bdepend
+                deps.append((dep, dep_type))
+            if rng.random() < 0.01:
+                # create a cycle
+                target = min(index + rng.randint(1, 50), size - 1)
+                deps.append((_package_name(target), pdepend))
+
+        versions = [("1.1", "0")]
+        if rng.random() < 0.1:
+            versions.append(("1.2", "0"))
+        elif is_lib and rng.random() < 0.1:
+            versions.append(("2.0", "2"))
+        versions = versions[:size - count]
+
+        for version, slot in versions:
+            repo.addPackage(_package_data(
+                    index, version, slot, deps, provided, needed))
+            count += 1
+
+        if rng.random() < 0.7:
+            version, slot = versions[0]
+            if rng.random() < 0.25:
+                version = "1.0"
+            installed_repo.addPackage(_package_data(
+                    index, version, slot, deps, provided, needed))
+        index += 1
+
+    repo.commit()
+    installed_repo.commit()
+
+
+class Benchmark(object):
+
+    """
+    Benchmark context, it holds the Entropy Client instance and the
+    synthetic repositories of the current size.
+    """
+
+    def __init__(self, work_dir, seed, repeat):
+        self._work_dir = work_dir
+        self._seed = seed
+        self._repeat = repeat
+        self._cache_dir = os.path.join(work_dir, "cache")
+        self._client = None
+        self._repo = None
+        self._installed_repo = None
+        self.size = None
+
+    def _repository_paths(self, size):
+        name = "synthetic-%d-%d-v%d" % (size, self._seed, GENERATOR_VERSION)
+        return (os.path.join(self._work_dir, name + ".db"),
+                os.path.join(self._work_dir, name + ".installed.db"))
+
+    def setup(self, size):
+        """
+        Load (generating it if needed) the repositories of given size
+        and setup the Entropy Client to use them.
+        """
+        self.teardown()
+        self.size = size
+        repo_path, installed_path = self._repository_paths(size)
+
+        # keep the on-disk cache inside the work directory
+        entropy.dump.D_DIR = self._cache_dir
+        self._client = Client(installed_repo = -1, indexing = False,
+            xcache = True, repo_validation = False)
+
+        generate = not (os.path.isfile(repo_path) and \
+                            os.path.isfile(installed_path))
+        if generate:
+            for path in (repo_path, installed_path):
+                if os.path.isfile(path):
+                    os.remove(path)
+            sys.stderr.write("generating %d packages repository...\n" % (
+                size,))
+
+        self._repo = self._client.open_generic_repository(
+            repo_path, name = REPOSITORY_ID, xcache = True,
+            indexing_override = True, skip_checks = True)
+        self._installed_repo = self._client.open_generic_repository(
+            installed_path, name = InstalledPackagesRepository.NAME,
+            xcache = True, indexing_override = True, skip_checks = True)
+        if generate:
+            t1 = time.time()
+            self._repo.initializeRepository()
+            self._installed_repo.initializeRepository()
+            _generate(size, self._seed, self._repo, self._installed_repo)
+            sys.stderr.write("generated in %.1fs\n" % (time.time() - t1,))
+
+        self._client._real_installed_repository = self._installed_repo
+        # register the repository as temporary one, see
+        # Client._init_generic_temp_repository()
+        self._client._memory_db_instances[
+            (REPOSITORY_ID, etpConst['systemroot'])] = self._repo
+        self._client.add_repository({
+            'repoid': REPOSITORY_ID,
+            '__temporary__': True,
+            'description': "Synthetic benchmark repository",
+            'packages': [],
+            'dbpath': repo_path,
+        })
+
+    def teardown(self):
+        """
+        Close the repositories and the Entropy Client.
+        """
+        if self._client is None:
+            return
+        self._client.remove_repository(REPOSITORY_ID)
+        self._installed_repo.close()
+        self._client.shutdown()
+        self._client = None
+        self._repo = None
+        self._installed_repo = None
+
+    def drop_caches(self):
+        """
+        Drop the in-memory and on-disk Entropy caches.
+        """
+        cacher = EntropyCacher()
+        cacher.sync()
+        cacher.discard()
+        self._repo.clearCache()
+        self._installed_repo.clearCache()
+        shutil.rmtree(self._cache_dir, True)
+
+    def warm_caches(self):
+        """
+        Wait for the asynchronous cache writes to complete.
+        """
+        EntropyCacher().sync()
+
+    def run(self, func, setup = None):
+        """
+        Run func() repeat times, calling setup() before each run, return
+        the timings.
+        """
+        timings = []
+        for _count in range(self._repeat):
+            if setup is not None:
+                setup()
+            t1 = time.time()
+            func()
+            timings.append(time.time() - t1)
+        return timings
+
+    def run_cached(self, func):
+        """
+        Run func() with cold and with warm caches, return a dict of
+        timings, keyed by cache mode.
+        """
+        def _warm():
+            self.drop_caches()
+            func()
+            self.warm_caches()
+
+        return {
+            'cold': self.run(func, setup = self.drop_caches),
+            'warm': self.run(func, setup = _warm),
+        }
+
+    def _sample_atoms(self, count):
+        rng = random.Random(self._seed)
+        keys = list(self._repo.listAllPackages(order_by = "package_id"))
+        keys = rng.sample(keys, min(count, len(keys)))
+        atoms = []
+        for atom, package_id, branch in keys:
+            key = entropy.dep.dep_getkey(atom)
+            choice = rng.random()
+            if choice < 0.4:
+                atoms.append(key)
+            elif choice < 0.7:
+                atoms.append(">=%s-1.0" % (key,))
+            elif choice < 0.9:
+                atoms.append("%s:0" % (key,))
+            else:
+                atoms.append("%s-missing" % (key,))
+        return atoms
+
+    def bench_atom_match(self):
+        """
+        EntropyRepository.atomMatch() on 500 dependency strings.
+        """
+        atoms = self._sample_atoms(500)
+        repo = self._repo
+
+        def _match():
+            for atom in atoms:
+                repo.atomMatch(atom)
+        return self.run_cached(_match)
+
+    def bench_client_atom_match(self):
+        """
+        Client.atom_match() on 200 dependency strings.
+        """
+        atoms = self._sample_atoms(200)
+        client = self._client
+
+        def _match():
+            for atom in atoms:
+                client.atom_match(atom)
+        return self.run_cached(_match)
+
+    def bench_calculate_updates(self):
+        """
+        Client.calculate_updates().
+        """
+        client = self._client
+
+        def _calculate():
+            client.calculate_updates(quiet = True)
+        return self.run_cached(_calculate)
+
+    def bench_get_install_queue(self):
+        """
+        Client.get_install_queue() of the 5 most recently added packages.
+        """
+        client = self._client
+        package_ids = sorted(self._repo.listAllPackageIds())[-5:]
+        matches = [(x, REPOSITORY_ID) for x in package_ids]
+
+        def _queue():
+            client.get_install_queue(matches, False, True, quiet = True)
+        return self.run_cached(_queue)
+
+    def bench_topological_sort(self):
+        """
+        TopologicalSorter.sort() of the whole repository dependency graph.
+        """
+        repo = self._repo
+        adjacency_map = {}
+        for package_id in repo.listAllPackageIds():
+            successors = set()
+            for dep in repo.retrieveDependenciesList(package_id):
+                dep_package_id, _rc = repo.atomMatch(dep)
+                if dep_package_id != -1:
+                    successors.add(dep_package_id)
+            adjacency_map[package_id] = successors
+        sys.setrecursionlimit(max(sys.getrecursionlimit(),
+                                  len(adjacency_map) + 1000))
+
+        def _sort():
+            TopologicalSorter(adjacency_map).sort()
+        return {None: self.run(_sort)}
+
+    def bench_repository_checksum(self):
+        """
+        EntropyRepository.checksum().
+        """
+        repo = self._repo
+
+        def _checksum():
+            repo.checksum(do_order = True, strict = False)
+        return self.run_cached(_checksum)
+
+    def _bench_cache_load(self, payloads):
+        """
+        Time entropy.dump.loadobj() of the given payloads, one file each,
+        written in legacy (protocol 0 pickle), portable and native format.
+        """
+        tmp_dir = const_mkdtemp(prefix = "benchmark.cache")
+        timings = {}
+        try:
+            for variant in ("legacy", "portable", "native"):
+                paths = []
+                for count, payload in enumerate(payloads):
+                    path = os.path.join(tmp_dir, "%s-%d" % (variant, count))
+                    if variant == "legacy":
+                        with open(path, "wb") as dmp_f:
+                            entropy.dump.pickle.dump(payload, dmp_f, 0)
+                    else:
+                        entropy.dump.dumpobj(
+                            path, payload, complete_path = True,
+                            ignore_exceptions = False,
+                            portable = variant == "portable")
+                    paths.append(path)
+
+                def _load():
+                    for path in paths:
+                        entropy.dump.loadobj(path, complete_path = True)
+                timings[variant] = self.run(_load)
+        finally:
+            shutil.rmtree(tmp_dir, True)
+        return timings
+
+    def bench_cache_load_updates(self):
+        """
+        entropy.dump.loadobj() of the Client.calculate_updates() result.
+        """
+        self.drop_caches()
+        updates = self._client.calculate_updates(quiet = True)
+        return self._bench_cache_load([updates])
+
+    def bench_cache_load_atom_match(self):
+        """
+        entropy.dump.loadobj() of 500 EntropyRepository.atomMatch()
+        results, one file each, like the on-disk cache does.
+        """
+        repo = self._repo
+        payloads = []
+        for atom in self._sample_atoms(500):
+            payloads.append(repo.atomMatch(atom))
+            payloads.append(repo.atomMatch(atom, multiMatch = True))
+        return self._bench_cache_load(payloads)
+
+    def bench_compare_versions(self):
+        """
+        entropy.dep.compare_versions() on 20000 version pairs.
+        """
+        rng = random.Random(self._seed)
+        suffixes = ("", "_alpha1", "_beta2", "_pre3", "_rc1", "_p1", "-r1",
+                    "-r2", "a", "_rc2-r1")
+
+        def _version():
+            return "%d.%d.%d%s" % (
+                rng.randint(0, 3), rng.randint(0, 20), rng.randint(0, 20),
+                rng.choice(suffixes))
+        pairs = [(_version(), _version()) for _count in range(20000)]
+
+        def _compare():
+            for ver1, ver2 in pairs:
+                entropy.dep.compare_versions(ver1, ver2)
+        return {None: self.run(_compare)}
+
+    def _test_packages(self):
+        return [_misc.get_test_generic_package(x) for x in _TEST_PACKAGES]
+
+    def bench_package_digest(self):
+        """
+        md5 and sha256 digests of the test package files.
+        """
+        paths = self._test_packages()
+
+        def _digest():
+            for path in paths:
+                entropy.tools.md5sum(path)
+                entropy.tools.sha256(path)
+        return {None: self.run(_digest)}
+
+    def bench_unpack(self):
+        """
+        entropy.tools.uncompress_tarball() of the test package files.
+        """
+        paths = self._test_packages()
+        tmp_dir = const_mkdtemp(prefix = "benchmark.unpack")
+        counter = [0]
+
+        def _unpack():
+            for path in paths:
+                counter[0] += 1
+                extract_path = os.path.join(tmp_dir, str(counter[0]))
+                entropy.tools.uncompress_tarball(
+                    path, extract_path = extract_path, catch_empty = True)
+        try:
+            return {None: self.run(_unpack)}
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+    def bench_merge(self):
+        """
+        Move the unpacked test package files to a new root, file by file,
+        like the install action does.
+        """
+        paths = self._test_packages()
+        tmp_dir = const_mkdtemp(prefix = "benchmark.merge")
+        image_dirs = []
+
+        def _unpack():
+            del image_dirs[:]
+            shutil.rmtree(os.path.join(tmp_dir, "root"), True)
+            for count, path in enumerate(paths):
+                image_dir = os.path.join(tmp_dir, "image%d" % (count,))
+                shutil.rmtree(image_dir, True)
+                entropy.tools.uncompress_tarball(
+                    path, extract_path = image_dir, catch_empty = True)
+                image_dirs.append(image_dir)
+
+        def _merge():
+            root = os.path.join(tmp_dir, "root")
+            for image_dir in image_dirs:
+                for current_dir, dirs, files in os.walk(image_dir):
+                    rel_dir = os.path.relpath(current_dir, image_dir)
+                    dest_dir = os.path.normpath(os.path.join(root, rel_dir))
+                    if not os.path.isdir(dest_dir):
+                        os.makedirs(dest_dir)
+                    for name in files:
+                        entropy.tools.movefile(
+                            os.path.join(current_dir, name),
+                            os.path.join(dest_dir, name),
+                            src_basedir = image_dir)
+        try:
+            return {None: self.run(_merge, setup = _unpack)}
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+
+# benchmarks depending on the repository size
+REPOSITORY_BENCHMARKS = ("atom_match", "client_atom_match",
+                         "calculate_updates", "get_install_queue",
+                         "topological_sort", "repository_checksum",
+                         "cache_load_updates", "cache_load_atom_match")
+# benchmarks independent of the repository size
+STATIC_BENCHMARKS = ("compare_versions", "package_digest", "unpack",
+                     "merge")
+
+
+def _result_key(name, mode, size):
+    key = name
+    if mode is not None:
+        key += "." + mode
+    if size is not None:
+        key += "@%d" % (size,)
+    return key
+
+
+def _summarize(timings):
+    timings = sorted(timings)
+    return {
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'runs': len(timings),
+    }
+
+
+def _compare(results, baseline, threshold):
+    """
+    Print the comparison between results and baseline, return the list
+    of regressed benchmarks.
+    """
+    regressions = []
+    base_results = baseline.get('results', {})
+    sys.stdout.write("%-40s %11s %11s %8s\n" % (
+        "benchmark", "baseline", "current", "delta"))
+    for key in sorted(results):
+        current = results[key]['median']
+        base = base_results.get(key)
+        if base is None:
+            sys.stdout.write("%-40s %10.4fs %10s\n" % (key, current, "new"))
+            continue
+        base = base['median']
+        ratio = (current - base) / base if base else 0.0
+        mark = ""
+        if ratio > threshold:
+            mark = " REGRESSION"
+            regressions.append(key)
+        elif ratio < -threshold:
+            mark = " improved"
+        sys.stdout.write("%-40s %10.4fs %10.4fs %+7.1f%%%s\n" % (
+            key, base, current, ratio * 100.0, mark))
+    return regressions
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description = "Entropy performance benchmark suite")
+    parser.add_argument("--sizes", default = "1000",
+        help = "comma separated synthetic repository sizes "
+               "(default: 1000, for instance: 1000,10000,50000)")
+    parser.add_argument("--repeat", type = int, default = 3,
+        help = "runs per benchmark (default: 3)")
+    parser.add_argument("--only", default = None,
+        help = "comma separated list of benchmarks to run, available: %s" % (
+            ", ".join(REPOSITORY_BENCHMARKS + STATIC_BENCHMARKS),))
+    parser.add_argument("--seed", type = int, default = 42,
+        help = "synthetic repositories random seed")
+    parser.add_argument("--work-dir", default = None,
+        help = "directory keeping the generated repositories across runs")
+    parser.add_argument("--save", default = None, metavar = "<file>",
+        help = "save results as JSON baseline")
+    parser.add_argument("--compare", default = None, metavar = "<file>",
+        help = "compare results with the given JSON baseline")
+    parser.add_argument("--threshold", type = float, default = 0.1,
+        help = "regression threshold ratio for --compare (default: 0.1)")
+    nsargs = parser.parse_args(args)
+
+    sizes = [int(x) for x in nsargs.sizes.split(",") if x.strip()]
+    names = REPOSITORY_BENCHMARKS + STATIC_BENCHMARKS
+    if nsargs.only:
+        only = set(x.strip() for x in nsargs.only.split(","))
+        unknown = only - set(names)
+        if unknown:
+            parser.error("unknown benchmarks: %s" % (
+                ", ".join(sorted(unknown)),))
+        names = [x for x in names if x in only]
+
+    baseline = None
+    if nsargs.compare:
+        with open(nsargs.compare, "r") as base_f:
+            baseline = json.load(base_f)
+
+    work_dir = nsargs.work_dir
+    remove_work_dir = work_dir is None
+    if work_dir is None:
+        work_dir = const_mkdtemp(prefix = "entropy.benchmark")
+    elif not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+
+    set_mute(True)
+    results = {}
+    bench = Benchmark(work_dir, nsargs.seed, nsargs.repeat)
+    try:
+        for size in sizes:
+            repo_names = [x for x in names if x in REPOSITORY_BENCHMARKS]
+            if not repo_names:
+                break
+            bench.setup(size)
+            for name in repo_names:
+                timings = getattr(bench, "bench_" + name)()
+                for mode, mode_timings in timings.items():
+                    key = _result_key(name, mode, size)
+                    results[key] = _summarize(mode_timings)
+                    sys.stderr.write("%-40s %10.4fs\n" % (
+                        key, results[key]['median']))
+        bench.teardown()
+
+        for name in names:
+            if name not in STATIC_BENCHMARKS:
+                continue
+            timings = getattr(bench, "bench_" + name)()
+            for mode, mode_timings in timings.items():
+                key = _result_key(name, mode, None)
+                results[key] = _summarize(mode_timings)
+                sys.stderr.write("%-40s %10.4fs\n" % (
+                    key, results[key]['median']))
+    finally:
+        bench.teardown()
+        set_mute(False)
+        if remove_work_dir:
+            shutil.rmtree(work_dir, True)
+
+    if nsargs.save:
+        data = {
+            'version': BASELINE_VERSION,
+            'generator': GENERATOR_VERSION,
+            'seed': nsargs.seed,
+            'repeat': nsargs.repeat,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'date': time.time(),
+            'results': results,
+        }
+        with open(nsargs.save, "w") as save_f:
+            json.dump(data, save_f, indent = 2, sort_keys = True)
+
+    if baseline is not None:
+        if baseline.get('seed') != nsargs.seed or \
+                baseline.get('generator') != GENERATOR_VERSION:
+            sys.stderr.write("warning: baseline generated with different "
+                             "synthetic repositories\n")
+        if baseline.get('python') != platform.python_version():
+            sys.stderr.write("warning: baseline generated with Python %s\n"
+                             % (baseline.get('python'),))
+        regressions = _compare(results, baseline, nsargs.threshold)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -419,6 +419,44 @@ class ToolsTest(unittest.TestCase):
         self.assertEqual(et.convert_seconds_to_fancy_output(seconds),
             '45m:40s')
 
+    def test_changelog_index(self):
+        import io
+        import time
+        from entropy.const import etpConst
+
+        def _entry(package_id, month):
+            date_str = time.strftime(etpConst['changelog_date_format'],
+                (2013, month, 1, 10, 0, 0, 0, 1, 0))
+            return const_convert_to_rawstring(
+                "commit 1; %d; hash\nDate:    %s\nName:    app-foo/bar-%d\n"
+                "\n    message\n\n" % (package_id, date_str, package_id))
+
+        old_entries = [_entry(3, 2), _entry(2, 2), _entry(1, 1)]
+        new_entry = _entry(4, 3)
+        changelog = const_convert_to_rawstring("").join(old_entries)
+
+        size, ranges = et.build_changelog_index(io.BytesIO(changelog))
+        self.assertEqual(size, len(changelog))
+        self.assertEqual([x[0] for x in ranges], ["201302", "201301"])
+        self.assertEqual(changelog[ranges[1][1]:ranges[1][2]],
+            old_entries[2])
+
+        ranges = et.prepend_changelog_index(ranges,
+            [("201303", len(new_entry))])
+        changelog = new_entry + changelog
+        self.assertEqual(ranges,
+            et.build_changelog_index(io.BytesIO(changelog))[1])
+
+        tmp_dir = const_mkdtemp()
+        try:
+            index_path = os.path.join(tmp_dir, "index")
+            self.assertEqual(et.read_changelog_index(index_path), None)
+            et.write_changelog_index(index_path, len(changelog), ranges)
+            self.assertEqual(et.read_changelog_index(index_path),
+                (len(changelog), ranges))
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
     def test_is_valid_string(self):
         valid = "ciasdoad"
         non_valid = "òèàòè"
@@ -50,7 +50,8 @@ def save_settings(settings):
     try:
         if not os.path.isdir(os.path.dirname(SETTINGS_FILE)):
             os.makedirs(os.path.dirname(SETTINGS_FILE))
-        entropy.dump.dumpobj(SETTINGS_FILE, settings, complete_path = True)
+        entropy.dump.dumpobj(SETTINGS_FILE, settings, complete_path = True,
+            portable = True)
     except:
         pass
 
@@ -1357,15 +1357,21 @@ class Application(object):
                 if not repo.isPackageIdAvailable(self._pkg_id):
                     self._vanished_callback(self)
 
-            version = repo.retrieveVersion(self._pkg_id)
+            data = repo.getPackageData(
+                self._pkg_id,
+                fields = ("version", "versiontag", "description"))
+            if data is None:
+                data = {}
+
+            version = data.get("version")
             if version is None:
                 version = _("N/A")
-            tag = repo.retrieveTag(self._pkg_id)
+            tag = data.get("versiontag")
             if not tag:
                 tag = ""
             else:
                 tag = "#" + tag
-            description = repo.retrieveDescription(self._pkg_id)
+            description = data.get("description")
             if description is None:
                 description = _("No description")
             if len(description) > 79:
@@ -1409,7 +1415,13 @@ class Application(object):
             name = " ".join([x.capitalize() for x in \
                                  name.replace("-"," ").split()])
             name = escape_markup(name)
-            website = repo.retrieveHomepage(self._pkg_id)
+            data = repo.getPackageData(
+                self._pkg_id,
+                fields = ("homepage", "description", "datecreation"))
+            if data is None:
+                data = {}
+
+            website = data.get("homepage")
             if website:
                 name = "<a href=\"%s\">%s</a>" % (
                     escape_markup(website),
@@ -1422,13 +1434,13 @@ class Application(object):
 
             revision_txt = "~%d" % (revision,)
 
-            description = repo.retrieveDescription(self._pkg_id)
+            description = data.get("description")
             if description is None:
                 description = _("No description")
             if len(description) > 79:
                 description =  description[:80].strip() + "..."
 
-            cdate = repo.retrieveCreationDate(self._pkg_id)
+            cdate = data.get("datecreation")
             if cdate:
                 date = time.strftime("%B %d, %Y",
                     time.gmtime(float(cdate))).capitalize()
@@ -1478,7 +1490,14 @@ class Application(object):
                 if not repo.isPackageIdAvailable(self._pkg_id):
                     self._vanished_callback(self)
 
-            licenses = repo.retrieveLicense(self._pkg_id)
+            data = repo.getPackageData(
+                self._pkg_id,
+                fields = ("license", "disksize", "size", "digest",
+                          "useflags"))
+            if data is None:
+                data = {}
+
+            licenses = data.get("license")
             if licenses:
                 licenses_txt = "<b>%s</b>: " % (escape_markup(_("License")),)
                 licenses_txt += prepare_markup(", ".join(sorted([
@@ -1487,29 +1506,28 @@ class Application(object):
             else:
                 licenses_txt = ""
 
-            required_space = repo.retrieveOnDiskSize(self._pkg_id)
+            required_space = data.get("disksize")
             if required_space is None:
                 required_space = 0
             required_space_txt = "<b>%s</b>: %s" % (
                 escape_markup(_("Required space")),
                 escape_markup(entropy.tools.bytes_into_human(required_space)),)
 
-            down_size = repo.retrieveSize(self._pkg_id)
+            down_size = data.get("size")
             if down_size is None:
                 down_size = 0
             down_size_txt = "<b>%s</b>: %s" % (
                 escape_markup(_("Download size")),
                 escape_markup(entropy.tools.bytes_into_human(down_size)),)
 
-            digest = repo.retrieveDigest(self._pkg_id)
+            digest = data.get("digest")
             if digest is None:
                 digest = _("N/A")
             digest_txt = "<b>%s</b>: %s" % (
                 escape_markup(_("Checksum")),
                 escape_markup(digest))
 
-            uses = repo.retrieveUseflags(self._pkg_id)
-            uses = sorted(uses)
+            uses = sorted(data.get("useflags", ()))
             use_list = []
             use_url = "%s/useflag/" % (etpConst['packages_website_url'],)
             for use in uses:
@@ -208,12 +208,7 @@ class ApplicationsViewController(GObject.Object):
                 use_fallback = False
                 sort = True
                 sets = self._entropy.Sets()
-                package_deps = sets.expand(text)
-                for package_dep in package_deps:
-                    pkg_id, pkg_repo = self._entropy.atom_match(
-                        package_dep)
-                    if pkg_id != -1:
-                        matches.append((pkg_id, pkg_repo))
+                matches.extend(sets.matches(text))
 
             elif show_exact and search_args:
                 use_fallback = False
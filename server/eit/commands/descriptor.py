@@ -10,6 +10,8 @@
     Eit Command descriptor class.
 
 """
+import os
+
 
 class EitCommandDescriptor(object):
     """
@@ -20,6 +22,8 @@ class EitCommandDescriptor(object):
     EIT_COMMANDS = []
     EIT_COMMANDS_MAP = {}
 
+    _EIT_COMMANDS_LOADED = False
+
     @staticmethod
     def register(descriptor):
         """
@@ -29,13 +33,72 @@ class EitCommandDescriptor(object):
         EitCommandDescriptor.EIT_COMMANDS_MAP[descriptor.get_name()] = \
             descriptor
 
+    @staticmethod
+    def _load_all():
+        """
+        Import all the eit.commands modules, so that every
+        command gets registered.
+        """
+        if EitCommandDescriptor._EIT_COMMANDS_LOADED:
+            return
+
+        cur_dir = os.path.dirname(os.path.abspath(__file__))
+        for py_file in sorted(os.listdir(cur_dir)):
+            if not py_file.endswith(".py"):
+                continue
+            if py_file.startswith("_"):
+                continue
+            # strip .py
+            mod = py_file[:-3]
+            if mod == "descriptor":
+                continue
+            try:
+                __import__("eit.commands." + mod)
+            except ValueError:
+                # garbage
+                continue
+        EitCommandDescriptor._EIT_COMMANDS_LOADED = True
+
     @staticmethod
     def obtain():
         """
         Get the list of registered EitCommandDescriptor object
         """
+        EitCommandDescriptor._load_all()
         return EitCommandDescriptor.EIT_COMMANDS[:]
 
+    @staticmethod
+    def obtain_class(name):
+        """
+        Get the EitCommand class bound to the given command name
+        or alias. Only the module named after the command is imported,
+        aliases and unknown names cause all the commands to be loaded.
+
+        @param name: command name or alias
+        @type name: string
+        @return: the EitCommand class or None, if not found
+        @rtype: class or None
+        """
+        if not EitCommandDescriptor._EIT_COMMANDS_LOADED and \
+                name and "." not in name and not name.startswith("_") and \
+                name != "descriptor":
+            try:
+                __import__("eit.commands." + name)
+            except ImportError:
+                pass
+
+        def _lookup():
+            for descriptor in EitCommandDescriptor.EIT_COMMANDS:
+                klass = descriptor.get_class()
+                if klass.NAME == name or name in klass.ALIASES:
+                    return klass
+
+        klass = _lookup()
+        if klass is None:
+            EitCommandDescriptor._load_all()
+            klass = _lookup()
+        return klass
+
     @staticmethod
     def obtain_descriptor(name):
         """
@@ -47,7 +110,11 @@ class EitCommandDescriptor(object):
         @raise KeyError: if name isn't bound to any
         EitCommandDescriptor object.
         """
-        return EitCommandDescriptor.EIT_COMMANDS_MAP[name]
+        descriptor = EitCommandDescriptor.EIT_COMMANDS_MAP.get(name)
+        if descriptor is None:
+            EitCommandDescriptor._load_all()
+            descriptor = EitCommandDescriptor.EIT_COMMANDS_MAP[name]
+        return descriptor
 
     def __init__(self, klass, name, description):
         self._klass = klass
@@ -49,17 +49,6 @@ def main():
 
     install_exception_handler()
 
-    descriptors = EitCommandDescriptor.obtain()
-    args_map = {}
-    catch_all = None
-    for descriptor in descriptors:
-        klass = descriptor.get_class()
-        if klass.CATCH_ALL:
-            catch_all = klass
-        args_map[klass.NAME] = klass
-        for alias in klass.ALIASES:
-            args_map[alias] = klass
-
     args = sys.argv[1:]
     # convert args to unicode, to avoid passing
     # raw string stuff down to entropy layers
@@ -88,7 +77,11 @@ def main():
         last_arg = args[-1]
         cmd = args[0]
         args = args[1:]
-    cmd_class = args_map.get(cmd)
+    # only import the modules implementing the requested command
+    catch_all = EitCommandDescriptor.obtain_class("help")
+    cmd_class = None
+    if cmd is not None:
+        cmd_class = EitCommandDescriptor.obtain_class(cmd)
 
     if cmd_class is None:
         cmd_class = catch_all